@@ -0,0 +1,377 @@
+# benchmark_suite.py
+"""
+Headless end-to-end benchmark of the measurement pipeline against the simulated instrument.
+
+Every measurement type is run through MeasurementBase.perform_measurement_flow (plus the PNG
+render the GUI does afterwards) at several point counts. Phase times are taken from the
+tracing_utils spans the pipeline records; medians are written as JSON and compared with a
+stored baseline:
+
+    python benchmark_suite.py                                  # run, compare with benchmark_baseline.json
+    python benchmark_suite.py --sizes 101 1001 --repeat 5 --output results.json
+    python benchmark_suite.py --update-baseline                # re-record the baseline on this machine
+
+Exit code is 1 when a phase regresses beyond the tolerance, so it can gate CI / pre-merge runs.
+
+--extract-corpus runs the parameter_extraction benchmark instead: Vth (all methods), SS and the
+other engines are extracted from a synthetic corpus of noisy curves in one batch call and one
+sweep at a time, and the cost per sweep is printed (no baseline comparison), followed by the
+diode fit's parameter errors against the known synthetic values:
+
+    python benchmark_suite.py --extract-corpus 2000 --extract-points 301 --vth-smooth 7 --ss-window 5
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import matplotlib
+matplotlib.use("Agg")  # Headless: must be selected before pyplot is imported by the plotting modules
+import matplotlib.pyplot as plt
+import numpy as np
+
+import config_settings
+import instrument_utils
+import parameter_extraction
+import gate_transfer_module
+import output_module
+import breakdown_module
+import diode_module
+import stress_module
+
+PHASES = [
+    "script_upload",           # loadscript/endscript + script run (sweep executes on the instrument)
+    "buffer_count_query",
+    "buffer_readout",          # printbuffer transfers + consistent length
+    "normalization",           # buffers copied into the run's MeasurementRecord
+    "source_current_density",  # calculate_source_current + calculate_current_densities
+    "specific_processing",
+    "csv_save",
+    "plot_render",
+]
+
+# Benchmark phase -> tracing_utils span names recorded by MeasurementBase / plotting_utils
+PHASE_SPANS = {
+    "script_upload": ["load_and_run_tsp", "wait_script_complete"],
+    "buffer_count_query": ["query_buffer_count"],
+    "buffer_readout": ["read_buffers", "determine_consistent_length"],
+    "normalization": ["build_record"],
+    "source_current_density": ["calculate_source_current", "calculate_current_densities"],
+    "specific_processing": ["specific_data_processing"],
+    "csv_save": ["save_to_csv"],
+    "plot_render": ["plot_draw", "plot_savefig"],
+}
+
+
+# --- Sweep configurations: `n` is the number of points per sweep leg / curve / stress sample ---
+
+def _gt_config(n):
+    return {"Vg_start": -1.0, "Vg_stop": 2.0, "step": 3.0 / (n - 1), "Vd": 1.0, "enable_backward": 1,
+            "IlimitDrain": 1.0, "IlimitGate": 0.01, "Drain_nplc": 1, "Gate_nplc": 1, "settling_delay": 0.0}
+
+def _output_config(n):
+    return {"Vg_start": 0.0, "Vg_stop": 2.0, "Vg_step": 4, "Vd_start": 0.0, "Vd_stop": 5.0, "Vd_step": 5.0 / (n - 1),
+            "IlimitDrain": 1.0, "IlimitGate": 0.01, "Drain_nplc": 1, "Gate_nplc": 1, "settling_delay": 0.0}
+
+def _breakdown_config(n):
+    # Stays below the simulated BV so the sweep is never cut short by compliance
+    return {"Vg": -2.0, "Vd_start": 0.0, "Vd_stop": 60.0, "Vd_step": 60.0 / (n - 1),
+            "IlimitDrain": 0.01, "IlimitGate": 0.01, "Drain_nplc": 1, "Gate_nplc": 1, "settling_delay": 0.0}
+
+def _diode_config(n):
+    return {"Vanode_start": -2.0, "Vanode_stop": 1.0, "Vanode_step": 3.0 / (n - 1), "enable_backward": 1,
+            "IlimitAnode": 1.0, "IlimitCathode": 1.0, "Anode_nplc": 1, "Cathode_nplc": 1, "settling_delay": 0.0}
+
+def _stress_config(n):
+    return {"VD_stress_val": 5.0, "VG_stress_val": 2.0, "VS_stress_val": 0.0,
+            "stress_duration_val": float(n - 1), "stress_measure_interval_val": 1.0, "initial_settling_delay_stress": 0.0,
+            "IlimitDrain_stress": 1.0, "IlimitGate_stress": 0.01, "IlimitSource_stress": 1.0,
+            "Drain_nplc_stress": 1, "Gate_nplc_stress": 1, "Source_nplc_stress": 1}
+
+# name -> (measurement class, plot function, measurement_type_name, simulated device, config builder)
+BENCHMARK_CASES = {
+    "GateTransfer": (gate_transfer_module.GateTransferMeasurement, gate_transfer_module.generate_gate_transfer_plot,
+                     "Gate Transfer", "MOSFET", _gt_config),
+    "Output": (output_module.OutputMeasurement, output_module.generate_output_plot,
+               "Output Characteristics", "MOSFET", _output_config),
+    "Breakdown": (breakdown_module.BreakdownMeasurement, breakdown_module.generate_breakdown_plot,
+                  "Breakdown Characteristics", "MOSFET", _breakdown_config),
+    "Diode": (diode_module.DiodeMeasurement, diode_module.generate_diode_plot,
+              "Diode Characterization", "DIODE", _diode_config),
+    "Stress": (stress_module.StressMeasurement, stress_module.generate_stress_plot,
+               "Stress Test", "MOSFET", _stress_config),
+}
+
+
+def _simulator_resource(device, seed, io_latency_s):
+    return f"{config_settings.SIMULATOR_RESOURCE_PREFIX}26XX::{device}?seed={seed}&io_latency_s={io_latency_s}"
+
+
+def run_case(case_name, n_points, output_dir, io_latency_s=0.0, seed=0, chrome_trace_dir=None):
+    """Run one measurement once; returns {"phases": {phase: s}, "total_s": s, "points": n_rows}."""
+    measurement_cls, plot_function, type_name, device, config_builder = BENCHMARK_CASES[case_name]
+    config = {
+        "output_dir": output_dir, "file_name": f"bench_{case_name}_{n_points}",
+        "device_type": "lateral", "channel_width_um": 100.0, "area_um2": 0.0,
+        "measurement_type_name": type_name,
+    }
+    config.update(config_builder(n_points))
+    config[config_settings.CONFIG_KEY_TRACE_JSONL] = False
+    measurement = measurement_cls()
+
+    t_start = time.perf_counter()
+    with instrument_utils.visa_instrument(_simulator_resource(device, seed, io_latency_s),
+                                          config_settings.DEFAULT_TIMEOUT, type_name) as inst:
+        plot_data_package = measurement.perform_measurement_flow(config, inst)
+    plot_data_package["target_figure"] = None
+    plot_function(plot_data_package)  # Records plot_draw / plot_savefig into the measurement's tracer
+    plt.close("all")
+    total_s = time.perf_counter() - t_start
+
+    tracer = measurement.tracer
+    if chrome_trace_dir:
+        tracer.export_chrome_trace(os.path.join(chrome_trace_dir, f"{case_name}_{n_points}_seed{seed}.chrome.json"))
+    return {
+        "phases": {phase: tracer.total_ms(*PHASE_SPANS[phase]) / 1000.0 for phase in PHASES},
+        "total_s": total_s,
+        "points": int(measurement.consistent_len),
+    }
+
+
+def run_benchmarks(case_names, sizes, repeat, io_latency_s=0.0, progress=True, chrome_trace_dir=None):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="ims_bench_") as output_dir:
+        for case_name in case_names:
+            results[case_name] = {}
+            for n_points in sizes:
+                runs = [run_case(case_name, n_points, output_dir, io_latency_s=io_latency_s, seed=i,
+                                 chrome_trace_dir=chrome_trace_dir) for i in range(repeat)]
+                entry = {
+                    "points": runs[0]["points"],
+                    "phases": {phase: statistics.median(r["phases"][phase] for r in runs) for phase in PHASES},
+                    "total_s": statistics.median(r["total_s"] for r in runs),
+                    "total_min_s": min(r["total_s"] for r in runs),
+                }
+                results[case_name][str(n_points)] = entry
+                if progress:
+                    print(f"  {case_name:<13} n={n_points:<6} rows={entry['points']:<6} total={entry['total_s'] * 1000:9.1f} ms", file=sys.stderr)
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "matplotlib": matplotlib.__version__,
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "sizes": list(sizes),
+            "io_latency_s": io_latency_s,
+        },
+        "results": results,
+    }
+
+
+def synthetic_transfer_corpus(n_sweeps, n_points, seed=0, vd=0.1, noise_a=1e-9):
+    """
+    Noisy EKV transfer curves (Vg -1..2 V) with per-sweep Vth / SS / beta spread, in the same
+    form as the simulated MOSFET. Returns (vg, id) arrays of shape (n_sweeps, n_points).
+    """
+    rng = np.random.default_rng(seed)
+    phit = 0.02585
+    vg = np.broadcast_to(np.linspace(-1.0, 2.0, n_points), (n_sweeps, n_points)).copy()
+    vth = rng.normal(0.5, 0.1, (n_sweeps, 1))
+    n_slope = rng.uniform(70.0, 120.0, (n_sweeps, 1)) / (1000.0 * phit * np.log(10))
+    beta = rng.uniform(0.01, 0.03, (n_sweeps, 1))
+    vp = (vg - vth) / n_slope
+    ekv = lambda x: np.logaddexp(0.0, x) ** 2
+    i_d = beta * n_slope * 2.0 * phit * phit * (ekv(vp / (2.0 * phit)) - ekv((vp - vd) / (2.0 * phit)))
+    return vg, i_d + rng.normal(0.0, noise_a, i_d.shape)
+
+
+def synthetic_diode_corpus(n_sweeps, n_points, seed=0, noise_rel=0.01):
+    """
+    Shockley + Rs forward curves with per-sweep n / Is / Rs spread: I log-spaced from 1e-9 to
+    0.1 A, V from the explicit form, then relative noise on I. Returns (v, i, truth) with v / i
+    of shape (n_sweeps, n_points) and truth a dict of the per-sweep 'n', 'Is', 'Rs'.
+    """
+    rng = np.random.default_rng(seed)
+    truth = {"n": rng.uniform(1.0, 2.0, n_sweeps), "Is": 10.0 ** rng.uniform(-15.0, -10.0, n_sweeps),
+             "Rs": rng.uniform(0.5, 20.0, n_sweeps)}
+    i = np.broadcast_to(np.geomspace(1e-9, 0.1, n_points), (n_sweeps, n_points))
+    n_vt = (truth["n"] * config_settings.DIODE_THERMAL_VOLTAGE_V)[:, None]
+    v = n_vt * np.log1p(i / truth["Is"][:, None]) + truth["Rs"][:, None] * i
+    return v, i * (1.0 + rng.normal(0.0, noise_rel, i.shape)), truth
+
+
+def synthetic_drift_corpus(n_sweeps, n_points, seed=0, noise_rel=0.01):
+    """
+    Stretched-exponential dId/Id0 traces, t log-spaced from 1 s to 1e5 s, with per-trace
+    D_inf / tau / beta spread and relative noise. Returns (t, drift) of shape (n_sweeps, n_points).
+    """
+    rng = np.random.default_rng(seed)
+    d_inf = rng.choice([-1.0, 1.0], n_sweeps) * 10.0 ** rng.uniform(-2.0, 0.0, n_sweeps)
+    tau, beta = 10.0 ** rng.uniform(1.0, 6.0, n_sweeps), rng.uniform(0.2, 0.8, n_sweeps)
+    t = np.broadcast_to(np.geomspace(1.0, 1e5, n_points), (n_sweeps, n_points))
+    drift = d_inf[:, None] * -np.expm1(-(t / tau[:, None]) ** beta[:, None])
+    return t, drift * (1.0 + rng.normal(0.0, noise_rel, drift.shape))
+
+
+def run_diode_accuracy(n_sweeps, n_points):
+    """Median and 95th-percentile relative error of the batched diode fit over a synthetic corpus."""
+    v, i, truth = synthetic_diode_corpus(n_sweeps, n_points, seed=2)
+    results = parameter_extraction.extract_diode(v, i, lengths=np.full(n_sweeps, n_points))
+    errors = {}
+    for key, true_values in truth.items():
+        relative = np.abs(results[key] / true_values - 1.0)
+        errors[key] = (np.nanmedian(relative), np.nanpercentile(relative, 95), np.isnan(relative).mean())
+    return errors
+
+
+def run_extraction_benchmark(n_sweeps, n_points, smooth_window, ss_window, repeat):
+    """
+    Per-sweep cost of extract_vth (all VTH_METHODS), extract_ss, extract_hysteresis (against a
+    reversed second corpus as the backward legs), extract_output and extract_breakdown (the same
+    rows read as Id-Vd curves and leakage sweeps; their cost only depends on the shape) and
+    extract_diode and extract_drift_kinetics (on synthetic diode and drift corpora): one batch call on pre-stacked rows, the same
+    after stack_sweeps, and a per-sweep loop of 1-D calls.
+    """
+    vg, i_d = synthetic_transfer_corpus(n_sweeps, n_points)
+    v_diode, i_diode, _ = synthetic_diode_corpus(n_sweeps, n_points)
+    t_drift, drift = synthetic_drift_corpus(n_sweeps, n_points)
+    vg_bwd, i_bwd = (rows[:, ::-1] for rows in synthetic_transfer_corpus(n_sweeps, n_points, seed=1))
+    lengths = np.full(n_sweeps, n_points)
+    loop_sweeps = min(n_sweeps, 200)  # The loop is only timed on a subset; its cost per sweep does not depend on the corpus size
+    # Each engine takes a row selector (all rows or one sweep) and the stacked lengths (None -> stack inside)
+    engines = {
+        "vth": lambda rows, lens: parameter_extraction.extract_vth(vg[rows], i_d[rows], smooth_window=smooth_window, lengths=lens),
+        "ss": lambda rows, lens: parameter_extraction.extract_ss(vg[rows], i_d[rows], window=ss_window, lengths=lens),
+        "hyst": lambda rows, lens: parameter_extraction.extract_hysteresis(vg[rows], i_d[rows], vg_bwd[rows], i_bwd[rows], lens, lens),
+        "output": lambda rows, lens: parameter_extraction.extract_output(vg[rows], i_d[rows], lengths=lens),
+        "breakdown": lambda rows, lens: parameter_extraction.extract_breakdown(vg[rows], i_d[rows], i_bwd[rows], i_d[rows], lengths=lens),
+        "diode": lambda rows, lens: parameter_extraction.extract_diode(v_diode[rows], i_diode[rows], lengths=lens),
+        "kinetics": lambda rows, lens: parameter_extraction.extract_drift_kinetics(t_drift[rows], drift[rows], lengths=lens),
+    }
+    timings = {}
+    for engine_name, engine in engines.items():
+        cases = {
+            "batch": (lambda: engine(slice(None), lengths), n_sweeps),
+            "stack+batch": (lambda: engine(slice(None), None), n_sweeps),
+            "per-sweep": (lambda: [engine(k, None) for k in range(loop_sweeps)], loop_sweeps),
+        }
+        for mode, (call, sweeps_done) in cases.items():
+            timings[f"{engine_name} {mode}"] = min(_timed(call) for _ in range(repeat)) / sweeps_done
+    return timings
+
+
+def _timed(call):
+    t_start = time.perf_counter()
+    call()
+    return time.perf_counter() - t_start
+
+
+def compare_to_baseline(current, baseline, tolerance, min_delta_s):
+    """
+    Returns a list of regression descriptions. A phase regresses when it is slower than the
+    baseline by more than `tolerance` (relative) AND by more than `min_delta_s` (absolute),
+    the latter keeping sub-millisecond phases from flagging on scheduler noise.
+    """
+    regressions = []
+    for case_name, sizes in current["results"].items():
+        for size, entry in sizes.items():
+            base_entry = baseline.get("results", {}).get(case_name, {}).get(size)
+            if base_entry is None:
+                continue
+            pairs = [(phase, entry["phases"][phase], base_entry.get("phases", {}).get(phase)) for phase in PHASES]
+            pairs.append(("total", entry["total_s"], base_entry.get("total_s")))
+            for phase, now_s, base_s in pairs:
+                if base_s is None:
+                    continue
+                if now_s - base_s > min_delta_s and now_s > base_s * (1.0 + tolerance):
+                    regressions.append(
+                        f"{case_name} n={size} {phase}: {now_s * 1000:.1f} ms vs baseline {base_s * 1000:.1f} ms "
+                        f"(+{(now_s / base_s - 1.0) * 100 if base_s > 0 else float('inf'):.0f}%)"
+                    )
+    return regressions
+
+
+def _print_table(report):
+    header = f"{'case':<13} {'n':>6} {'rows':>6} " + " ".join(f"{p[:12]:>12}" for p in PHASES) + f" {'total':>9}"
+    print(header)
+    for case_name, sizes in report["results"].items():
+        for size, entry in sizes.items():
+            cells = " ".join(f"{entry['phases'][p] * 1000:12.2f}" for p in PHASES)
+            print(f"{case_name:<13} {size:>6} {entry['points']:>6} {cells} {entry['total_s'] * 1000:9.1f}")
+    print("(all times in ms, median of repeats)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless measurement pipeline benchmark (simulated instrument).")
+    parser.add_argument("--types", nargs="+", choices=list(BENCHMARK_CASES), default=list(BENCHMARK_CASES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=config_settings.BENCHMARK_DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=config_settings.BENCHMARK_DEFAULT_REPEAT)
+    parser.add_argument("--io-latency-ms", type=float, default=0.0, help="Simulated round-trip latency per VISA write/query")
+    parser.add_argument("--chrome-trace-dir", help="Also export one Chrome trace per run into this directory")
+    parser.add_argument("--output", help="Write the JSON report to this file (default: stdout)")
+    parser.add_argument("--baseline", default=config_settings.BENCHMARK_BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=config_settings.BENCHMARK_REGRESSION_TOLERANCE)
+    parser.add_argument("--min-delta-ms", type=float, default=config_settings.BENCHMARK_MIN_DELTA_MS)
+    parser.add_argument("--extract-corpus", type=int, metavar="SWEEPS", help="Run the parameter extraction benchmark on this many synthetic sweeps")
+    parser.add_argument("--extract-points", type=int, default=301, help="Points per synthetic sweep (--extract-corpus)")
+    parser.add_argument("--vth-smooth", type=int, default=0, help="Savitzky-Golay window for --extract-corpus (0 = off)")
+    parser.add_argument("--ss-window", type=int, default=int(config_settings.GT_DEFAULT_SS_WINDOW), help="SS fit window for --extract-corpus")
+    args = parser.parse_args(argv)
+
+    if args.extract_corpus:
+        timings = run_extraction_benchmark(args.extract_corpus, args.extract_points, args.vth_smooth, args.ss_window, max(1, args.repeat))
+        print(f"Parameter extraction, {args.extract_corpus} sweeps x {args.extract_points} points "
+              f"(Vth: {', '.join(parameter_extraction.VTH_METHODS)}, smoothing window {args.vth_smooth}; SS window {args.ss_window}):")
+        for name, per_sweep_s in timings.items():
+            print(f"  {name:<22} {per_sweep_s * 1e6:8.1f} us/sweep")
+        print("Diode fit accuracy (relative error: median / 95th percentile / not fitted):")
+        for key, (median, p95, failed) in run_diode_accuracy(args.extract_corpus, args.extract_points).items():
+            print(f"  {key:<4} {median:10.2e} {p95:10.2e} {failed:7.1%}")
+        return 0
+
+    if any(n < 3 for n in args.sizes):
+        parser.error("--sizes must all be >= 3")
+    if args.chrome_trace_dir:
+        os.makedirs(args.chrome_trace_dir, exist_ok=True)
+    report = run_benchmarks(args.types, args.sizes, max(1, args.repeat), io_latency_s=args.io_latency_ms / 1000.0,
+                            chrome_trace_dir=args.chrome_trace_dir)
+    _print_table(report)
+
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report_json + "\n")
+    elif not args.update_baseline:
+        print(report_json)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(report_json + "\n")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.", file=sys.stderr)
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(report, baseline, args.tolerance, args.min_delta_ms / 1000.0)
+    if regressions:
+        print(f"{len(regressions)} regression(s) against {os.path.basename(args.baseline)}:", file=sys.stderr)
+        for line in regressions:
+            print(f"  REGRESSION {line}", file=sys.stderr)
+        return 1
+    print(f"No regressions against {os.path.basename(args.baseline)} (tolerance {args.tolerance:.0%}).", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
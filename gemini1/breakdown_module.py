@@ -10,17 +10,48 @@ import traceback
 import instrument_utils
 import config_settings
 from measurement_base import MeasurementBase
+import parameter_extraction
 import plotting_utils
 
+# (bv_params key, CSV metadata and batch summary label, format)
+BV_PARAM_LABELS = (("BV_criterion", "BV_criterion (V)", ".3f"), ("BV_slope", "BV_slope (V)", ".3f"),
+                   ("V_max", "V_max (V)", ".3f"), ("I_at_V_max", "Leakage at V_max (criterion unit)", ".4e"),
+                   ("gate_fraction", "Leakage Gate Fraction", ".3f"))
+
+def leakage_basis(device_type, channel_width_um, area_um2, criterion):
+    """
+    (current keys, criterion, unit) the BV criterion applies to: Jd/Jg/Js when the run is
+    normalized (lateral with a channel width, vertical with an area), otherwise Id/Ig/Is with
+    BD_BV_FALLBACK_CURRENT_A, since the densities are then all zero.
+    """
+    j_coeff, unit = instrument_utils.current_density_scale({'device_type': device_type, 'channel_width': channel_width_um, 'area': area_um2})
+    if j_coeff:
+        return ('Jd', 'Jg', 'Js'), criterion, unit
+    return ('Id', 'Ig', 'Is'), config_settings.BD_BV_FALLBACK_CURRENT_A, 'A'
+
+def leakage_path(gate_fraction):
+    """'gate' or 'drain' (to source) for the path carrying most of the leakage at breakdown."""
+    if gate_fraction is None or np.isnan(gate_fraction):
+        return 'N/A'
+    return 'gate' if gate_fraction >= 0.5 else 'drain'
+
 class BreakdownMeasurement(MeasurementBase):
+    reads_sweep_status = True
+
     def __init__(self):
         super().__init__(measurement_type_name_short="Breakdown", plot_file_suffix="_linear_log.png")
         self.N_st = 0 # Number of Vd points
+        self.bv_criterion = float(config_settings.BD_DEFAULT_BV_CRITERION) # As configured, in the Jd unit
+        self.bv_criterion_used = np.nan # As applied (the fallback in A when the run is not normalized)
+        self.bv_criterion_unit = 'A'
+        self.bv_params = {} # The BV_PARAM_LABELS keys
 
     def _get_tsp_script_path_key(self, config):
         return config_settings.CONFIG_KEY_TSP_BREAKDOWN
 
     def _get_default_tsp_script_path(self, config):
+        if self._use_trigger_model(config):
+            return config_settings.DEFAULT_TSP_BREAKDOWN_TRIGGER
         return config_settings.DEFAULT_TSP_BREAKDOWN
 
     def _prepare_tsp_parameters(self, config):
@@ -36,14 +67,26 @@ class BreakdownMeasurement(MeasurementBase):
                (Vd_stop < Vd_start and Vd_step_val > 0):
                 raise ValueError(f"Vd voltage step ({Vd_step_val}V) sign mismatch with scan direction (from {Vd_start}V to {Vd_stop}V) for Breakdown.")
             self.N_st = int(round(abs(Vd_stop - Vd_start) / abs(Vd_step_val))) + 1
+        self._prepare_extraction_parameters(config)
 
         return {
             "IlimitDrain": config['IlimitDrain'], "IlimitGate": config['IlimitGate'],
             "Drain_nplc": config['Drain_nplc'], "Gate_nplc": config['Gate_nplc'],
             "Vg": config['Vg'], "Vd_start": Vd_start, "Vd_stop": Vd_stop, "Vd_step": Vd_step_val,
-            "settling_delay": config.get('settling_delay', config_settings.BD_DEFAULT_SETTLING_DELAY) # Added
+            "settling_delay": config.get('settling_delay', config_settings.BD_DEFAULT_SETTLING_DELAY), # Added
+            "chunk_points": config_settings.BD_TRIGGER_MODEL_CHUNK_POINTS # Trigger-model script only
         }
 
+    def _prepare_extraction_parameters(self, config):
+        bv_criterion = float(config.get('bv_criterion', config_settings.BD_DEFAULT_BV_CRITERION))
+        if not bv_criterion > 0:
+            raise ValueError(f"BV 判据 ({bv_criterion}) 必须为正。")
+        self.bv_criterion = bv_criterion
+
+    def _estimate_run_duration_s(self, config, tsp_params):
+        return self._sweep_duration_s(self.N_st, tsp_params['settling_delay'],
+                                      (tsp_params['Drain_nplc'], tsp_params['Gate_nplc'], tsp_params['Drain_nplc']))
+
     def _get_primary_buffer_info(self, config):
         expected_total_points = self.N_st
         return config_settings.SMUA_NVBUFFER1, expected_total_points # Drain current buffer as primary
@@ -79,7 +122,17 @@ class BreakdownMeasurement(MeasurementBase):
             self.processed_data['Time'] = self.processed_data['Time_gate']
         elif 'Time' not in self.processed_data: # Ensure 'Time' key exists
              self.processed_data['Time'] = np.full(self.consistent_len, np.nan) if self.consistent_len > 0 else np.array([])
+        self._extract_breakdown_params(config)
 
+    def _extract_breakdown_params(self, config):
+        self.bv_params = {}
+        keys, self.bv_criterion_used, self.bv_criterion_unit = leakage_basis(
+            config.get('device_type', 'unknown'), config.get('channel_width_um', 0), config.get('area_um2', 0), self.bv_criterion)
+        vd = self.processed_data.get('Vd_read', np.array([]))
+        currents = [self.processed_data.get(key, np.array([])) for key in keys]
+        if vd.size == 0 or any(current.size != vd.size for current in currents):
+            return
+        self.bv_params = parameter_extraction.extract_breakdown(vd, *currents, criterion=self.bv_criterion_used)
 
     def _get_csv_header_info(self, config):
         header_cols = ['Time', 'Vg_final', 'Vd_read', 'Id', 'Ig', 'Is', 'Jd', 'Jg', 'Js']
@@ -101,6 +154,13 @@ class BreakdownMeasurement(MeasurementBase):
             avg_vg_read = np.nanmean(vg_final_data)
             if not np.isnan(avg_vg_read):
                  comments += f"# Avg Vg_read (V): {avg_vg_read:.3f}\n"
+        if self.bv_params:
+            comments += f"# BV Criterion ({self.bv_criterion_unit}): {self.bv_criterion_used:g}\n"
+            comments += f"# BV Slope Window (points): {config_settings.BD_SLOPE_WINDOW}\n"
+            comments += f"# BV Slope Exponent (dlnI/dlnV): {config_settings.BD_SLOPE_EXPONENT}\n"
+            for key, label, fmt in BV_PARAM_LABELS:
+                comments += f"# {label}: {self.bv_params[key]:{fmt}}\n"
+            comments += f"# Leakage Path: {leakage_path(self.bv_params['gate_fraction'])}\n"
         return comments
 
     def _prepare_plot_data_package(self, config):
@@ -115,6 +175,11 @@ class BreakdownMeasurement(MeasurementBase):
         return {
             "processed_data": self.processed_data,
             "Vg_set_for_title": vg_for_title, # Use the determined Vg for title
+            "bv_params": self.bv_params,
+            "BV_criterion": self.bv_params.get('BV_criterion', np.nan),
+            "BV_slope": self.bv_params.get('BV_slope', np.nan),
+            "Leakage_Gate_Fraction": self.bv_params.get('gate_fraction', np.nan),
+            "bv_criterion_label": f"{self.bv_criterion_used:g} {self.bv_criterion_unit}",
             "png_file_path": self.png_file_path,
             "csv_file_path": self.csv_file_path,
             "measurement_type_name": self.measurement_type_name_full,
@@ -191,6 +256,11 @@ def _plot_breakdown_figure_content(fig, plot_data_package):
             if np.any(valid_log_ig):
                 ax2.plot(vd_plot[valid_log_ig], ig_abs[valid_log_ig], color='red', linestyle='--', marker='None', label='$|I_G|$')
 
+        bv_criterion = plot_data_package.get('BV_criterion', np.nan)
+        if bv_criterion is not None and not np.isnan(bv_criterion):
+            ax2.axvline(bv_criterion, color='black', linestyle=':', linewidth=1,
+                        label=f"BV = {bv_criterion:.1f} V @ {plot_data_package.get('bv_criterion_label', '')}")
+
         ax2.set_yscale('log')
         ax2.set_ylabel('|Current| (A)')
         ax2.set_xlabel('$V_D$ (V)') # X-label only on the bottom plot due to sharex
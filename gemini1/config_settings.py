@@ -20,6 +20,18 @@ DEFAULT_TSP_OUTPUT_CHAR = os.path.join(TSP_SCRIPT_BASE_PATH, "IDVD.tsp")
 DEFAULT_TSP_BREAKDOWN = os.path.join(TSP_SCRIPT_BASE_PATH, "BV.tsp")
 DEFAULT_TSP_DIODE = os.path.join(TSP_SCRIPT_BASE_PATH, "diode.tsp")
 DEFAULT_TSP_STRESS = os.path.join(TSP_SCRIPT_BASE_PATH, "Stress.tsp") # New Stress TSP
+DEFAULT_TSP_STRESS_LOG = os.path.join(TSP_SCRIPT_BASE_PATH, "StressLog.tsp") # Log-time sampling variant
+DEFAULT_TSP_STRESS_CHUNKED = os.path.join(TSP_SCRIPT_BASE_PATH, "StressChunked.tsp") # Double-buffered, unbounded length
+DEFAULT_TSP_GATE_TRANSFER_ADAPTIVE = os.path.join(TSP_SCRIPT_BASE_PATH, "AdaptiveGateSweep.tsp")
+# Trigger-model variants (trigger.source.listv + TSP-Link synchronised measure), used when trigger-model sweeps are enabled
+DEFAULT_TSP_GATE_TRANSFER_TRIGGER = os.path.join(TSP_SCRIPT_BASE_PATH, "GateSweepTrigger.tsp")
+DEFAULT_TSP_GATE_TRANSFER_SCHEDULED = os.path.join(TSP_SCRIPT_BASE_PATH, "GateSweepScheduled.tsp") # Per-point range / NPLC
+DEFAULT_TSP_OUTPUT_CHAR_TRIGGER = os.path.join(TSP_SCRIPT_BASE_PATH, "IDVDTrigger.tsp")
+DEFAULT_TSP_OUTPUT_CHAR_EARLY_STOP = os.path.join(TSP_SCRIPT_BASE_PATH, "IDVDEarlyStop.tsp") # Per-Vg early termination
+DEFAULT_TSP_BREAKDOWN_TRIGGER = os.path.join(TSP_SCRIPT_BASE_PATH, "BVTrigger.tsp")
+# Pulsed I-V (trigger-timer pulse trains, measure.count samples per pulse)
+DEFAULT_TSP_PULSED_GATE_TRANSFER = os.path.join(TSP_SCRIPT_BASE_PATH, "PulsedGateSweep.tsp")
+DEFAULT_TSP_PULSED_OUTPUT = os.path.join(TSP_SCRIPT_BASE_PATH, "PulsedIDVD.tsp")
 
 # --- Default Instrument Settings ---
 DEFAULT_GPIB_ADDRESS = 'GPIB0::30::INSTR' # 请根据您的实际GPIB地址修改
@@ -27,6 +39,89 @@ DEFAULT_TIMEOUT = 3000000
 DIODE_TIMEOUT = 30000
 STRESS_TIMEOUT = 3600000 # Example: 1 hour for potentially long stress tests
 
+# --- Trigger-Model Sweeps ---
+TRIGGER_MODEL_SWEEPS_ENABLED = False   # Default for GT / Output / Breakdown; overridden per run by config[CONFIG_KEY_TRIGGER_MODEL]
+TRIGGER_MODEL_CHUNK_POINTS = 50        # Points per trigger-model run; compliance is checked between chunks
+BD_TRIGGER_MODEL_CHUNK_POINTS = 5      # Breakdown: short chunks so few points are taken past breakdown
+
+# --- Pulsed I-V ---
+LINE_FREQUENCY_HZ = 50                 # Mains frequency: converts NPLC to integration time for the in-pulse timing check
+
+# --- Instrument Simulator (instrument_simulator.py) ---
+# Any GPIB address starting with this prefix opens the simulated 2657A + 2636B system instead of a VISA resource,
+# e.g. "SIM::26XX::MOSFET" or "SIM::26XX::DIODE?noise_rel=0&seed=1" (query keys = SimulatedKeithley26xx arguments).
+SIMULATOR_RESOURCE_PREFIX = "SIM::"
+SIMULATOR_DEFAULT_RESOURCE = "SIM::26XX::MOSFET"
+SIMULATOR_NOISE_REL = 0.002          # Relative current noise (1 sigma)
+SIMULATOR_NOISE_FLOOR_A = 5e-13      # Absolute current noise floor (A, 1 sigma)
+SIMULATOR_NOISE_V = 1e-5             # Voltage readback noise (V, 1 sigma)
+SIMULATOR_IO_LATENCY_S = 0.0         # Real sleep per write/query, to mimic GPIB round trips
+SIMULATOR_TIME_SCALE = 0.0           # Real seconds slept per simulated second (0 = run as fast as possible)
+SIMULATOR_LINE_FREQUENCY_HZ = 50     # NPLC -> integration time
+SIMULATOR_MEASURE_OVERHEAD_S = 0.001 # Fixed per-reading overhead added to the integration time
+SIMULATOR_RANGE_CHANGE_S = 0.002     # Extra settling per current range change under autorange
+SIMULATOR_NOISE_REF_RANGE_A = 1e-6   # Noise floor applies up to this range and grows with the range above it (at 1 NPLC)
+SIMULATOR_BUFFER_CAPACITY = 60000    # Readings per nvbuffer
+
+# --- Benchmark Suite (benchmark_suite.py) ---
+BENCHMARK_DEFAULT_SIZES = [101, 501, 2001]  # Points per sweep leg / curve / stress sample
+BENCHMARK_DEFAULT_REPEAT = 3
+BENCHMARK_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+BENCHMARK_REGRESSION_TOLERANCE = 0.5       # Relative slowdown that counts as a regression
+BENCHMARK_MIN_DELTA_MS = 5.0               # ...but only if it is also at least this many ms slower
+
+# --- Tracing (tracing_utils.py) ---
+TRACE_CSV_METADATA = True         # Write per-step '# Timing ... (ms)' / '# Counter ...' lines into the CSV header
+TRACE_JSONL_ENABLED = False       # Also stream every span to <csv base name>_trace.jsonl (convert with tracing_utils.py)
+TRACE_JSONL_SUFFIX = "_trace.jsonl"
+
+# --- TSP Script Upload (tsp_template.py) ---
+TSP_MINIFY_ENABLED = True         # Strip comments / indentation / blank lines before upload (fewer bytes on the bus)
+
+# --- Script Completion (instrument_utils.wait_for_script_completion) ---
+SCRIPT_DONE_MARKER = "TSP_SCRIPT_DONE"  # Printed by a command queued behind script.run(), i.e. once the script has ended
+SCRIPT_POLL_INTERVAL_S = 1.0       # VISA read timeout while waiting; also the progress reporting period
+SCRIPT_TIMEOUT_FACTOR = 1.5        # A script still running after factor x expected duration + margin is treated as hung
+SCRIPT_TIMEOUT_MARGIN_S = 30.0
+SCRIPT_POINT_OVERHEAD_S = 0.005    # Per-point script / range-change overhead on top of settling + integration time
+
+# --- Duration Estimates / Time Budget (duration_estimator.py) ---
+ESTIMATE_FIXED_OVERHEAD_S = 2.0               # Connect, upload, CSV save and plot per run (used until calibrated)
+ESTIMATE_DEFAULT_OVERHEAD_PER_POINT_S = 0.002 # Buffer readout + processing per point (used until calibrated)
+ESTIMATE_CALIBRATION_MAX_FILES = 50           # Most recent CSVs per measurement type used for calibration
+ESTIMATE_OVERHEAD_SPANS = ("load_and_run_tsp", "query_and_read_buffers", "common_data_processing", "specific_data_processing")
+CAMPAIGN_DEFAULT_BUDGET_HOURS = "8.0"         # Instrument-hours budget shown next to the estimate button
+
+# --- Parameter Extraction (parameter_extraction.py) ---
+VTH_SMOOTH_POLYORDER = 2          # Savitzky-Golay polynomial order; the window must be larger than this
+VTH_RATIO_MIN_POINTS = 3          # Fewest strong-inversion points for the Y-function (ratio) fit
+VTH_RATIO_GM_FRACTION = 0.9       # Y-function fit starts where gm first reaches this fraction of gm_max
+VTH_SD_MIN_WINDOW = 11            # Second-derivative Vth: gm is always Savitzky-Golay smoothed over at least this many points
+VTH_SD_GM_FRACTION = 0.5          # Second-derivative Vth: the d2Id/dVg2 peak is searched before gm first reaches this fraction of gm_max
+VTH_SD_PEAK_TOLERANCE = 0.1       # Second-derivative Vth: first point within this fraction of the d2 maximum counts as the peak (flat tops)
+SS_MIN_R2 = 0.98                  # SS windows fitting log10|Id| worse than this (noise floor, on-state bend) are not subthreshold
+SS_MAX_MV_DEC = 500.0             # ...nor are windows with a swing above this
+SS_SPAN_FACTOR = 1.5              # Decade span / SS_avg cover the windows around SS_min with a swing below factor x SS_min
+SS_CURRENT_FLOOR_A = 1e-14        # |Id| is clipped to this before log10
+HYSTERESIS_GRID_POINTS = 201      # Common grid (over the range both sweep legs cover) for the hysteresis loop
+DIODE_HYST_ON_CURRENT_A = 1e-3    # Diode turn-on criterion |I| when the run has no width / area normalization
+OC_RON_FIT_POINTS = 5             # Lowest-|Vd| points per output curve in the linear-region (Ron) fit
+OC_GDS_FIT_FRACTION = 0.2         # Saturation (gds) fit covers this top fraction of each curve's |Vd| span
+BD_BV_FALLBACK_CURRENT_A = 1e-6   # BV criterion on |Id| when the run has no width / area normalization (Jd in A.U.)
+BD_SLOPE_WINDOW = 5               # Points per sliding window for the log|I| - log|Vd| exponent
+BD_SLOPE_EXPONENT = 10.0          # BV_slope: first window whose d ln|I| / d ln|Vd| reaches this (ohmic leakage ~ 1)
+BD_SLOPE_MIN_R2 = 0.95            # ...with a fit at least this good and |I| rising across the window
+DIODE_THERMAL_VOLTAGE_V = 0.025852  # kT/q at 300 K for the ideality factor
+DIODE_FIT_MIN_CURRENT_A = 1e-9    # Shockley fit uses forward points from this |I| up (below it shunt leakage and noise dominate)
+DIODE_FIT_COMPLIANCE_FRACTION = 0.99  # ...and leaves out points at or above this fraction of the anode current limit
+DIODE_FIT_MIN_POINTS = 5          # Fewer fit points than this -> no n / Is / Rs
+DIODE_FIT_ITERATIONS = 30         # Levenberg-Marquardt iterations (all curves step together)
+STRESS_KINETICS_BINS_PER_DECADE = 10  # Log-time bins per decade for the dId/Id0 kinetics fits
+STRESS_KINETICS_T_MIN_S = 1e-3    # (s) Lower edge of the first kinetics bin (earlier samples join it)
+STRESS_KINETICS_DECADES = 10      # Bins cover this many decades from STRESS_KINETICS_T_MIN_S (later samples join the last bin)
+STRESS_KINETICS_MIN_BINS = 4      # Fewer filled bins than this -> no kinetics fit
+STRESS_KINETICS_FIT_ITERATIONS = 30  # Levenberg-Marquardt iterations of the stretched-exponential fit
+
 # --- Buffer Definitions (confirm if Stress.tsp uses these consistently or needs new ones) ---
 # These are general and should be fine if Stress.tsp uses the same SMU mapping for D, G, S
 SMUA_NVBUFFER1 = "smua.nvbuffer1" # Typically Drain Current
@@ -34,6 +129,7 @@ SMUA_NVBUFFER2 = "smua.nvbuffer2" # Typically Drain Voltage
 DRAIN_SMU_VOLTAGE_READINGS_BUFFER_PATH = f"{SMUA_NVBUFFER2}.readings"
 DRAIN_SMU_CURRENT_READINGS_BUFFER_PATH = f"{SMUA_NVBUFFER1}.readings"
 DRAIN_SMU_TIMESTAMP_BUFFER_PATH = f"{SMUA_NVBUFFER1}.timestamps" # Stress TSP uses this as primary
+DRAIN_SMU_CURRENT_MEASURERANGES_BUFFER_PATH = f"{SMUA_NVBUFFER1}.measureranges" # Range used per reading
 
 NODE2_SMUA_NVBUFFER1 = "node[2].smua.nvbuffer1" # Typically Gate Current
 NODE2_SMUA_NVBUFFER2 = "node[2].smua.nvbuffer2" # Typically Gate Voltage
@@ -63,6 +159,13 @@ CONFIG_KEY_TSP_DIODE = "TSP_SCRIPT_PATH_DIODE"
 CONFIG_KEY_TSP_STRESS = "TSP_SCRIPT_PATH_STRESS" # New Stress config key
 CONFIG_KEY_GPIB_ADDRESS = "GPIB_ADDRESS"
 CONFIG_KEY_TIMEOUT = "TIMEOUT"
+CONFIG_KEY_TRACE_CSV_METADATA = "TRACE_CSV_METADATA"
+CONFIG_KEY_TRACE_JSONL = "TRACE_JSONL"
+CONFIG_KEY_TRIGGER_MODEL = "TRIGGER_MODEL"
+CONFIG_KEY_PROGRESS_CALLBACK = "PROGRESS_CALLBACK" # Optional callable(percent, elapsed_s, expected_s) while the script runs
+CONFIG_KEY_STRESS_KINETICS_CALLBACK = "STRESS_KINETICS_CALLBACK" # Optional callable(kinetics dict) after each streamed stress chunk
+CONFIG_KEY_TSP_PULSED_GATE_TRANSFER = "TSP_SCRIPT_PATH_PULSED_GATE_TRANSFER"
+CONFIG_KEY_TSP_PULSED_OUTPUT = "TSP_SCRIPT_PATH_PULSED_OUTPUT"
 
 # --- Default GUI Settings ---
 DEFAULT_OUTPUT_DIR = os.path.join(os.path.expanduser("~"), "Documents", "TSP_Python_Measurements_Output")
@@ -80,6 +183,17 @@ GT_DEFAULT_VG_STOP = "2.0"
 GT_DEFAULT_VG_STEP = "0.1"
 GT_DEFAULT_VD = "1"
 GT_DEFAULT_SETTLING_DELAY = DEFAULT_SETTLING_DELAY_S
+GT_DEFAULT_ADAPTIVE_COARSE_STEP = "0.2"     # Adaptive sweep: coarse pass step (V); "Vg 步进" is the fine step
+GT_DEFAULT_ADAPTIVE_REFINE_THRESHOLD = "2.0"  # Adaptive sweep: |d log10(Id)/dVg| (dec/V) above which the next interval uses the fine step
+GT_DEFAULT_SCHED_NPLC_FAST = "0.01"  # Range/NPLC schedule: NPLC at high current; "漏极NPLC" is used near the noise floor
+GT_DEFAULT_SCHED_I_LOW = "1e-9"      # (A) Range/NPLC schedule: at or below this |I| the slow NPLC is used
+GT_DEFAULT_SCHED_I_HIGH = "1e-5"     # (A) Range/NPLC schedule: at or above this |I| the fast NPLC is used
+GT_SCHED_RANGE_HEADROOM = 10         # Fixed range = previous |Id| x headroom (one range up per decade of growth)
+GT_SCHED_MIN_RANGE_A = 1e-9          # (A) Lowest drain range the schedule selects
+GT_DEFAULT_VTH_METHOD = "max_gm"      # Vth reported as Vth_fwd (parameter_extraction.VTH_METHODS); the others go to the CSV header
+GT_DEFAULT_VTH_SMOOTH_WINDOW = "0"   # Savitzky-Golay window (points) applied to Id before gm / Vth extraction; 0 = off
+GT_DEFAULT_VTH_CC_CURRENT = "1e-7"   # (A) Constant-current Vth criterion on |Id|
+GT_DEFAULT_SS_WINDOW = "5"           # Points per sliding least-squares window for SS (odd, >= 3)
 
 # Output Characteristics Defaults
 OC_DEFAULT_ILIMIT_DRAIN = "0.1"
@@ -93,6 +207,15 @@ OC_DEFAULT_VD_START = "0.0"
 OC_DEFAULT_VD_STOP = "5.0"
 OC_DEFAULT_VD_STEP = "0.2"
 OC_DEFAULT_SETTLING_DELAY = DEFAULT_SETTLING_DELAY_S
+OC_DEFAULT_POWER_LIMIT = "1.0" # (W) Early-stop mode: a Vd sweep ends once |Vd*Id| would exceed this
+
+# Pulsed I-V Defaults (GT / Output tabs, used when pulsed mode is ticked)
+PULSE_DEFAULT_WIDTH = "0.001"          # (s) Pulse width
+PULSE_DEFAULT_DUTY_CYCLE = "0.01"      # Pulse width / period
+PULSE_DEFAULT_NPLC = "0.005"           # NPLC of each in-pulse reading (0.1 ms at 50 Hz)
+PULSE_DEFAULT_SAMPLES = "4"            # Readings per pulse (measure.count), averaged per pulse
+PULSE_DEFAULT_MEAS_DELAY = "0.0002"    # (s) Pulse edge to first reading
+PULSE_DEFAULT_BASE = "0"               # (V) Level of the pulsed terminal between pulses
 
 # Breakdown Defaults
 BD_DEFAULT_ILIMIT_DRAIN = "0.01"
@@ -104,6 +227,7 @@ BD_DEFAULT_VD_START = "0"
 BD_DEFAULT_VD_STOP = "100"
 BD_DEFAULT_VD_STEP = "1"
 BD_DEFAULT_SETTLING_DELAY = DEFAULT_SETTLING_DELAY_S
+BD_DEFAULT_BV_CRITERION = "1e-3"     # BV leakage criterion in the Jd unit (1e-3 mA/mm = 1 uA/mm; A/cm^2 for vertical devices)
 
 # Diode Defaults
 DIODE_DEFAULT_ILIMIT_ANODE = "0.1"
@@ -114,6 +238,8 @@ DIODE_DEFAULT_VANODE_START = "0"
 DIODE_DEFAULT_VANODE_STOP = "3"
 DIODE_DEFAULT_VANODE_STEP = "0.1"
 DIODE_DEFAULT_SETTLING_DELAY = DEFAULT_SETTLING_DELAY_S
+DIODE_DEFAULT_TURN_ON_J = "1"        # Turn-on criterion in the current density unit (mA/mm lateral, A/cm^2 vertical)
+DIODE_DEFAULT_REVERSE_V = "-1"       # (V) Anode voltage the reverse leakage is read at
 
 # Stress Test Defaults (New Section)
 STRESS_DEFAULT_VD_STRESS = "5.0"       # (V)
@@ -128,6 +254,16 @@ STRESS_DEFAULT_ILIMIT_SOURCE = "0.1"   # (A) - Current limit for the source SMU
 STRESS_DEFAULT_DRAIN_NPLC = "1"
 STRESS_DEFAULT_GATE_NPLC = "1"
 STRESS_DEFAULT_SOURCE_NPLC = "1"       # NPLC for the source SMU
+STRESS_LOG_DEFAULT_FIRST_POINT = "0.01"       # (s) Log-time sampling: first sample time after t=0
+STRESS_LOG_DEFAULT_POINTS_PER_DECADE = "10"   # Log-time sampling: samples per decade of time
+STRESS_LOG_AVG_FILL = 0.5                     # Fraction of each log bin spent in the on-instrument average
+STRESS_LOG_FILTER_MAX_COUNT = 100             # measure.filter.count limit of the 26xx
+STRESS_LOG_CONVERSION_OVERHEAD_S = 0.001      # (s) Per-conversion time on top of NPLC / line frequency
+STRESS_CHUNK_POINTS = 500                     # Chunked logging: readings per buffer set (two sets per SMU alternate)
+STRESS_CHUNK_READ_MARGIN_S = 60               # (s) Chunked logging: slack past the planned end before giving up on the output
+STRESS_DEFAULT_FAILURE_PERCENT = "10"          # (%) Lifetime criterion: |dId/Id0| reaching this counts as failure
+POST_STRESS_GT_SUFFIX = "_post_stress_GT"      # Appended to the file name of the gate transfer after a stress
+STRESS_SERIES_CACHE_FILE = "stress_series_cache.npz"  # Per-file stress series results, kept in the data folder
 
 # Device Parameter Defaults (Common)
 DEVICE_DEFAULT_CHANNEL_WIDTH_UM = "100.0"
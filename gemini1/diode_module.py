@@ -10,50 +10,39 @@ import traceback
 import instrument_utils
 import config_settings
 from measurement_base import MeasurementBase
+from measurement_record import SweepLegs
+import parameter_extraction
 import plotting_utils
 
-def _split_diode_data_internal(data_dict, num_points_forward):
-    forward_data = {}
-    backward_data = {}
-
-    for key_init in data_dict.keys(): # Initialize with empty arrays
-        forward_data[key_init] = np.array([])
-        backward_data[key_init] = np.array([])
-
-    if num_points_forward <= 0: # If no forward points expected, assume all data is forward
-        for key, full_array in data_dict.items():
-            if isinstance(full_array, np.ndarray):
-                forward_data[key] = full_array
-        return forward_data, backward_data
-
-    for key, full_array in data_dict.items():
-        if not isinstance(full_array, np.ndarray):
-            continue
-
-        actual_len = len(full_array)
-
-        # Assign forward part
-        if actual_len >= num_points_forward:
-            forward_data[key] = full_array[:num_points_forward]
-        elif actual_len > 0 : # Data is shorter than expected for forward sweep
-            forward_data[key] = full_array
-        # else: forward_data[key] remains empty if actual_len is 0
-
-        # Assign backward part
-        if actual_len > num_points_forward: # If there's any data beyond the forward part
-            # Backward sweep can be at most num_points_forward long, or shorter if data ends
-            backward_part_len = min(num_points_forward, actual_len - num_points_forward)
-            if backward_part_len > 0:
-                 backward_data[key] = full_array[num_points_forward : num_points_forward + backward_part_len]
-        # else: backward_data[key] remains empty
-
-    return forward_data, backward_data
-
+# (hysteresis key, CSV metadata label, format) for the forward/backward comparison
+HYSTERESIS_LABELS = (("V_on_fwd", "V_on_fwd (V)", ".4f"), ("V_on_bwd", "V_on_bwd (V)", ".4f"), ("Delta_V_on", "Delta_V_on (V)", ".4f"),
+                     ("Loop_Area", "Hysteresis_Loop_Area (A*V)", ".4e"), ("Max_Gap", "Hysteresis_Max_Gap (A)", ".4e"),
+                     ("V_at_Max_Gap", "V_at_Hysteresis_Max_Gap (V)", ".4f"))
+# (diode_params key, CSV metadata and batch summary label, format) of the forward-leg extraction
+DIODE_PARAM_LABELS = (("n", "Ideality n", ".4f"), ("Is", "Is (A)", ".4e"), ("Rs", "Rs (Ohm)", ".4f"),
+                      ("fit_rms", "Fit RMS Residual (V)", ".3e"), ("fit_points", "Fit Points", "d"),
+                      ("V_on", "V_on (V)", ".4f"), ("I_reverse", "I_reverse (A)", ".4e"))
+
+def turn_on_current(device_config, turn_on_j):
+    """(criterion current in A, description): turn_on_j in the density unit, or DIODE_HYST_ON_CURRENT_A without a width / area."""
+    j_coeff, unit = instrument_utils.current_density_scale(device_config)
+    if j_coeff:
+        return turn_on_j / j_coeff, f"{turn_on_j:g} {unit}"
+    return config_settings.DIODE_HYST_ON_CURRENT_A, f"{config_settings.DIODE_HYST_ON_CURRENT_A:g} A"
 
 class DiodeMeasurement(MeasurementBase):
+    reads_sweep_status = True
+
     def __init__(self):
         super().__init__(measurement_type_name_short="Diode", plot_file_suffix=".png")
         self.num_points_per_sweep = 0
+        self.num_points_bwd = None # Measured backward leg length (sweep status record)
+        self.hysteresis = {} # Forward/backward comparison (keys of HYSTERESIS_LABELS), empty without a backward leg
+        self.turn_on_j = float(config_settings.DIODE_DEFAULT_TURN_ON_J)
+        self.reverse_v = float(config_settings.DIODE_DEFAULT_REVERSE_V)
+        self.on_current = config_settings.DIODE_HYST_ON_CURRENT_A # Turn-on criterion in A, as applied
+        self.on_criterion_label = ""
+        self.diode_params = {} # Forward-leg extraction (keys of DIODE_PARAM_LABELS)
 
     def _get_tsp_script_path_key(self, config):
         return config_settings.CONFIG_KEY_TSP_DIODE
@@ -75,6 +64,7 @@ class DiodeMeasurement(MeasurementBase):
                 self.num_points_per_sweep = int(round(abs(Vanode_stop - Vanode_start) / abs(Vanode_step))) + 1
         elif Vanode_start != Vanode_stop: # Step is 0 but start != stop
             raise ValueError("If Vanode_start != Vanode_stop, then Vanode_step cannot be zero for Diode measurement.")
+        self._prepare_extraction_parameters(config)
 
         return {
             'Vanode_start': Vanode_start,
@@ -88,6 +78,20 @@ class DiodeMeasurement(MeasurementBase):
             "settling_delay": config.get('settling_delay', config_settings.DIODE_DEFAULT_SETTLING_DELAY) # Added
         }
 
+    def _prepare_extraction_parameters(self, config):
+        turn_on_j = float(config.get('turn_on_j', config_settings.DIODE_DEFAULT_TURN_ON_J))
+        if not turn_on_j > 0:
+            raise ValueError(f"开启判据 ({turn_on_j}) 必须为正。")
+        self.turn_on_j = turn_on_j
+        self.reverse_v = float(config.get('reverse_v', config_settings.DIODE_DEFAULT_REVERSE_V))
+        self.on_current, self.on_criterion_label = turn_on_current(
+            {'device_type': config.get('device_type', 'unknown'), 'channel_width': config.get('channel_width_um', 0.0), 'area': config.get('area_um2', 0.0)},
+            turn_on_j)
+
+    def _estimate_run_duration_s(self, config, tsp_params):
+        return self._sweep_duration_s(self._get_expected_point_count(config), tsp_params['settling_delay'],
+                                      (tsp_params['Anode_nplc'], tsp_params['Cathode_nplc']))
+
     def _get_primary_buffer_info(self, config):
         expected_total_points = self.num_points_per_sweep
         if config.get('enable_backward', False):
@@ -108,8 +112,18 @@ class DiodeMeasurement(MeasurementBase):
         # Prioritize buffers that are most critical for defining a valid data point
         return ['anode_current', 'anode_voltage_read', 'anode_voltage_set']
 
+    def _get_smu_role_names(self):
+        return {"smua": "Anode", "node[2].smua": "Cathode", "node[2].smub": "node[2].smub"}
+
 
     def _perform_specific_data_processing(self, config):
+        # A leg stopped by compliance is shorter than planned; split at the measured leg lengths instead
+        self.num_points_bwd = None
+        if self.sweep_status is not None and config.get('enable_backward', False):
+            legs = self.sweep_status['leg_points']
+            if legs.size == 2 and legs.sum() == self.consistent_len:
+                self.num_points_per_sweep, self.num_points_bwd = int(legs[0]), int(legs[1])
+
         # Calculate relative time from absolute timestamps
         if self.consistent_len > 0 and 'time_abs' in self.processed_data and \
            isinstance(self.processed_data['time_abs'], np.ndarray) and \
@@ -121,9 +135,55 @@ class DiodeMeasurement(MeasurementBase):
         elif 'Time' not in self.processed_data: # Ensure 'Time' key exists
             self.processed_data['Time'] = np.full(self.consistent_len, np.nan) if self.consistent_len > 0 else np.array([])
 
+        self.sweep_legs = SweepLegs.split(self.processed_data, config.get('enable_backward', False), self.num_points_per_sweep,
+                                          self.num_points_bwd, direction=1 if config['Vanode_stop'] >= config['Vanode_start'] else -1)
+        self._extract_diode_params(config)
+        self._extract_hysteresis()
+
         # Note: Current density calculation is handled by MeasurementBase's _perform_common_data_processing
         # No specific current density calculation here unless Diode has unique needs not covered by base.
 
+    def _extract_diode_params(self, config):
+        # Shockley + Rs fit, turn-on and reverse leakage on the forward leg
+        self.diode_params = {}
+        fwd_leg = self.sweep_legs.forward
+        voltage, current = fwd_leg.get(self._voltage_key(), np.array([])), fwd_leg.get('anode_current', np.array([]))
+        if voltage.size < 2 or current.size != voltage.size:
+            return
+        compliance = config.get('IlimitAnode')
+        self.diode_params = parameter_extraction.extract_diode(voltage, current, on_current=self.on_current, reverse_v=self.reverse_v,
+                                                               compliance=float(compliance) if compliance is not None else None)
+
+    def _extract_hysteresis(self):
+        # Backward minus forward anode current; turn-on is where |I_anode| first reaches the turn-on criterion
+        self.hysteresis = {}
+        if not self.sweep_legs.has_backward:
+            return
+        voltage_key = self._voltage_key()
+        fwd_leg, bwd_leg = self.sweep_legs.forward, self.sweep_legs.backward
+        loop = parameter_extraction.extract_hysteresis(fwd_leg[voltage_key], fwd_leg['anode_current'],
+                                                       bwd_leg[voltage_key], bwd_leg['anode_current'],
+                                                       level=self.on_current)
+        # The forward turn-on is the diode fit's V_on (same criterion and interpolation), so the two header values agree
+        v_on_fwd = self.diode_params.get('V_on', loop['x_at_level_fwd'])
+        self.hysteresis = {
+            'V_on_fwd': v_on_fwd,
+            'V_on_bwd': loop['x_at_level_bwd'],
+            'Delta_V_on': loop['x_at_level_bwd'] - v_on_fwd,
+            'Loop_Area': loop['loop_area'],
+            'Max_Gap': loop['max_gap'],
+            'V_at_Max_Gap': loop['x_at_max_gap'],
+        }
+
+    def _voltage_key(self):
+        # Prefer the read-back anode voltage, fall back to the programmed one
+        if 'anode_voltage_read' in self.processed_data and \
+           isinstance(self.processed_data['anode_voltage_read'], np.ndarray) and \
+           self.processed_data['anode_voltage_read'].size == self.consistent_len and \
+           not np.all(np.isnan(self.processed_data['anode_voltage_read'])):
+            return 'anode_voltage_read'
+        return 'anode_voltage_set'
+
     def _get_csv_header_info(self, config):
         header_cols_ordered = ['Time', 'anode_voltage_set', 'anode_voltage_read', 'anode_current']
         csv_header_list = ["Time(s)", "VAnode_set(V)", "VAnode_read(V)", "IAnode(A)"]
@@ -147,50 +207,35 @@ class DiodeMeasurement(MeasurementBase):
         comments += f"# Enable Backward: {config.get('enable_backward', False)}\n"
         comments += f"# Settling Delay (s): {config.get('settling_delay', 'N/A')}\n" # Added
         comments += f"# Num Points Fwd Expected: {self.num_points_per_sweep}\n"
+        comments += f"# IlimitAnode (A): {config.get('IlimitAnode', 'N/A')}\n"
+        if self.hysteresis or self.diode_params:
+            comments += f"# Turn-on Criterion (A): {self.on_current:.3e}\n"
+            comments += f"# Turn-on Criterion: {self.on_criterion_label}\n"
+        if self.diode_params:
+            comments += f"# Reverse Leakage Voltage (V): {self.reverse_v}\n"
+            comments += f"# Diode Fit: V = n*Vt*ln(I/Is+1) + Rs*I, Vt = {config_settings.DIODE_THERMAL_VOLTAGE_V} V, I >= {config_settings.DIODE_FIT_MIN_CURRENT_A:.1e} A\n"
+            for key, label, fmt in DIODE_PARAM_LABELS:
+                comments += f"# {label}: {self.diode_params[key]:{fmt}}\n"
+        for key, label, fmt in HYSTERESIS_LABELS:
+            value = self.hysteresis.get(key, np.nan)
+            if not np.isnan(value): comments += f"# {label}: {value:{fmt}}\n"
         return comments
 
     def _prepare_plot_data_package(self, config):
-        # Determine which voltage data to use for plotting (prefer read, fallback to set)
-        voltage_for_plot_key = 'anode_voltage_read'
-        if not ('anode_voltage_read' in self.processed_data and \
-                isinstance(self.processed_data['anode_voltage_read'], np.ndarray) and \
-                self.processed_data['anode_voltage_read'].size == self.consistent_len and \
-                not np.all(np.isnan(self.processed_data['anode_voltage_read']))):
-            voltage_for_plot_key = 'anode_voltage_set'
-
-        # Prepare data for potential splitting into forward/backward sweeps
-        temp_plot_data_for_splitting = {
-            'voltage_plot': self.processed_data.get(voltage_for_plot_key, np.array([])),
-            'anode_current_plot': self.processed_data.get('anode_current', np.array([])),
-            'cathode_current_plot': self.processed_data.get('cathode_current_buffer', np.array([]))
-        }
-
-        forward_plot_data = {}
-        backward_plot_data = {}
-        actual_enable_backward_for_plot = False # Flag to indicate if backward data is valid for plotting
-
-        if config.get('enable_backward', False) and self.consistent_len > 0:
-            forward_plot_data, backward_plot_data = _split_diode_data_internal(
-                temp_plot_data_for_splitting, self.num_points_per_sweep
-            )
-
-            # Check if backward data is actually usable for plotting
-            bwd_v_plot = backward_plot_data.get('voltage_plot', np.array([]))
-            if bwd_v_plot.size > 0 and \
-               (backward_plot_data.get('anode_current_plot', np.array([])).size == bwd_v_plot.size or \
-                backward_plot_data.get('cathode_current_plot', np.array([])).size == bwd_v_plot.size):
-                actual_enable_backward_for_plot = True
-            else: # If backward voltage is empty, or currents don't match, revert to all-forward
-                if not (forward_plot_data.get('voltage_plot', np.array([])).size > 0): # If fwd also became empty
-                     forward_plot_data = temp_plot_data_for_splitting # Use original full data as forward
-        else: # Not enabled backward, or no data
-            forward_plot_data = temp_plot_data_for_splitting
-
+        voltage_for_plot_key = self._voltage_key()
 
+        # The plot reads the legs straight from the record (sweep_legs views); only the voltage column is chosen here
         return {
-            "forward_plot_data": forward_plot_data,
-            "backward_plot_data": backward_plot_data,
-            "enable_backward_plot": actual_enable_backward_for_plot,
+            "sweep_legs": self.sweep_legs,
+            "voltage_key": voltage_for_plot_key,
+            "enable_backward_plot": self.sweep_legs is not None and self.sweep_legs.has_backward,
+            "hysteresis": self.hysteresis,
+            "diode_params": self.diode_params,
+            "Ideality_n": self.diode_params.get('n', np.nan),
+            "Is_fit": self.diode_params.get('Is', np.nan),
+            "Rs_fit": self.diode_params.get('Rs', np.nan),
+            "V_on": self.diode_params.get('V_on', np.nan),
+            "I_reverse": self.diode_params.get('I_reverse', np.nan),
             "png_file_path": self.png_file_path,
             "csv_file_path": self.csv_file_path,
             "measurement_type_name": self.measurement_type_name_full,
@@ -204,8 +249,10 @@ def generate_diode_plot(plot_data_package):
     )
 
 def _plot_diode_figure_content(fig, plot_data_package):
-    forward_plot_data = plot_data_package.get('forward_plot_data', {})
-    backward_plot_data = plot_data_package.get('backward_plot_data', {})
+    sweep_legs = plot_data_package.get('sweep_legs')
+    forward_plot_data = sweep_legs.forward if sweep_legs is not None else {}
+    backward_plot_data = sweep_legs.backward if sweep_legs is not None else {}
+    voltage_key = plot_data_package.get('voltage_key', 'anode_voltage_read')
     enable_backward_plot = plot_data_package.get('enable_backward_plot', False)
     measurement_name = plot_data_package.get("measurement_type_name", "Diode Characterization")
 
@@ -213,9 +260,9 @@ def _plot_diode_figure_content(fig, plot_data_package):
     ax2 = fig.add_subplot(1, 2, 2) # Log scale
 
     # --- Plotting Forward Sweep Data ---
-    fwd_v = forward_plot_data.get('voltage_plot', np.array([]))
-    fwd_ia = forward_plot_data.get('anode_current_plot', np.array([]))
-    fwd_ic = forward_plot_data.get('cathode_current_plot', np.array([]))
+    fwd_v = forward_plot_data.get(voltage_key, np.array([]))
+    fwd_ia = forward_plot_data.get('anode_current', np.array([]))
+    fwd_ic = forward_plot_data.get('cathode_current_buffer', np.array([]))
 
     has_fwd_ia_data = fwd_v.size > 0 and fwd_ia.size == fwd_v.size and not np.all(np.isnan(fwd_ia))
     has_fwd_ic_data = fwd_v.size > 0 and fwd_ic.size == fwd_v.size and not np.all(np.isnan(fwd_ic))
@@ -238,9 +285,9 @@ def _plot_diode_figure_content(fig, plot_data_package):
 
     # --- Plotting Backward Sweep Data (if enabled and valid) ---
     if enable_backward_plot:
-        bwd_v = backward_plot_data.get('voltage_plot', np.array([]))
-        bwd_ia = backward_plot_data.get('anode_current_plot', np.array([]))
-        bwd_ic = backward_plot_data.get('cathode_current_plot', np.array([]))
+        bwd_v = backward_plot_data.get(voltage_key, np.array([]))
+        bwd_ia = backward_plot_data.get('anode_current', np.array([]))
+        bwd_ic = backward_plot_data.get('cathode_current_buffer', np.array([]))
 
         has_bwd_ia_data = bwd_v.size > 0 and bwd_ia.size == bwd_v.size and not np.all(np.isnan(bwd_ia))
         has_bwd_ic_data = bwd_v.size > 0 and bwd_ic.size == bwd_v.size and not np.all(np.isnan(bwd_ic))
@@ -261,6 +308,16 @@ def _plot_diode_figure_content(fig, plot_data_package):
                 ax2.semilogy(bwd_v[valid_log_bwd_ic], bwd_ic_abs[valid_log_bwd_ic],
                              color='lightcoral', linestyle='--', marker='s', markersize=3, linewidth=1, label='Backward $|I_{Cathode}|$', alpha=0.7)
 
+    # --- Shockley + Rs fit, drawn as V(I) over the measured forward current range ---
+    diode_params = plot_data_package.get('diode_params') or {}
+    if has_fwd_ia_data and np.isfinite(diode_params.get('n', np.nan)):
+        fit_range = fwd_ia[(fwd_ia >= config_settings.DIODE_FIT_MIN_CURRENT_A) & (fwd_v > 0)]
+        if fit_range.size > 1:
+            i_model = np.geomspace(fit_range.min(), fit_range.max(), 100)
+            v_model = diode_params['n'] * config_settings.DIODE_THERMAL_VOLTAGE_V * np.log1p(i_model / diode_params['Is']) + diode_params['Rs'] * i_model
+            ax2.semilogy(v_model, i_model, color='black', linestyle=':', linewidth=1.5,
+                         label=f"Fit: n={diode_params['n']:.2f}, $R_s$={diode_params['Rs']:.3g} Ω")
+
     # --- Axes Formatting ---
     ax1.set_xlabel('Voltage (V)'); ax1.set_ylabel('Current (A)')
     ax1.set_title('Linear Scale Currents'); ax1.grid(True, alpha=0.4)
@@ -0,0 +1,162 @@
+# duration_estimator.py
+"""
+Run-time estimates for configured measurements and planning against an instrument-hours budget.
+
+Estimates use the measurement classes themselves: `_prepare_tsp_parameters` (no instrument needed)
+fixes the point count exactly as the run would, and `_estimate_run_duration_s` gives the script time
+from settling, NPLC and pulse timing. Recorded runs calibrate the result: each CSV carries
+'# Script Run Time (s): measured (expected ...)' and the '# Timing <span> (ms)' lines, from which a
+per-type script time scale and a per-point host overhead (upload, readout, processing) are taken as
+medians over the most recent files of that type in the data folder.
+
+    python duration_estimator.py <output_dir>     # print the calibration found in a data folder
+"""
+import os
+import re
+import sys
+
+import numpy as np
+
+import config_settings
+from gate_transfer_module import GateTransferMeasurement
+from output_module import OutputMeasurement
+from breakdown_module import BreakdownMeasurement
+from diode_module import DiodeMeasurement
+from stress_module import StressMeasurement
+from pulsed_iv_module import PulsedGateTransferMeasurement, PulsedOutputMeasurement
+
+MEASUREMENT_CLASSES = {
+    "GateTransfer": GateTransferMeasurement,
+    "PulsedGateTransfer": PulsedGateTransferMeasurement,
+    "Output": OutputMeasurement,
+    "PulsedOutput": PulsedOutputMeasurement,
+    "Breakdown": BreakdownMeasurement,
+    "Diode": DiodeMeasurement,
+    "Stress": StressMeasurement,
+}
+
+_SCRIPT_RUN_RE = re.compile(r"^# Script Run Time \(s\): ([0-9.eE+-]+) \(expected ([0-9.eE+-]+)\)")
+_TIMING_RE = re.compile(r"^# Timing (\S+) \(ms\): ([0-9.eE+-]+)")
+
+
+class DurationCalibration:
+    """Per measurement type: measured / expected script time and host overhead per data point."""
+    def __init__(self, script_scale=1.0, overhead_per_point_s=config_settings.ESTIMATE_DEFAULT_OVERHEAD_PER_POINT_S, runs=0):
+        self.script_scale = script_scale
+        self.overhead_per_point_s = overhead_per_point_s
+        self.runs = runs
+
+
+def _read_run_record(csv_path):
+    """(script_run_s, expected_s, host_overhead_s, rows) from a CSV's '#' header; None without a script run time line."""
+    script_run = expected = None
+    span_ms = {}
+    rows = -1  # The column header line is not a data row
+    with open(csv_path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if not line.startswith('#'):
+                rows += 1
+                continue
+            m = _SCRIPT_RUN_RE.match(line)
+            if m:
+                script_run, expected = float(m.group(1)), float(m.group(2))
+                continue
+            m = _TIMING_RE.match(line)
+            if m:
+                span_ms[m.group(1)] = float(m.group(2))
+    if script_run is None or rows <= 0:
+        return None
+    host_s = sum(span_ms.get(name, 0.0) for name in config_settings.ESTIMATE_OVERHEAD_SPANS) / 1000.0
+    return script_run, expected, host_s, rows
+
+
+def calibrate_from_directory(output_dir, kinds=None):
+    """{kind: DurationCalibration} from the most recent CSVs of each kind in output_dir (uncalibrated kinds use the defaults)."""
+    kinds = list(kinds or MEASUREMENT_CLASSES)
+    calibration = {kind: DurationCalibration() for kind in kinds}
+    if not output_dir or not os.path.isdir(output_dir):
+        return calibration
+    file_names = sorted((n for n in os.listdir(output_dir) if n.lower().endswith('.csv')), reverse=True)
+    for kind in kinds:
+        # File names end in _<kind>_<YYYYmmdd_HHMMSS>.csv (see instrument_utils.generate_file_paths)
+        pattern = re.compile(rf"(^|_){kind}_\d{{8}}_\d{{6}}\.csv$")
+        records = []
+        for name in (n for n in file_names if pattern.search(n)):
+            try:
+                record = _read_run_record(os.path.join(output_dir, name))
+            except OSError:
+                continue
+            if record is not None:
+                records.append(record)
+            if len(records) >= config_settings.ESTIMATE_CALIBRATION_MAX_FILES:
+                break
+        if not records:
+            continue
+        scales = [run / expected for run, expected, _, _ in records if expected > 0]
+        calibration[kind] = DurationCalibration(
+            script_scale=float(np.median(scales)) if scales else 1.0,
+            overhead_per_point_s=float(np.median([host_s / rows for _, _, host_s, rows in records])),
+            runs=len(records),
+        )
+    return calibration
+
+
+def estimate_measurement(kind, config, calibration=None):
+    """
+    Expected points and wall time for one run of `kind` with `config` (the same dict the runner gets).
+    Raises ValueError for parameters the measurement itself would reject.
+    """
+    if kind not in MEASUREMENT_CLASSES:
+        raise ValueError(f"未知的测量类型: {kind}")
+    measurement = MEASUREMENT_CLASSES[kind]()
+    run_config = dict(config)
+    tsp_params = measurement._prepare_tsp_parameters(run_config)
+    points = int(measurement._get_expected_point_count(run_config))
+    script_s = measurement._estimate_run_duration_s(run_config, tsp_params) or 0.0
+    cal = (calibration or {}).get(kind) or DurationCalibration()
+    script_s *= cal.script_scale
+    host_s = points * cal.overhead_per_point_s + config_settings.ESTIMATE_FIXED_OVERHEAD_S
+    return {
+        "kind": kind,
+        "points": points,
+        "script_s": script_s,
+        "host_s": host_s,
+        "total_s": script_s + host_s,
+        "calibration_runs": cal.runs,
+    }
+
+
+def plan_budget(step_estimates, budget_hours, devices=None):
+    """
+    Budget plan for a per-device recipe (a list of estimate_measurement results run back to back).
+    Returns the per-device time, how many devices fit the budget and, with `devices`, the campaign total.
+    """
+    per_device_s = sum(e["total_s"] for e in step_estimates)
+    budget_s = float(budget_hours) * 3600.0
+    plan = {
+        "per_device_s": per_device_s,
+        "budget_s": budget_s,
+        "devices_within_budget": int(budget_s // per_device_s) if per_device_s > 0 else 0,
+    }
+    if devices is not None:
+        plan["devices"] = int(devices)
+        plan["campaign_s"] = per_device_s * int(devices)
+        plan["fits_budget"] = plan["campaign_s"] <= budget_s
+    return plan
+
+
+def format_duration(seconds):
+    seconds = float(seconds)
+    if seconds < 60:
+        return f"{seconds:.1f} s"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min {int(seconds % 60):02d} s"
+    return f"{int(seconds // 3600)} h {int(seconds % 3600 // 60):02d} min"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python duration_estimator.py <数据目录>", file=sys.stderr)
+        sys.exit(2)
+    for kind, cal in calibrate_from_directory(sys.argv[1]).items():
+        print(f"{kind:20s} runs={cal.runs:3d}  script_scale={cal.script_scale:.3f}  overhead/point={cal.overhead_per_point_s * 1e3:.3f} ms")
@@ -10,36 +10,51 @@ import traceback
 import instrument_utils
 import config_settings
 from measurement_base import MeasurementBase 
+from measurement_record import SweepLegs
+import parameter_extraction
 import plotting_utils 
 
-def _split_sweep_data_internal(data_array, enable_backward_flag, num_points_fwd_expected=0):
-    if not isinstance(data_array, np.ndarray):
-        return np.array([]), np.array([])
-    actual_len = len(data_array)
-    if not enable_backward_flag or actual_len == 0:
-        return data_array, np.array([])
-    if num_points_fwd_expected > 0:
-        if actual_len >= num_points_fwd_expected:
-            fwd_part = data_array[:num_points_fwd_expected]
-            bwd_part_len = min(num_points_fwd_expected, actual_len - num_points_fwd_expected)
-            if bwd_part_len > 0:
-                bwd_part = data_array[num_points_fwd_expected : num_points_fwd_expected + bwd_part_len]
-            else:
-                bwd_part = np.array([])
-            return fwd_part, bwd_part
-        else: 
-            return data_array, np.array([])
-    else: 
-        if actual_len % 2 == 0:
-            num_points_forward_inferred = actual_len // 2
-            return data_array[:num_points_forward_inferred], data_array[num_points_forward_inferred:]
-        else: 
-            return data_array, np.array([])
+_LEG_SUFFIXES = {"forward": "fwd", "backward": "bwd"} # CSV metadata key suffix per sweep leg
+# (leg_params / hysteresis key, CSV metadata and batch summary label, format) for the backward leg and the loop
+BWD_PARAM_LABELS = (("Vth", "Vth_bwd (V)", ".4f"), ("gm_max", "Max_gm_bwd (S)", ".4e"), ("Vg_at_gm_max", "Vg_at_Max_gm_bwd (V)", ".4f"),
+                    ("Ion", "Ion_bwd (A)", ".4e"), ("Ioff", "Ioff_bwd (A)", ".4e"), ("Ion_Ioff_Ratio", "Ion_Ioff_Ratio_bwd", ".4e"))
+HYSTERESIS_LABELS = (("Delta_Vth", "Delta_Vth (V)", ".4f"), ("Loop_Area", "Hysteresis_Loop_Area (A*V)", ".4e"),
+                     ("Max_Gap", "Hysteresis_Max_Gap (A)", ".4e"), ("Vg_at_Max_Gap", "Vg_at_Hysteresis_Max_Gap (V)", ".4f"),
+                     ("Delta_Ion", "Delta_Ion (A)", ".4e"), ("Delta_Ioff_dec", "Delta_Ioff (dec)", ".3f"))
+
+
+def hysteresis_params(loop, fwd_params, bwd_params):
+    """HYSTERESIS_LABELS keys from one extract_hysteresis result and the forward / backward leg_params."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ioff_shift = np.log10(np.divide(bwd_params.get('Ioff', np.nan), fwd_params.get('Ioff', np.nan)))
+    return {
+        'Delta_Vth': bwd_params.get('Vth', np.nan) - fwd_params.get('Vth', np.nan),
+        'Loop_Area': loop['loop_area'],
+        'Max_Gap': loop['max_gap'],
+        'Vg_at_Max_Gap': loop['x_at_max_gap'],
+        'Delta_Ion': bwd_params.get('Ion', np.nan) - fwd_params.get('Ion', np.nan),
+        'Delta_Ioff_dec': ioff_shift,
+    }
 
 class GateTransferMeasurement(MeasurementBase):
+    reads_sweep_status = True
+
     def __init__(self):
         super().__init__(measurement_type_name_short="GateTransfer", plot_file_suffix=".png")
         self.num_points_per_sweep = 0
+        self.num_points_bwd = None # Measured backward leg length (sweep status record), None -> mirror the forward leg
+        self.adaptive_sweep = False
+        self.adaptive_fwd_points = 0
+        self.range_schedule = False
+        self.sched_retake_indices = np.array([], dtype=int) # 1-based drain buffer indices of discarded overflow readings
+        self.vth_method = config_settings.GT_DEFAULT_VTH_METHOD
+        self.vth_smooth_window = 0
+        self.vth_cc_current = float(config_settings.GT_DEFAULT_VTH_CC_CURRENT)
+        self.vth_fwd_by_method = {}
+        self.ss_window = int(config_settings.GT_DEFAULT_SS_WINDOW)
+        self.ss_by_leg = {} # Leg name -> extract_ss results (SS_min, SS_min_index into the leg, SS_avg, SS_decades)
+        self.leg_params = {} # Leg name -> Vth, Vth_by_method, gm_max, Vg_at_gm_max, Ion, Ioff, Ion_Ioff_Ratio
+        self.hysteresis = {} # Forward/backward comparison (keys of HYSTERESIS_LABELS), empty without a backward leg
         # Removed mobility attribute initializations
         # self.mu_lin_fwd_calc = np.nan 
         # self.mu_sat_fwd_calc = np.nan
@@ -48,6 +63,13 @@ class GateTransferMeasurement(MeasurementBase):
         return config_settings.CONFIG_KEY_TSP_GATE_TRANSFER
 
     def _get_default_tsp_script_path(self, config):
+        if config.get('adaptive_sweep', False):
+            return config_settings.DEFAULT_TSP_GATE_TRANSFER_ADAPTIVE
+        # The schedule picks range / NPLC from the previous reading, so it cannot run in the trigger model
+        if config.get('range_schedule', False):
+            return config_settings.DEFAULT_TSP_GATE_TRANSFER_SCHEDULED
+        if self._use_trigger_model(config):
+            return config_settings.DEFAULT_TSP_GATE_TRANSFER_TRIGGER
         return config_settings.DEFAULT_TSP_GATE_TRANSFER
 
     def _prepare_tsp_parameters(self, config):
@@ -55,19 +77,82 @@ class GateTransferMeasurement(MeasurementBase):
         Vg_stop = config['Vg_stop']
         vg_step_val = config['step']
         enable_backward = config['enable_backward']
+        self.adaptive_sweep = bool(config.get('adaptive_sweep', False))
 
         self.num_points_per_sweep = 1
         if vg_step_val != 0:
             self.num_points_per_sweep = int(round(abs(Vg_stop - Vg_start) / abs(vg_step_val))) + 1
         elif Vg_start != Vg_stop:
             raise ValueError("If Vg_start != Vg_stop, then Vg step (config['step']) cannot be zero.")
-        return {
+        tsp_params = {
             "IlimitDrain": config['IlimitDrain'], "IlimitGate": config['IlimitGate'],
             "Drain_nplc": config['Drain_nplc'], "Gate_nplc": config['Gate_nplc'],
             "Vd": config['Vd'], "Vg_start": Vg_start, "Vg_stop": Vg_stop,
             "step": vg_step_val, "enable_backward": "1" if enable_backward else "0", 
-            "settling_delay": config.get('settling_delay', config_settings.GT_DEFAULT_SETTLING_DELAY)
+            "settling_delay": config.get('settling_delay', config_settings.GT_DEFAULT_SETTLING_DELAY),
+            "chunk_points": config_settings.TRIGGER_MODEL_CHUNK_POINTS # Trigger-model script only
         }
+        self.range_schedule = bool(config.get('range_schedule', False)) and not self.adaptive_sweep
+        if self.adaptive_sweep:
+            tsp_params.update(self._prepare_adaptive_parameters(config))
+        elif self.range_schedule:
+            tsp_params.update(self._prepare_schedule_parameters(config))
+        self._prepare_extraction_parameters(config)
+        return tsp_params
+
+    def _prepare_extraction_parameters(self, config):
+        # Checked before the sweep runs so a bad setting does not cost a measurement
+        method = config.get('vth_method', config_settings.GT_DEFAULT_VTH_METHOD)
+        smooth_window = int(round(float(config.get('vth_smooth_window', config_settings.GT_DEFAULT_VTH_SMOOTH_WINDOW))))
+        cc_current = abs(float(config.get('vth_cc_current', config_settings.GT_DEFAULT_VTH_CC_CURRENT)))
+        ss_window = int(round(float(config.get('ss_window', config_settings.GT_DEFAULT_SS_WINDOW))))
+        if method not in parameter_extraction.VTH_METHODS:
+            raise ValueError(f"Vth 提取方法 '{method}' 无效 (可选: {', '.join(parameter_extraction.VTH_METHODS)})。")
+        if smooth_window != 0 and smooth_window <= config_settings.VTH_SMOOTH_POLYORDER:
+            raise ValueError(f"Vth 平滑窗口 ({smooth_window}) 必须为 0 (关闭) 或大于多项式阶数 ({config_settings.VTH_SMOOTH_POLYORDER})。")
+        if cc_current == 0:
+            raise ValueError("恒流 Vth 判据电流不能为零。")
+        if ss_window < 3:
+            raise ValueError(f"SS 拟合窗口 ({ss_window}) 必须至少为 3 点。")
+        self.vth_method = method
+        self.vth_smooth_window = smooth_window
+        self.vth_cc_current = cc_current
+        self.ss_window = ss_window
+
+    def _prepare_schedule_parameters(self, config):
+        # The configured drain NPLC is the slow end of the schedule (noise floor)
+        nplc_slow = float(config['Drain_nplc'])
+        nplc_fast = float(config.get('sched_nplc_fast', config_settings.GT_DEFAULT_SCHED_NPLC_FAST))
+        i_low = float(config.get('sched_i_low', config_settings.GT_DEFAULT_SCHED_I_LOW))
+        i_high = float(config.get('sched_i_high', config_settings.GT_DEFAULT_SCHED_I_HIGH))
+        if nplc_fast <= 0 or nplc_fast > nplc_slow:
+            raise ValueError(f"量程/NPLC 调度: 快速NPLC ({nplc_fast}) 必须为正且不大于漏极NPLC ({nplc_slow})。")
+        if not 0 < i_low < i_high:
+            raise ValueError(f"量程/NPLC 调度: 电流阈值必须满足 0 < 慢速区上限 ({i_low}) < 快速区下限 ({i_high})。")
+        return {
+            "sched_nplc_slow": nplc_slow, "sched_nplc_fast": nplc_fast,
+            "sched_i_low": i_low, "sched_i_high": i_high,
+            "sched_range_headroom": config_settings.GT_SCHED_RANGE_HEADROOM,
+            "sched_min_range": config_settings.GT_SCHED_MIN_RANGE_A
+        }
+
+    def _prepare_adaptive_parameters(self, config):
+        # Adaptive mode: 'step' is the fine step used inside the refined intervals
+        fine_step = abs(config['step'])
+        coarse_step = abs(float(config.get('adaptive_coarse_step', config_settings.GT_DEFAULT_ADAPTIVE_COARSE_STEP)))
+        refine_threshold = float(config.get('adaptive_refine_threshold', config_settings.GT_DEFAULT_ADAPTIVE_REFINE_THRESHOLD))
+        if fine_step == 0 or coarse_step < fine_step:
+            raise ValueError("自适应扫描: 粗扫步进必须不小于 Vg 步进 (细扫步进)，且两者均不能为零。")
+        if refine_threshold < 0:
+            raise ValueError("自适应扫描: 细化阈值不能为负。")
+        # Upper bound per leg (every interval refined); the actual split comes from adaptive_fwd_n
+        self.num_points_per_sweep = int(round(abs(config['Vg_stop'] - config['Vg_start']) / fine_step)) + 1
+        return {"step": fine_step, "coarse_step": coarse_step, "refine_threshold": refine_threshold}
+
+    def _estimate_run_duration_s(self, config, tsp_params):
+        # Planned points at the configured NPLC: an upper bound for adaptive, scheduled and compliance-stopped sweeps
+        return self._sweep_duration_s(self._get_expected_point_count(config), tsp_params['settling_delay'],
+                                      (tsp_params['Drain_nplc'], tsp_params['Gate_nplc'], tsp_params['Drain_nplc']))
 
     def _get_primary_buffer_info(self, config):
         expected_total_points = self.num_points_per_sweep
@@ -76,20 +161,73 @@ class GateTransferMeasurement(MeasurementBase):
         return config_settings.NODE2_SMUA_NVBUFFER2, expected_total_points
 
     def _get_buffers_to_read_config(self, config, buffer_read_count):
-        return {
+        # Retaken overflow readings leave extra entries in the drain buffers only
+        drain_read_count = buffer_read_count + self.sched_retake_indices.size
+        buffers = {
             'Time': (config_settings.GATE_SMU_TIMESTAMP_BUFFER_PATH, buffer_read_count),
             'Vg_read': (config_settings.GATE_SMU_VOLTAGE_READINGS_BUFFER_PATH, buffer_read_count),
             'Vg_source': (config_settings.GATE_SMU_VOLTAGE_SOURCEVALUES_BUFFER_PATH, buffer_read_count),
-            'Vd_read': (config_settings.DRAIN_SMU_VOLTAGE_READINGS_BUFFER_PATH, buffer_read_count),
-            'Id': (config_settings.DRAIN_SMU_CURRENT_READINGS_BUFFER_PATH, buffer_read_count),
+            'Vd_read': (config_settings.DRAIN_SMU_VOLTAGE_READINGS_BUFFER_PATH, drain_read_count),
+            'Id': (config_settings.DRAIN_SMU_CURRENT_READINGS_BUFFER_PATH, drain_read_count),
             'Ig': (config_settings.GATE_SMU_CURRENT_READINGS_BUFFER_PATH, buffer_read_count),
             'Is_buffer': (config_settings.SOURCE_SMU_IS_BUFFER_READINGS_PATH, buffer_read_count)
         }
+        if self.range_schedule:
+            buffers['Id_range'] = (config_settings.DRAIN_SMU_CURRENT_MEASURERANGES_BUFFER_PATH, drain_read_count)
+        return buffers
 
     def _get_priority_keys_for_consistent_length(self):
         return ['Id', 'Vg_read', 'Vg_source']
 
+    def _query_and_read_buffers(self, inst, config):
+        self.sched_retake_indices = np.array([], dtype=int)
+        if self.range_schedule:
+            self.sched_retake_indices = instrument_utils.query_lua_number_list(inst, 'gt_retake').astype(int)
+        super()._query_and_read_buffers(inst, config)
+        if self.range_schedule:
+            self._apply_schedule_readback(inst)
+        self.num_points_bwd = None
+        # The adaptive forward leg length depends on the data, so the split point is read back from the instrument.
+        # The sweep status record replaces this in _apply_sweep_status_legs; adaptive_fwd_n stays as the fallback.
+        if self.adaptive_sweep:
+            self.adaptive_fwd_points = self.consistent_len
+            try:
+                fwd_n_str = instrument_utils.visa_query(inst, 'print(adaptive_fwd_n)').strip()
+                if fwd_n_str.lower() != 'nil':
+                    self.adaptive_fwd_points = min(int(float(fwd_n_str)), self.consistent_len)
+            except (ValueError, pyvisa.errors.VisaIOError) as e:
+                print(f"查询自适应扫描正向点数时出错: {e}。按全部数据为正向处理。", file=sys.stderr)
+            self.num_points_per_sweep = self.adaptive_fwd_points
+
+    def _apply_schedule_readback(self, inst):
+        # Drop the overflowed drain readings that were retaken, then attach the NPLC used per point
+        drop = self.sched_retake_indices - 1
+        for key in ('Id', 'Vd_read', 'Id_range'):
+            arr = self.raw_data.get(key)
+            if isinstance(arr, np.ndarray) and drop.size:
+                self.raw_data[key] = np.delete(arr, drop[drop < arr.size])
+        self.raw_data['Drain_NPLC'] = instrument_utils.query_lua_number_list(inst, 'gt_nplc_used')
+        self.consistent_len = instrument_utils.determine_consistent_length(
+            self.raw_data, priority_keys=self._get_priority_keys_for_consistent_length()
+        )
+
+    def _apply_sweep_status_legs(self, config):
+        # Runs after any per-pulse averaging, so the leg lengths (in points) match consistent_len
+        if self.sweep_status is None:
+            return
+        legs = self.sweep_status['leg_points']
+        expected_legs = 2 if config['enable_backward'] else 1
+        if legs.size != expected_legs or legs.sum() != self.consistent_len:
+            print(f"  Warning ({self.measurement_type_name_full}): 扫描状态记录 (各段点数 {legs.tolist()}) "
+                  f"与数据长度 ({self.consistent_len}) 不符，按预期点数拆分正/反向。")
+            return
+        self.num_points_per_sweep = int(legs[0])
+        self.adaptive_fwd_points = self.num_points_per_sweep
+        if expected_legs == 2:
+            self.num_points_bwd = int(legs[1])
+
     def _perform_specific_data_processing(self, config):
+        self._apply_sweep_status_legs(config)
         vg_read_data = self.processed_data.get('Vg_read')
         vg_source_data = self.processed_data.get('Vg_source')
         use_generated_vg = True
@@ -105,7 +243,14 @@ class GateTransferMeasurement(MeasurementBase):
             Vg_stop = config['Vg_stop']
             vg_fwd_calc = np.linspace(Vg_start, Vg_stop, self.num_points_per_sweep) if self.num_points_per_sweep > 0 else np.array([Vg_start])
             temp_vg_combined = vg_fwd_calc
-            if config['enable_backward'] and self.num_points_per_sweep > 0:
+            if config['enable_backward'] and self.num_points_bwd is not None:
+                # Legs of measured length: each one starts from its own end of the range
+                step_abs = abs(config['step'])
+                direction = 1.0 if Vg_stop >= Vg_start else -1.0
+                vg_fwd_calc = Vg_start + direction * step_abs * np.arange(self.num_points_per_sweep)
+                vg_bwd_calc = Vg_stop - direction * step_abs * np.arange(self.num_points_bwd)
+                temp_vg_combined = np.concatenate([vg_fwd_calc, vg_bwd_calc])
+            elif config['enable_backward'] and self.num_points_per_sweep > 0:
                 temp_vg_combined = np.concatenate([vg_fwd_calc, np.flip(vg_fwd_calc)])
             if len(temp_vg_combined) >= self.consistent_len:
                 self.processed_data['Vg_actual_for_data'] = temp_vg_combined[:self.consistent_len]
@@ -116,106 +261,118 @@ class GateTransferMeasurement(MeasurementBase):
         elif 'Vg_actual_for_data' not in self.processed_data:
              self.processed_data['Vg_actual_for_data'] = np.array([])
 
-        temp_data_for_splitting = self.processed_data.copy()
-        self.forward_data = {}
-        self.backward_data = {}
-        for key, arr_val in temp_data_for_splitting.items():
-            fwd_part, bwd_part = _split_sweep_data_internal(arr_val, config['enable_backward'], self.num_points_per_sweep)
-            self.forward_data[key] = fwd_part
-            self.backward_data[key] = bwd_part
-
-        gm_calc_fwd = np.array([])
-        ss_calc_values_fwd = np.array([])
-        Vth_fwd = np.nan
-        min_ss_fwd = np.nan
-        min_index_ss_fwd = None
-        ion_fwd = np.nan
-        ioff_fwd = np.nan
-        ion_ioff_ratio_fwd = np.nan
-        max_gm_fwd = np.nan
-        vg_at_max_gm_fwd = np.nan
-        
-        fwd_vg_data = self.forward_data.get('Vg_actual_for_data', np.array([]))
-        fwd_id_data = self.forward_data.get('Id', np.array([]))
-
-        if fwd_vg_data.size > 1 and fwd_id_data.size == fwd_vg_data.size:
-            valid_indices_fwd = ~np.isnan(fwd_vg_data) & ~np.isnan(fwd_id_data)
-            vg_valid_fwd = fwd_vg_data[valid_indices_fwd]
-            id_valid_fwd = fwd_id_data[valid_indices_fwd]
-            if vg_valid_fwd.size > 1:
-                gm_subset_fwd = np.gradient(id_valid_fwd, vg_valid_fwd)
-                gm_calc_fwd = np.full(fwd_vg_data.size, np.nan)
-                gm_calc_fwd[valid_indices_fwd] = gm_subset_fwd
-                if np.any(~np.isnan(gm_calc_fwd)):
-                    max_gm_fwd = np.nanmax(gm_calc_fwd)
-                    idx_max_gm = np.nanargmax(gm_calc_fwd)
-                    vg_at_max_gm_fwd = fwd_vg_data[idx_max_gm]
-                id_abs_safe_fwd = np.clip(np.abs(id_valid_fwd), 1e-14, None)
-                log_id_fwd = np.log10(id_abs_safe_fwd)
-                dlog_Id_dVg_fwd = np.gradient(log_id_fwd, vg_valid_fwd)
-                ss_subset_fwd = np.full_like(dlog_Id_dVg_fwd, np.nan)
-                valid_dlog_indices_fwd = np.abs(dlog_Id_dVg_fwd) > 1e-9
-                ss_subset_fwd[valid_dlog_indices_fwd] = 1000.0 / dlog_Id_dVg_fwd[valid_dlog_indices_fwd]
-                ss_calc_values_fwd = np.full(fwd_vg_data.size, np.nan)
-                ss_calc_values_fwd[valid_indices_fwd] = ss_subset_fwd
-                positive_ss_values_fwd = ss_subset_fwd[ss_subset_fwd > 0]
-                if positive_ss_values_fwd.size > 0:
-                    min_ss_fwd = np.min(positive_ss_values_fwd)
-                    min_ss_indices_in_subset = np.where(ss_subset_fwd == min_ss_fwd)[0]
-                    if min_ss_indices_in_subset.size > 0:
-                        original_valid_indices_map_fwd = np.where(valid_indices_fwd)[0]
-                        min_index_ss_fwd = original_valid_indices_map_fwd[min_ss_indices_in_subset[0]]
-                if not np.isnan(max_gm_fwd) and max_gm_fwd > 0:
-                    idx_max_gm_fwd = np.nanargmax(gm_calc_fwd)
-                    if idx_max_gm_fwd < len(fwd_vg_data) and idx_max_gm_fwd < len(fwd_id_data) and \
-                       not np.isnan(fwd_vg_data[idx_max_gm_fwd]) and not np.isnan(fwd_id_data[idx_max_gm_fwd]):
-                        vg_at_gm_max_val = fwd_vg_data[idx_max_gm_fwd]
-                        id_at_gm_max_val = fwd_id_data[idx_max_gm_fwd]
-                        Vth_fwd = vg_at_gm_max_val - (id_at_gm_max_val / max_gm_fwd)
-            if id_valid_fwd.size > 0:
-                ion_fwd = np.max(np.abs(id_valid_fwd))
-                ioff_candidates_abs_fwd = np.abs(id_valid_fwd[np.abs(id_valid_fwd) > 1e-13])
-                if not np.isnan(Vth_fwd):
-                    ioff_region_mask_fwd = (vg_valid_fwd < (Vth_fwd - 0.5)) & (np.abs(id_valid_fwd) > 1e-13)
-                    ioff_candidates_in_region_fwd = np.abs(id_valid_fwd[ioff_region_mask_fwd])
-                    if ioff_candidates_in_region_fwd.size > 0: ioff_fwd = np.min(ioff_candidates_in_region_fwd)
-                    elif ioff_candidates_abs_fwd.size > 0: ioff_fwd = np.min(ioff_candidates_abs_fwd)
-                elif ioff_candidates_abs_fwd.size > 0: ioff_fwd = np.min(ioff_candidates_abs_fwd)
-                if not np.isnan(ion_fwd) and not np.isnan(ioff_fwd) and ioff_fwd > 1e-14:
-                    ion_ioff_ratio_fwd = ion_fwd / ioff_fwd
-            
-            # Mobility calculation section is removed.
-
-        self.processed_data['gm'] = np.full(self.consistent_len, np.nan)
-        if gm_calc_fwd.size > 0 and len(gm_calc_fwd) == len(self.forward_data.get('Id',[])) :
-            self.processed_data['gm'][:len(gm_calc_fwd)] = gm_calc_fwd
-        self.processed_data['SS'] = np.full(self.consistent_len, np.nan)
-        if ss_calc_values_fwd.size > 0 and len(ss_calc_values_fwd) == len(self.forward_data.get('Id',[])):
-            self.processed_data['SS'][:len(ss_calc_values_fwd)] = ss_calc_values_fwd
+        # Legs are row views of the record: gm / SS written below show up in the forward leg as well
+        self.sweep_legs = SweepLegs.split(self.processed_data, config['enable_backward'], self.num_points_per_sweep, self.num_points_bwd,
+                                          direction=1 if config['Vg_stop'] >= config['Vg_start'] else -1)
+        fwd_leg = self.sweep_legs.forward
+        fwd_vg_data = fwd_leg.get('Vg_actual_for_data', np.array([]))
+
+        self._extract_leg_threshold()
+        self._extract_leg_swing()
+        self._extract_hysteresis()
+        fwd_params = self.leg_params.get('forward', {})
+        fwd_ss = self.ss_by_leg.get('forward', {})
         
-        self.Vth_fwd_calc = Vth_fwd
-        self.min_ss_fwd_calc = min_ss_fwd
-        self.min_index_ss_fwd_calc = min_index_ss_fwd
-        self.ion_fwd_calc = ion_fwd
-        self.ioff_fwd_calc = ioff_fwd
-        self.ion_ioff_ratio_fwd_calc = ion_ioff_ratio_fwd
-        self.max_gm_fwd_calc = max_gm_fwd
-        self.vg_at_max_gm_fwd_calc = vg_at_max_gm_fwd
+        self.vth_fwd_by_method = fwd_params.get('Vth_by_method', {})
+        self.Vth_fwd_calc = fwd_params.get('Vth', np.nan)
+        self.min_ss_fwd_calc = fwd_ss.get('SS_min', np.nan)
+        self.min_index_ss_fwd_calc = fwd_ss.get('SS_min_index')
+        self.ion_fwd_calc = fwd_params.get('Ion', np.nan)
+        self.ioff_fwd_calc = fwd_params.get('Ioff', np.nan)
+        self.ion_ioff_ratio_fwd_calc = fwd_params.get('Ion_Ioff_Ratio', np.nan)
+        self.max_gm_fwd_calc = fwd_params.get('gm_max', np.nan)
+        self.vg_at_max_gm_fwd_calc = fwd_params.get('Vg_at_gm_max', np.nan)
         self.avg_sweep_rate_fwd = 0
-        fwd_time_data = self.forward_data.get('Time', np.array([]))
+        fwd_time_data = fwd_leg.get('Time', np.array([]))
         if fwd_vg_data.size > 1 and fwd_time_data.size == fwd_vg_data.size:
             valid_sr_indices_fwd = ~np.isnan(fwd_time_data) & ~np.isnan(fwd_vg_data)
             if np.sum(valid_sr_indices_fwd) > 1:
                 dvdt_fwd = np.gradient(fwd_vg_data[valid_sr_indices_fwd], fwd_time_data[valid_sr_indices_fwd])
                 self.avg_sweep_rate_fwd = np.nanmean(dvdt_fwd)
         self.average_drain_bias_fwd = config.get('Vd', np.nan)
-        fwd_vd_data = self.forward_data.get('Vd_read', np.array([]))
+        fwd_vd_data = fwd_leg.get('Vd_read', np.array([]))
         if fwd_vd_data.size > 0 and not np.all(np.isnan(fwd_vd_data)):
             self.average_drain_bias_fwd = np.nanmean(fwd_vd_data)
 
+    def _extract_leg_threshold(self):
+        # One stacked extract_vth call covers every leg; gm is written back through the leg views
+        self.processed_data.column('gm').fill(np.nan)
+        self.leg_params = {}
+        legs = [leg for leg in self.sweep_legs.legs if leg.stop > leg.start]
+        views = [self.sweep_legs.view(leg) for leg in legs]
+        valid_masks = [~np.isnan(view['Vg_actual_for_data']) & ~np.isnan(view['Id']) for view in views]
+        fit_rows = [row for row, valid in enumerate(valid_masks) if np.count_nonzero(valid) > 1]
+        if fit_rows:
+            vg_rows, id_rows, lengths = parameter_extraction.stack_sweeps(
+                (views[row]['Vg_actual_for_data'], views[row]['Id']) for row in fit_rows)
+            vth_results = parameter_extraction.extract_vth(vg_rows, id_rows, smooth_window=self.vth_smooth_window,
+                                                           cc_current=self.vth_cc_current, lengths=lengths)
+        for row, (leg, view, valid) in enumerate(zip(legs, views, valid_masks)):
+            params = {'Vth': np.nan, 'Vth_by_method': {}, 'gm_max': np.nan, 'Vg_at_gm_max': np.nan}
+            if row in fit_rows:
+                fit = fit_rows.index(row)
+                view['gm'][np.flatnonzero(valid)] = vth_results['gm'][fit, :lengths[fit]]
+                params['Vth_by_method'] = {method: vth_results[f'Vth_{method}'][fit] for method in parameter_extraction.VTH_METHODS}
+                params['Vth'] = params['Vth_by_method'][self.vth_method]
+                params['gm_max'] = vth_results['gm_max'][fit]
+                params['Vg_at_gm_max'] = vth_results['Vg_at_gm_max'][fit]
+            params.update(self._on_off_currents(view['Vg_actual_for_data'][valid], view['Id'][valid], params['Vth']))
+            self.leg_params[leg.name] = params
+
+    @staticmethod
+    def _on_off_currents(vg_valid, id_valid, vth):
+        ion, ioff, ratio = np.nan, np.nan, np.nan
+        if id_valid.size > 0:
+            ion = np.max(np.abs(id_valid))
+            ioff_candidates_abs = np.abs(id_valid[np.abs(id_valid) > 1e-13])
+            if not np.isnan(vth):
+                ioff_region_mask = (vg_valid < (vth - 0.5)) & (np.abs(id_valid) > 1e-13)
+                ioff_candidates_in_region = np.abs(id_valid[ioff_region_mask])
+                if ioff_candidates_in_region.size > 0: ioff = np.min(ioff_candidates_in_region)
+                elif ioff_candidates_abs.size > 0: ioff = np.min(ioff_candidates_abs)
+            elif ioff_candidates_abs.size > 0: ioff = np.min(ioff_candidates_abs)
+            if not np.isnan(ion) and not np.isnan(ioff) and ioff > 1e-14:
+                ratio = ion / ioff
+        return {'Ion': ion, 'Ioff': ioff, 'Ion_Ioff_Ratio': ratio}
+
+    def _extract_hysteresis(self):
+        # Backward minus forward, from the in-memory legs
+        self.hysteresis = {}
+        if not self.sweep_legs.has_backward:
+            return
+        fwd_leg, bwd_leg = self.sweep_legs.forward, self.sweep_legs.backward
+        loop = parameter_extraction.extract_hysteresis(fwd_leg['Vg_actual_for_data'], fwd_leg['Id'],
+                                                       bwd_leg['Vg_actual_for_data'], bwd_leg['Id'])
+        self.hysteresis = hysteresis_params(loop, self.leg_params.get('forward', {}), self.leg_params.get('backward', {}))
+
+    def _extract_leg_swing(self):
+        # One stacked extract_ss call covers every leg; SS is written back through the leg views
+        self.processed_data.column('SS').fill(np.nan)
+        self.ss_by_leg = {}
+        legs = [leg for leg in self.sweep_legs.legs if leg.stop > leg.start]
+        if not legs:
+            return
+        views = [self.sweep_legs.view(leg) for leg in legs]
+        valid_masks = [~np.isnan(view['Vg_actual_for_data']) & ~np.isnan(view['Id']) for view in views]
+        vg_rows, id_rows, lengths = parameter_extraction.stack_sweeps((view['Vg_actual_for_data'], view['Id']) for view in views)
+        ss_results = parameter_extraction.extract_ss(vg_rows, id_rows, window=self.ss_window, lengths=lengths)
+        for row, (leg, view, valid) in enumerate(zip(legs, views, valid_masks)):
+            valid_positions = np.flatnonzero(valid)
+            view['SS'][valid_positions] = ss_results['SS'][row, :lengths[row]]
+            min_index = int(ss_results['SS_min_index'][row])
+            self.ss_by_leg[leg.name] = {
+                'SS_min': ss_results['SS_min'][row],
+                'SS_min_index': int(valid_positions[min_index]) if min_index >= 0 else None,
+                'SS_avg': ss_results['SS_avg'][row],
+                'SS_decades': ss_results['SS_decades'][row],
+            }
+
     def _get_csv_header_info(self, config):
         header_cols = ['Time', 'Vg_actual_for_data', 'Id', 'Ig', 'Is', 'Vd_read', 'gm', 'SS', 'Jd', 'Jg', 'Js']
         header_str = f"Time(s),Vg_actual(V),IDrain(A),IGate(A),ISource(A),VDrain_read(V),gm(S),SS(mV/dec),Jd({self.jd_unit_plot}),Jg({self.jd_unit_plot}),Js({self.jd_unit_plot})"
+        if self.range_schedule:
+            header_cols += ['Id_range', 'Drain_NPLC']
+            header_str += ",IDrain_range(A),Drain_NPLC"
         return header_cols, header_str
 
     def _get_specific_metadata_comments(self, config):
@@ -227,28 +384,60 @@ class GateTransferMeasurement(MeasurementBase):
         comments += f"# Enable Backward: {config.get('enable_backward', False)}\n"
         comments += f"# Settling Delay (s): {config.get('settling_delay', 'N/A')}\n" # Added
         comments += f"# Num Points Fwd Expected: {self.num_points_per_sweep}\n"
+        if self.adaptive_sweep:
+            comments += f"# Sweep Mode: adaptive (fine step where |dlog10(Id)/dVg| >= threshold)\n"
+            comments += f"# Adaptive Coarse Step (V): {config.get('adaptive_coarse_step', 'N/A')}\n"
+            comments += f"# Adaptive Refine Threshold (dec/V): {config.get('adaptive_refine_threshold', 'N/A')}\n"
+        if self.range_schedule:
+            comments += f"# Range/NPLC Schedule: fixed drain range from previous |Id| (x{config_settings.GT_SCHED_RANGE_HEADROOM}), NPLC {config.get('Drain_nplc', 'N/A')} -> {config.get('sched_nplc_fast', 'N/A')}\n"
+            comments += f"# Schedule Current Thresholds (A): slow <= {config.get('sched_i_low', 'N/A')}, fast >= {config.get('sched_i_high', 'N/A')}\n"
+            comments += f"# Overflow Retakes: {self.sched_retake_indices.size}\n"
 
         
+        comments += f"# Vth Method: {self.vth_method}\n"
+        comments += f"# Vth Smoothing Window (points): {self.vth_smooth_window}\n"
+        comments += f"# Vth CC Criterion (A): {self.vth_cc_current:.3e}\n"
         if not np.isnan(self.Vth_fwd_calc): comments += f"# Vth_fwd (V): {self.Vth_fwd_calc:.4f}\n"
-        if not np.isnan(self.min_ss_fwd_calc): comments += f"# SS_min_fwd (mV/dec): {self.min_ss_fwd_calc:.2f}\n"
+        for method, vth_value in self.vth_fwd_by_method.items():
+            if not np.isnan(vth_value): comments += f"# Vth_fwd_{method} (V): {vth_value:.4f}\n"
+        comments += f"# SS Window (points): {self.ss_window}\n"
+        for leg_name, leg_ss in self.ss_by_leg.items():
+            suffix = _LEG_SUFFIXES.get(leg_name, leg_name)
+            if not np.isnan(leg_ss['SS_min']): comments += f"# SS_min_{suffix} (mV/dec): {leg_ss['SS_min']:.2f}\n"
+            if not np.isnan(leg_ss['SS_avg']): comments += f"# SS_avg_{suffix} (mV/dec): {leg_ss['SS_avg']:.2f}\n"
+            if not np.isnan(leg_ss['SS_decades']): comments += f"# SS_decades_{suffix}: {leg_ss['SS_decades']:.2f}\n"
         if not np.isnan(self.max_gm_fwd_calc): comments += f"# Max_gm_fwd (S): {self.max_gm_fwd_calc:.4e}\n"
         if not np.isnan(self.vg_at_max_gm_fwd_calc): comments += f"# Vg_at_Max_gm_fwd (V): {self.vg_at_max_gm_fwd_calc:.4f}\n"
         if not np.isnan(self.ion_fwd_calc): comments += f"# Ion_fwd (A): {self.ion_fwd_calc:.4e}\n"
         if not np.isnan(self.ioff_fwd_calc): comments += f"# Ioff_fwd (A): {self.ioff_fwd_calc:.4e}\n"
         if not np.isnan(self.ion_ioff_ratio_fwd_calc): comments += f"# Ion_Ioff_Ratio_fwd: {self.ion_ioff_ratio_fwd_calc:.4e}\n"
+        bwd_params = self.leg_params.get('backward', {})
+        for source, labels in ((bwd_params, BWD_PARAM_LABELS), (self.hysteresis, HYSTERESIS_LABELS)):
+            for key, label, fmt in labels:
+                value = source.get(key, np.nan)
+                if not np.isnan(value): comments += f"# {label}: {value:{fmt}}\n"
         if self.avg_sweep_rate_fwd != 0: comments += f"# Avg_Sweep_Rate_Fwd (V/s): {self.avg_sweep_rate_fwd:.3f}\n"
         if not np.isnan(self.average_drain_bias_fwd): comments += f"# Avg_Drain_Bias_Fwd (V): {self.average_drain_bias_fwd:.3f}\n"
         return comments
 
     def _prepare_plot_data_package(self, config):
         return {
-            "forward_data": self.forward_data,
-            "backward_data": self.backward_data,
-            "enable_backward_plot": config['enable_backward'] and self.backward_data.get('Vg_actual_for_data', np.array([])).size > 0,
-            "gm_fwd_calc": self.processed_data.get('gm', np.array([])), 
+            "sweep_legs": self.sweep_legs,
+            "enable_backward_plot": config['enable_backward'] and self.sweep_legs.has_backward,
+            "gm_fwd_calc": self.sweep_legs.forward.get('gm', np.array([])),
             "Vth_fwd_calc": self.Vth_fwd_calc,
+            "vth_method": self.vth_method,
+            "vth_fwd_by_method": self.vth_fwd_by_method,
             "min_ss_fwd_calc": self.min_ss_fwd_calc,
             "min_index_ss_fwd_calc": self.min_index_ss_fwd_calc,
+            "ss_by_leg": self.ss_by_leg,
+            "leg_params": self.leg_params,
+            "hysteresis": self.hysteresis,
+            "Vth_bwd_calc": self.leg_params.get('backward', {}).get('Vth', np.nan),
+            "Delta_Vth": self.hysteresis.get('Delta_Vth', np.nan),
+            "Hysteresis_Loop_Area": self.hysteresis.get('Loop_Area', np.nan),
+            "SS_avg_fwd": self.ss_by_leg.get('forward', {}).get('SS_avg', np.nan),
+            "SS_decades_fwd": self.ss_by_leg.get('forward', {}).get('SS_decades', np.nan),
             "avg_sweep_rate_fwd": self.avg_sweep_rate_fwd,
             "average_drain_bias_fwd": self.average_drain_bias_fwd,
             "jd_unit_plot": self.jd_unit_plot,
@@ -284,8 +473,9 @@ def generate_gate_transfer_plot(plot_data_package):
 
 def _plot_gate_transfer_figure_content(fig, plot_data_package):
     live_plot_type = plot_data_package.get('live_plot_type', 'default_live')
-    forward_data = plot_data_package.get('forward_data', {})
-    backward_data = plot_data_package.get('backward_data', {})
+    sweep_legs = plot_data_package.get('sweep_legs')
+    forward_data = sweep_legs.forward if sweep_legs is not None else {}
+    backward_data = sweep_legs.backward if sweep_legs is not None else {}
     enable_backward_plot = plot_data_package.get('enable_backward_plot', False)
     gm_fwd_for_plot = plot_data_package.get('gm_fwd_calc', np.array([]))
     fwd_vg_len = len(forward_data.get('Vg_actual_for_data', []))
@@ -375,8 +565,9 @@ def _plot_gate_transfer_figure_content(fig, plot_data_package):
 def _plot_gt_default_live(fig, plot_data_package):
     # This is the 4-subplot function. Ensure its full definition is present.
     # (Content from previous complete gate_transfer_module.py)
-    forward_data = plot_data_package.get('forward_data', {})
-    backward_data = plot_data_package.get('backward_data', {})
+    sweep_legs = plot_data_package.get('sweep_legs')
+    forward_data = sweep_legs.forward if sweep_legs is not None else {}
+    backward_data = sweep_legs.backward if sweep_legs is not None else {}
     enable_backward_plot = plot_data_package.get('enable_backward_plot', False)
     gm_fwd_for_plot = plot_data_package.get('gm_fwd_calc', np.array([]))
     fwd_vg_len = len(forward_data.get('Vg_actual_for_data', []))
@@ -15,11 +15,15 @@ import subprocess # For opening file location
 import instrument_utils
 import gui_utils
 import plotting_utils # For displaying errors on plot
+import parameter_extraction
 # Import measurement classes if needed for recalculating parameters
-from gate_transfer_module import GateTransferMeasurement
+from gate_transfer_module import GateTransferMeasurement, BWD_PARAM_LABELS, HYSTERESIS_LABELS, hysteresis_params
+from output_module import OutputMeasurement, CURVE_PARAM_LABELS
+from breakdown_module import BV_PARAM_LABELS, leakage_basis, leakage_path
+from diode_module import DIODE_PARAM_LABELS, turn_on_current
+import stress_series
+from measurement_record import MeasurementRecord, SweepLegs, SWEEP_LEG_ROWS_METADATA_KEY, SWEEP_LEG_POINTS_METADATA_KEY
 # from output_module import OutputMeasurement # Example, uncomment if needed
-# from breakdown_module import BreakdownMeasurement # Example, uncomment if needed
-# from diode_module import DiodeMeasurement # Example, uncomment if needed
 import config_settings # For default NPLC, etc., if needed for recalculation config
 
 # A more extensive default color cycle for history plots
@@ -115,8 +119,12 @@ class HistoryTabHandler:
         
         button_frame_row2 = ttk.Frame(controls_area_frame)
         button_frame_row2.pack(fill=tk.X, expand=False, pady=(2,0))
-        button_frame_row2.columnconfigure(0, weight=1)
+        button_frame_row2.columnconfigure(0, weight=1); button_frame_row2.columnconfigure(1, weight=1)
         ttk.Button(button_frame_row2, text="提取选中栅转移参数 (Extract GT Params)", command=self._batch_extract_gt_params).grid(row=0, column=0, sticky="ew", padx=2, pady=2)
+        ttk.Button(button_frame_row2, text="提取选中输出特性参数 (Extract OC Params)", command=self._batch_extract_oc_params).grid(row=0, column=1, sticky="ew", padx=2, pady=2)
+        ttk.Button(button_frame_row2, text="提取选中击穿参数 (Extract BD Params)", command=self._batch_extract_bd_params).grid(row=1, column=0, sticky="ew", padx=2, pady=2)
+        ttk.Button(button_frame_row2, text="提取选中二极管参数 (Extract Diode Params)", command=self._batch_extract_diode_params).grid(row=1, column=1, sticky="ew", padx=2, pady=2)
+        ttk.Button(button_frame_row2, text="应力/恢复序列分析 (Stress→GT Series)", command=self._analyze_stress_series).grid(row=2, column=0, columnspan=2, sticky="ew", padx=2, pady=2)
 
         right_history_pane_container = ttk.Frame(history_main_h_pane, padding=(5,0,0,0))
         history_main_h_pane.add(right_history_pane_container, weight=3) 
@@ -324,17 +332,11 @@ class HistoryTabHandler:
                     print(f"Warning: Could not convert column '{col_original_case}' to float in {filename}. Using NaN for non-numeric values.", file=sys.stderr)
                     processed_data_std_keys[std_key] = pd.to_numeric(df[col_original_case], errors='coerce').values
 
-            essential_plot_keys = [
-                'Vg_actual_for_data', 'Vd_read', 'Id', 'Ig', 'Is', 'gm', 'SS',
-                'anode_voltage_read', 'anode_voltage_set', 'anode_current', 'cathode_current',
-                'Jd', 'Jg', 'Js', 'Time'
-            ]
-            for k in essential_plot_keys:
-                if k not in processed_data_std_keys:
-                    processed_data_std_keys[k] = np.array([])
-
+            # Missing columns stay missing (.get returns None), so no empty series reach the overlay
+            processed_record = MeasurementRecord.from_columns(processed_data_std_keys)
             return {
-                "processed_data": processed_data_std_keys, "csv_file_path": csv_path,
+                "processed_data": processed_record, "csv_file_path": csv_path,
+                "sweep_legs": SweepLegs.from_metadata(processed_record, metadata.get(SWEEP_LEG_ROWS_METADATA_KEY)),
                 "png_file_path": os.path.splitext(csv_path)[0] + instrument_utils.get_plot_suffix_for_measurement(instrument_utils.get_short_measurement_type(filename)),
                 "measurement_type_name": measurement_type, "status": "success_data_ready",
                 "metadata_from_csv": metadata, "filename_short": filename
@@ -479,7 +481,7 @@ class HistoryTabHandler:
                     'color': current_plot_color, 'linestyle': base_style['linestyle'], 
                     'marker': base_style['marker'], 'ms': base_style['ms'],               
                     'var': var, 'filename': filename, 'current_key': key_label, 
-                    'measurement_type': measurement_type, 
+                    'measurement_type': measurement_type, 'sweep_legs': data_package['sweep_legs'],
                     'is_secondary_y': key_label == 'gm' and measurement_type == "Gate Transfer", 
                     'series_index': series_idx, 'is_current_density': False, 'vg_value': None
                 })
@@ -591,13 +593,23 @@ class HistoryTabHandler:
             valid_indices = ~(np.isnan(x_data) | np.isnan(y_data_to_plot))
             if current_series_use_log_y: valid_indices &= (y_data_to_plot > 1e-14)
             
-            if np.any(valid_indices):
-                sorted_indices = np.argsort(x_data[valid_indices])
-                line, = current_ax_for_item.plot(x_data[valid_indices][sorted_indices], y_data_to_plot[valid_indices][sorted_indices], 
-                                        label=series_item['label'], color=series_item['color'], 
-                                        linestyle=series_item['linestyle'], marker=series_item['marker'], ms=series_item['ms'])
-                if is_secondary: lines_for_legend_secondary.append(line); labels_for_legend_secondary.append(series_item['label'])
-                else: lines_for_legend_primary.append(line); labels_for_legend_primary.append(series_item['label'])
+            # Each sweep leg is drawn on its own (sorted within the leg), so forward and backward are not joined
+            sweep_legs = series_item.get('sweep_legs')
+            segments = [(leg.start, leg.stop) for leg in sweep_legs.legs] if sweep_legs is not None else [(0, x_data.size)]
+            first_line = None
+            for seg_start, seg_stop in segments:
+                seg_valid = valid_indices[seg_start:seg_stop]
+                if not np.any(seg_valid): continue
+                x_seg, y_seg = x_data[seg_start:seg_stop][seg_valid], y_data_to_plot[seg_start:seg_stop][seg_valid]
+                sorted_indices = np.argsort(x_seg)
+                line, = current_ax_for_item.plot(x_seg[sorted_indices], y_seg[sorted_indices], 
+                                        label=series_item['label'] if first_line is None else '_nolegend_', color=series_item['color'], 
+                                        linestyle=series_item['linestyle'], marker=series_item['marker'], ms=series_item['ms'],
+                                        alpha=1.0 if first_line is None else 0.6)
+                if first_line is None: first_line = line
+            if first_line is not None:
+                if is_secondary: lines_for_legend_secondary.append(first_line); labels_for_legend_secondary.append(series_item['label'])
+                else: lines_for_legend_primary.append(first_line); labels_for_legend_primary.append(series_item['label'])
                 plotted_anything_on_overlay = True
         
         ax.set_xlabel(x_label_overlay)
@@ -685,6 +697,17 @@ class HistoryTabHandler:
             messagebox.showinfo("提示", "选中的文件中没有栅转移测试文件。")
             gui_utils.set_status(self.app, "参数提取：未找到栅转移文件。")
             return
+        # Extraction follows the current GT tab settings, so a corpus can be re-extracted with another method
+        try:
+            vth_method, vth_smooth_window, vth_cc_current, ss_window = stress_series.extraction_settings({
+                'vth_method': self.app.gt_vth_method.get(),
+                'vth_smooth_window': self.app.gt_params_vars['vth_smooth_window']['var'].get(),
+                'vth_cc_current': self.app.gt_params_vars['vth_cc_current']['var'].get(),
+                'ss_window': self.app.gt_params_vars['ss_window']['var'].get(),
+            })
+        except ValueError as e:
+            messagebox.showerror("参数错误", f"栅转移参数提取设置无效: {e}")
+            return
 
         output_summary_path = filedialog.asksaveasfilename(
             defaultextension=".csv",
@@ -698,66 +721,96 @@ class HistoryTabHandler:
             return
 
         extracted_params_list = []
+        files = [] # (summary row, SweepLegs) of every file that loaded
         current_output_dir = self.app.output_dir.get()
-        gui_utils.set_status(self.app, f"正在从 {len(gate_transfer_files)} 个栅转移文件中提取参数...")
-        self.app.root.update_idletasks()
-
         try:
             for i, filename in enumerate(gate_transfer_files):
-                gui_utils.set_status(self.app, f"正在处理文件 {i+1}/{len(gate_transfer_files)}: {filename}...")
+                gui_utils.set_status(self.app, f"正在读取文件 {i+1}/{len(gate_transfer_files)}: {filename}...")
                 self.app.root.update_idletasks()
-                csv_path = os.path.join(current_output_dir, filename)
-                
-                data_package = self._prepare_data_package_for_file(csv_path, filename)
+                data_package = self._prepare_data_package_for_file(os.path.join(current_output_dir, filename), filename)
                 if not data_package or data_package['status'] != "success_data_ready":
                     print(f"  Skipping {filename} due to data loading error for param extraction.", file=sys.stderr)
                     extracted_params_list.append({'FileName': filename, 'Error': 'DataLoadFail'})
                     continue
-                
-                meta = data_package['metadata_from_csv']
-                temp_config_for_recalc = {
-                    'output_dir': self.app.output_dir.get(), 
-                    'file_name': os.path.splitext(filename)[0],
-                    'device_type': meta.get('Device Type', self.app.device_type.get()),
-                    'channel_width': float(meta.get('Channel Width (um)', self.app.channel_width.get() or 0)),
-                    'area': float(meta.get('Area (um^2)', self.app.area.get() or 0)),
-                    'Vg_start': float(meta.get('Vg_start (set)', config_settings.GT_DEFAULT_VG_START)),
-                    'Vg_stop': float(meta.get('Vg_stop (set)', config_settings.GT_DEFAULT_VG_STOP)),
-                    'step': float(meta.get('Vg_step (set)', config_settings.GT_DEFAULT_VG_STEP)),
-                    'enable_backward': meta.get('Enable Backward', 'True').lower() == 'true',
-                    'Vd': float(meta.get('Vd_bias (set)', config_settings.GT_DEFAULT_VD)),
-                    'IlimitDrain': meta.get('IlimitDrain', config_settings.GT_DEFAULT_ILIMIT_DRAIN),
-                    'IlimitGate': meta.get('IlimitGate', config_settings.GT_DEFAULT_ILIMIT_GATE),
-                    'Drain_nplc': meta.get('Drain_nplc', config_settings.GT_DEFAULT_DRAIN_NPLC),
-                    'Gate_nplc': meta.get('Gate_nplc', config_settings.GT_DEFAULT_GATE_NPLC),
-                }
-                
-                try:
-                    gt_recalc_instance = GateTransferMeasurement()
-                    gt_recalc_instance.processed_data = data_package['processed_data'] 
-                    gt_recalc_instance.consistent_len = len(data_package['processed_data'].get('Id', []))
-                    
-                    gt_recalc_instance._prepare_tsp_parameters(temp_config_for_recalc) 
-                    gt_recalc_instance._perform_specific_data_processing(temp_config_for_recalc)
-
-                    params_row = {
-                        'FileName': filename,
-                        'Vth_fwd (V)': f"{gt_recalc_instance.Vth_fwd_calc:.4f}" if not np.isnan(gt_recalc_instance.Vth_fwd_calc) else 'N/A',
-                        'SS_min_fwd (mV/dec)': f"{gt_recalc_instance.min_ss_fwd_calc:.2f}" if not np.isnan(gt_recalc_instance.min_ss_fwd_calc) else 'N/A',
-                        'Max_gm_fwd (S)': f"{gt_recalc_instance.max_gm_fwd_calc:.4e}" if not np.isnan(gt_recalc_instance.max_gm_fwd_calc) else 'N/A',
-                        'Vg_at_Max_gm_fwd (V)': f"{gt_recalc_instance.vg_at_max_gm_fwd_calc:.4f}" if not np.isnan(gt_recalc_instance.vg_at_max_gm_fwd_calc) else 'N/A',
-                        'Ion_fwd (A)': f"{gt_recalc_instance.ion_fwd_calc:.4e}" if not np.isnan(gt_recalc_instance.ion_fwd_calc) else 'N/A',
-                        'Ioff_fwd (A)': f"{gt_recalc_instance.ioff_fwd_calc:.4e}" if not np.isnan(gt_recalc_instance.ioff_fwd_calc) else 'N/A',
-                        'Ion_Ioff_Ratio_fwd': f"{gt_recalc_instance.ion_ioff_ratio_fwd_calc:.4e}" if not np.isnan(gt_recalc_instance.ion_ioff_ratio_fwd_calc) else 'N/A',
-                    }
-                    extracted_params_list.append(params_row)
-
-                except Exception as e_recalc:
-                    print(f"Error recalculating parameters for {filename}: {e_recalc}\n{traceback.format_exc()}", file=sys.stderr)
-                    extracted_params_list.append({
-                        'FileName': filename, 'Error': f'RecalcFail: {e_recalc}'
-                    })
+                meta, record = data_package['metadata_from_csv'], data_package['processed_data']
+                if 'Vg_actual_for_data' not in record or 'Id' not in record:
+                    extracted_params_list.append({'FileName': filename, 'Error': 'MissingColumns'})
                     continue
+                # Legs at the rows the run recorded (a compliance-shortened leg is not the planned length)
+                sweep_legs = data_package['sweep_legs']
+                if SWEEP_LEG_ROWS_METADATA_KEY not in meta:
+                    vg_start = float(meta.get('Vg_start (set)', config_settings.GT_DEFAULT_VG_START))
+                    vg_stop = float(meta.get('Vg_stop (set)', config_settings.GT_DEFAULT_VG_STOP))
+                    vg_step = float(meta.get('Vg_step (set)', config_settings.GT_DEFAULT_VG_STEP))
+                    planned_points = int(round(abs(vg_stop - vg_start) / abs(vg_step))) + 1 if vg_step != 0 else 1
+                    sweep_legs = SweepLegs.split(record, meta.get('Enable Backward', 'True').strip().lower() in ('true', '1'),
+                                                 planned_points, direction=1 if vg_stop >= vg_start else -1)
+                params_row = {'FileName': filename}
+                extracted_params_list.append(params_row)
+                files.append((params_row, sweep_legs))
+
+            # One stacked extract_vth / extract_ss call covers every forward and backward leg of the selection
+            legs = [(file_row, leg.name, sweep_legs.view(leg)) for file_row, (_, sweep_legs) in enumerate(files)
+                    for leg in sweep_legs.legs if leg.stop > leg.start]
+            leg_params = [{} for _ in files] # Per file: leg name -> Vth, Vth_by_method, gm_max, Vg_at_gm_max, Ion, Ioff, Ion_Ioff_Ratio
+            ss_by_leg = [{} for _ in files]  # Per file: leg name -> SS_min, SS_avg, SS_decades
+            if legs:
+                gui_utils.set_status(self.app, f"正在提取 {len(legs)} 条栅转移扫描段的参数...")
+                self.app.root.update_idletasks()
+                vg_rows, id_rows, lengths = parameter_extraction.stack_sweeps(
+                    (view['Vg_actual_for_data'], view['Id']) for _, _, view in legs)
+                fit_rows = np.flatnonzero(lengths > 1)
+                vth_results = parameter_extraction.extract_vth(vg_rows[fit_rows], id_rows[fit_rows], smooth_window=vth_smooth_window,
+                                                               cc_current=vth_cc_current, lengths=lengths[fit_rows])
+                ss_results = parameter_extraction.extract_ss(vg_rows, id_rows, window=ss_window, lengths=lengths)
+                for row, (file_row, leg_name, _) in enumerate(legs):
+                    params = {'Vth': np.nan, 'Vth_by_method': {}, 'gm_max': np.nan, 'Vg_at_gm_max': np.nan}
+                    if lengths[row] > 1:
+                        fit = np.searchsorted(fit_rows, row)
+                        params['Vth_by_method'] = {method: vth_results[f'Vth_{method}'][fit] for method in parameter_extraction.VTH_METHODS}
+                        params['Vth'] = params['Vth_by_method'][vth_method]
+                        params['gm_max'] = vth_results['gm_max'][fit]
+                        params['Vg_at_gm_max'] = vth_results['Vg_at_gm_max'][fit]
+                    params.update(GateTransferMeasurement._on_off_currents(vg_rows[row, :lengths[row]], id_rows[row, :lengths[row]], params['Vth']))
+                    leg_params[file_row][leg_name] = params
+                    ss_by_leg[file_row][leg_name] = {key: ss_results[key][row] for key in ('SS_min', 'SS_avg', 'SS_decades')}
+
+            # Hysteresis of every file with a backward leg, again in one call
+            looped = [file_row for file_row, (_, sweep_legs) in enumerate(files) if sweep_legs.has_backward]
+            hysteresis = [{} for _ in files]
+            if looped:
+                fwd_vg, fwd_id, fwd_lengths = parameter_extraction.stack_sweeps(
+                    (files[file_row][1].forward['Vg_actual_for_data'], files[file_row][1].forward['Id']) for file_row in looped)
+                bwd_vg, bwd_id, bwd_lengths = parameter_extraction.stack_sweeps(
+                    (files[file_row][1].backward['Vg_actual_for_data'], files[file_row][1].backward['Id']) for file_row in looped)
+                loops = parameter_extraction.extract_hysteresis(fwd_vg, fwd_id, bwd_vg, bwd_id, fwd_lengths, bwd_lengths)
+                for row, file_row in enumerate(looped):
+                    hysteresis[file_row] = hysteresis_params({key: value[row] for key, value in loops.items()},
+                                                             leg_params[file_row].get('forward', {}), leg_params[file_row].get('backward', {}))
+
+            for file_row, (params_row, _) in enumerate(files):
+                fwd_params = leg_params[file_row].get('forward', {})
+                fwd_columns = (('Vth', 'Vth_fwd (V)', '.4f'), ('SS_min', 'SS_min_fwd (mV/dec)', '.2f'), ('gm_max', 'Max_gm_fwd (S)', '.4e'),
+                               ('Vg_at_gm_max', 'Vg_at_Max_gm_fwd (V)', '.4f'), ('Ion', 'Ion_fwd (A)', '.4e'),
+                               ('Ioff', 'Ioff_fwd (A)', '.4e'), ('Ion_Ioff_Ratio', 'Ion_Ioff_Ratio_fwd', '.4e'))
+                for key, label, fmt in fwd_columns:
+                    value = (ss_by_leg[file_row].get('forward', {}) if key == 'SS_min' else fwd_params).get(key, np.nan)
+                    params_row[label] = f"{value:{fmt}}" if not np.isnan(value) else 'N/A'
+                for method in parameter_extraction.VTH_METHODS:
+                    vth_value = fwd_params.get('Vth_by_method', {}).get(method, np.nan)
+                    params_row[f'Vth_fwd_{method} (V)'] = f"{vth_value:.4f}" if not np.isnan(vth_value) else 'N/A'
+                for leg_name, suffix in (('forward', 'fwd'), ('backward', 'bwd')):
+                    leg_ss = ss_by_leg[file_row].get(leg_name, {})
+                    for key, unit in (('SS_min', ' (mV/dec)'), ('SS_avg', ' (mV/dec)'), ('SS_decades', '')):
+                        if leg_name == 'forward' and key == 'SS_min':
+                            continue # Already in the summary as SS_min_fwd
+                        value = leg_ss.get(key, np.nan)
+                        params_row[f'{key}_{suffix}{unit}'] = f"{value:.2f}" if not np.isnan(value) else 'N/A'
+                bwd_params = leg_params[file_row].get('backward', {})
+                for source, labels in ((bwd_params, BWD_PARAM_LABELS), (hysteresis[file_row], HYSTERESIS_LABELS)):
+                    for key, label, fmt in labels:
+                        value = source.get(key, np.nan)
+                        params_row[label] = f"{value:{fmt}}" if not np.isnan(value) else 'N/A'
 
             if not extracted_params_list:
                 messagebox.showinfo("无参数", "未能从选中的文件中提取任何参数。")
@@ -777,6 +830,304 @@ class HistoryTabHandler:
             print(f"批量提取参数时发生错误: {e_extract_batch}\n{traceback.format_exc()}", file=sys.stderr)
             gui_utils.set_status(self.app, "批量提取参数时出错。", error=True)
 
+    def _batch_extract_oc_params(self):
+        selected_indices = self.history_listbox.curselection()
+        output_files = [self.history_listbox.get(i) for i in selected_indices if "Output" in self.history_listbox.get(i)]
+        if not output_files:
+            messagebox.showinfo("提示", "请先选择要提取参数的输出特性文件。")
+            gui_utils.set_status(self.app, "参数提取：未找到输出特性文件。")
+            return
+
+        output_summary_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("Text files", "*.txt")],
+            title="保存提取的输出特性参数汇总",
+            initialdir=self.app.output_dir.get(),
+            parent=self.app.root
+        )
+        if not output_summary_path:
+            gui_utils.set_status(self.app, "参数提取操作已取消。")
+            return
+
+        extracted_params_list = [] # One row per Vg curve
+        current_output_dir = self.app.output_dir.get()
+        try:
+            for i, filename in enumerate(output_files):
+                gui_utils.set_status(self.app, f"正在处理文件 {i+1}/{len(output_files)}: {filename}...")
+                self.app.root.update_idletasks()
+                data_package = self._prepare_data_package_for_file(os.path.join(current_output_dir, filename), filename)
+                if not data_package or data_package['status'] != "success_data_ready":
+                    print(f"  Skipping {filename} due to data loading error for param extraction.", file=sys.stderr)
+                    extracted_params_list.append({'FileName': filename, 'Error': 'DataLoadFail'})
+                    continue
+
+                meta = data_package['metadata_from_csv']
+                temp_config_for_recalc = {
+                    'Vg_start': float(meta.get('Vg_start (set)', config_settings.OC_DEFAULT_VG_START)),
+                    'Vg_stop': float(meta.get('Vg_stop (set)', config_settings.OC_DEFAULT_VG_STOP)),
+                    'Vg_step': int(meta.get('Vg_segments (set)', config_settings.OC_DEFAULT_VG_STEP)),
+                    'Vd_start': float(meta.get('Vd_start (set)', config_settings.OC_DEFAULT_VD_START)),
+                    'Vd_stop': float(meta.get('Vd_stop (set)', config_settings.OC_DEFAULT_VD_STOP)),
+                    'Vd_step': float(meta.get('Vd_step (set)', config_settings.OC_DEFAULT_VD_STEP)),
+                    'IlimitDrain': meta.get('IlimitDrain', config_settings.OC_DEFAULT_ILIMIT_DRAIN),
+                    'IlimitGate': meta.get('IlimitGate', config_settings.OC_DEFAULT_ILIMIT_GATE),
+                    'Drain_nplc': meta.get('Drain_nplc', config_settings.OC_DEFAULT_DRAIN_NPLC),
+                    'Gate_nplc': meta.get('Gate_nplc', config_settings.OC_DEFAULT_GATE_NPLC),
+                }
+                try:
+                    oc_recalc_instance = OutputMeasurement()
+                    oc_recalc_instance.processed_data = data_package['processed_data']
+                    oc_recalc_instance.consistent_len = oc_recalc_instance.processed_data.n_points
+                    # Split into curves at the measured per-Vg lengths when the run recorded them
+                    if SWEEP_LEG_POINTS_METADATA_KEY in meta:
+                        csv_curve_points = [int(n) for n in meta[SWEEP_LEG_POINTS_METADATA_KEY].split(',') if n.strip()]
+                        oc_recalc_instance.sweep_status = {'leg_points': np.array(csv_curve_points, dtype=int)}
+                    oc_recalc_instance._prepare_tsp_parameters(temp_config_for_recalc)
+                    oc_recalc_instance._perform_specific_data_processing(temp_config_for_recalc)
+                    curve_params = oc_recalc_instance.curve_params
+                    if not curve_params:
+                        extracted_params_list.append({'FileName': filename, 'Error': 'NoCurves'})
+                        continue
+                    for curve, vg_value in enumerate(curve_params['Vg']):
+                        params_row = {'FileName': filename, 'Vg (V)': f"{vg_value:.3f}"}
+                        for key, label, fmt in CURVE_PARAM_LABELS:
+                            value = curve_params[key][curve]
+                            params_row[label] = f"{value:{fmt}}" if not np.isnan(value) else 'N/A'
+                        extracted_params_list.append(params_row)
+                except Exception as e_recalc:
+                    print(f"Error recalculating parameters for {filename}: {e_recalc}\n{traceback.format_exc()}", file=sys.stderr)
+                    extracted_params_list.append({'FileName': filename, 'Error': f'RecalcFail: {e_recalc}'})
+
+            summary_df = pd.DataFrame(extracted_params_list)
+            if output_summary_path.endswith(".csv"):
+                summary_df.to_csv(output_summary_path, index=False, encoding='utf-8')
+            else:
+                summary_df.to_string(output_summary_path, index=False)
+            messagebox.showinfo("成功", f"选中的 {len(output_files)} 个输出特性文件的参数已成功提取到\n{os.path.basename(output_summary_path)}")
+            gui_utils.set_status(self.app, f"输出特性参数已成功提取到 {os.path.basename(output_summary_path)}")
+
+        except Exception as e_extract_batch:
+            messagebox.showerror("参数提取错误", f"批量提取参数时发生错误: {e_extract_batch}")
+            print(f"批量提取参数时发生错误: {e_extract_batch}\n{traceback.format_exc()}", file=sys.stderr)
+            gui_utils.set_status(self.app, "批量提取参数时出错。", error=True)
+
+    def _batch_extract_bd_params(self):
+        selected_indices = self.history_listbox.curselection()
+        breakdown_files = [self.history_listbox.get(i) for i in selected_indices if "Breakdown" in self.history_listbox.get(i)]
+        if not breakdown_files:
+            messagebox.showinfo("提示", "请先选择要提取参数的击穿文件。")
+            gui_utils.set_status(self.app, "参数提取：未找到击穿文件。")
+            return
+        # Extraction follows the current BD tab criterion, so a wafer can be re-mapped at another leakage level
+        try:
+            bv_criterion = float(self.app.bd_params_vars['bv_criterion']['var'].get())
+        except ValueError:
+            bv_criterion = np.nan
+        if not bv_criterion > 0:
+            messagebox.showerror("参数错误", "BV 判据必须为正数。")
+            return
+
+        output_summary_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("Text files", "*.txt")],
+            title="保存提取的击穿参数汇总",
+            initialdir=self.app.output_dir.get(),
+            parent=self.app.root
+        )
+        if not output_summary_path:
+            gui_utils.set_status(self.app, "参数提取操作已取消。")
+            return
+
+        extracted_params_list = []
+        sweeps = [] # (summary row, [Vd, main, gate, source], criterion) of every file that loaded
+        current_output_dir = self.app.output_dir.get()
+        try:
+            for i, filename in enumerate(breakdown_files):
+                gui_utils.set_status(self.app, f"正在读取文件 {i+1}/{len(breakdown_files)}: {filename}...")
+                self.app.root.update_idletasks()
+                data_package = self._prepare_data_package_for_file(os.path.join(current_output_dir, filename), filename)
+                if not data_package or data_package['status'] != "success_data_ready":
+                    print(f"  Skipping {filename} due to data loading error for param extraction.", file=sys.stderr)
+                    extracted_params_list.append({'FileName': filename, 'Error': 'DataLoadFail'})
+                    continue
+                meta = data_package['metadata_from_csv']
+                keys, criterion, unit = leakage_basis(meta.get('Device Type', self.app.device_type.get()),
+                                                      meta.get('Channel Width (um)', 0), meta.get('Area (um^2)', 0), bv_criterion)
+                columns = [data_package['processed_data'].get(key) for key in ('Vd_read',) + keys]
+                if any(column is None for column in columns):
+                    extracted_params_list.append({'FileName': filename, 'Error': 'MissingColumns'})
+                    continue
+                params_row = {'FileName': filename, 'Device Type': meta.get('Device Type', 'N/A'), 'BV Criterion': f"{criterion:g} {unit}"}
+                extracted_params_list.append(params_row)
+                sweeps.append((params_row, columns, criterion))
+
+            if sweeps:
+                # One stacked extract_breakdown call over the selection: NaN-padded rows, Vd and the currents kept aligned
+                gui_utils.set_status(self.app, f"正在提取 {len(sweeps)} 条击穿曲线的 BV...")
+                self.app.root.update_idletasks()
+                lengths = np.array([columns[0].size for _, columns, _ in sweeps])
+                stacked = np.full((4, len(sweeps), int(lengths.max())), np.nan)
+                for row, (_, columns, _) in enumerate(sweeps):
+                    for k, column in enumerate(columns):
+                        stacked[k, row, :column.size] = column
+                results = parameter_extraction.extract_breakdown(*stacked, lengths=lengths,
+                                                                 criterion=np.array([criterion for _, _, criterion in sweeps]))
+                for row, (params_row, _, _) in enumerate(sweeps):
+                    for key, label, fmt in BV_PARAM_LABELS:
+                        value = results[key][row]
+                        params_row[label] = f"{value:{fmt}}" if not np.isnan(value) else 'N/A'
+                    params_row['Leakage Path'] = leakage_path(results['gate_fraction'][row])
+
+            summary_df = pd.DataFrame(extracted_params_list)
+            if output_summary_path.endswith(".csv"):
+                summary_df.to_csv(output_summary_path, index=False, encoding='utf-8')
+            else:
+                summary_df.to_string(output_summary_path, index=False)
+            messagebox.showinfo("成功", f"选中的 {len(breakdown_files)} 个击穿文件的参数已成功提取到\n{os.path.basename(output_summary_path)}")
+            gui_utils.set_status(self.app, f"击穿参数已成功提取到 {os.path.basename(output_summary_path)}")
+
+        except Exception as e_extract_batch:
+            messagebox.showerror("参数提取错误", f"批量提取参数时发生错误: {e_extract_batch}")
+            print(f"批量提取参数时发生错误: {e_extract_batch}\n{traceback.format_exc()}", file=sys.stderr)
+            gui_utils.set_status(self.app, "批量提取参数时出错。", error=True)
+
+    def _batch_extract_diode_params(self):
+        selected_indices = self.history_listbox.curselection()
+        diode_files = [self.history_listbox.get(i) for i in selected_indices if "Diode" in self.history_listbox.get(i)]
+        if not diode_files:
+            messagebox.showinfo("提示", "请先选择要提取参数的二极管文件。")
+            gui_utils.set_status(self.app, "参数提取：未找到二极管文件。")
+            return
+        # Turn-on criterion and reverse voltage follow the current Diode tab settings
+        try:
+            turn_on_j = float(self.app.diode_params_vars['turn_on_j']['var'].get())
+            reverse_v = float(self.app.diode_params_vars['reverse_v']['var'].get())
+        except ValueError:
+            turn_on_j = reverse_v = np.nan
+        if not turn_on_j > 0 or np.isnan(reverse_v):
+            messagebox.showerror("参数错误", "开启判据必须为正数，反向漏电读取电压必须为数字。")
+            return
+
+        output_summary_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("Text files", "*.txt")],
+            title="保存提取的二极管参数汇总",
+            initialdir=self.app.output_dir.get(),
+            parent=self.app.root
+        )
+        if not output_summary_path:
+            gui_utils.set_status(self.app, "参数提取操作已取消。")
+            return
+
+        extracted_params_list = []
+        sweeps = [] # (summary row, forward-leg voltage, current, on-current, compliance) of every file that loaded
+        current_output_dir = self.app.output_dir.get()
+        try:
+            for i, filename in enumerate(diode_files):
+                gui_utils.set_status(self.app, f"正在读取文件 {i+1}/{len(diode_files)}: {filename}...")
+                self.app.root.update_idletasks()
+                data_package = self._prepare_data_package_for_file(os.path.join(current_output_dir, filename), filename)
+                if not data_package or data_package['status'] != "success_data_ready":
+                    print(f"  Skipping {filename} due to data loading error for param extraction.", file=sys.stderr)
+                    extracted_params_list.append({'FileName': filename, 'Error': 'DataLoadFail'})
+                    continue
+                meta = data_package['metadata_from_csv']
+                fwd_leg = data_package['sweep_legs'].forward
+                voltage = fwd_leg.get('anode_voltage_read')
+                if voltage is None or np.all(np.isnan(voltage)):
+                    voltage = fwd_leg.get('anode_voltage_set')
+                current = fwd_leg.get('anode_current')
+                if voltage is None or current is None:
+                    extracted_params_list.append({'FileName': filename, 'Error': 'MissingColumns'})
+                    continue
+                on_current, criterion_label = turn_on_current(
+                    {'device_type': meta.get('Device Type', self.app.device_type.get()),
+                     'channel_width': meta.get('Channel Width (um)', 0), 'area': meta.get('Area (um^2)', 0)}, turn_on_j)
+                try:
+                    compliance = float(meta.get('IlimitAnode (A)', 'nan'))
+                except ValueError:
+                    compliance = np.nan
+                params_row = {'FileName': filename, 'Device Type': meta.get('Device Type', 'N/A'), 'Turn-on Criterion': criterion_label}
+                extracted_params_list.append(params_row)
+                sweeps.append((params_row, voltage, current, on_current, compliance if compliance > 0 else np.inf))
+
+            if sweeps:
+                # One stacked extract_diode call: every forward leg is fitted in the same batched iterations
+                gui_utils.set_status(self.app, f"正在拟合 {len(sweeps)} 条二极管曲线...")
+                self.app.root.update_idletasks()
+                v_rows, i_rows, lengths = parameter_extraction.stack_sweeps((voltage, current) for _, voltage, current, _, _ in sweeps)
+                results = parameter_extraction.extract_diode(v_rows, i_rows, lengths=lengths, reverse_v=reverse_v,
+                                                             on_current=np.array([sweep[3] for sweep in sweeps]),
+                                                             compliance=np.array([sweep[4] for sweep in sweeps]))
+                for row, (params_row, _, _, _, _) in enumerate(sweeps):
+                    for key, label, fmt in DIODE_PARAM_LABELS:
+                        value = results[key][row]
+                        params_row[label] = f"{value:{fmt}}" if not np.isnan(value) else 'N/A'
+                    params_row['Reverse Leakage Voltage (V)'] = f"{reverse_v:g}"
+
+            summary_df = pd.DataFrame(extracted_params_list)
+            if output_summary_path.endswith(".csv"):
+                summary_df.to_csv(output_summary_path, index=False, encoding='utf-8')
+            else:
+                summary_df.to_string(output_summary_path, index=False)
+            messagebox.showinfo("成功", f"选中的 {len(diode_files)} 个二极管文件的参数已成功提取到\n{os.path.basename(output_summary_path)}")
+            gui_utils.set_status(self.app, f"二极管参数已成功提取到 {os.path.basename(output_summary_path)}")
+
+        except Exception as e_extract_batch:
+            messagebox.showerror("参数提取错误", f"批量提取参数时发生错误: {e_extract_batch}")
+            print(f"批量提取参数时发生错误: {e_extract_batch}\n{traceback.format_exc()}", file=sys.stderr)
+            gui_utils.set_status(self.app, "批量提取参数时出错。", error=True)
+
+    def _analyze_stress_series(self):
+        # Devices of the selected files, or every device in the folder; stress files are found by device ID
+        current_output_dir = self.app.output_dir.get()
+        if not os.path.isdir(current_output_dir):
+            messagebox.showerror("错误", "输出目录无效或未设置。")
+            return
+        selected = [stress_series.parse_series_filename(self.history_listbox.get(i)) for i in self.history_listbox.curselection()]
+        devices = sorted({parsed[0] for parsed in selected if parsed}) or None
+        # Vth / SS extraction follows the current GT tab settings, as for the GT batch extraction
+        extraction_config = {
+            'vth_method': self.app.gt_vth_method.get(),
+            'vth_smooth_window': self.app.gt_params_vars['vth_smooth_window']['var'].get(),
+            'vth_cc_current': self.app.gt_params_vars['vth_cc_current']['var'].get(),
+            'ss_window': self.app.gt_params_vars['ss_window']['var'].get(),
+        }
+        output_summary_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("Text files", "*.txt")],
+            title="保存应力/恢复序列",
+            initialdir=current_output_dir,
+            parent=self.app.root
+        )
+        if not output_summary_path:
+            gui_utils.set_status(self.app, "序列分析操作已取消。")
+            return
+
+        try:
+            scope = f"{len(devices)} 个器件" if devices else "全部器件"
+            gui_utils.set_status(self.app, f"正在分析应力/恢复序列 ({scope})...")
+            self.app.root.update_idletasks()
+            series = stress_series.analyze_directory(current_output_dir, devices=devices, config=extraction_config)
+            if series['filename'].size == 0:
+                messagebox.showinfo("无序列", "未找到所选器件的栅转移文件。")
+                gui_utils.set_status(self.app, "序列分析完成：无栅转移文件。"); return
+            summary_df = stress_series.series_dataframe(series)
+            if output_summary_path.endswith(".csv"):
+                summary_df.to_csv(output_summary_path, index=False, encoding='utf-8')
+            else:
+                summary_df.to_string(output_summary_path, index=False)
+            n_devices = np.unique(series['device']).size
+            messagebox.showinfo("成功", f"{n_devices} 个器件的 {series['filename'].size} 次栅转移已汇总到\n{os.path.basename(output_summary_path)}")
+            gui_utils.set_status(self.app, f"应力/恢复序列已保存到 {os.path.basename(output_summary_path)}")
+
+        except ValueError as e_settings:
+            messagebox.showerror("参数错误", f"栅转移提取设置无效: {e_settings}")
+        except Exception as e_series:
+            messagebox.showerror("序列分析错误", f"应力/恢复序列分析时发生错误: {e_series}")
+            print(f"应力/恢复序列分析时发生错误: {e_series}\n{traceback.format_exc()}", file=sys.stderr)
+            gui_utils.set_status(self.app, "应力/恢复序列分析时出错。", error=True)
+
     def _on_mouse_motion_history_plot(self, event):
         for manager in self.history_annotation_managers:
              manager.on_motion(event)
@@ -0,0 +1,963 @@
+# instrument_simulator.py
+"""
+Simulated Keithley 26xx TSP-Link system (2657A master + 2636B as node[2]) for offline work.
+
+The simulator is a drop-in for the pyvisa resource returned by instrument_utils.open_visa_resource:
+it accepts the same write/query traffic (loadscript ... endscript, script.run(), print(...),
+printbuffer(...)) and executes the real tsp_scripts/*.tsp files through tsp_interpreter.py.
+Measurements come from an analytic device model wired to the SMUs the scripts use:
+
+    MOSFET: Drain = smua, Gate = node[2].smua, Source = node[2].smub
+    DIODE : Anode = smua, Cathode = node[2].smua
+
+Time is virtual: delay() and each measurement (NPLC / line frequency) advance a simulated
+clock that feeds buffer timestamps and timer.measure.t(), so a 1 h stress script finishes
+in seconds unless `time_scale` asks for real sleeping. The SMU trigger model (listv sweeps,
+blenders, TSP-Link trigger lines) is emulated event by event, with each initiated SMU keeping its
+own time cursor so lockstep measurements on different SMUs overlap in time.
+
+Selected by GPIB address, e.g. "SIM::26XX::MOSFET" or "SIM::26XX::DIODE?noise_rel=0&seed=1".
+"""
+import bisect
+import math
+import sys
+import time
+from urllib.parse import parse_qsl
+
+import numpy as np
+import pyvisa
+
+import config_settings
+from tsp_interpreter import TspInterpreter, TspError, Multi, to_lua_string
+
+_THERMAL_VOLTAGE = 0.025852  # kT/q at 300 K
+
+# Named constants exposed on every SMU object (values only need to be self-consistent)
+_SMU_CONSTANTS = {
+    'OUTPUT_DCAMPS': 0, 'OUTPUT_DCVOLTS': 1,
+    'OUTPUT_OFF': 0, 'OUTPUT_ON': 1, 'OUTPUT_HIGH_Z': 2,
+    'AUTORANGE_OFF': 0, 'AUTORANGE_ON': 1, 'AUTORANGE_FOLLOW_LIMIT': 2,
+    'AUTOZERO_OFF': 0, 'AUTOZERO_ONCE': 1, 'AUTOZERO_AUTO': 2,
+    'FILL_ONCE': 0, 'FILL_WINDOW': 1,
+    'ENABLE': 1, 'DISABLE': 0,
+    'SENSE_LOCAL': 0, 'SENSE_REMOTE': 1,
+    'SOURCE_IDLE': 0, 'SOURCE_HOLD': 1,
+    'FILTER_OFF': 0, 'FILTER_ON': 1,
+    'FILTER_MOVING_AVG': 0, 'FILTER_REPEAT_AVG': 1, 'FILTER_MEDIAN': 2,
+}
+
+# Current measure ranges (A) and the reading a fixed range returns when it is exceeded
+_CURRENT_RANGES_A = (1e-9, 1e-8, 1e-7, 1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 1.5)
+_OVERFLOW_READING = 9.91e37
+
+# Event IDs published by each SMU's trigger model (allocated per SMU, globally unique in the sim)
+_SMU_TRIGGER_EVENTS = ('ARMED', 'SWEEPING', 'SOURCE_COMPLETE', 'MEASURE_COMPLETE', 'PULSE_COMPLETE', 'SWEEP_COMPLETE', 'IDLE')
+
+
+# --- Device models ---
+
+class SimulatedMosfet:
+    """
+    n-type FET: EKV-style channel current (smooth sub-/above-threshold, SS set by `ss_mv_dec`),
+    channel-length modulation, ohmic off-state leakage, gate tunnelling leakage and an
+    exponential avalanche term around `bv`. Threshold drift / mobility loss accumulate with
+    the time spent under bias above `stress_threshold_v` (power law), and persist between
+    scripts so a stress followed by a transfer sweep shows the shift. Channel self-heating
+    (first-order, `rth_k_per_w` / `tau_th_s`) lowers mobility, so long DC sweeps at high power
+    droop where short pulses do not.
+    """
+    terminals = {'drain': '1.smua', 'gate': '2.smua', 'source': '2.smub'}
+
+    def __init__(self, vth=0.5, ss_mv_dec=90.0, beta=0.02, lambda_=0.02, g_leak=1e-11,
+                 ig0=1e-11, ig_scale_v=10.0, bv=80.0, bv_slope=2.0, i_bd0=1e-6,
+                 drift_a=0.05, drift_n=0.25, drift_mu=0.01, stress_threshold_v=2.5,
+                 rth_k_per_w=60.0, tau_th_s=2e-3):
+        self.vth = vth
+        self.n_slope = ss_mv_dec / (1000.0 * _THERMAL_VOLTAGE * math.log(10))
+        self.beta = beta
+        self.lambda_ = lambda_
+        self.g_leak = g_leak
+        self.ig0 = ig0
+        self.ig_scale_v = ig_scale_v
+        self.bv = bv
+        self.bv_slope = bv_slope
+        self.i_bd0 = i_bd0
+        self.drift_a = drift_a
+        self.drift_n = drift_n
+        self.drift_mu = drift_mu
+        self.stress_threshold_v = stress_threshold_v
+        self.stress_time_s = 0.0
+        self.rth_k_per_w = rth_k_per_w
+        self.tau_th_s = tau_th_s
+        self.temp_rise_k = 0.0
+
+    @staticmethod
+    def _ekv_f(x):
+        # ln^2(1 + e^x) without overflow
+        soft = x if x > 40 else math.log1p(math.exp(x))
+        return soft * soft
+
+    def vth_shift(self):
+        if self.stress_time_s <= 0: return 0.0
+        return self.drift_a * self.stress_time_s ** self.drift_n
+
+    def age(self, dt, volts):
+        vd, vg, vs = volts.get('1.smua', 0.0), volts.get('2.smua', 0.0), volts.get('2.smub', 0.0)
+        if max(abs(vg - vs), abs(vd - vs)) >= self.stress_threshold_v:
+            self.stress_time_s += dt
+        if self.rth_k_per_w > 0:
+            power = abs(self.terminal_currents(volts)['1.smua'] * (vd - vs))
+            relax = 1.0 - math.exp(-dt / self.tau_th_s) if self.tau_th_s > 0 else 1.0
+            self.temp_rise_k += (self.rth_k_per_w * power - self.temp_rise_k) * relax
+
+    def terminal_currents(self, volts):
+        vd, vg, vs = volts.get('1.smua', 0.0), volts.get('2.smua', 0.0), volts.get('2.smub', 0.0)
+        phit2 = 2.0 * _THERMAL_VOLTAGE
+        vth_eff = self.vth + self.vth_shift()
+        mobility = 1.0 / (1.0 + self.drift_mu * (self.stress_time_s ** self.drift_n if self.stress_time_s > 0 else 0.0))
+        mobility *= (1.0 + self.temp_rise_k / 300.0) ** -1.5
+        vp = (vg - vth_eff) / self.n_slope
+        i_channel = (self.beta * mobility * self.n_slope * phit2 * _THERMAL_VOLTAGE
+                     * (self._ekv_f((vp - vs) / phit2) - self._ekv_f((vp - vd) / phit2)))
+        vds = vd - vs
+        i_channel *= 1.0 + self.lambda_ * abs(vds)
+        i_leak = self.g_leak * vds
+        bd_exp = min((abs(vds) - self.bv) / self.bv_slope, 60.0)
+        i_bd = math.copysign(self.i_bd0 * math.exp(bd_exp), vds) if vds != 0 else 0.0
+        i_gs = self.ig0 * math.sinh(max(min((vg - vs) / self.ig_scale_v, 60.0), -60.0))
+        i_gd = self.ig0 * math.sinh(max(min((vg - vd) / self.ig_scale_v, 60.0), -60.0))
+        i_drain = i_channel + i_leak + i_bd - i_gd
+        i_gate = i_gs + i_gd
+        return {'1.smua': i_drain, '2.smua': i_gate, '2.smub': -(i_drain + i_gate)}
+
+
+class SimulatedDiode:
+    """Shockley diode with series/shunt resistance and reverse avalanche, solved by Newton on the junction voltage."""
+    terminals = {'anode': '1.smua', 'cathode': '2.smua'}
+
+    def __init__(self, i_sat=1e-12, ideality=1.5, r_series=5.0, r_shunt=1e10, bv=50.0, bv_slope=1.0, i_bd0=1e-6):
+        self.i_sat = i_sat
+        self.nvt = ideality * _THERMAL_VOLTAGE
+        self.r_series = r_series
+        self.r_shunt = r_shunt
+        self.bv = bv
+        self.bv_slope = bv_slope
+        self.i_bd0 = i_bd0
+
+    def age(self, dt, volts):
+        pass
+
+    def _junction_current(self, vj):
+        e_fwd = math.exp(min(vj / self.nvt, 200.0))
+        e_bd = math.exp(min((-vj - self.bv) / self.bv_slope, 200.0))
+        i = self.i_sat * (e_fwd - 1.0) + vj / self.r_shunt - self.i_bd0 * e_bd
+        di = self.i_sat * e_fwd / self.nvt + 1.0 / self.r_shunt + self.i_bd0 * e_bd / self.bv_slope
+        return i, di
+
+    def current(self, v):
+        if v > 0:
+            # Upper bound for vj (all of v across Rs); g(vj) is convex there so Newton converges from the right
+            vj = min(v, self.nvt * math.log1p(v / (self.r_series * self.i_sat)))
+        else:
+            vj = v
+        for _ in range(100):
+            i, di = self._junction_current(vj)
+            g = vj + self.r_series * i - v
+            step = g / (1.0 + self.r_series * di)
+            vj -= step
+            if abs(step) < 1e-12:
+                break
+        return self._junction_current(vj)[0]
+
+    def terminal_currents(self, volts):
+        i = self.current(volts.get('1.smua', 0.0) - volts.get('2.smua', 0.0))
+        return {'1.smua': i, '2.smua': -i, '2.smub': 0.0}
+
+
+DEVICE_MODELS = {'MOSFET': SimulatedMosfet, 'DIODE': SimulatedDiode}
+
+
+# --- TSP object model ---
+
+class SimulatedBufferColumn:
+    """One column (readings / sourcevalues / timestamps) of a reading buffer; 1-based like TSP."""
+    def __init__(self, buffer, attr):
+        self._buffer = buffer
+        self._attr = attr
+
+    @property
+    def n(self):
+        return self._buffer.n
+
+    def _values(self):
+        return getattr(self._buffer, self._attr)
+
+    def __getitem__(self, index):
+        if index < 1:
+            raise IndexError(index)
+        return self._values()[index - 1]
+
+
+class SimulatedBuffer:
+    """
+    smuX.nvbufferY: readings with source values and timestamps, FILL_ONCE / FILL_WINDOW semantics.
+    As on the instrument, timestamps are relative to the first stored reading, whose absolute time
+    is `basetimestamp`.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.appendmode = 0
+        self.collecttimestamps = 0
+        self.collectsourcevalues = 0
+        self.fillmode = _SMU_CONSTANTS['FILL_ONCE']
+        self.timestampresolution = 1e-6
+        self.basetimestamp = 0.0
+        self._readings = []
+        self._sourcevalues = []
+        self._timestamps = []
+        self._measureranges = []
+        self.readings = SimulatedBufferColumn(self, '_readings')
+        self.sourcevalues = SimulatedBufferColumn(self, '_sourcevalues')
+        self.timestamps = SimulatedBufferColumn(self, '_timestamps')
+        self.measureranges = SimulatedBufferColumn(self, '_measureranges')
+
+    @property
+    def n(self):
+        return len(self._readings)
+
+    def clear(self):
+        self._readings.clear()
+        self._sourcevalues.clear()
+        self._timestamps.clear()
+        self._measureranges.clear()
+        self.basetimestamp = 0.0
+
+    def __getitem__(self, index):
+        return self.readings[index]
+
+    def _store(self, reading, source_value, timestamp, measure_range=0.0):
+        if not self.appendmode:
+            self.clear()
+        if len(self._readings) >= self.capacity:
+            if self.fillmode == _SMU_CONSTANTS['FILL_ONCE']:
+                return
+            del self._readings[0], self._sourcevalues[0], self._timestamps[0], self._measureranges[0]
+        if not self._readings:
+            self.basetimestamp = timestamp
+        self._readings.append(reading)
+        self._sourcevalues.append(source_value)
+        self._timestamps.append(timestamp - self.basetimestamp)
+        self._measureranges.append(measure_range)
+
+
+class _Namespace:
+    """Plain attribute bag for TSP sub-objects (display.smua.measure, smua.measure.filter, ...)."""
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+
+class SimulatedSource:
+    def __init__(self, smu):
+        self._smu = smu
+        self.func = _SMU_CONSTANTS['OUTPUT_DCVOLTS']
+        self.levelv = 0.0
+        self.leveli = 0.0
+        self.limiti = 0.1
+        self.limitv = 20.0
+        self.rangev = 20.0
+        self.rangei = 0.1
+        self.autorangev = 1
+        self.autorangei = 1
+        self.output = _SMU_CONSTANTS['OUTPUT_OFF']
+        self.offmode = 0
+        self.settling = 0
+        self.delay = 0
+
+    @property
+    def compliance(self):
+        return self._smu._sim._in_compliance(self._smu)
+
+
+class SimulatedMeasure:
+    def __init__(self, smu):
+        self._smu = smu
+        self.nplc = 1.0
+        self.delay = 0
+        self.autozero = _SMU_CONSTANTS['AUTOZERO_AUTO']
+        self.autorangei = 1
+        self.autorangev = 1
+        self.rangei = 0.1
+        self.rangev = 20.0
+        self.lowrangei = 1e-9
+        self.count = 1
+        self.interval = 0
+        self.filter = _Namespace(count=1, enable=0, type=0)
+
+    def i(self, ibuf=None):
+        return self._smu._sim._measure(self._smu, ibuf=ibuf)[0]
+
+    def v(self, vbuf=None):
+        return self._smu._sim._measure(self._smu, vbuf=vbuf)[1]
+
+    def iv(self, ibuf=None, vbuf=None):
+        i, v = self._smu._sim._measure(self._smu, ibuf=ibuf, vbuf=vbuf)
+        return Multi((i, v))
+
+    def r(self, rbuf=None):
+        i, v = self._smu._sim._measure(self._smu)
+        r = v / i if i else math.inf
+        if rbuf is not None: rbuf._store(r, self._smu.source.levelv, self._smu._sim._timestamp())
+        return r
+
+    def p(self, pbuf=None):
+        i, v = self._smu._sim._measure(self._smu)
+        if pbuf is not None: pbuf._store(i * v, self._smu.source.levelv, self._smu._sim._timestamp())
+        return i * v
+
+
+class _StimulusTable:
+    """blender.stimulus[1..4]: 1-based, integer-indexed host table."""
+    def __init__(self, size):
+        self._values = [0] * size
+
+    def __getitem__(self, index):
+        return self._values[index - 1]
+
+    def __setitem__(self, index, value):
+        self._values[index - 1] = int(value)
+
+
+class SimulatedTriggerSource:
+    def __init__(self):
+        self.action = _SMU_CONSTANTS['DISABLE']
+        self.stimulus = 0
+        self.limiti = None
+        self.limitv = None
+        self._values = []
+
+    def listv(self, values):
+        self._values = [float(v) for v in values.array_values()]
+
+    def linearv(self, start, stop, points):
+        self._values = [float(v) for v in np.linspace(float(start), float(stop), int(points))]
+
+    def logv(self, start, stop, points, asymptote=0):
+        self._values = [float(v) + float(asymptote) for v in np.geomspace(float(start) - float(asymptote), float(stop) - float(asymptote), int(points))]
+
+
+class SimulatedTriggerMeasure:
+    def __init__(self):
+        self.action = _SMU_CONSTANTS['DISABLE']
+        self.stimulus = 0
+        self._buffers = (None, None)
+
+    def i(self, ibuf):
+        self._buffers = (ibuf, None)
+
+    def v(self, vbuf):
+        self._buffers = (None, vbuf)
+
+    def iv(self, ibuf, vbuf):
+        self._buffers = (ibuf, vbuf)
+
+
+class SimulatedTrigger:
+    """smuX.trigger: arm -> source -> measure -> endpulse, repeated `count` times per arm."""
+    def __init__(self, smu, event_ids):
+        self._smu = smu
+        for name, event_id in zip(_SMU_TRIGGER_EVENTS, event_ids):
+            setattr(self, f"{name}_EVENT_ID", event_id)
+        self.count = 1
+        self.arm = _Namespace(count=1, stimulus=0)
+        self.source = SimulatedTriggerSource()
+        self.measure = SimulatedTriggerMeasure()
+        self.endpulse = _Namespace(action=_SMU_CONSTANTS['SOURCE_HOLD'], stimulus=0)
+        self.endsweep = _Namespace(action=_SMU_CONSTANTS['SOURCE_IDLE'])
+        self.autoclear = 0
+
+    def initiate(self):
+        self._smu._sim._trigger_initiate(self._smu)
+
+    def abort(self):
+        self._smu._sim._trigger_abort(self._smu)
+
+
+class SimulatedSmu:
+    def __init__(self, sim, key):
+        self._sim = sim
+        self._key = key
+        self.__dict__.update(_SMU_CONSTANTS)
+        self.reset()
+
+    def reset(self):
+        self.source = SimulatedSource(self)
+        self.measure = SimulatedMeasure(self)
+        self.nvbuffer1 = SimulatedBuffer(self._sim.buffer_capacity)
+        self.nvbuffer2 = SimulatedBuffer(self._sim.buffer_capacity)
+        self.sense = _SMU_CONSTANTS['SENSE_LOCAL']
+        self._last_rangei = None
+        if not hasattr(self, '_trigger_event_ids'):
+            self._trigger_event_ids = [self._sim._new_event_id() for _ in _SMU_TRIGGER_EVENTS]
+        self.trigger = SimulatedTrigger(self, self._trigger_event_ids)
+
+    def makebuffer(self, capacity):
+        return SimulatedBuffer(int(capacity))
+
+
+class SimulatedDisplay:
+    MEASURE_DCAMPS = 0
+    MEASURE_DCVOLTS = 1
+    MEASURE_OHMS = 2
+    MEASURE_WATTS = 3
+
+    def __init__(self):
+        self.smua = _Namespace(measure=_Namespace(func=0))
+        self.smub = _Namespace(measure=_Namespace(func=0))
+        self.screen = 0
+
+    def clear(self): pass
+    def settext(self, text=""): pass
+    def setcursor(self, *args): pass
+
+
+class _TsplinkLine:
+    """tsplink.trigger[N] on one node. The line's EVENT_ID is shared by every node on the link."""
+    def __init__(self, sim, event_id):
+        self._sim = sim
+        self.EVENT_ID = event_id
+        self.mode = 0
+        self.stimulus = 0
+        self.pulsewidth = 10e-6
+        self.overrun = False
+
+    def assert_(self):
+        self._sim._fire_event(self.EVENT_ID, self._sim.clock_s)
+
+    def clear(self): pass
+    def release(self): pass
+
+
+class _Tsplink:
+    TRIG_BYPASS = 0
+    TRIG_FALLING = 1
+    TRIG_RISING = 2
+    TRIG_EITHER = 3
+    TRIG_SYNCHRONOUSA = 4
+    TRIG_SYNCHRONOUS = 5
+    TRIG_SYNCHRONOUSM = 6
+
+    def __init__(self, sim, line_event_ids):
+        self.state = "online"
+        self.node = 1
+        self.trigger = _NodeTable({n: _TsplinkLine(sim, eid) for n, eid in line_event_ids.items()})
+        # Scripts call tsplink.trigger[N].assert(), and 'assert' is a Python keyword
+        for line in self.trigger._nodes.values():
+            setattr(line, 'assert', line.assert_)
+
+    def reset(self, *args):
+        return 2
+
+
+class _Blender:
+    """trigger.blender[N]: AND (orenable = false) or OR of up to four stimuli."""
+    def __init__(self, sim):
+        self.EVENT_ID = sim._new_event_id()
+        self.orenable = False
+        self.stimulus = _StimulusTable(4)
+        self._seen = set()
+
+    def clear(self):
+        self._seen.clear()
+
+    def _on_event(self, event_id):
+        inputs = [s for s in self.stimulus._values if s]
+        if event_id not in inputs:
+            return False
+        if self.orenable:
+            return True
+        self._seen.add(event_id)
+        if self._seen.issuperset(inputs):
+            self._seen.clear()
+            return True
+        return False
+
+
+class _TriggerTimer:
+    """trigger.timer[N]: on each stimulus, `count` events spaced by `delay` (plus one immediately if passthrough)."""
+    def __init__(self, sim):
+        self.EVENT_ID = sim._new_event_id()
+        self.count = 1
+        self.delay = 10e-6
+        self.passthrough = False
+        self.stimulus = 0
+
+    def clear(self): pass
+
+    def _event_times(self, at_s):
+        times = [at_s] if self.passthrough else []
+        return times + [at_s + k * float(self.delay) for k in range(1, int(self.count) + 1)]
+
+
+class _NodeTrigger:
+    def __init__(self, sim):
+        self.blender = _NodeTable({n: _Blender(sim) for n in range(1, 7)})
+        self.timer = _NodeTable({n: _TriggerTimer(sim) for n in range(1, 9)})
+        self.EVENT_ID = sim._new_event_id()
+
+    def clear(self): pass
+
+
+class SimulatedNode:
+    def __init__(self, sim, index, channels, tsplink_line_ids):
+        self.display = SimulatedDisplay()
+        for ch in channels:
+            setattr(self, ch, SimulatedSmu(sim, f"{index}.{ch}"))
+        self._channels = channels
+        self.tsplink = _Tsplink(sim, tsplink_line_ids)
+        self.trigger = _NodeTrigger(sim)
+        self.linefreq = sim.line_frequency
+
+    def smus(self):
+        return [getattr(self, ch) for ch in self._channels]
+
+
+class _NodeTable:
+    def __init__(self, nodes):
+        self._nodes = nodes
+
+    def __getitem__(self, index):
+        return self._nodes[index]
+
+
+class _Timer:
+    def __init__(self, sim):
+        self._sim = sim
+        self.measure = _Namespace(t=lambda: sim.clock_s - sim._timer_origin)
+
+    def reset(self):
+        self._sim._timer_origin = self._sim.clock_s
+
+
+class _Script:
+    def __init__(self, sim, name, source):
+        self._sim = sim
+        self.name = name
+        self.source = source
+
+    def run(self):
+        self._sim._execute(self.source)
+
+    def __call__(self):
+        self.run()
+
+
+# --- pyvisa-compatible resource ---
+
+class SimulatedKeithley26xx:
+    """
+    pyvisa-like resource (write / query / read / close / timeout) backed by the TSP interpreter.
+    Script errors behave like the instrument: the run stops, the error goes to the error queue
+    (and stderr), and a later query without output times out with a VisaIOError.
+    """
+    def __init__(self, device="MOSFET", noise_rel=None, noise_floor_a=None, noise_v=None,
+                 io_latency_s=None, time_scale=None, line_frequency=None, buffer_capacity=None,
+                 measure_overhead_s=None, seed=None, resource_name=None, **device_params):
+        device = device.upper()
+        if device not in DEVICE_MODELS:
+            raise ValueError(f"Unknown simulated device '{device}' (expected one of {', '.join(DEVICE_MODELS)})")
+        self.resource_name = resource_name or f"{config_settings.SIMULATOR_RESOURCE_PREFIX}26XX::{device}"
+        self.device = DEVICE_MODELS[device](**device_params)
+        self.noise_rel = config_settings.SIMULATOR_NOISE_REL if noise_rel is None else float(noise_rel)
+        self.noise_floor_a = config_settings.SIMULATOR_NOISE_FLOOR_A if noise_floor_a is None else float(noise_floor_a)
+        self.noise_v = config_settings.SIMULATOR_NOISE_V if noise_v is None else float(noise_v)
+        self.io_latency_s = config_settings.SIMULATOR_IO_LATENCY_S if io_latency_s is None else float(io_latency_s)
+        self.time_scale = config_settings.SIMULATOR_TIME_SCALE if time_scale is None else float(time_scale)
+        self.line_frequency = config_settings.SIMULATOR_LINE_FREQUENCY_HZ if line_frequency is None else float(line_frequency)
+        self.buffer_capacity = config_settings.SIMULATOR_BUFFER_CAPACITY if buffer_capacity is None else int(buffer_capacity)
+        self.measure_overhead_s = config_settings.SIMULATOR_MEASURE_OVERHEAD_S if measure_overhead_s is None else float(measure_overhead_s)
+        self._rng = np.random.default_rng(None if seed is None else int(seed))
+        self.timeout = config_settings.DEFAULT_TIMEOUT
+        self.clock_s = 0.0
+        self.last_measure_end_s = 0.0
+        self._timer_origin = 0.0
+        self._output = []
+        self._loading_script = None  # (name, [lines]) while between loadscript and endscript
+        self.error_queue = []
+        self.write_count = 0
+        self.query_count = 0
+        self._next_event_id = 1
+        self._engines = {}  # smu -> _TriggerEngine while its trigger model is initiated
+        self._build_nodes()
+        self._interp = TspInterpreter(self._build_globals())
+
+    # Construction ----------------------------------------------------------
+
+    @classmethod
+    def from_resource_name(cls, resource_name):
+        """Parse "SIM::26XX::<DEVICE>[?key=value&...]" into constructor arguments."""
+        body = resource_name[len(config_settings.SIMULATOR_RESOURCE_PREFIX):]
+        body, _, query = body.partition('?')
+        parts = [p for p in body.split('::') if p]
+        device = parts[-1] if parts else "MOSFET"
+        kwargs = {}
+        for key, value in parse_qsl(query):
+            try:
+                kwargs[key] = float(value)
+            except ValueError:
+                kwargs[key] = value
+        return cls(device=device, resource_name=resource_name, **kwargs)
+
+    def _new_event_id(self):
+        event_id = self._next_event_id
+        self._next_event_id += 1
+        return event_id
+
+    def _build_nodes(self):
+        line_ids = {n: self._new_event_id() for n in range(1, 4)}
+        self.node1 = SimulatedNode(self, 1, ['smua'], line_ids)            # 2657A
+        self.node2 = SimulatedNode(self, 2, ['smua', 'smub'], line_ids)    # 2636B over TSP-Link
+        self._all_smus = self.node1.smus() + self.node2.smus()
+
+    def _build_globals(self):
+        nodes = _NodeTable({1: self.node1, 2: self.node2})
+        g = {
+            'node': nodes,
+            'localnode': self.node1,
+            'smua': self.node1.smua,
+            'display': self.node1.display,
+            'timer': _Timer(self),
+            'tsplink': self.node1.tsplink,
+            'trigger': self.node1.trigger,
+            'errorqueue': _ErrorQueueView(self),
+            'status': _Namespace(reset=lambda: None),
+            'beeper': _Namespace(beep=lambda *a: None, enable=0),
+            'format': _Namespace(asciiprecision=6, data=1),
+            'script': _Namespace(run=self._run_anonymous_script, anonymous=None),
+            'reset': self._reset_all,
+            'delay': self._delay,
+            'print': self._print,
+            'printbuffer': self._printbuffer,
+            'waitcomplete': self._waitcomplete,
+            'opc': lambda: self._output.append("1"),
+        }
+        return g
+
+    # TSP global functions --------------------------------------------------
+
+    def _reset_all(self):
+        self._engines.clear()
+        for smu in self._all_smus:
+            smu.reset()
+        for node in (self.node1, self.node2):
+            node.display = SimulatedDisplay()
+            for blender in node.trigger.blender._nodes.values():
+                blender.orenable = False
+                blender.stimulus = _StimulusTable(4)
+                blender.clear()
+            for line in node.tsplink.trigger._nodes.values():
+                line.mode = line.stimulus = 0
+            for timer in node.trigger.timer._nodes.values():
+                timer.count, timer.delay, timer.passthrough, timer.stimulus = 1, 10e-6, False, 0
+        self._interp.globals['display'] = self.node1.display
+
+    def _delay(self, seconds):
+        self._advance(float(seconds))
+
+    def _print(self, *args):
+        self._output.append("\t".join(to_lua_string(a) for a in args))
+
+    def _printbuffer(self, start, end, *buffers):
+        start, end = int(start), int(end)
+        values = []
+        for idx in range(start, end + 1):
+            for buf in buffers:
+                try:
+                    values.append(f"{buf[idx]:.6e}")
+                except IndexError:
+                    pass  # real instrument raises; keep the sim lenient so short reads surface as length mismatches
+        self._output.append(", ".join(values))
+
+    def _waitcomplete(self, *args):
+        self._run_trigger_engines()
+        if self._engines:
+            stalled = ", ".join(smu._key for smu in self._engines)
+            self._engines.clear()
+            self.error_queue.append(f"trigger model stalled waiting for events ({stalled})")
+            print(f"[SIM] 触发模型停滞: {stalled}", file=sys.stderr)
+
+    def _run_anonymous_script(self):
+        script = self._interp.globals['script'].anonymous
+        if script is not None:
+            script.run()
+
+    def _errorqueue_next(self):
+        if not self.error_queue:
+            return Multi((0, "Queue Is Empty", 0, 0))
+        return Multi((-286, self.error_queue.pop(0), 0, 0))
+
+    # Physics ---------------------------------------------------------------
+
+    def _terminal_voltages(self):
+        return {smu._key: (smu.source.levelv if smu.source.output else 0.0) for smu in self._all_smus}
+
+    def _true_current(self, smu):
+        if not smu.source.output:
+            return 0.0
+        return self.device.terminal_currents(self._terminal_voltages()).get(smu._key, 0.0)
+
+    def _in_compliance(self, smu):
+        return smu.source.output != 0 and abs(self._true_current(smu)) >= smu.source.limiti
+
+    def _advance(self, dt):
+        if dt <= 0:
+            return
+        self.device.age(dt, self._terminal_voltages())
+        self.clock_s += dt
+        if self.time_scale > 0:
+            time.sleep(dt * self.time_scale)
+
+    def _timestamp(self):
+        return self.clock_s
+
+    def _aperture(self, smu):
+        return float(smu.measure.nplc) / self.line_frequency + self.measure_overhead_s
+
+    def _filter_count(self, smu):
+        # Repeat-average filter: every stored reading is the mean of filter.count conversions
+        flt = smu.measure.filter
+        if flt.enable and flt.type == _SMU_CONSTANTS['FILTER_REPEAT_AVG']:
+            return max(int(flt.count), 1)
+        return 1
+
+    def _sample_spacing(self, smu):
+        # measure.count > 1 takes readings every measure.interval, but never faster than one (filtered) reading
+        return max(float(smu.measure.interval or 0), self._filter_count(smu) * self._aperture(smu))
+
+    def _current_range(self, smu, i_abs):
+        """Autorange: smallest range holding |I| (not below lowrangei). Fixed: rangei rounded up to a range."""
+        meas = smu.measure
+        if meas.autorangei:
+            wanted = max(i_abs, float(meas.lowrangei or 0))
+        else:
+            wanted = abs(float(meas.rangei))
+        return next((r for r in _CURRENT_RANGES_A if r >= wanted * (1 - 1e-9)), _CURRENT_RANGES_A[-1])
+
+    def _measure(self, smu, ibuf=None, vbuf=None, start_s=None):
+        """
+        Takes measure.count readings and returns the last (i, v). The end of the last conversion is kept
+        in `last_measure_end_s` so trigger-model engines can advance their time cursor. The current noise
+        floor grows with the range above SIMULATOR_NOISE_REF_RANGE_A and with 1/sqrt(NPLC); a fixed range
+        below the signal reads overflow, and an autorange change costs SIMULATOR_RANGE_CHANGE_S.
+        """
+        # start_s lets trigger-model engines measure concurrently from their own time cursor
+        start_s = self.clock_s if start_s is None else start_s
+        timestamp = start_s + float(smu.measure.delay or 0)
+        aperture = self._aperture(smu)
+        n_avg = self._filter_count(smu)
+        nplc_noise = 1.0 / math.sqrt(max(float(smu.measure.nplc), 1e-3))
+        limit = abs(smu.source.limiti)
+        for _ in range(max(int(smu.measure.count or 1), 1)):
+            i_range = self._current_range(smu, min(abs(self._true_current(smu)), limit))
+            if smu.measure.autorangei and i_range != smu._last_rangei and smu._last_rangei is not None:
+                timestamp += config_settings.SIMULATOR_RANGE_CHANGE_S
+            smu._last_rangei = i_range
+            noise_floor = self.noise_floor_a * nplc_noise * max(1.0, i_range / config_settings.SIMULATOR_NOISE_REF_RANGE_A)
+            i_sum = v_sum = 0.0
+            for k in range(n_avg):
+                self._advance(timestamp + (k + 1) * aperture - self.clock_s)
+                i_true = self._true_current(smu)
+                i_meas = max(-limit, min(limit, i_true))
+                i_sum += i_meas + self.noise_rel * abs(i_meas) * self._rng.standard_normal() + noise_floor * self._rng.standard_normal()
+                level = smu.source.levelv if smu.source.output else 0.0
+                v_sum += level + self.noise_v * self._rng.standard_normal()
+            i_meas, v_meas = i_sum / n_avg, v_sum / n_avg
+            if abs(i_meas) > i_range * 1.01:
+                i_meas = math.copysign(_OVERFLOW_READING, i_meas)
+            if ibuf is not None: ibuf._store(i_meas, level, timestamp, i_range)
+            if vbuf is not None: vbuf._store(v_meas, level, timestamp, float(smu.measure.rangev))
+            self.last_measure_end_s = timestamp + n_avg * aperture
+            timestamp += self._sample_spacing(smu)
+        return i_meas, v_meas
+
+    # Trigger model ---------------------------------------------------------
+
+    def _trigger_initiate(self, smu):
+        engine = self._engines[smu] = _TriggerEngine(self, smu)
+        engine.start()  # registered first so it sees the events its own ARMED event sets off
+        self._run_trigger_engines()
+
+    def _trigger_abort(self, smu):
+        self._engines.pop(smu, None)
+
+    def _fire_event(self, event_id, at_s):
+        """
+        Latch `event_id` into every initiated engine and propagate it through blenders, TSP-Link
+        lines and timers. Timer outputs are latched up front with their future time stamps.
+        """
+        pending = [(event_id, at_s)]
+        while pending:
+            eid, t = pending.pop(0)
+            for engine in self._engines.values():
+                engine.latch(eid, t)
+            for node in (self.node1, self.node2):
+                for blender in node.trigger.blender._nodes.values():
+                    if blender._on_event(eid):
+                        pending.append((blender.EVENT_ID, t))
+                for line in node.tsplink.trigger._nodes.values():
+                    if line.stimulus and line.stimulus == eid and (line.EVENT_ID, t) not in pending:
+                        pending.append((line.EVENT_ID, t))
+                for timer in node.trigger.timer._nodes.values():
+                    if timer.stimulus and timer.stimulus == eid:
+                        pending.extend((timer.EVENT_ID, tt) for tt in timer._event_times(t))
+
+    def _run_trigger_engines(self):
+        # Always step the engine with the earliest time cursor so concurrent SMUs interleave in time order
+        while True:
+            runnable = [e for e in self._engines.values() if e.ready()]
+            if not runnable:
+                break
+            engine = min(runnable, key=lambda e: e.next_time())
+            if not engine.step():
+                self._engines.pop(engine.smu, None)
+
+    # Script execution ------------------------------------------------------
+
+    def _execute(self, source):
+        try:
+            self._interp.execute(source)
+        except TspError as e:
+            self.error_queue.append(str(e))
+            print(f"[SIM] TSP 脚本错误: {e}", file=sys.stderr)
+
+    # pyvisa resource API ---------------------------------------------------
+
+    def write(self, command):
+        self.write_count += 1
+        if self.io_latency_s > 0:
+            time.sleep(self.io_latency_s)
+        stripped = command.strip()
+        if self._loading_script is not None:
+            if stripped == 'endscript':
+                name, lines = self._loading_script
+                self._loading_script = None
+                script = _Script(self, name, "\n".join(lines))
+                if name:
+                    self._interp.globals[name] = script
+                else:
+                    self._interp.globals['script'].anonymous = script
+            else:
+                self._loading_script[1].append(command)
+            return len(command)
+        if stripped == 'loadscript' or stripped.startswith('loadscript '):
+            self._loading_script = (stripped[len('loadscript'):].strip() or None, [])
+            return len(command)
+        self._execute(command)
+        return len(command)
+
+    def read(self):
+        # One message per read, like a GPIB read up to the termination character
+        if not self._output:
+            raise pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_timeout)
+        return self._output.pop(0) + "\n"
+
+    def query(self, command):
+        self.query_count += 1
+        self.write(command)
+        return self.read()
+
+    def clear(self):
+        self._output.clear()
+
+    def close(self):
+        self._output.clear()
+
+
+class _TriggerEngine:
+    """
+    One SMU's initiated trigger model, run as a generator that yields the stimulus it waits on.
+    Detectors latch events (with their time) whether or not the engine is waiting yet.
+    """
+    def __init__(self, sim, smu):
+        self.sim = sim
+        self.smu = smu
+        self.t_s = sim.clock_s
+        self._latched = {}  # event id -> sorted occurrence times not yet consumed
+        self._waiting = None
+        self._idle_level = smu.source.levelv
+        self._gen = self._run()
+
+    def start(self):
+        self._waiting = next(self._gen, None)
+
+    def latch(self, event_id, at_s):
+        bisect.insort(self._latched.setdefault(event_id, []), at_s)
+
+    def ready(self):
+        if self._waiting is None:
+            return False
+        return self._waiting == 0 or bool(self._latched.get(self._waiting))
+
+    def next_time(self):
+        if not self._waiting:
+            return self.t_s
+        return max(self.t_s, self._latched[self._waiting][0])
+
+    def step(self):
+        if self._waiting:
+            self.t_s = max(self.t_s, self._latched[self._waiting].pop(0))
+        self._waiting = next(self._gen, None)
+        return self._waiting is not None
+
+    def _set_level(self, level):
+        # Bring the device up to this engine's time at the old bias before changing it (pulse off-time cooling)
+        self.sim._advance(self.t_s - self.sim.clock_s)
+        self.smu.source.levelv = level
+
+    def _emit(self, name):
+        self.sim._fire_event(getattr(self.smu.trigger, f"{name}_EVENT_ID"), self.t_s)
+
+    def _run(self):
+        trig = self.smu.trigger
+        self._emit('ARMED')
+        for _ in range(max(int(trig.arm.count), 1)):
+            yield int(trig.arm.stimulus or 0)
+            self._emit('SWEEPING')
+            values = trig.source._values
+            for point in range(max(int(trig.count), 1)):
+                yield int(trig.source.stimulus or 0)
+                if trig.source.action and values:
+                    self._set_level(values[point % len(values)])
+                self._emit('SOURCE_COMPLETE')
+                yield int(trig.measure.stimulus or 0)
+                if trig.measure.action:
+                    ibuf, vbuf = trig.measure._buffers
+                    self.sim._measure(self.smu, ibuf=ibuf, vbuf=vbuf, start_s=self.t_s)
+                    self.t_s = self.sim.last_measure_end_s
+                self._emit('MEASURE_COMPLETE')
+                yield int(trig.endpulse.stimulus or 0)
+                if trig.source.action and trig.endpulse.action == _SMU_CONSTANTS['SOURCE_IDLE']:
+                    self._set_level(self._idle_level)
+                self._emit('PULSE_COMPLETE')
+            if trig.source.action and trig.endsweep.action == _SMU_CONSTANTS['SOURCE_IDLE']:
+                self._set_level(self._idle_level)
+            self._emit('SWEEP_COMPLETE')
+        self._emit('IDLE')
+        self.sim._advance(self.t_s - self.sim.clock_s)
+
+
+class _ErrorQueueView:
+    """TSP `errorqueue` with a live `count` attribute."""
+    def __init__(self, sim):
+        self._sim = sim
+        self.clear = sim.error_queue.clear
+        self.next = sim._errorqueue_next
+
+    @property
+    def count(self):
+        return len(self._sim.error_queue)
+
+
+def open_simulated_resource(resource_name, timeout):
+    inst = SimulatedKeithley26xx.from_resource_name(resource_name)
+    inst.timeout = timeout
+    return inst
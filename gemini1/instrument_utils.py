@@ -4,10 +4,16 @@ import numpy as np
 import os
 from contextlib import contextmanager
 import sys
+import time
 from datetime import datetime
 import functools # For functools.wraps
 import traceback # For full traceback in error dict
 
+import config_settings
+import tracing_utils
+import tsp_template
+from measurement_record import MeasurementRecord
+
 # --- Error Handling Decorator ---
 def handle_measurement_errors(func):
     """
@@ -38,15 +44,41 @@ def handle_measurement_errors(func):
             return {"status": "error", "message": err_msg, "traceback": tb_str, "measurement_type_name": measurement_type_name}
     return wrapper
 
-def query_buffer(inst, buffer_name, num_readings):
-    """检查并查询缓冲区数据"""
+def visa_write(inst, cmd):
+    """inst.write 的跟踪封装: 记录 visa.write 跨度及发送字节数。"""
+    with tracing_utils.span("visa.write", "visa", bytes_out=len(cmd)):
+        tracing_utils.count("visa.writes")
+        tracing_utils.count("visa.bytes_out", len(cmd))
+        return inst.write(cmd)
+
+def visa_query(inst, cmd):
+    """inst.query 的跟踪封装: 记录 visa.query 跨度及收发字节数。"""
+    with tracing_utils.span("visa.query", "visa", cmd=cmd[:80]) as span_args:
+        response = inst.query(cmd)
+        span_args["bytes_in"] = len(response)
+        tracing_utils.count("visa.queries")
+        tracing_utils.count("visa.bytes_in", len(response))
+        return response
+
+def visa_read(inst):
+    """inst.read 的跟踪封装: 读取脚本运行中自行打印的输出 (每次一行)。"""
+    with tracing_utils.span("visa.read", "visa") as span_args:
+        response = inst.read()
+        span_args["bytes_in"] = len(response)
+        tracing_utils.count("visa.reads")
+        tracing_utils.count("visa.bytes_in", len(response))
+        return response
+
+def query_buffer(inst, buffer_name, num_readings, start_index=1):
+    """检查并查询缓冲区数据 (start_index 为1起始的缓冲区索引，用于分段读取)"""
     try:
         num_readings_int = int(num_readings)
         if num_readings_int <= 0:
             # print(f"  Query_buffer: num_readings is {num_readings_int} for {buffer_name}. Will try to read all if possible by TSP printbuffer.")
             pass 
-        cmd = f'printbuffer(1, {num_readings_int}, {buffer_name})'
-        return inst.query(cmd).strip()
+        start_index_int = max(1, int(start_index))
+        cmd = f'printbuffer({start_index_int}, {start_index_int + num_readings_int - 1}, {buffer_name})'
+        return visa_query(inst, cmd).strip()
     except pyvisa.errors.VisaIOError as e:
         print(f"查询缓冲区 {buffer_name} 时发生VISA错误: {str(e)}", file=sys.stderr)
         return ""
@@ -54,6 +86,38 @@ def query_buffer(inst, buffer_name, num_readings):
         print(f"查询缓冲区 {buffer_name} 时发生一般错误: {str(e)}", file=sys.stderr)
         return ""
 
+def query_lua_number_list(inst, table_name):
+    """读取脚本留下的 Lua 数值表 (如每点 NPLC / 重测索引)。表不存在或查询失败时返回空数组。"""
+    try:
+        response = visa_query(inst, f'if {table_name} ~= nil then print(table.concat({table_name}, ",")) else print("") end')
+        return safe_float_convert(response.strip())
+    except pyvisa.errors.VisaIOError as e:
+        print(f"查询 Lua 表 {table_name} 时发生VISA错误: {str(e)}", file=sys.stderr)
+        return np.array([])
+
+def query_sweep_status(inst):
+    """读取扫描脚本留下的状态记录 (每段点数、是否触发限流及其点索引、触发的SMU)。脚本未提供时返回 None。"""
+    try:
+        response = visa_query(inst, 'if sweep_leg_n == nil then print("nil") else print(table.concat(sweep_leg_n, ","), sweep_cmpl, sweep_cmpl_index, sweep_cmpl_smu) end').strip()
+    except pyvisa.errors.VisaIOError as e:
+        print(f"查询扫描状态记录时发生VISA错误: {str(e)}", file=sys.stderr)
+        return None
+    fields = response.split()
+    if len(fields) == 3:
+        fields.insert(0, "") # No leg finished: table.concat printed an empty string
+    if len(fields) != 4 or fields[0] == "nil":
+        return None
+    try:
+        return {
+            'leg_points': np.array([int(float(x)) for x in fields[0].split(',') if x.strip()], dtype=int),
+            'compliance': int(float(fields[1])) != 0,
+            'compliance_index': int(float(fields[2])),
+            'compliance_smu': fields[3],
+        }
+    except ValueError:
+        print(f"无法解析扫描状态记录: '{response}'", file=sys.stderr)
+        return None
+
 def safe_float_convert(data_str):
     """安全地将字符串转换为浮点数数组"""
     try:
@@ -63,22 +127,28 @@ def safe_float_convert(data_str):
         return np.array([])
 
 def load_tsp_script(inst, script_path, tsp_params):
-    """加载TSP脚本并运行，替换占位符。"""
+    """加载TSP脚本并运行。模板按文件修改时间缓存编译结果，发送前校验占位符参数 (缺失或非数值时抛出 ValueError)。"""
     try:
-        with open(script_path, 'r', encoding='utf-8') as f:
-            tsp_script_template = f.read()
-
-        tsp_script = tsp_script_template
-        for key, value in tsp_params.items():
-            placeholder = "{{" + key + "}}"
-            tsp_script = tsp_script.replace(placeholder, str(value))
-
-        inst.write("loadscript")
-        inst.write(tsp_script)
-        inst.write("endscript")
-        inst.write("script.run()")
+        with tracing_utils.span("tsp_compile", "visa") as compile_args:
+            template, cache_hit = tsp_template.compile_tsp_template(script_path)
+            tsp_script = template.render(tsp_params)
+            compile_args["cache_hit"] = cache_hit
+        tracing_utils.count("tsp.template_cache_hits" if cache_hit else "tsp.template_compiles")
+
+        visa_write(inst, "errorqueue.clear()") # Errors counted after the run then belong to this script
+        upload_bytes = len(tsp_script.encode('utf-8'))
+        with tracing_utils.span("tsp_upload", "visa", script=os.path.basename(script_path), bytes=upload_bytes,
+                                source_chars=template.source_chars, minified=template.minify):
+            visa_write(inst, "loadscript")
+            visa_write(inst, tsp_script)
+            visa_write(inst, "endscript")
+        tracing_utils.count("tsp.upload_bytes", upload_bytes)
+        with tracing_utils.span("tsp_run_command", "visa"):
+            visa_write(inst, "script.run()")
         # print(f"  TSP script '{os.path.basename(script_path)}' loaded and run.")
         return True
+    except ValueError:
+        raise # Parameter validation: surfaces as a 'Value Error' in the run result instead of a generic load failure
     except FileNotFoundError:
         print(f"TSP脚本加载失败: 在 {script_path} 未找到文件", file=sys.stderr)
         return False
@@ -89,15 +159,72 @@ def load_tsp_script(inst, script_path, tsp_params):
         print(f"在 {script_path} 的TSP脚本加载/运行期间发生一般错误: {str(e)}", file=sys.stderr)
         return False
 
+def wait_for_script_completion(inst, expected_duration_s=None, progress_callback=None, measurement_type_name=""):
+    """
+    在 script.run() 之后等待脚本结束，返回实际用时 (s)。
+    完成标记由排在脚本之后的命令打印，因此以短超时轮询读取: 等待期间按已用时间/预计时长报告进度，
+    超过 预计时长 × SCRIPT_TIMEOUT_FACTOR + SCRIPT_TIMEOUT_MARGIN_S 仍未结束则视为脚本挂起，
+    清除仪器 (中止脚本) 并抛出 RuntimeError。预计时长未知时以 inst.timeout 为上限。
+    """
+    marker = config_settings.SCRIPT_DONE_MARKER
+    if expected_duration_s is not None and expected_duration_s >= 0:
+        limit_s = expected_duration_s * config_settings.SCRIPT_TIMEOUT_FACTOR + config_settings.SCRIPT_TIMEOUT_MARGIN_S
+    else:
+        limit_s = inst.timeout / 1000.0
+    context_msg = f" ({measurement_type_name})" if measurement_type_name else ""
+    original_timeout = inst.timeout
+    start = time.monotonic()
+    with tracing_utils.span("wait_script_complete", "visa", expected_s=expected_duration_s, limit_s=limit_s) as span_args:
+        visa_write(inst, f'print("{marker}", errorqueue.count)')
+        inst.timeout = config_settings.SCRIPT_POLL_INTERVAL_S * 1000
+        polls = 0
+        try:
+            while True:
+                try:
+                    line = visa_read(inst).strip()
+                except pyvisa.errors.VisaIOError as e:
+                    if e.error_code != pyvisa.constants.StatusCode.error_timeout:
+                        raise
+                    polls += 1
+                    elapsed = time.monotonic() - start
+                    if elapsed >= limit_s:
+                        inst.clear() # Device clear aborts the running script
+                        raise RuntimeError(f"TSP脚本{context_msg}在 {limit_s:.0f} s 内未完成，判定为挂起并已中止。")
+                    if progress_callback is not None and expected_duration_s:
+                        progress_callback(min(100.0 * elapsed / expected_duration_s, 99.0), elapsed, expected_duration_s)
+                    continue
+                fields = line.split('\t')
+                if fields[0] == marker:
+                    break
+                print(f"  Warning{context_msg}: 等待脚本结束时忽略输出: '{line[:80]}'", file=sys.stderr)
+        finally:
+            inst.timeout = original_timeout
+        elapsed = time.monotonic() - start
+        error_count = int(float(fields[1])) if len(fields) > 1 else 0
+        span_args.update(elapsed_s=elapsed, polls=polls, errors=error_count)
+    for _ in range(error_count):
+        print(f"  仪器错误队列{context_msg}: {visa_query(inst, 'print(errorqueue.next())').strip()}", file=sys.stderr)
+    if progress_callback is not None and expected_duration_s:
+        progress_callback(100.0, elapsed, expected_duration_s)
+    return elapsed
+
+def open_visa_resource(gpib_address, timeout):
+    """打开VISA资源并设置超时，返回 (resource_manager, instrument)。"SIM::" 地址返回模拟仪器 (resource_manager 为 None)。"""
+    if isinstance(gpib_address, str) and gpib_address.upper().startswith(config_settings.SIMULATOR_RESOURCE_PREFIX):
+        import instrument_simulator  # Imported lazily: only needed for offline / benchmark runs
+        return None, instrument_simulator.open_simulated_resource(gpib_address, timeout)
+    rm = pyvisa.ResourceManager()
+    inst = rm.open_resource(gpib_address)
+    inst.timeout = timeout
+    return rm, inst
+
 @contextmanager
 def visa_instrument(gpib_address, timeout, measurement_type_name="测量"):
     rm = None
     inst = None
     try:
         # print(f"  Connecting to VISA instrument: {gpib_address} for {measurement_type_name}...")
-        rm = pyvisa.ResourceManager()
-        inst = rm.open_resource(gpib_address)
-        inst.timeout = timeout
+        rm, inst = open_visa_resource(gpib_address, timeout)
         # print(f"  Successfully connected. Timeout: {timeout/1000}s.")
         yield inst
     except pyvisa.errors.VisaIOError as ve:
@@ -136,7 +263,7 @@ def query_instrument_buffer_count(inst, primary_buffer_object_str, expected_coun
     buffer_read_count_final = expected_count
     context_msg = f"({measurement_type_name}, 缓冲区: {primary_buffer_object_str})" if measurement_type_name else f"(缓冲区: {primary_buffer_object_str})"
     try:
-        actual_n_str = inst.query(f'print({primary_buffer_object_str}.n)').strip()
+        actual_n_str = visa_query(inst, f'print({primary_buffer_object_str}.n)').strip()
         if actual_n_str.lower() == 'nil':
             # print(f"  仪器报告主缓冲区大小为 'nil' {context_msg}。使用计算值: {expected_count}")
             pass
@@ -179,26 +306,12 @@ def determine_consistent_length(raw_data_dict, priority_keys=None, retrieved_cou
             max_len = len(arr)
     return max_len
 
-def normalize_data_arrays(raw_data_dict, consistent_length):
-    processed_data = {}
-    if consistent_length == 0:
-        for name in raw_data_dict.keys(): 
-            processed_data[name] = np.array([])
-        return processed_data
-
-    for name, arr in raw_data_dict.items():
-        if not isinstance(arr, np.ndarray):
-            processed_data[name] = np.full(consistent_length, np.nan)
-            continue
-        if len(arr) == consistent_length:
-            processed_data[name] = arr
-        elif len(arr) > consistent_length:
-            processed_data[name] = arr[:consistent_length]
-        else: 
-            padded_arr = np.full(consistent_length, np.nan)
-            if len(arr) > 0 : padded_arr[:len(arr)] = arr
-            processed_data[name] = padded_arr
-    return processed_data
+def _output_array(processed_data, key, length):
+    # A MeasurementRecord hands out its preallocated column; a plain dict gets a new array
+    if isinstance(processed_data, MeasurementRecord):
+        return processed_data.column(key)
+    processed_data[key] = np.empty(length)
+    return processed_data[key]
 
 def calculate_source_current(processed_data,
                              id_key='Id', ig_key='Ig',
@@ -233,8 +346,7 @@ def calculate_source_current(processed_data,
 
     if use_is_buffer_directly:
         # print("DEBUG IsCalc: Using directly measured Is_buffer for Is.")
-        # MeasurementBase.normalize_data_arrays will ensure this is padded/truncated to consistent_len later
-        # if it's not already. Here, we just assign what was read.
+        # MeasurementBase builds the record at consistent_len, so this is already padded/truncated.
         processed_data[is_out_key] = is_buffer_data 
         # --- DEBUG PRINT FOR Is_buffer ---
         # if isinstance(processed_data[is_out_key], np.ndarray) and processed_data[is_out_key].size > 0:
@@ -260,7 +372,8 @@ def calculate_source_current(processed_data,
         valid_ig_for_calc = isinstance(ig_data, np.ndarray) and ig_data.size == ref_len_for_calc
 
         if valid_id_for_calc and valid_ig_for_calc and ref_len_for_calc > 0:
-            processed_data[is_out_key] = -(id_data + ig_data)
+            is_out = _output_array(processed_data, is_out_key, ref_len_for_calc)
+            np.negative(np.add(id_data, ig_data, out=is_out), out=is_out)
         else:
             processed_data[is_out_key] = np.full(ref_len_for_calc if ref_len_for_calc > 0 else 0, np.nan)
         
@@ -278,9 +391,8 @@ def calculate_source_current(processed_data,
     return processed_data
 
 
-def calculate_current_densities(processed_data, device_config,
-                                current_keys=('Id', 'Ig', 'Is'),
-                                density_keys=('Jd', 'Jg', 'Js')):
+def current_density_scale(device_config):
+    """(J_coeff, unit): a current in A times J_coeff is its density in `unit`; J_coeff is 0 without a width / area."""
     device_type = device_config.get('device_type', 'unknown')
     try: channel_width_um = float(device_config.get('channel_width', 0)) 
     except (ValueError, TypeError): channel_width_um = 0
@@ -300,6 +412,12 @@ def calculate_current_densities(processed_data, device_config,
         if area_um2 > 0:
             area_cm2 = area_um2 * 1e-8 
             J_coeff = 1 / area_cm2 
+    return J_coeff, jd_unit_plot
+
+def calculate_current_densities(processed_data, device_config,
+                                current_keys=('Id', 'Ig', 'Is'),
+                                density_keys=('Jd', 'Jg', 'Js')):
+    J_coeff, jd_unit_plot = current_density_scale(device_config)
     
     ref_len = 0
     for key in current_keys:
@@ -315,10 +433,12 @@ def calculate_current_densities(processed_data, device_config,
         current_array = processed_data.get(current_key)
 
         if isinstance(current_array, np.ndarray) and current_array.size == ref_len and ref_len > 0 : 
+            density = _output_array(processed_data, density_key, ref_len)
             if J_coeff != 0:
-                processed_data[density_key] = current_array * J_coeff
+                np.multiply(current_array, J_coeff, out=density)
             else: 
-                processed_data[density_key] = np.where(np.isnan(current_array), np.nan, 0.0)
+                density.fill(0.0)
+                density[np.isnan(current_array)] = np.nan
         else: 
             processed_data[density_key] = np.full(ref_len if ref_len > 0 else 0, np.nan)
     return processed_data, jd_unit_plot
@@ -327,6 +447,14 @@ def save_data_to_csv(file_path, data_dict, column_keys, header_string, comments=
     try:
         if not column_keys:
             return False
+        if isinstance(data_dict, MeasurementRecord):
+            # Columns are already one length; the table is a view of the record when the CSV columns lead it
+            with open(file_path, 'w', encoding='utf-8') as f:
+                if comments:
+                    f.write(comments)
+                    if not comments.endswith('\n'): f.write('\n')
+                np.savetxt(f, data_dict.table(column_keys), delimiter=",", header=header_string, comments="", fmt='%.9e')
+            return True
         expected_len = -1
         first_valid_key_found = False
         for key in column_keys:
@@ -13,6 +13,24 @@ import output_module
 import breakdown_module
 import diode_module
 
+# (package key, label) of the parameters shown under the live plot
+GT_PARAM_DISPLAY_ORDER = [
+    ('Vth_fwd_calc', 'V_th (V)'), ('min_ss_fwd_calc', 'SS_min (mV/dec)'), ('SS_avg_fwd', 'SS_avg (mV/dec)'),
+    ('max_gm_fwd', 'g_m_max (S)'), ('Vg_at_max_gm_fwd', 'Vg @ g_m_max (V)'),
+    ('Ion_fwd', 'I_on (A)'), ('Ioff_fwd', 'I_off (A)'), ('Ion_Ioff_ratio_fwd', 'I_on/I_off'),
+    ('Delta_Vth', 'ΔV_th (V)'), ('Hysteresis_Loop_Area', 'Loop area (A·V)')
+]
+OC_PARAM_DISPLAY_ORDER = [
+    ('Vg_top_curve', 'V_G (V)'), ('Ron_top_curve', 'R_on (Ω)'), ('Idsat_top_curve', 'I_D,sat (A)'),
+    ('V_knee_top_curve', 'V_knee (V)'), ('gds_top_curve', 'g_ds (S)')
+]
+BD_PARAM_DISPLAY_ORDER = [
+    ('BV_criterion', 'BV (判据) (V)'), ('BV_slope', 'BV (斜率) (V)'), ('Leakage_Gate_Fraction', '栅极漏电占比')
+]
+DIODE_PARAM_DISPLAY_ORDER = [
+    ('Ideality_n', 'n'), ('Is_fit', 'I_s (A)'), ('Rs_fit', 'R_s (Ω)'), ('V_on', 'V_on (V)'), ('I_reverse', 'I_reverse (A)')
+]
+
 class LivePlotHandler:
     def __init__(self, app_instance, parent_frame):
         self.app = app_instance
@@ -84,18 +102,32 @@ class LivePlotHandler:
             gt_params_to_display = {
                 'Vth_fwd_calc': result_package.get('Vth_fwd_calc'), 
                 'min_ss_fwd_calc': result_package.get('min_ss_fwd_calc'),
+                'SS_avg_fwd': result_package.get('SS_avg_fwd'),
                 'max_gm_fwd': result_package.get('max_gm_fwd'), 
                 'Vg_at_max_gm_fwd': result_package.get('Vg_at_max_gm_fwd'),
                 'Ion_fwd': result_package.get('Ion_fwd'), 
                 'Ioff_fwd': result_package.get('Ioff_fwd'),
-                'Ion_Ioff_ratio_fwd': result_package.get('Ion_Ioff_ratio_fwd')
+                'Ion_Ioff_ratio_fwd': result_package.get('Ion_Ioff_ratio_fwd'),
+                'Delta_Vth': result_package.get('Delta_Vth'),
+                'Hysteresis_Loop_Area': result_package.get('Hysteresis_Loop_Area')
             }
             self._update_live_plot_params_display(gt_params_to_display)
             result_package['live_plot_type'] = self.gt_live_plot_type.get()
             plot_function_generate = gate_transfer_module.generate_gate_transfer_plot
         else: # For other measurement types
             self.gt_plot_controls_frame.grid_remove() # Hide GT plot type controls
-            self._update_live_plot_params_display(None) # Clear or hide params display
+            if "Output Characteristics" == measurement_name:
+                # Parameters of the curve at the largest |Vg|
+                oc_params_to_display = {key: result_package.get(key) for key, _ in OC_PARAM_DISPLAY_ORDER}
+                self._update_live_plot_params_display(oc_params_to_display, OC_PARAM_DISPLAY_ORDER)
+            elif "Breakdown Characteristics" == measurement_name:
+                bd_params_to_display = {key: result_package.get(key) for key, _ in BD_PARAM_DISPLAY_ORDER}
+                self._update_live_plot_params_display(bd_params_to_display, BD_PARAM_DISPLAY_ORDER)
+            elif "Diode Characterization" == measurement_name:
+                diode_params_to_display = {key: result_package.get(key) for key, _ in DIODE_PARAM_DISPLAY_ORDER}
+                self._update_live_plot_params_display(diode_params_to_display, DIODE_PARAM_DISPLAY_ORDER)
+            else:
+                self._update_live_plot_params_display(None) # Clear or hide params display
             if "Output Characteristics" == measurement_name: plot_function_generate = output_module.generate_output_plot
             elif "Breakdown Characteristics" == measurement_name: plot_function_generate = breakdown_module.generate_breakdown_plot
             elif "Diode Characterization" == measurement_name: plot_function_generate = diode_module.generate_diode_plot
@@ -145,11 +177,14 @@ class LivePlotHandler:
             gt_params_to_display = {
                 'Vth_fwd_calc': package_for_replot.get('Vth_fwd_calc'), 
                 'min_ss_fwd_calc': package_for_replot.get('min_ss_fwd_calc'),
+                'SS_avg_fwd': package_for_replot.get('SS_avg_fwd'),
                 'max_gm_fwd': package_for_replot.get('max_gm_fwd'), 
                 'Vg_at_max_gm_fwd': package_for_replot.get('Vg_at_max_gm_fwd'),
                 'Ion_fwd': package_for_replot.get('Ion_fwd'), 
                 'Ioff_fwd': package_for_replot.get('Ioff_fwd'),
-                'Ion_Ioff_ratio_fwd': package_for_replot.get('Ion_Ioff_ratio_fwd')
+                'Ion_Ioff_ratio_fwd': package_for_replot.get('Ion_Ioff_ratio_fwd'),
+                'Delta_Vth': package_for_replot.get('Delta_Vth'),
+                'Hysteresis_Loop_Area': package_for_replot.get('Hysteresis_Loop_Area')
             }
             self._update_live_plot_params_display(gt_params_to_display)
 
@@ -198,18 +233,14 @@ class LivePlotHandler:
             except Exception as e_draw: print(f"Error during draw_idle in clear_live_plot_area: {e_draw}", file=sys.stderr)
         self._update_live_plot_params_display(None) # Clear params display when plot is cleared
 
-    def _update_live_plot_params_display(self, params_dict=None):
+    def _update_live_plot_params_display(self, params_dict=None, param_display_order=None):
         for widget in self.live_params_display_frame.winfo_children(): widget.destroy()
         if not params_dict:
             self.live_params_display_frame.grid_remove()
             return
         self.live_params_display_frame.grid()
-        # param_display_order without mobility
-        param_display_order = [
-            ('Vth_fwd_calc', 'V_th (V)'), ('min_ss_fwd_calc', 'SS_min (mV/dec)'),
-            ('max_gm_fwd', 'g_m_max (S)'), ('Vg_at_max_gm_fwd', 'Vg @ g_m_max (V)'),
-            ('Ion_fwd', 'I_on (A)'), ('Ioff_fwd', 'I_off (A)'), ('Ion_Ioff_ratio_fwd', 'I_on/I_off')
-        ]
+        if param_display_order is None:
+            param_display_order = GT_PARAM_DISPLAY_ORDER
         row_idx, col_idx, max_cols = 0, 0, 2 # Adjusted max_cols for fewer params
         for key, display_name in param_display_order:
             value = params_dict.get(key)
@@ -21,6 +21,7 @@ import breakdown_module
 import diode_module
 import stress_module 
 import config_settings
+import parameter_extraction
 
 class MeasurementApp:
     # CONFIG_FILE_NAME = "gui_layout_config.json" # Removed for sash persistence rollback
@@ -39,6 +40,8 @@ class MeasurementApp:
         self.device_type = tk.StringVar(value="lateral")
         self.channel_width_um = tk.StringVar(value=config_settings.DEVICE_DEFAULT_CHANNEL_WIDTH_UM)
         self.area_um2 = tk.StringVar(value=config_settings.DEVICE_DEFAULT_AREA_UM2)
+        self.trigger_model_sweeps = tk.BooleanVar(value=config_settings.TRIGGER_MODEL_SWEEPS_ENABLED)
+        self.campaign_budget_hours = tk.StringVar(value=config_settings.CAMPAIGN_DEFAULT_BUDGET_HOURS)
 
         # --- Auto Device ID StringVars ---
         self.project_prefix = tk.StringVar(value="MyChip")
@@ -70,7 +73,21 @@ class MeasurementApp:
             ("Vg 终止 (V):", "Vg_stop", config_settings.GT_DEFAULT_VG_STOP),
             ("Vg 步进 (V):", "step", config_settings.GT_DEFAULT_VG_STEP),
             ("Vd (V):", "Vd", config_settings.GT_DEFAULT_VD),
-            ("稳定延时 (s):", "settling_delay", config_settings.GT_DEFAULT_SETTLING_DELAY)
+            ("稳定延时 (s):", "settling_delay", config_settings.GT_DEFAULT_SETTLING_DELAY),
+            ("粗扫步进 (V):", "adaptive_coarse_step", config_settings.GT_DEFAULT_ADAPTIVE_COARSE_STEP),
+            ("细化阈值 (dec/V):", "adaptive_refine_threshold", config_settings.GT_DEFAULT_ADAPTIVE_REFINE_THRESHOLD),
+            ("快速NPLC (大电流):", "sched_nplc_fast", config_settings.GT_DEFAULT_SCHED_NPLC_FAST),
+            ("慢速区电流上限 (A):", "sched_i_low", config_settings.GT_DEFAULT_SCHED_I_LOW),
+            ("快速区电流下限 (A):", "sched_i_high", config_settings.GT_DEFAULT_SCHED_I_HIGH),
+            ("Vth 平滑窗口 (点, 0=关):", "vth_smooth_window", config_settings.GT_DEFAULT_VTH_SMOOTH_WINDOW),
+            ("恒流Vth判据 (A):", "vth_cc_current", config_settings.GT_DEFAULT_VTH_CC_CURRENT),
+            ("SS 拟合窗口 (点):", "ss_window", config_settings.GT_DEFAULT_SS_WINDOW),
+            ("脉冲宽度 (s):", "pulse_width", config_settings.PULSE_DEFAULT_WIDTH),
+            ("占空比:", "duty_cycle", config_settings.PULSE_DEFAULT_DUTY_CYCLE),
+            ("脉冲内NPLC:", "pulse_nplc", config_settings.PULSE_DEFAULT_NPLC),
+            ("每脉冲采样数:", "pulse_samples", config_settings.PULSE_DEFAULT_SAMPLES),
+            ("测量延时 (s):", "pulse_meas_delay", config_settings.PULSE_DEFAULT_MEAS_DELAY),
+            ("脉冲基准电平 (V):", "pulse_base", config_settings.PULSE_DEFAULT_BASE)
         ]
         self.oc_fields_structure = [
             ("漏极电流限制 (A):", "IlimitDrain", config_settings.OC_DEFAULT_ILIMIT_DRAIN),
@@ -83,7 +100,14 @@ class MeasurementApp:
             ("Vd 起始 (V):", "Vd_start", config_settings.OC_DEFAULT_VD_START),
             ("Vd 终止 (V):", "Vd_stop", config_settings.OC_DEFAULT_VD_STOP),
             ("Vd 步进 (V):", "Vd_step", config_settings.OC_DEFAULT_VD_STEP),
-            ("稳定延时 (s):", "settling_delay", config_settings.OC_DEFAULT_SETTLING_DELAY)
+            ("稳定延时 (s):", "settling_delay", config_settings.OC_DEFAULT_SETTLING_DELAY),
+            ("功率限制 (W):", "power_limit", config_settings.OC_DEFAULT_POWER_LIMIT),
+            ("脉冲宽度 (s):", "pulse_width", config_settings.PULSE_DEFAULT_WIDTH),
+            ("占空比:", "duty_cycle", config_settings.PULSE_DEFAULT_DUTY_CYCLE),
+            ("脉冲内NPLC:", "pulse_nplc", config_settings.PULSE_DEFAULT_NPLC),
+            ("每脉冲采样数:", "pulse_samples", config_settings.PULSE_DEFAULT_SAMPLES),
+            ("测量延时 (s):", "pulse_meas_delay", config_settings.PULSE_DEFAULT_MEAS_DELAY),
+            ("脉冲基准电平 (V):", "pulse_base", config_settings.PULSE_DEFAULT_BASE)
         ]
         self.bd_fields_structure = [
             ("漏极电流限制 (A):", "IlimitDrain", config_settings.BD_DEFAULT_ILIMIT_DRAIN),
@@ -94,7 +118,8 @@ class MeasurementApp:
             ("Vd 起始 (V):", "Vd_start", config_settings.BD_DEFAULT_VD_START),
             ("Vd 终止 (V):", "Vd_stop", config_settings.BD_DEFAULT_VD_STOP),
             ("Vd 步进 (V):", "Vd_step", config_settings.BD_DEFAULT_VD_STEP),
-            ("稳定延时 (s):", "settling_delay", config_settings.BD_DEFAULT_SETTLING_DELAY)
+            ("稳定延时 (s):", "settling_delay", config_settings.BD_DEFAULT_SETTLING_DELAY),
+            ("BV 判据 (Jd 单位):", "bv_criterion", config_settings.BD_DEFAULT_BV_CRITERION)
         ]
         self.diode_fields_structure = [
             ("阳极电流限制 (A):", "IlimitAnode", config_settings.DIODE_DEFAULT_ILIMIT_ANODE),
@@ -104,7 +129,9 @@ class MeasurementApp:
             ("阳极起始电压 (V):", "Vanode_start", config_settings.DIODE_DEFAULT_VANODE_START),
             ("阳极终止电压 (V):", "Vanode_stop", config_settings.DIODE_DEFAULT_VANODE_STOP),
             ("阳极电压步进 (V):", "Vanode_step", config_settings.DIODE_DEFAULT_VANODE_STEP),
-            ("稳定延时 (s):", "settling_delay", config_settings.DIODE_DEFAULT_SETTLING_DELAY)
+            ("稳定延时 (s):", "settling_delay", config_settings.DIODE_DEFAULT_SETTLING_DELAY),
+            ("开启判据 (J 单位):", "turn_on_j", config_settings.DIODE_DEFAULT_TURN_ON_J),
+            ("反向漏电读取电压 (V):", "reverse_v", config_settings.DIODE_DEFAULT_REVERSE_V)
         ]
         self.stress_fields_structure = [
             ("漏极应力电压 (V):", "VD_stress_val", config_settings.STRESS_DEFAULT_VD_STRESS),
@@ -119,6 +146,9 @@ class MeasurementApp:
             ("漏极NPLC:", "Drain_nplc_stress", config_settings.STRESS_DEFAULT_DRAIN_NPLC),
             ("栅极NPLC:", "Gate_nplc_stress", config_settings.STRESS_DEFAULT_GATE_NPLC),
             ("源极NPLC:", "Source_nplc_stress", config_settings.STRESS_DEFAULT_SOURCE_NPLC),
+            ("对数采样首点 (s):", "log_first_point", config_settings.STRESS_LOG_DEFAULT_FIRST_POINT),
+            ("每十倍频点数:", "log_points_per_decade", config_settings.STRESS_LOG_DEFAULT_POINTS_PER_DECADE),
+            ("失效判据 |ΔId/Id0| (%):", "failure_percent", config_settings.STRESS_DEFAULT_FAILURE_PERCENT),
         ]
 
         self.gt_params_vars = {}
@@ -128,6 +158,14 @@ class MeasurementApp:
         self.stress_params_vars = {}
 
         self.gt_enable_backward = tk.BooleanVar(value=True)
+        self.gt_adaptive_sweep = tk.BooleanVar(value=False)
+        self.gt_range_schedule = tk.BooleanVar(value=False)
+        self.gt_pulsed_mode = tk.BooleanVar(value=False)
+        self.gt_vth_method = tk.StringVar(value=config_settings.GT_DEFAULT_VTH_METHOD)
+        self.oc_pulsed_mode = tk.BooleanVar(value=False)
+        self.oc_early_stop = tk.BooleanVar(value=False)
+        self.stress_log_sampling = tk.BooleanVar(value=False)
+        self.stress_chunked_logging = tk.BooleanVar(value=False)
         self.diode_enable_backward = tk.BooleanVar(value=True)
         
         self.post_stress_char_method = tk.StringVar(value="栅转移特性 (Gate Transfer)")
@@ -244,6 +282,8 @@ class MeasurementApp:
         self.entry_file_name_base = ttk.Entry(file_frame, textvariable=self.file_name_base) 
         self.entry_file_name_base.grid(row=0, column=1, sticky=tk.EW, padx=5)
 
+        ttk.Checkbutton(self.common_settings_frame, text="硬件触发模型扫描 (Trigger-Model Sweeps: GT / Output / BV)", variable=self.trigger_model_sweeps).pack(anchor=tk.W, padx=5, pady=(0,2))
+
         # --- Device Parameters ---
         device_frame = ttk.LabelFrame(self.common_settings_frame, text="器件参数 (Device Parameters - for Current Density)")
         device_frame.pack(fill=tk.X, expand=True, padx=5, pady=(8,4), ipady=5)
@@ -510,21 +550,40 @@ class MeasurementApp:
         measurement_settings_gt = [f for f in self.gt_fields_structure if f[1] in ["IlimitDrain", "IlimitGate", "Drain_nplc", "Gate_nplc", "settling_delay"]]
         vg_settings_gt = [f for f in self.gt_fields_structure if f[1] in ["Vg_start", "Vg_stop", "step"]]
         vd_settings_gt = [f for f in self.gt_fields_structure if f[1] == "Vd"]
+        adaptive_settings_gt = [f for f in self.gt_fields_structure if f[1] in ["adaptive_coarse_step", "adaptive_refine_threshold"]]
+        schedule_settings_gt = [f for f in self.gt_fields_structure if f[1].startswith("sched_")]
+        pulse_settings_gt = [f for f in self.gt_fields_structure if f[1].startswith("pulse_") or f[1] == "duty_cycle"]
+        extraction_settings_gt = [f for f in self.gt_fields_structure if f[1].startswith("vth_") or f[1] == "ss_window"]
         gui_utils.create_param_frame(self, frame_gt, "基本测量设置", measurement_settings_gt, self.gt_params_vars)
         gui_utils.create_param_frame(self, frame_gt, "Vg 扫描设置", vg_settings_gt, self.gt_params_vars, context_keys={'start':'Vg_start', 'stop':'Vg_stop', 'step':'step'})
         gui_utils.create_param_frame(self, frame_gt, "Vd 固定偏置", vd_settings_gt, self.gt_params_vars, columns=1)
+        gui_utils.create_param_frame(self, frame_gt, "自适应扫描设置", adaptive_settings_gt, self.gt_params_vars)
+        gui_utils.create_param_frame(self, frame_gt, "量程/NPLC 调度设置", schedule_settings_gt, self.gt_params_vars, columns=1)
+        gui_utils.create_param_frame(self, frame_gt, "脉冲设置", pulse_settings_gt, self.gt_params_vars)
+        gui_utils.create_param_frame(self, frame_gt, "参数提取设置 (Vth / SS)", extraction_settings_gt, self.gt_params_vars)
+        vth_method_frame = ttk.Frame(frame_gt)
+        vth_method_frame.pack(anchor=tk.W, padx=self.style_config['padx']+5, pady=(5,0), fill=tk.X)
+        ttk.Label(vth_method_frame, text="Vth 提取方法:", font=self.style_config['font_label']).pack(side=tk.LEFT, padx=(0,5))
+        ttk.Combobox(vth_method_frame, textvariable=self.gt_vth_method, values=list(parameter_extraction.VTH_METHODS), state="readonly", width=20).pack(side=tk.LEFT)
         ttk.Checkbutton(frame_gt, text="启用反向扫描 (Enable Backward Sweep)", variable=self.gt_enable_backward).pack(anchor=tk.W, padx=self.style_config['padx']+5, pady=(5,0), fill=tk.X)
+        ttk.Checkbutton(frame_gt, text="自适应扫描 (Adaptive Sweep: 粗扫 + 阈值附近细化)", variable=self.gt_adaptive_sweep).pack(anchor=tk.W, padx=self.style_config['padx']+5, pady=(2,0), fill=tk.X)
+        ttk.Checkbutton(frame_gt, text="量程/NPLC 逐点调度 (Range/NPLC Schedule: 大电流快速, 噪声底慢速)", variable=self.gt_range_schedule).pack(anchor=tk.W, padx=self.style_config['padx']+5, pady=(2,0), fill=tk.X)
+        ttk.Checkbutton(frame_gt, text="脉冲模式 (Pulsed I-V: 栅极脉冲)", variable=self.gt_pulsed_mode).pack(anchor=tk.W, padx=self.style_config['padx']+5, pady=(2,0), fill=tk.X)
         gui_utils.add_reset_button_to_tab(self, frame_gt, self.gt_params_vars, self.gt_fields_structure, "栅转移特性")
 
         # Output Characteristics Tab
         frame_oc = self.output_char_tab
         ttk.Label(frame_oc, text="输出特性参数", font=self.style_config['font_title']).pack(anchor=tk.W, pady=(8,2), fill=tk.X, padx=self.style_config['padx']-2)
-        measurement_settings_oc = [f for f in self.oc_fields_structure if f[1] in ["IlimitDrain", "IlimitGate", "Drain_nplc", "Gate_nplc", "settling_delay"]]
+        measurement_settings_oc = [f for f in self.oc_fields_structure if f[1] in ["IlimitDrain", "IlimitGate", "Drain_nplc", "Gate_nplc", "settling_delay", "power_limit"]]
         vg_settings_oc = [f for f in self.oc_fields_structure if f[1] in ["Vg_start", "Vg_stop", "Vg_step"]]
         vd_settings_oc = [f for f in self.oc_fields_structure if f[1] in ["Vd_start", "Vd_stop", "Vd_step"]]
+        pulse_settings_oc = [f for f in self.oc_fields_structure if f[1].startswith("pulse_") or f[1] == "duty_cycle"]
         gui_utils.create_param_frame(self, frame_oc, "基本测量设置", measurement_settings_oc, self.oc_params_vars)
         gui_utils.create_param_frame(self, frame_oc, "Vg 扫描设置", vg_settings_oc, self.oc_params_vars, context_keys={'start':'Vg_start', 'stop':'Vg_stop', 'step':'Vg_step'})
         gui_utils.create_param_frame(self, frame_oc, "Vd 扫描设置", vd_settings_oc, self.oc_params_vars, context_keys={'start':'Vd_start', 'stop':'Vd_stop', 'step':'Vd_step'})
+        gui_utils.create_param_frame(self, frame_oc, "脉冲设置", pulse_settings_oc, self.oc_params_vars)
+        ttk.Checkbutton(frame_oc, text="脉冲模式 (Pulsed I-V: 漏极脉冲)", variable=self.oc_pulsed_mode).pack(anchor=tk.W, padx=self.style_config['padx']+5, pady=(5,0), fill=tk.X)
+        ttk.Checkbutton(frame_oc, text="提前终止 (Early Stop: 限流或超过功率限制即结束当前 Vg 曲线)", variable=self.oc_early_stop).pack(anchor=tk.W, padx=self.style_config['padx']+5, pady=(2,0), fill=tk.X)
         gui_utils.add_reset_button_to_tab(self, frame_oc, self.oc_params_vars, self.oc_fields_structure, "输出特性")
 
         # Stress Test Tab
@@ -532,10 +591,16 @@ class MeasurementApp:
         ttk.Label(frame_st, text="应力测试参数", font=self.style_config['font_title']).pack(anchor=tk.W, pady=(8,2), fill=tk.X, padx=self.style_config['padx']-2)
         stress_voltage_fields = [f for f in self.stress_fields_structure if f[1] in ["VD_stress_val", "VG_stress_val", "VS_stress_val"]]
         stress_time_fields = [f for f in self.stress_fields_structure if f[1] in ["stress_duration_val", "stress_measure_interval_val", "initial_settling_delay_stress"]]
-        stress_limit_nplc_fields = [f for f in self.stress_fields_structure if f[1] not in ["VD_stress_val", "VG_stress_val", "VS_stress_val", "stress_duration_val", "stress_measure_interval_val", "initial_settling_delay_stress"]]
+        stress_log_fields = [f for f in self.stress_fields_structure if f[1] in ["log_first_point", "log_points_per_decade"]]
+        stress_kinetics_fields = [f for f in self.stress_fields_structure if f[1] in ["failure_percent"]]
+        stress_limit_nplc_fields = [f for f in self.stress_fields_structure if f[1] not in ["VD_stress_val", "VG_stress_val", "VS_stress_val", "stress_duration_val", "stress_measure_interval_val", "initial_settling_delay_stress", "log_first_point", "log_points_per_decade", "failure_percent"]]
         gui_utils.create_param_frame(self, frame_st, "应力电压设置", stress_voltage_fields, self.stress_params_vars, columns=1)
         gui_utils.create_param_frame(self, frame_st, "应力时间与延时设置", stress_time_fields, self.stress_params_vars, columns=1)
         gui_utils.create_param_frame(self, frame_st, "电流限制和NPLC设置", stress_limit_nplc_fields, self.stress_params_vars, columns=2)
+        gui_utils.create_param_frame(self, frame_st, "对数时间采样设置", stress_log_fields, self.stress_params_vars, columns=2)
+        gui_utils.create_param_frame(self, frame_st, "漂移动力学设置 (ΔId/Id0 幂律 / 拉伸指数拟合, 寿命外推)", stress_kinetics_fields, self.stress_params_vars)
+        ttk.Checkbutton(frame_st, text="对数时间采样 (Log-Time Sampling: 短时密集, 长时稀疏)", variable=self.stress_log_sampling).pack(anchor=tk.W, padx=self.style_config['padx']+5, pady=(5,0), fill=tk.X)
+        ttk.Checkbutton(frame_st, text="分块双缓冲记录 (Chunked Logging: 长时应力不受缓冲区容量限制)", variable=self.stress_chunked_logging).pack(anchor=tk.W, padx=self.style_config['padx']+5, pady=(2,0), fill=tk.X)
         post_stress_frame = ttk.LabelFrame(frame_st, text="应力后特性表征 (Post-Stress Characterization)", padding=(self.style_config['padx']-4, self.style_config['pady']-4))
         post_stress_frame.pack(fill=tk.X, expand=True, padx=self.style_config['padx']-2, pady=(10,2), ipady=5)
         ttk.Label(post_stress_frame, text="选择表征方法:", font=self.style_config['font_label']).pack(side=tk.LEFT, padx=(5,5), pady=5)
@@ -550,8 +615,10 @@ class MeasurementApp:
         ttk.Label(frame_bd, text="晶体管击穿参数", font=self.style_config['font_title']).pack(anchor=tk.W, pady=(8,2), fill=tk.X, padx=self.style_config['padx']-2)
         measurement_settings_bd = [f for f in self.bd_fields_structure if f[1] in ["IlimitDrain", "IlimitGate", "Drain_nplc", "Gate_nplc", "Vg", "settling_delay"]]
         vd_settings_bd = [f for f in self.bd_fields_structure if f[1] in ["Vd_start", "Vd_stop", "Vd_step"]]
+        extraction_settings_bd = [f for f in self.bd_fields_structure if f[1].startswith("bv_")]
         gui_utils.create_param_frame(self, frame_bd, "测量设置", measurement_settings_bd, self.bd_params_vars)
         gui_utils.create_param_frame(self, frame_bd, "Vd 扫描设置", vd_settings_bd, self.bd_params_vars, context_keys={'start':'Vd_start', 'stop':'Vd_stop', 'step':'Vd_step'})
+        gui_utils.create_param_frame(self, frame_bd, "参数提取设置 (BV; 未归一化时按 |Id| 判据)", extraction_settings_bd, self.bd_params_vars)
         gui_utils.add_reset_button_to_tab(self, frame_bd, self.bd_params_vars, self.bd_fields_structure, "晶体管击穿")
 
         # Diode Tab
@@ -559,8 +626,10 @@ class MeasurementApp:
         ttk.Label(frame_diode, text="二极管IV参数", font=self.style_config['font_title']).pack(anchor=tk.W, pady=(8,2), fill=tk.X, padx=self.style_config['padx']-2)
         measurement_settings_diode = [f for f in self.diode_fields_structure if f[1] in ["IlimitAnode", "IlimitCathode", "Anode_nplc", "Cathode_nplc", "settling_delay"]]
         vanode_settings_diode = [f for f in self.diode_fields_structure if f[1] in ["Vanode_start", "Vanode_stop", "Vanode_step"]]
+        extraction_settings_diode = [f for f in self.diode_fields_structure if f[1] in ["turn_on_j", "reverse_v"]]
         gui_utils.create_param_frame(self, frame_diode, "测量设置", measurement_settings_diode, self.diode_params_vars)
         gui_utils.create_param_frame(self, frame_diode, "阳极扫描设置", vanode_settings_diode, self.diode_params_vars, context_keys={'start':'Vanode_start', 'stop':'Vanode_stop', 'step':'Vanode_step'})
+        gui_utils.create_param_frame(self, frame_diode, "参数提取设置 (n / Is / Rs; 未归一化时按 |I| 判据)", extraction_settings_diode, self.diode_params_vars)
         ttk.Checkbutton(frame_diode, text="启用反向扫描 (Enable Backward Sweep)", variable=self.diode_enable_backward).pack(anchor=tk.W, padx=self.style_config['padx']+5, pady=(5,0), fill=tk.X)
         gui_utils.add_reset_button_to_tab(self, frame_diode, self.diode_params_vars, self.diode_fields_structure, "二极管IV")
 
@@ -576,6 +645,10 @@ class MeasurementApp:
         s.map('Exit.TButton', background=[('active', '#c82333'), ('pressed', '#bd2130')])
         self.run_button = ttk.Button(btn_container, text="▶ 运行 (Run)", command=lambda: self.measurement_handler.run_measurement(), style='Run.TButton', width=14 )
         self.run_button.pack(side=tk.LEFT, padx=20, ipady=4)
+        estimate_button = ttk.Button(btn_container, text="⏱ 估算 (Estimate)", command=lambda: self.measurement_handler.estimate_measurement(), width=16)
+        estimate_button.pack(side=tk.LEFT, padx=(0, 5), ipady=4)
+        ttk.Label(btn_container, text="预算 (h):").pack(side=tk.LEFT)
+        ttk.Entry(btn_container, textvariable=self.campaign_budget_hours, width=6).pack(side=tk.LEFT, padx=(2, 20))
         exit_button = ttk.Button(btn_container, text="退出 (Exit)", command=self._on_closing, style='Exit.TButton', width=14)
         exit_button.pack(side=tk.RIGHT, padx=20, ipady=4)
         self.status_bar_label = ttk.Label(self.bottom_frame, text="准备就绪 (Ready)", anchor=tk.W, relief=tk.SUNKEN, padding=(5,2))
@@ -5,13 +5,21 @@ from datetime import datetime
 import numpy as np
 import instrument_utils
 import config_settings 
+import tracing_utils
+from measurement_record import MeasurementRecord, SWEEP_LEG_POINTS_METADATA_KEY
+
+# Filled by _perform_common_data_processing for every measurement type
+_COMMON_DERIVED_COLUMNS = ('Is', 'Jd', 'Jg', 'Js', 'Time')
 
 class MeasurementBase(abc.ABC):
+    # Sweep scripts leave a status record (points per leg, compliance event); see query_sweep_status
+    reads_sweep_status = False
+
     def __init__(self, measurement_type_name_short, plot_file_suffix=".png"):
         self.measurement_type_name_short = measurement_type_name_short
         self.measurement_type_name_full = "" 
         self.plot_file_suffix = plot_file_suffix
-        self.processed_data = {}
+        self.processed_data = {} # MeasurementRecord once the buffers are read
         self.raw_data = {}
         self.consistent_len = 0
         self.buffer_read_count_final = 0
@@ -20,6 +28,11 @@ class MeasurementBase(abc.ABC):
         self.base_name_generated = ""
         self.jd_unit_plot = "A.U."
         self.timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.tracer = None
+        self.sweep_status = None # Dict from instrument_utils.query_sweep_status, None if the script left none
+        self.sweep_legs = None # measurement_record.SweepLegs for swept forward/backward measurements
+        self.expected_run_duration_s = None
+        self.script_run_duration_s = None
 
     def _generate_file_paths(self, config):
         output_dir = config['output_dir']
@@ -42,6 +55,9 @@ class MeasurementBase(abc.ABC):
     def _prepare_tsp_parameters(self, config):
         pass
 
+    def _use_trigger_model(self, config):
+        return bool(config.get(config_settings.CONFIG_KEY_TRIGGER_MODEL, config_settings.TRIGGER_MODEL_SWEEPS_ENABLED))
+
     def _load_and_run_tsp(self, inst, config, tsp_params):
         tsp_script_path_key = self._get_tsp_script_path_key(config)
         tsp_script_path = config.get(tsp_script_path_key)
@@ -49,11 +65,36 @@ class MeasurementBase(abc.ABC):
             raise FileNotFoundError(
                 f"TSP script path '{tsp_script_path}' for {self.measurement_type_name_full} is invalid or not found."
             )
+        if self.reads_sweep_status:
+            # Clear a record left by an earlier run so a custom script without one is not misread
+            instrument_utils.visa_write(inst, "sweep_leg_n = nil")
         if not instrument_utils.load_tsp_script(inst, tsp_script_path, tsp_params):
             raise RuntimeError(
                 f"Failed to load/run TSP script '{tsp_script_path}' for {self.measurement_type_name_full}."
             )
 
+    def _estimate_run_duration_s(self, config, tsp_params):
+        """Expected script run time (s) from the prepared parameters; None leaves the VISA timeout as the only limit."""
+        return None
+
+    def _get_expected_point_count(self, config):
+        """Planned data points (rows) for the prepared parameters."""
+        _, expected_points = self._get_primary_buffer_info(config)
+        return expected_points
+
+    @staticmethod
+    def _sweep_duration_s(points, settling_delay, nplcs):
+        # One settling delay plus the listed sequential integrations per point
+        integration_s = sum(float(n) for n in nplcs) / config_settings.LINE_FREQUENCY_HZ
+        return points * (float(settling_delay) + integration_s + config_settings.SCRIPT_POINT_OVERHEAD_S)
+
+    def _wait_for_script_completion(self, inst, config, tsp_params):
+        self.expected_run_duration_s = self._estimate_run_duration_s(config, tsp_params)
+        self.script_run_duration_s = instrument_utils.wait_for_script_completion(
+            inst, self.expected_run_duration_s, config.get(config_settings.CONFIG_KEY_PROGRESS_CALLBACK),
+            self.measurement_type_name_full
+        )
+
     @abc.abstractmethod
     def _get_primary_buffer_info(self, config):
         pass
@@ -64,36 +105,46 @@ class MeasurementBase(abc.ABC):
 
     def _query_and_read_buffers(self, inst, config):
         primary_buffer_obj_str, expected_total_points = self._get_primary_buffer_info(config)
-        self.buffer_read_count_final = instrument_utils.query_instrument_buffer_count(
-            inst, primary_buffer_obj_str, expected_total_points, self.measurement_type_name_full
-        )
+        with tracing_utils.span("query_buffer_count", "flow"):
+            self.buffer_read_count_final = instrument_utils.query_instrument_buffer_count(
+                inst, primary_buffer_obj_str, expected_total_points, self.measurement_type_name_full
+            )
         if self.buffer_read_count_final <= 0:
             print(f"  Warning ({self.measurement_type_name_full}): Final buffer read count is {self.buffer_read_count_final}. Data might be missing.")
         
         buffers_config = self._get_buffers_to_read_config(config, self.buffer_read_count_final)
-        self.raw_data, retrieved_counts = instrument_utils.read_instrument_buffers(
-            inst, buffers_config, default_read_count=self.buffer_read_count_final
-        )
+        with tracing_utils.span("read_buffers", "flow", buffers=len(buffers_config)):
+            self.raw_data, retrieved_counts = instrument_utils.read_instrument_buffers(
+                inst, buffers_config, default_read_count=self.buffer_read_count_final
+            )
         priority_keys_for_len = self._get_priority_keys_for_consistent_length()
-        self.consistent_len = instrument_utils.determine_consistent_length(
-            self.raw_data, priority_keys=priority_keys_for_len, retrieved_counts=retrieved_counts
-        )
+        with tracing_utils.span("determine_consistent_length", "flow"):
+            self.consistent_len = instrument_utils.determine_consistent_length(
+                self.raw_data, priority_keys=priority_keys_for_len, retrieved_counts=retrieved_counts
+            )
+        if self.reads_sweep_status:
+            with tracing_utils.span("query_sweep_status", "flow"):
+                self.sweep_status = instrument_utils.query_sweep_status(inst)
 
     def _get_priority_keys_for_consistent_length(self):
         return None
 
+    def _get_record_columns(self, config):
+        """Column layout of the run's MeasurementRecord: CSV columns first, so saving needs no restacking."""
+        header_cols, _ = self._get_csv_header_info(config)
+        return list(header_cols) + list(self._get_buffers_to_read_config(config, 0)) + list(_COMMON_DERIVED_COLUMNS)
+
     def _perform_common_data_processing(self, config):
         if self.consistent_len == 0 and self.buffer_read_count_final <= 0:
-            temp_buffers_config = self._get_buffers_to_read_config(config, 0)
-            self.processed_data = {key: np.array([]) for key in temp_buffers_config.keys()}
-            common_calc_keys = ['Is', 'Jd', 'Jg', 'Js', 'Time', 'Vg_actual_for_data']
-            for k in common_calc_keys:
-                if k not in self.processed_data:
-                    self.processed_data[k] = np.array([])
+            self.processed_data = MeasurementRecord(0, self._get_record_columns(config))
             return
 
-        self.processed_data = instrument_utils.normalize_data_arrays(self.raw_data, self.consistent_len)
-        self.processed_data = instrument_utils.calculate_source_current(self.processed_data)
+        # The one allocation for the run's data: buffers are copied in, derived columns are computed in place
+        with tracing_utils.span("build_record", "processing", points=self.consistent_len) as span_args:
+            self.processed_data = MeasurementRecord.from_buffers(self.raw_data, self.consistent_len, self._get_record_columns(config))
+            span_args["bytes"] = self.processed_data.nbytes
+        with tracing_utils.span("calculate_source_current", "processing"):
+            self.processed_data = instrument_utils.calculate_source_current(self.processed_data)
 
         # Correctly prepare device_details for calculate_current_densities
         device_details_for_calc = {
@@ -101,16 +152,11 @@ class MeasurementBase(abc.ABC):
             'channel_width': config.get('channel_width_um', 0.0), # Use key 'channel_width_um' from config
             'area': config.get('area_um2', 0.0)                 # Use key 'area_um2' from config
         }
-        self.processed_data, self.jd_unit_plot = instrument_utils.calculate_current_densities(
-            self.processed_data, device_details_for_calc
-        )
-        
-        # Ensure 'Time' key exists in processed_data, even if all NaNs
-        if 'Time' not in self.processed_data:
-            if self.consistent_len > 0:
-                self.processed_data['Time'] = np.full(self.consistent_len, np.nan)
-            else:
-                self.processed_data['Time'] = np.array([])
+        with tracing_utils.span("calculate_current_densities", "processing"):
+            self.processed_data, self.jd_unit_plot = instrument_utils.calculate_current_densities(
+                self.processed_data, device_details_for_calc
+            )
+        # 'Time' is a planned column (all NaN until a module fills it from its timestamps)
 
 
     @abc.abstractmethod
@@ -131,17 +177,49 @@ class MeasurementBase(abc.ABC):
         comments += f"# Output File (CSV): {os.path.basename(self.csv_file_path)}\n"
         comments += f"# Output File (PNG): {os.path.basename(self.png_file_path)}\n"
         comments += f"# JD Unit Plot: {self.jd_unit_plot}\n"
+        if self.script_run_duration_s is not None:
+            expected_info = f" (expected {self.expected_run_duration_s:.1f})" if self.expected_run_duration_s is not None else ""
+            comments += f"# Script Run Time (s): {self.script_run_duration_s:.1f}{expected_info}\n"
         return comments
 
     @abc.abstractmethod
     def _get_specific_metadata_comments(self, config):
         pass
 
+    def _get_smu_role_names(self):
+        return {"smua": "Drain", "node[2].smua": "Gate", "node[2].smub": "Source"}
+
+    def _get_sweep_status_metadata_comments(self, config):
+        if self.sweep_status is None:
+            return ""
+        status = self.sweep_status
+        comments = f"# {SWEEP_LEG_POINTS_METADATA_KEY}: {','.join(str(n) for n in status['leg_points'])}\n"
+        if status['compliance']:
+            smu = status['compliance_smu']
+            role = self._get_smu_role_names().get(smu, smu)
+            comments += f"# Compliance Reached: Yes ({role}, {smu}) at point {status['compliance_index']}\n"
+        else:
+            comments += "# Compliance Reached: No\n"
+        return comments
+
+    def _get_timing_metadata_comments(self, config):
+        # Steps finished before the CSV is written (the save and plot spans go to the JSONL trace only)
+        if self.tracer is None or not config.get(config_settings.CONFIG_KEY_TRACE_CSV_METADATA, config_settings.TRACE_CSV_METADATA):
+            return ""
+        return self.tracer.metadata_comments()
+
+    def _get_trace_jsonl_path(self, config):
+        if not config.get(config_settings.CONFIG_KEY_TRACE_JSONL, config_settings.TRACE_JSONL_ENABLED):
+            return None
+        return os.path.splitext(self.csv_file_path)[0] + config_settings.TRACE_JSONL_SUFFIX
+
     def _save_to_csv(self, config):
         header_cols, header_str = self._get_csv_header_info(config)
         base_comments = self._get_base_metadata_comments(config)
         specific_comments = self._get_specific_metadata_comments(config)
-        full_comments = base_comments + specific_comments
+        leg_comments = self.sweep_legs.metadata_comment() if self.sweep_legs is not None else ""
+        full_comments = (base_comments + specific_comments + self._get_sweep_status_metadata_comments(config)
+                         + leg_comments + self._get_timing_metadata_comments(config))
         if not instrument_utils.save_data_to_csv(
                 self.csv_file_path, self.processed_data, header_cols, header_str, comments=full_comments.strip()
         ):
@@ -153,10 +231,25 @@ class MeasurementBase(abc.ABC):
 
     def perform_measurement_flow(self, config, inst):
         self.measurement_type_name_full = config.get("measurement_type_name", f"Unknown ({self.measurement_type_name_short})")
-        self._generate_file_paths(config)
+        self.tracer = tracing_utils.Tracer(self.measurement_type_name_full)
+        with tracing_utils.activate(self.tracer):
+            with self.tracer.span("measurement_flow", "flow", measurement=self.measurement_type_name_short):
+                plot_data_package = self._run_traced_flow_steps(config, inst)
+            self.tracer.flush_counters()
+        plot_data_package["tracer"] = self.tracer
+        plot_data_package["trace_summary"] = self.tracer.summary()
+        return plot_data_package
+
+    def _run_traced_flow_steps(self, config, inst):
+        tracer = self.tracer
+        with tracer.span("generate_file_paths", "flow"):
+            self._generate_file_paths(config)
         config['csv_file_path_generated'] = self.csv_file_path
         config['png_file_path_generated'] = self.png_file_path
         config['base_name_generated'] = self.base_name_generated
+        trace_jsonl_path = self._get_trace_jsonl_path(config)
+        if trace_jsonl_path:
+            tracer.attach_jsonl(trace_jsonl_path)
 
         tsp_script_path_key = self._get_tsp_script_path_key(config)
         default_tsp_path = self._get_default_tsp_script_path(config)
@@ -165,25 +258,25 @@ class MeasurementBase(abc.ABC):
             raise FileNotFoundError(f"TSP script not found at {final_tsp_script_path} for {self.measurement_type_name_full}")
         config[tsp_script_path_key] = final_tsp_script_path
 
-        tsp_params = self._prepare_tsp_parameters(config)
-        self._load_and_run_tsp(inst, config, tsp_params)
-        self._query_and_read_buffers(inst, config)
+        with tracer.span("prepare_tsp_parameters", "flow"):
+            tsp_params = self._prepare_tsp_parameters(config)
+        with tracer.span("load_and_run_tsp", "flow", script=os.path.basename(final_tsp_script_path)):
+            self._load_and_run_tsp(inst, config, tsp_params)
+        self._wait_for_script_completion(inst, config, tsp_params)
+        with tracer.span("query_and_read_buffers", "flow"):
+            self._query_and_read_buffers(inst, config)
 
         if self.consistent_len == 0:
             print(f"  Warning/Info ({self.measurement_type_name_full}): Consistent data length is 0. "
                   f"Buffer reported {self.buffer_read_count_final} points. "
                   "Processed data will be initialized as empty or with NaNs.")
-            # Initialize processed_data with empty arrays for expected keys if consistent_len is 0
-            # This helps prevent KeyErrors in specific_data_processing if it expects certain keys.
-            temp_buffers_config = self._get_buffers_to_read_config(config, 0) # Get potential keys
-            self.processed_data = {key: np.array([]) for key in temp_buffers_config.keys()}
-            # Ensure other common keys that might be calculated or expected also exist
-            common_calc_keys = ['Is', 'Jd', 'Jg', 'Js', 'Time', 'Vg_actual_for_data', 'gm', 'SS']
-            for k in common_calc_keys:
-                 if k not in self.processed_data: self.processed_data[k] = np.array([])
         
-        self._perform_common_data_processing(config)
-        self._perform_specific_data_processing(config)
-        self._save_to_csv(config)
-        plot_data_package = self._prepare_plot_data_package(config)
-        return plot_data_package
\ No newline at end of file
+        with tracer.span("common_data_processing", "flow"):
+            self._perform_common_data_processing(config)
+        with tracer.span("specific_data_processing", "flow"):
+            self._perform_specific_data_processing(config)
+        with tracer.span("save_to_csv", "flow"):
+            self._save_to_csv(config)
+        with tracer.span("prepare_plot_data_package", "flow"):
+            plot_data_package = self._prepare_plot_data_package(config)
+        return plot_data_package
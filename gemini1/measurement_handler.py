@@ -7,16 +7,28 @@ import traceback
 import queue
 import sys
 import numpy as np
-from datetime import datetime # For timestamping post-stress files
 
 import gate_transfer_module
 import output_module
 import breakdown_module
 import diode_module
 import stress_module # New import
+import pulsed_iv_module
 import config_settings
 import gui_utils
 import instrument_utils
+import duration_estimator
+
+# Runner -> duration_estimator measurement kind, for the pre-run estimate
+_RUNNER_ESTIMATE_KINDS = {
+    gate_transfer_module.run_gate_transfer_measurement: "GateTransfer",
+    pulsed_iv_module.run_pulsed_gate_transfer_measurement: "PulsedGateTransfer",
+    output_module.run_output_measurement: "Output",
+    pulsed_iv_module.run_pulsed_output_measurement: "PulsedOutput",
+    breakdown_module.run_breakdown_measurement: "Breakdown",
+    diode_module.run_diode_measurement: "Diode",
+    stress_module.run_stress_measurement: "Stress",
+}
 
 class MeasurementHandler:
     def __init__(self, app_instance, live_plot_handler_instance):
@@ -39,6 +51,7 @@ class MeasurementHandler:
         config['file_name'] = file_name_base_val # This will be the base for all parts of the sequence
 
         config['device_type'] = self.app.device_type.get()
+        config[config_settings.CONFIG_KEY_TRIGGER_MODEL] = self.app.trigger_model_sweeps.get()
         try:
             raw_val_cw_um = self.app.channel_width_um.get().strip()
             raw_val_area_um2 = self.app.area_um2.get().strip()
@@ -90,6 +103,65 @@ class MeasurementHandler:
                 return False
         return True
 
+    def _make_progress_callback(self, measurement_display_name):
+        """Status bar progress while the TSP script runs (called from the worker thread)."""
+        def report_progress(percent, elapsed_s, expected_s):
+            gui_utils.set_status(self.app, f"正在运行 {measurement_display_name}... {percent:.0f}% "
+                                           f"(已用 {elapsed_s:.0f} s / 预计 {expected_s:.0f} s)")
+        return report_progress
+
+    def _make_kinetics_callback(self, measurement_display_name):
+        """Status bar drift kinetics after each streamed stress chunk (called from the worker thread)."""
+        def report_kinetics(kinetics):
+            status = f"正在运行 {measurement_display_name}... ΔId/Id0 = {kinetics['drift_last']:+.2%}"
+            if np.isfinite(kinetics['n']):
+                status += f", n = {kinetics['n']:.3f}"
+            if np.isfinite(kinetics['beta']):
+                status += f", τ = {kinetics['tau']:.3g} s, β = {kinetics['beta']:.3f}"
+            if np.isfinite(kinetics['life_power']):
+                status += f", 幂律寿命 {duration_estimator.format_duration(kinetics['life_power'])}"
+            gui_utils.set_status(self.app, status)
+        return report_kinetics
+
+    def _estimate_steps(self, measurement_runner_func, config_dict):
+        """duration_estimator results for what the Run button would start (one entry per stage)."""
+        if measurement_runner_func == self._run_stress_then_gate_transfer_sequence:
+            common = config_dict['common_params']
+            stages = [("Stress", {**common, **config_dict['stress_params']}),
+                      ("GateTransfer", {**common, **config_dict['gt_params']})]
+        else:
+            stages = [(_RUNNER_ESTIMATE_KINDS[measurement_runner_func], config_dict)]
+        calibration = duration_estimator.calibrate_from_directory(stages[0][1].get('output_dir'), [kind for kind, _ in stages])
+        return [duration_estimator.estimate_measurement(kind, cfg, calibration) for kind, cfg in stages]
+
+    def _show_duration_estimate(self, measurement_runner_func, config_dict, measurement_display_name):
+        try:
+            budget_hours = float(self.app.campaign_budget_hours.get().strip())
+            if budget_hours <= 0: raise ValueError
+        except ValueError:
+            messagebox.showerror("输入错误", "时间预算 (h) 必须为正数。")
+            return
+        try:
+            steps = self._estimate_steps(measurement_runner_func, config_dict)
+        except (ValueError, KeyError) as e:
+            messagebox.showerror("估算错误", f"无法估算 {measurement_display_name} 的时长: {e}")
+            return
+        plan = duration_estimator.plan_budget(steps, budget_hours)
+        lines = []
+        for step in steps:
+            calibrated = f"校准自 {step['calibration_runs']} 次记录" if step['calibration_runs'] else "未校准"
+            lines.append(f"{step['kind']}: {step['points']} 点, {duration_estimator.format_duration(step['total_s'])} "
+                         f"(脚本 {duration_estimator.format_duration(step['script_s'])}, {calibrated})")
+        lines.append("")
+        lines.append(f"每个器件: {duration_estimator.format_duration(plan['per_device_s'])}")
+        lines.append(f"预算 {budget_hours:g} h 内可测器件数: {plan['devices_within_budget']}")
+        messagebox.showinfo("时长估算 (Duration Estimate)", "\n".join(lines))
+        gui_utils.set_status(self.app, f"{measurement_display_name} 预计耗时 {duration_estimator.format_duration(plan['per_device_s'])}。")
+
+    def estimate_measurement(self):
+        """Validates the current tab like Run does and shows the expected duration instead of starting it."""
+        self.run_measurement(estimate_only=True)
+
     def _actual_measurement_task_decorated(self, measurement_runner_func, config_dict, measurement_name_override=None):
         """
         Wrapper to run a single measurement function (like run_gate_transfer_measurement).
@@ -102,6 +174,8 @@ class MeasurementHandler:
         # Ensure GPIB address and timeout are in the config for the runner function
         config_dict[config_settings.CONFIG_KEY_GPIB_ADDRESS] = config_dict.get(config_settings.CONFIG_KEY_GPIB_ADDRESS, config_settings.DEFAULT_GPIB_ADDRESS)
         config_dict[config_settings.CONFIG_KEY_TIMEOUT] = config_dict.get(config_settings.CONFIG_KEY_TIMEOUT, config_settings.DEFAULT_TIMEOUT)
+        config_dict[config_settings.CONFIG_KEY_PROGRESS_CALLBACK] = self._make_progress_callback(measurement_display_name)
+        config_dict[config_settings.CONFIG_KEY_STRESS_KINETICS_CALLBACK] = self._make_kinetics_callback(measurement_display_name)
 
         result_package = measurement_runner_func(config_dict) # This function now expects config with GPIB and timeout
         
@@ -121,7 +195,12 @@ class MeasurementHandler:
         common_config_for_sequence = combined_config['common_params']
         
         # --- Stage 1: Stress Measurement ---
-        gui_utils.set_status(self.app, f"正在运行应力阶段 (Running Stress Phase)... (1/2)")
+        try:
+            sequence_s = sum(step['total_s'] for step in self._estimate_steps(self._run_stress_then_gate_transfer_sequence, combined_config))
+            sequence_estimate = f" 序列预计 {duration_estimator.format_duration(sequence_s)}"
+        except (ValueError, KeyError):
+            sequence_estimate = ""
+        gui_utils.set_status(self.app, f"正在运行应力阶段 (Running Stress Phase)... (1/2){sequence_estimate}")
         self.app.root.update_idletasks()
 
         # Prepare full config for stress_module.run_stress_measurement
@@ -130,6 +209,8 @@ class MeasurementHandler:
         
         # Use a specific timeout for stress if defined, otherwise default
         current_stress_config[config_settings.CONFIG_KEY_TIMEOUT] = getattr(config_settings, 'STRESS_TIMEOUT', config_settings.DEFAULT_TIMEOUT)
+        current_stress_config[config_settings.CONFIG_KEY_PROGRESS_CALLBACK] = self._make_progress_callback("应力阶段 (1/2)")
+        current_stress_config[config_settings.CONFIG_KEY_STRESS_KINETICS_CALLBACK] = self._make_kinetics_callback("应力阶段 (1/2)")
 
         stress_result_package = stress_module.run_stress_measurement(current_stress_config)
         
@@ -150,9 +231,9 @@ class MeasurementHandler:
         # Use the base filename from common_config and append a suffix
         post_stress_file_name_base = common_config_for_sequence.get('file_name', "")
         if post_stress_file_name_base:
-            post_stress_file_name_base += "_post_stress_GT"
-        else: # If no base name, create one
-            post_stress_file_name_base = f"post_stress_GT_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            post_stress_file_name_base += config_settings.POST_STRESS_GT_SUFFIX
+        else: # If no base name, use the bare suffix; the GT file name carries the timestamp already
+            post_stress_file_name_base = config_settings.POST_STRESS_GT_SUFFIX.lstrip('_')
 
 
         current_gt_config = {
@@ -162,6 +243,7 @@ class MeasurementHandler:
         }
         current_gt_config["measurement_type_name"] = "应力后栅转移 (Post-Stress GT)" # Specific name
         current_gt_config[config_settings.CONFIG_KEY_TIMEOUT] = config_settings.DEFAULT_TIMEOUT # Standard timeout for GT
+        current_gt_config[config_settings.CONFIG_KEY_PROGRESS_CALLBACK] = self._make_progress_callback("应力后栅转移 (2/2)")
 
         gt_result_package = gate_transfer_module.run_gate_transfer_measurement(current_gt_config)
         
@@ -175,7 +257,7 @@ class MeasurementHandler:
         
         self.app.run_button.config(state=tk.NORMAL, text="▶ 运行 (Run)") # Re-enable run button at the end
 
-    def run_measurement(self):
+    def run_measurement(self, estimate_only=False):
         self.app.run_button.config(state=tk.DISABLED, text="运行中... (Running...)")
         gui_utils.set_status(self.app, "正在准备测量... (Preparing measurement...)")
         self.app.root.update_idletasks()
@@ -207,15 +289,23 @@ class MeasurementHandler:
             if measurement_name_context == "Gate Transfer":
                 if self._validate_specific_params(self.app.gt_params_vars, self.app.gt_fields_structure, current_config_dict, measurement_name_context):
                     current_config_dict['enable_backward'] = self.app.gt_enable_backward.get()
+                    current_config_dict['adaptive_sweep'] = self.app.gt_adaptive_sweep.get()
+                    current_config_dict['range_schedule'] = self.app.gt_range_schedule.get()
+                    current_config_dict['vth_method'] = self.app.gt_vth_method.get()
                     # ... (existing GT validation)
                     specific_validation_ok = True # Assume existing validation is fine
-                    if specific_validation_ok: measurement_runner_func = gate_transfer_module.run_gate_transfer_measurement
+                    if specific_validation_ok:
+                        measurement_runner_func = pulsed_iv_module.run_pulsed_gate_transfer_measurement if self.app.gt_pulsed_mode.get() \
+                            else gate_transfer_module.run_gate_transfer_measurement
             
             elif measurement_name_context == "Output Characteristics":
                 if self._validate_specific_params(self.app.oc_params_vars, self.app.oc_fields_structure, current_config_dict, measurement_name_context):
+                    current_config_dict['oc_early_stop'] = self.app.oc_early_stop.get()
                     # ... (existing OC validation)
                     specific_validation_ok = True # Assume existing validation is fine
-                    if specific_validation_ok: measurement_runner_func = output_module.run_output_measurement
+                    if specific_validation_ok:
+                        measurement_runner_func = pulsed_iv_module.run_pulsed_output_measurement if self.app.oc_pulsed_mode.get() \
+                            else output_module.run_output_measurement
 
             elif measurement_name_context == "Breakdown Characteristics":
                 if self._validate_specific_params(self.app.bd_params_vars, self.app.bd_fields_structure, current_config_dict, measurement_name_context):
@@ -233,6 +323,8 @@ class MeasurementHandler:
             elif measurement_name_context == "Stress Test": # New Handling for Stress Test Tab
                 stress_params_config = {} # For stress-specific GUI params
                 if self._validate_specific_params(self.app.stress_params_vars, self.app.stress_fields_structure, stress_params_config, "应力测试参数"):
+                    stress_params_config['stress_log_sampling'] = self.app.stress_log_sampling.get()
+                    stress_params_config['stress_chunked_logging'] = self.app.stress_chunked_logging.get()
                     post_char_method_selected = self.app.post_stress_char_method.get()
                     
                     if post_char_method_selected == "栅转移特性 (Gate Transfer)":
@@ -240,6 +332,9 @@ class MeasurementHandler:
                         # IMPORTANT: Collect GT params from the GT tab's current settings
                         if self._validate_specific_params(self.app.gt_params_vars, self.app.gt_fields_structure, gt_params_config, "应力后栅转移参数"):
                             gt_params_config['enable_backward'] = self.app.gt_enable_backward.get() # Get backward sweep setting for GT
+                            gt_params_config['adaptive_sweep'] = self.app.gt_adaptive_sweep.get()
+                            gt_params_config['range_schedule'] = self.app.gt_range_schedule.get()
+                            gt_params_config['vth_method'] = self.app.gt_vth_method.get()
                             # Add other GT specific validations if necessary here (like step vs start/stop)
                             vg_s, vg_e, vg_st_val = gt_params_config['Vg_start'], gt_params_config['Vg_stop'], gt_params_config['step']
                             if vg_s != vg_e and (vg_st_val == 0 or ((vg_e > vg_s and vg_st_val < 0) or (vg_e < vg_s and vg_st_val > 0))):
@@ -290,7 +385,10 @@ class MeasurementHandler:
             if not specific_validation_ok and measurement_name_context != "Stress Test": # Don't show generic fail if Stress Test had its own more specific messages
                 gui_utils.set_status(self.app, f"{measurement_name_context} 参数验证失败。(Parameter validation failed.)", error=True)
             
-            if specific_validation_ok and measurement_runner_func and current_config_dict:
+            if specific_validation_ok and measurement_runner_func and current_config_dict and estimate_only:
+                self._show_duration_estimate(measurement_runner_func, current_config_dict, measurement_name_context)
+                self.app.run_button.config(state=tk.NORMAL, text="▶ 运行 (Run)")
+            elif specific_validation_ok and measurement_runner_func and current_config_dict:
                 if measurement_name_context == "Stress Test" and measurement_runner_func == self._run_stress_then_gate_transfer_sequence:
                     gui_utils.set_status(self.app, f"正在开始应力然后栅转移序列...")
                     # For sequences, the runner itself handles status updates for each stage
@@ -0,0 +1,208 @@
+# measurement_record.py
+"""
+Per-run data store for MeasurementBase: one preallocated float64 block holding every column of a run
+(instrument buffers, derived source current and densities, analysis columns), addressed by name.
+
+Each named column is one contiguous row of the block, so a column is a plain 1-D view and a range of
+points (a sweep leg) is a view as well; nothing is copied to split a run. Columns are laid out in CSV
+order first, which lets the CSV writer hand a transposed view of the block to np.savetxt instead of
+stacking the columns again. The record behaves like the dict of arrays it replaces: reading a key
+returns the column view, assigning copies the values in (truncated or NaN-padded to the row count).
+Adding a column that was not planned grows the block, so column views should not be held across that.
+Deleting a column retires its slot; slots are never reused, so the other columns keep their rows.
+
+SweepLegs records where the legs of a swept record start and stop (and which way the swept voltage
+runs), and hands out each leg as a RecordRows view. Processing, plot packages, the CSV header and the
+history tab share it instead of each splitting the columns again.
+"""
+import collections
+import collections.abc
+import re
+
+import numpy as np
+
+# Free column slots allocated with the block, so a few unplanned columns do not move it
+SPARE_COLUMNS = 4
+
+SWEEP_LEG_ROWS_METADATA_KEY = "Sweep Leg Rows"
+SWEEP_LEG_POINTS_METADATA_KEY = "Sweep Legs (points, measured)" # Measured points per leg / output curve, comma-separated
+_LEG_ROWS_RE = re.compile(r"(\w+) (\d+):(\d+) \(([+-]1)\)")
+
+
+def _copy_into(column, values):
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 0:
+        column.fill(values)
+        return
+    n = min(values.size, column.size)
+    column[:n] = values[:n]
+    column[n:] = np.nan
+
+
+class MeasurementRecord(collections.abc.MutableMapping):
+    def __init__(self, n_points, columns=()):
+        self.n_points = int(n_points)
+        self._index = {name: i for i, name in enumerate(dict.fromkeys(columns))}
+        self._next_slot = len(self._index) # Only grows: deleted columns leave their slot behind
+        self._block = np.full((len(self._index) + SPARE_COLUMNS, self.n_points), np.nan)
+
+    @classmethod
+    def from_buffers(cls, buffers, n_points, columns=()):
+        """Record of n_points rows from a dict of buffer arrays (longer ones truncated, shorter ones NaN-padded)."""
+        record = cls(n_points, list(columns) + list(buffers))
+        for name, values in buffers.items():
+            if isinstance(values, np.ndarray):
+                _copy_into(record._block[record._index[name]], values)
+        return record
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Record sized to the longest array of a dict of columns (e.g. a CSV loaded back from disk)."""
+        n_points = max((len(v) for v in columns.values() if isinstance(v, np.ndarray) and v.ndim == 1), default=0)
+        return cls.from_buffers(columns, n_points)
+
+    @property
+    def nbytes(self):
+        return self._block.nbytes
+
+    def column(self, name):
+        """View of a column, added (all NaN) if the record does not have it yet."""
+        if name not in self._index:
+            if self._next_slot == self._block.shape[0]:
+                grown = np.full((self._block.shape[0] + SPARE_COLUMNS, self.n_points), np.nan)
+                grown[:self._block.shape[0]] = self._block
+                self._block = grown
+            self._index[name] = self._next_slot
+            self._next_slot += 1
+        return self._block[self._index[name]]
+
+    def rows(self, start, stop):
+        """Zero-copy view of the points start:stop (e.g. one sweep leg), with the same column names."""
+        return RecordRows(self, start, stop)
+
+    def table(self, column_keys):
+        """(n_points, len(column_keys)) array for writing; a view when the keys are the record's leading columns."""
+        indices = [self._index.get(key) for key in column_keys]
+        if indices == list(range(len(indices))):
+            return self._block[:len(indices)].T
+        table = np.full((self.n_points, len(column_keys)), np.nan)
+        for j, i in enumerate(indices):
+            if i is not None:
+                table[:, j] = self._block[i]
+        return table
+
+    def __getitem__(self, name):
+        return self._block[self._index[name]]
+
+    def __setitem__(self, name, values):
+        _copy_into(self.column(name), values)
+
+    def __delitem__(self, name):
+        # The slot is left unused; rows of later columns stay where views expect them
+        del self._index[name]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return f"MeasurementRecord({self.n_points} points, columns={list(self._index)})"
+
+
+class RecordRows(collections.abc.Mapping):
+    """A range of points of a MeasurementRecord; columns are views and assignments write through."""
+    def __init__(self, record, start, stop):
+        self.record = record
+        self.start = int(start)
+        self.stop = max(int(stop), self.start)
+        self.n_points = self.stop - self.start
+
+    def rows(self, start, stop):
+        return RecordRows(self.record, self.start + start, self.start + stop)
+
+    def __getitem__(self, name):
+        return self.record[name][self.start:self.stop]
+
+    def __setitem__(self, name, values):
+        _copy_into(self.record.column(name)[self.start:self.stop], values)
+
+    def __iter__(self):
+        return iter(self.record)
+
+    def __len__(self):
+        return len(self.record)
+
+    def __repr__(self):
+        return f"RecordRows({self.start}:{self.stop} of {self.record!r})"
+
+
+def sweep_leg_lengths(actual_len, enable_backward, num_points_fwd_expected=0, num_points_bwd_expected=None):
+    """(forward, backward) point counts of a swept record of actual_len points."""
+    if not enable_backward or actual_len == 0:
+        return actual_len, 0
+    # Exact leg lengths from the instrument: a leg cut short by compliance can be shorter than the other one
+    if num_points_bwd_expected is not None and num_points_fwd_expected + num_points_bwd_expected == actual_len:
+        return num_points_fwd_expected, num_points_bwd_expected
+    if num_points_fwd_expected > 0:
+        if actual_len >= num_points_fwd_expected:
+            return num_points_fwd_expected, min(num_points_fwd_expected, actual_len - num_points_fwd_expected)
+        return actual_len, 0
+    if actual_len % 2 == 0:
+        return actual_len // 2, actual_len // 2
+    return actual_len, 0
+
+
+# direction: +1 when the swept voltage increases along the leg, -1 when it decreases
+SweepLeg = collections.namedtuple("SweepLeg", "name start stop direction")
+
+
+class SweepLegs:
+    """Forward / backward leg boundaries of a swept record; legs are zero-copy RecordRows views."""
+    def __init__(self, record, legs):
+        self.record = record
+        self.legs = list(legs)
+
+    @classmethod
+    def split(cls, record, enable_backward, num_points_fwd_expected=0, num_points_bwd_expected=None, direction=1):
+        fwd_len, bwd_len = sweep_leg_lengths(record.n_points, enable_backward, num_points_fwd_expected, num_points_bwd_expected)
+        legs = [SweepLeg("forward", 0, fwd_len, direction)]
+        if bwd_len > 0:
+            legs.append(SweepLeg("backward", fwd_len, fwd_len + bwd_len, -direction))
+        return cls(record, legs)
+
+    @classmethod
+    def from_metadata(cls, record, leg_rows_text):
+        """Legs from a CSV '# Sweep Leg Rows' value; one forward leg over all rows if it is missing or does not fit."""
+        legs = [SweepLeg(name, int(start), int(stop), int(direction))
+                for name, start, stop, direction in _LEG_ROWS_RE.findall(leg_rows_text or "")]
+        if not legs or any(leg.stop > record.n_points for leg in legs):
+            legs = [SweepLeg("forward", 0, record.n_points, 1)]
+        return cls(record, legs)
+
+    def view(self, leg):
+        return self.record.rows(leg.start, leg.stop)
+
+    def _named(self, name):
+        for leg in self.legs:
+            if leg.name == name:
+                return self.view(leg)
+        return self.record.rows(self.record.n_points, self.record.n_points)
+
+    @property
+    def forward(self):
+        return self._named("forward")
+
+    @property
+    def backward(self):
+        """Backward leg view; zero rows when the sweep has none."""
+        return self._named("backward")
+
+    @property
+    def has_backward(self):
+        return any(leg.name == "backward" and leg.stop > leg.start for leg in self.legs)
+
+    def metadata_comment(self):
+        rows = ", ".join(f"{leg.name} {leg.start}:{leg.stop} ({leg.direction:+d})" for leg in self.legs)
+        return f"# {SWEEP_LEG_ROWS_METADATA_KEY}: {rows}\n"
@@ -10,19 +10,33 @@ import traceback
 import instrument_utils
 import config_settings
 from measurement_base import MeasurementBase
+import parameter_extraction
 import plotting_utils
 
+# (curve_params key, CSV metadata and batch summary label, format); metadata holds one comma-separated value per Vg curve
+CURVE_PARAM_LABELS = (("Ron", "Ron (Ohm)", ".4e"), ("Idsat", "Idsat (A)", ".4e"), ("V_knee", "V_knee (V)", ".3f"), ("gds", "gds (S)", ".4e"))
+
 class OutputMeasurement(MeasurementBase):
+    reads_sweep_status = True
+
     def __init__(self):
         super().__init__(measurement_type_name_short="Output", plot_file_suffix=".png")
         self.num_actual_vg_points = 0
         self.N_st_for_tsp = 0
         self.vd_voltage_step_for_tsp = 0
+        self.early_stop = False
+        self.curve_lengths = np.array([], dtype=int) # Points per Vg curve, from the sweep status record
+        self.curve_params = {} # 'Vg' and the CURVE_PARAM_LABELS keys, one array entry per Vg curve
 
     def _get_tsp_script_path_key(self, config):
         return config_settings.CONFIG_KEY_TSP_OUTPUT
 
     def _get_default_tsp_script_path(self, config):
+        # Early stop decides per point, so it takes precedence over the trigger-model sweep
+        if config.get('oc_early_stop', False):
+            return config_settings.DEFAULT_TSP_OUTPUT_CHAR_EARLY_STOP
+        if self._use_trigger_model(config):
+            return config_settings.DEFAULT_TSP_OUTPUT_CHAR_TRIGGER
         return config_settings.DEFAULT_TSP_OUTPUT_CHAR
 
     def _prepare_tsp_parameters(self, config):
@@ -58,6 +72,11 @@ class OutputMeasurement(MeasurementBase):
                 raise ValueError(f"Vd voltage step ({self.vd_voltage_step_for_tsp}V) sign mismatch with scan direction (from {Vd_start}V to {Vd_stop}V).")
             self.N_st_for_tsp = int(round(abs(Vd_stop - Vd_start) / abs(self.vd_voltage_step_for_tsp))) + 1
 
+        self.early_stop = bool(config.get('oc_early_stop', False))
+        power_limit = float(config.get('power_limit', config_settings.OC_DEFAULT_POWER_LIMIT))
+        if self.early_stop and power_limit <= 0:
+            raise ValueError(f"提前终止模式: 功率限制 ({power_limit} W) 必须为正数。")
+
         return {
             "IlimitDrain": config['IlimitDrain'], "IlimitGate": config['IlimitGate'],
             "Drain_nplc": config['Drain_nplc'], "Gate_nplc": config['Gate_nplc'],
@@ -66,7 +85,9 @@ class OutputMeasurement(MeasurementBase):
             "Vd_start": Vd_start, "Vd_stop": Vd_stop,
             "Vd_step": self.vd_voltage_step_for_tsp, # This is actual Vd step value for TSP
             "N_st": self.N_st_for_tsp, # This is number of Vd points for TSP
-            "settling_delay": config.get('settling_delay', config_settings.OC_DEFAULT_SETTLING_DELAY) # Added
+            "settling_delay": config.get('settling_delay', config_settings.OC_DEFAULT_SETTLING_DELAY), # Added
+            "chunk_points": config_settings.TRIGGER_MODEL_CHUNK_POINTS, # Trigger-model script only
+            "power_limit": power_limit # Early-stop script only
         }
 
     def _get_primary_buffer_info(self, config):
@@ -84,10 +105,29 @@ class OutputMeasurement(MeasurementBase):
             'Is_buffer': (config_settings.SOURCE_SMU_IS_BUFFER_READINGS_PATH, buffer_read_count)
         }
 
+    def _estimate_run_duration_s(self, config, tsp_params):
+        return self._sweep_duration_s(self.num_actual_vg_points * self.N_st_for_tsp, tsp_params['settling_delay'],
+                                      (tsp_params['Drain_nplc'], tsp_params['Gate_nplc'], tsp_params['Drain_nplc']))
+
     def _get_priority_keys_for_consistent_length(self):
         return ['Id', 'Vd_read', 'Vg_source', 'Vg_read']
 
+    def _set_curve_lengths_from_status(self):
+        # Curves cut short (compliance / early stop) have different lengths; every sweep leg of the status record is one Vg curve.
+        # Checked here rather than at read time because pulsed readings are only averaged to points after the read.
+        self.curve_lengths = np.array([], dtype=int)
+        if self.sweep_status is None:
+            return
+        legs = self.sweep_status['leg_points']
+        if legs.sum() != self.consistent_len:
+            if legs.size:
+                print(f"  Warning ({self.measurement_type_name_full}): 曲线索引总点数 ({legs.sum()}) "
+                      f"与读取点数 ({self.consistent_len}) 不符，忽略索引。", file=sys.stderr)
+            return
+        self.curve_lengths = legs
+
     def _perform_specific_data_processing(self, config):
+        self._set_curve_lengths_from_status()
         vg_source_data = self.processed_data.get('Vg_source')
         vg_read_data = self.processed_data.get('Vg_read')
         use_generated_vg = True
@@ -105,7 +145,10 @@ class OutputMeasurement(MeasurementBase):
             # self.num_actual_vg_points is already calculated in _prepare_tsp_parameters
             vg_points_ideal_sequence = np.linspace(Vg_start, Vg_stop, self.num_actual_vg_points) if self.num_actual_vg_points > 1 else np.array([Vg_start])
             # self.N_st_for_tsp is also calculated
-            vg_repeated_ideal = np.repeat(vg_points_ideal_sequence, self.N_st_for_tsp if self.N_st_for_tsp > 0 else 1)
+            if self.curve_lengths.size:
+                vg_repeated_ideal = np.repeat(vg_points_ideal_sequence[:self.curve_lengths.size], self.curve_lengths[:vg_points_ideal_sequence.size])
+            else:
+                vg_repeated_ideal = np.repeat(vg_points_ideal_sequence, self.N_st_for_tsp if self.N_st_for_tsp > 0 else 1)
 
             if len(vg_repeated_ideal) == self.consistent_len:
                 self.processed_data['Vg_actual_for_data'] = vg_repeated_ideal
@@ -124,6 +167,40 @@ class OutputMeasurement(MeasurementBase):
             self.processed_data['Time'] = self.processed_data['Time_gate']
         elif 'Time' not in self.processed_data: # Ensure 'Time' key exists
              self.processed_data['Time'] = np.full(self.consistent_len, np.nan) if self.consistent_len > 0 else np.array([])
+        self._extract_curve_params()
+
+    def _curve_slices(self):
+        # Curves are contiguous: split at the measured per-Vg lengths, else wherever Vg changes
+        vg = self.processed_data.get('Vg_actual_for_data', np.array([]))
+        if self.curve_lengths.size and self.curve_lengths.sum() == vg.size:
+            bounds = np.concatenate(([0], np.cumsum(self.curve_lengths)))
+        else:
+            vg_changes = np.flatnonzero(~np.isclose(vg[1:], vg[:-1], atol=1e-5, equal_nan=True)) + 1
+            bounds = np.concatenate(([0], vg_changes, [vg.size]))
+        return [slice(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+    def _extract_curve_params(self):
+        # One stacked extract_output call covers every Vg curve
+        self.curve_params = {}
+        vg = self.processed_data.get('Vg_actual_for_data', np.array([]))
+        vd = self.processed_data.get('Vd_read', np.array([]))
+        id_ = self.processed_data.get('Id', np.array([]))
+        if vg.size == 0 or vd.size != vg.size or id_.size != vg.size:
+            return
+        curve_slices = self._curve_slices()
+        vd_rows, id_rows, lengths = parameter_extraction.stack_sweeps((vd[sl], id_[sl]) for sl in curve_slices)
+        if not lengths.any():
+            return
+        results = parameter_extraction.extract_output(vd_rows, id_rows, lengths=lengths)
+        self.curve_params = {'Vg': np.array([vg[sl.start] for sl in curve_slices])}
+        self.curve_params.update((key, results[key]) for key, _, _ in CURVE_PARAM_LABELS)
+
+    def _top_curve_params(self):
+        # The curve at the largest |Vg| (the most strongly driven one) summarizes the run
+        if not self.curve_params or np.all(np.isnan(self.curve_params['Vg'])):
+            return {}
+        top = int(np.nanargmax(np.abs(self.curve_params['Vg'])))
+        return {key: values[top] for key, values in self.curve_params.items()}
 
 
     def _get_csv_header_info(self, config):
@@ -143,12 +220,28 @@ class OutputMeasurement(MeasurementBase):
         comments += f"# Settling Delay (s): {config.get('settling_delay', 'N/A')}\n" # Added
         comments += f"# Num Vg points expected: {self.num_actual_vg_points}\n"
         comments += f"# Num Vd points per Vg expected: {self.N_st_for_tsp}\n"
+        if self.early_stop:
+            comments += f"# Early Stop: True (compliance or |Vd*Id| > {config.get('power_limit', 'N/A')} W)\n"
+        if self.curve_params:
+            comments += f"# Ron Fit Points: {config_settings.OC_RON_FIT_POINTS}\n"
+            comments += f"# gds Fit Fraction (of |Vd| span): {config_settings.OC_GDS_FIT_FRACTION}\n"
+            comments += f"# Curve Vg (V): {','.join(f'{v:.3f}' for v in self.curve_params['Vg'])}\n"
+            for key, label, fmt in CURVE_PARAM_LABELS:
+                comments += f"# {label}: {','.join(f'{v:{fmt}}' for v in self.curve_params[key])}\n"
         return comments
 
     def _prepare_plot_data_package(self, config):
+        top_curve = self._top_curve_params()
         return {
             "processed_data": self.processed_data,
+            "curve_params": self.curve_params,
+            "Vg_top_curve": top_curve.get('Vg', np.nan),
+            "Ron_top_curve": top_curve.get('Ron', np.nan),
+            "Idsat_top_curve": top_curve.get('Idsat', np.nan),
+            "V_knee_top_curve": top_curve.get('V_knee', np.nan),
+            "gds_top_curve": top_curve.get('gds', np.nan),
             "Vd_step_val_config": self.vd_voltage_step_for_tsp, # Use the value prepared for TSP
+            "curve_lengths": self.curve_lengths, # Ragged per-Vg index; empty -> group by Vg value
             "jd_unit_plot": self.jd_unit_plot,
             "png_file_path": self.png_file_path,
             "csv_file_path": self.csv_file_path,
@@ -170,17 +263,23 @@ def _plot_output_figure_content(fig, plot_data_package):
     jd_unit_plot = plot_data_package.get('jd_unit_plot', "A.U.")
     measurement_name = plot_data_package.get("measurement_type_name", "Output Characteristics")
     ax_id_vd, ax_jd_vd = fig.subplots(2, 1, sharex=True)
-    unique_vg_values = unique_vg_values_raw[~np.isnan(unique_vg_values_raw)]
-    if len(unique_vg_values) > 0 :
-        num_curves = len(unique_vg_values)
+    curve_lengths = np.asarray(plot_data_package.get('curve_lengths', []), dtype=int)
+    if curve_lengths.size and curve_lengths.sum() == vg_actual_data.size:
+        # Ragged per-Vg index from the instrument: every curve is a contiguous slice
+        bounds = np.concatenate(([0], np.cumsum(curve_lengths)))
+        curve_selectors = [(vg_actual_data[lo], slice(lo, hi)) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+    else:
+        unique_vg_values = unique_vg_values_raw[~np.isnan(unique_vg_values_raw)]
+        curve_selectors = [(vg_val, np.isclose(vg_actual_data, vg_val, atol=1e-5)) for vg_val in unique_vg_values] # Use isclose for float comparison
+    if len(curve_selectors) > 0 :
+        num_curves = len(curve_selectors)
         default_colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
         # Use a colormap if more curves than default colors, otherwise cycle default colors
         colors_plot_list = plt.cm.get_cmap('viridis', num_curves) if num_curves > len(default_colors) else default_colors
 
-        for i, vg_val_plot in enumerate(unique_vg_values):
-            if vg_actual_data.size == 0: continue # Should not happen if unique_vg_values is populated
-            mask = np.isclose(vg_actual_data, vg_val_plot, atol=1e-5) # Use isclose for float comparison
-            if not np.any(mask): continue
+        for i, (vg_val_plot, mask) in enumerate(curve_selectors):
+            if vg_actual_data.size == 0: continue # Should not happen if curve_selectors is populated
+            if isinstance(mask, np.ndarray) and not np.any(mask): continue
 
             vd_points = processed_data.get('Vd_read', np.array([]))[mask]
             id_points = processed_data.get('Id', np.array([]))[mask]
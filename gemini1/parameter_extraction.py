@@ -0,0 +1,754 @@
+# parameter_extraction.py
+"""
+Vectorized parameter extraction for transfer (Id-Vg) sweeps.
+
+Every function works on many sweeps at once: sweeps are stacked row-wise into 2-D arrays by
+stack_sweeps (valid points packed to the left, ragged rows padded with NaN, plus the number
+of valid points per row), so a whole history corpus is extracted in one call instead of one
+Python pass per file. A single sweep may also be passed as 1-D arrays; results then come
+back as scalars.
+
+Threshold voltage methods (VTH_METHODS):
+    max_gm             - linear extrapolation at maximum transconductance: Vg_k - Id_k / gm_max
+    constant_current   - Vg where |Id| first reaches the criterion current coming from the
+                         off-state end of the sweep (log-interpolated)
+    second_derivative  - Vg at the maximum of d2Id/dVg2 (parabolic refinement around the peak),
+                         from gm smoothed over at least VTH_SD_MIN_WINDOW points and searched
+                         only in the turn-on region, before gm reaches VTH_SD_GM_FRACTION x
+                         gm_max; on a flat top the first point within VTH_SD_PEAK_TOLERANCE of
+                         the maximum. NaN when the peak sits on the edge of that region
+    ratio              - Y-function Id / sqrt(gm): x-intercept of a line fitted over the
+                         strong-inversion points, i.e. from where gm first reaches
+                         VTH_RATIO_GM_FRACTION x gm_max towards higher |Id|
+
+Id can be smoothed with a Savitzky-Golay filter before differentiating (smooth_window > 0).
+The smoothed Id only feeds gm and the gm-based methods; constant_current reads the raw |Id|,
+since a linear-scale smooth across the exponential subthreshold region biases it.
+The filter runs along the point index, so on adaptive (non-uniform Vg) sweeps it smooths
+per point rather than per volt; derivatives always use the actual Vg spacing.
+
+Subthreshold swing (extract_ss) comes from least-squares fits of log10|Id| vs Vg over
+sliding windows of k points (strided views, no per-window loop). Windows in which |Id| rises
+monotonically, the fit is good (R^2 >= SS_MIN_R2) and the swing is below SS_MAX_MV_DEC count
+as subthreshold, which keeps noise-floor windows out; SS_min is the lowest of them. The
+contiguous run of windows around it whose swing stays within SS_SPAN_FACTOR x SS_min gives
+the decade span and the average swing over that span.
+
+Hysteresis (extract_hysteresis) compares the two legs of a bidirectional sweep: both are
+interpolated onto a common ascending grid over the voltage range they share, the loop area is
+the trapezoidal integral of (backward - forward) over it, and an optional criterion current
+gives the voltage where each leg first reaches it.
+
+Output curves (extract_output, one Id-Vd curve per row): Ron from a line through the points
+nearest Vd = 0, gds from a line through the top of the Vd span, the knee where the two lines
+cross, and Idsat at the largest |Vd|.
+
+Breakdown (extract_breakdown, one Vd sweep per row) is read two ways: BV_criterion is the Vd
+where the leakage first reaches a criterion current (or density) coming up from low |Vd|, the
+same log-interpolated crossing as the constant-current Vth; BV_slope is the centre of the
+first window in which the local exponent d ln|I| / d ln|Vd| (sliding least-squares windows,
+as for SS) reaches a threshold - ohmic leakage sits near 1, avalanche runs far above it.
+Gate and source currents at the breakdown point split the leakage into its gate and drain
+(to source) paths.
+
+Diode forward curves (extract_diode) are fitted with the Shockley equation plus series
+resistance written for V: V = n Vt ln(I / Is + 1) + Rs I, so no implicit solve is needed. For
+I >> Is it is linear in (n Vt, n Vt ln Is, Rs), which gives the starting point; Levenberg-
+Marquardt on the full form then refines all curves together (one batched 3x3 solve per
+iteration, each row keeping its own damping). Turn-on voltage is the constant-current crossing
+and the reverse leakage is interpolated at a set voltage.
+
+Stress drift (extract_drift_kinetics, one relative-drift trace dId/Id0 vs stress time per row,
+normally log-time bin means) is fitted two ways, both in log |drift| so every decade of time
+weighs the same: a power law A t^n (a straight line in log-log) and a stretched exponential
+D_inf (1 - exp(-(t / tau)^beta)), which bends over where the power law keeps going. The power
+law gives the starting point of the stretched-exponential Levenberg-Marquardt unless a start
+(the previous fit of a growing trace) is passed. Both are extrapolated to the time at which
+|drift| reaches a failure criterion.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import config_settings
+
+VTH_METHODS = ("max_gm", "constant_current", "second_derivative", "ratio")
+
+
+def stack_sweeps(sweeps):
+    """
+    Stacks (x, y) pairs into NaN-padded 2-D arrays. Points where x or y is NaN are dropped and
+    the rest packed to the left in their original order. Returns (X, Y, lengths).
+    """
+    pairs = []
+    for x, y in sweeps:
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        n = min(x.size, y.size)
+        valid = ~np.isnan(x[:n]) & ~np.isnan(y[:n])
+        pairs.append((x[:n][valid], y[:n][valid]))
+    lengths = np.array([x.size for x, _ in pairs], dtype=int)
+    width = int(lengths.max()) if lengths.size else 0
+    X = np.full((len(pairs), width), np.nan)
+    Y = np.full((len(pairs), width), np.nan)
+    for row, (x, y) in enumerate(pairs):
+        X[row, :x.size] = x
+        Y[row, :y.size] = y
+    return X, Y, lengths
+
+
+def savgol_matrix(window, polyorder):
+    """
+    (window, window) least-squares projection: row j holds the weights giving the fitted
+    polynomial at position j of the window. The middle row is the usual Savitzky-Golay kernel,
+    the others evaluate the first / last window at the sweep ends.
+    """
+    positions = np.arange(window) - window // 2
+    vander = np.vander(positions, polyorder + 1, increasing=True).astype(float)
+    return vander @ np.linalg.pinv(vander)
+
+
+def savgol_smooth(y, lengths, window, polyorder=config_settings.VTH_SMOOTH_POLYORDER):
+    """
+    Savitzky-Golay smoothing of each row of `y` over its first `lengths[row]` points. Rows
+    shorter than the window are returned unchanged. window <= polyorder disables smoothing.
+    """
+    window = int(window)
+    if window % 2 == 0:
+        window += 1
+    if window <= polyorder or y.shape[-1] < window:
+        return y
+    half = window // 2
+    weights = savgol_matrix(window, polyorder)
+    out = np.array(y, dtype=float, copy=True)
+    # Interior: centre row of the projection over every full window (windows reaching into padding give NaN)
+    out[:, half:y.shape[1] - half] = sliding_window_view(y, window, axis=-1) @ weights[half]
+    # Ends: fitted values of the first / last full window of each row
+    out[:, :half] = y[:, :window] @ weights[:half].T
+    rows = np.flatnonzero(lengths >= window)
+    last_start = (lengths[rows] - window)[:, None]
+    last_window = np.take_along_axis(y[rows], last_start + np.arange(window), axis=1)
+    tail = np.array(out[rows])
+    np.put_along_axis(tail, last_start + half + 1 + np.arange(half), last_window @ weights[half + 1:].T, axis=1)
+    out[rows] = tail
+    short = lengths < window
+    out[short] = y[short]
+    return out
+
+
+def row_gradient(y, x, lengths):
+    """
+    d y / d x along each row, like np.gradient (second-order interior, first-order ends) but
+    with per-row x coordinates and the last valid point of each ragged row handled as an end.
+    """
+    out = np.full(y.shape, np.nan)
+    if y.shape[1] < 2:
+        return out
+    dx = np.diff(x, axis=1)
+    if y.shape[1] > 2:
+        dx1, dx2 = dx[:, :-1], dx[:, 1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a = -dx2 / (dx1 * (dx1 + dx2))
+            b = (dx2 - dx1) / (dx1 * dx2)
+            c = dx1 / (dx2 * (dx1 + dx2))
+            out[:, 1:-1] = a * y[:, :-2] + b * y[:, 1:-1] + c * y[:, 2:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[:, 0] = (y[:, 1] - y[:, 0]) / dx[:, 0]
+        rows = np.flatnonzero(lengths >= 2)
+        last = lengths[rows] - 1
+        out[rows, last] = (y[rows, last] - y[rows, last - 1]) / (x[rows, last] - x[rows, last - 1])
+    out[lengths < 2] = np.nan
+    return out
+
+
+def _masked_argmax(values):
+    """Row-wise argmax ignoring NaN; also returns whether the row had any finite value."""
+    filled = np.where(np.isnan(values), -np.inf, values)
+    return filled.argmax(axis=1), np.isfinite(filled).any(axis=1)
+
+
+def _take(values, index):
+    return np.take_along_axis(values, index[:, None], axis=1)[:, 0]
+
+
+def _off_state_order(id_abs, lengths):
+    """Column order reading each row from its off-state end: rows that start in the on-state (backward legs) are reversed."""
+    last = np.maximum(lengths - 1, 0)
+    index = np.arange(id_abs.shape[1])
+    reverse = (id_abs[:, 0] > _take(id_abs, last))[:, None] & (index <= last[:, None])
+    return np.where(reverse, last[:, None] - index, index)
+
+
+def _vth_constant_current(vg, id_abs, cc_current, lengths):
+    if vg.shape[1] < 2:
+        return np.full(vg.shape[0], np.nan) # A crossing needs two points (e.g. a leg stopped by compliance at once)
+    # Scan from the off-state end
+    order = _off_state_order(id_abs, lengths)
+    vg, id_abs = np.take_along_axis(vg, order, axis=1), np.take_along_axis(id_abs, order, axis=1)
+    cc_current = np.broadcast_to(np.asarray(cc_current, dtype=float), vg.shape[:1])
+    reached = id_abs >= cc_current[:, None]
+    first, any_reached = reached.argmax(axis=1), reached.any(axis=1)
+    # The criterion has to be crossed inside the sweep, not already exceeded at the first point
+    ok = any_reached & (first > 0)
+    upper = np.where(ok, first, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_lo = np.log10(np.clip(_take(id_abs, upper - 1), 1e-30, None))
+        log_hi = np.log10(_take(id_abs, upper))
+        frac = (np.log10(cc_current) - log_lo) / (log_hi - log_lo)
+    vg_lo, vg_hi = _take(vg, upper - 1), _take(vg, upper)
+    return np.where(ok, vg_lo + frac * (vg_hi - vg_lo), np.nan)
+
+
+def _vth_second_derivative(vg, id_abs, gm, lengths, smooth_window, polyorder):
+    # d2Id/dVg2 of unsmoothed gm is dominated by noise at high Id, so gm is always smoothed first
+    gm_s = savgol_smooth(gm, lengths, max(int(smooth_window), config_settings.VTH_SD_MIN_WINDOW), polyorder)
+    d2 = row_gradient(gm_s, vg, lengths)
+    order = _off_state_order(id_abs, lengths)
+    vg, gm_s, d2 = (np.take_along_axis(values, order, axis=1) for values in (vg, gm_s, d2))
+    # Turn-on region: from the off-state end up to where the smoothed gm first reaches the fraction of its maximum
+    gm_peak, has_gm = _masked_argmax(gm_s)
+    reached = gm_s >= config_settings.VTH_SD_GM_FRACTION * np.where(has_gm, _take(gm_s, gm_peak), np.inf)[:, None]
+    onset = np.where(reached.any(axis=1), reached.argmax(axis=1), lengths - 1)
+    turn_on = np.arange(vg.shape[1]) <= onset[:, None]
+    top, has_peak = _masked_argmax(np.where(turn_on, d2, np.nan))
+    d2_top = _take(d2, top)
+    # On a flat top (square-law gm) the argmax is a noise pick; the first point near the top marks the turn-on
+    near_top = turn_on & (d2 >= (1.0 - config_settings.VTH_SD_PEAK_TOLERANCE) * d2_top[:, None])
+    peak = near_top.argmax(axis=1)
+    # A peak on the edge of the region (or a non-positive one) is not a turn-on
+    has_peak &= (peak > 0) & (peak < onset) & (d2_top > 0)
+    vth = np.where(has_peak, _take(vg, peak), np.nan)
+    # Vertex of the parabola through the peak and its neighbours, where the peak point is a local maximum
+    left, right = np.where(has_peak, peak - 1, 0), np.where(has_peak, peak + 1, 0)
+    x0, x1, x2 = _take(vg, left), _take(vg, peak), _take(vg, right)
+    y0, y1, y2 = _take(d2, left), _take(d2, peak), _take(d2, right)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        num = (x1 - x0) ** 2 * (y1 - y2) - (x1 - x2) ** 2 * (y1 - y0)
+        den = (x1 - x0) * (y1 - y2) - (x1 - x2) * (y1 - y0)
+        vertex = x1 - 0.5 * num / den
+    refined = has_peak & (y1 >= y0) & (y1 >= y2) & np.isfinite(vertex) & (den != 0)
+    return np.where(refined, np.clip(vertex, np.minimum(x0, x2), np.maximum(x0, x2)), vth)
+
+
+def _masked_line_fit(x, y, fit):
+    """Row-wise least-squares line through the points where `fit` is set: (slope, intercept, points)."""
+    n = fit.sum(axis=1)
+    x = np.where(fit, x, 0.0)
+    y = np.where(fit, y, 0.0)
+    sx, sy = x.sum(axis=1), y.sum(axis=1)
+    sxx, sxy = (x * x).sum(axis=1), (x * y).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        intercept = (sy - slope * sx) / n
+    return slope, intercept, n
+
+
+def _vth_ratio(vg, id_s, gm, gm_max):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y_func = id_s / np.sqrt(gm)
+    # Strong inversion starts at the lowest |Id| whose gm is near the maximum (a plateau or a peak)
+    near_max = gm >= config_settings.VTH_RATIO_GM_FRACTION * gm_max[:, None]
+    id_onset = np.where(near_max, np.abs(id_s), np.inf).min(axis=1)
+    fit = (np.abs(id_s) >= id_onset[:, None]) & (gm > 0) & np.isfinite(y_func) & ~np.isnan(vg)
+    slope, intercept, n = _masked_line_fit(vg, y_func, fit)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vth = -intercept / slope
+    return np.where((n >= config_settings.VTH_RATIO_MIN_POINTS) & np.isfinite(vth) & (slope != 0), vth, np.nan)
+
+
+def _window_line_fits(x, y, window):
+    """
+    Least-squares lines through every `window`-point sliding window of each row, shape
+    (rows, columns - window + 1): (slope, r_squared, rising, falling), where rising / falling
+    mark windows in which y moves the same / opposite way as x at every step.
+    """
+    x_win = sliding_window_view(x, window, axis=1)
+    y_win = sliding_window_view(y, window, axis=1)
+    # Moments about each window's first point (small values, no cancellation), accumulated one window
+    # column at a time: every pass is a (rows, windows) array op, reductions over the short strided axis are slow
+    sx = sy = sxx = sxy = syy = 0.0
+    rising = np.ones(x_win.shape[:2], dtype=bool)
+    falling = np.ones(x_win.shape[:2], dtype=bool)
+    for j in range(1, window):
+        dx = x_win[:, :, j] - x_win[:, :, 0]
+        dy = y_win[:, :, j] - y_win[:, :, 0]
+        sx, sy = sx + dx, sy + dy
+        sxx, sxy, syy = sxx + dx * dx, sxy + dx * dy, syy + dy * dy
+        step = (y_win[:, :, j] - y_win[:, :, j - 1]) * (x_win[:, :, j] - x_win[:, :, j - 1])
+        rising &= step > 0
+        falling &= step < 0
+    sxx, sxy, syy = sxx - sx * sx / window, sxy - sx * sy / window, syy - sy * sy / window
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = sxy / sxx
+        r_squared = sxy * sxy / (sxx * syy)
+    return slope, r_squared, rising, falling
+
+
+def _as_rows(vg, id_, lengths):
+    """(single, vg, id_, lengths) with 1-D input promoted to one row and unstacked rows stacked."""
+    single = np.ndim(vg) == 1
+    if lengths is None:
+        vg, id_, lengths = stack_sweeps(zip(np.atleast_2d(vg), np.atleast_2d(id_)))
+    else:
+        vg, id_ = np.atleast_2d(vg).astype(float, copy=False), np.atleast_2d(id_).astype(float, copy=False)
+        lengths = np.atleast_1d(np.asarray(lengths, dtype=int))
+    return single, vg, id_, lengths
+
+
+def _single_row(results, lengths, per_point_keys):
+    """Results of a 1-D call: scalars, and the per-point arrays trimmed to the sweep."""
+    return {key: (value[0][:int(lengths[0])] if key in per_point_keys else value[0].item())
+            for key, value in results.items()}
+
+
+def extract_vth(vg, id_, methods=VTH_METHODS, smooth_window=0, cc_current=None, lengths=None,
+                polyorder=config_settings.VTH_SMOOTH_POLYORDER):
+    """
+    Threshold voltage of one sweep (1-D arrays) or of many (2-D, one sweep per row).
+
+    `lengths` gives the valid points per row of pre-stacked arrays (see stack_sweeps); without
+    it the rows are stacked here, dropping NaN points. Returns a dict with 'Vth_<method>' for
+    each requested method plus 'gm' (dId/dVg of the smoothed Id, same shape as the input),
+    'gm_max' and 'Vg_at_gm_max'.
+    """
+    unknown = [m for m in methods if m not in VTH_METHODS]
+    if unknown:
+        raise ValueError(f"未知的 Vth 提取方法: {unknown} (可选: {', '.join(VTH_METHODS)})")
+    single, vg, id_, lengths = _as_rows(vg, id_, lengths)
+    if cc_current is None:
+        cc_current = float(config_settings.GT_DEFAULT_VTH_CC_CURRENT)
+
+    id_s = savgol_smooth(id_, lengths, smooth_window, polyorder) if smooth_window else id_
+    gm = row_gradient(id_s, vg, lengths)
+    peak, has_gm = _masked_argmax(gm)
+    gm_max = np.where(has_gm, _take(gm, peak), np.nan)
+    vg_at_peak = np.where(has_gm, _take(vg, peak), np.nan)
+    id_at_peak = np.where(has_gm, _take(id_s, peak), np.nan)
+
+    results = {"gm": gm, "gm_max": gm_max, "Vg_at_gm_max": vg_at_peak}
+    for method in methods:
+        if method == "max_gm":
+            with np.errstate(divide='ignore', invalid='ignore'):
+                vth = np.where(gm_max > 0, vg_at_peak - id_at_peak / gm_max, np.nan)
+        elif method == "constant_current":
+            vth = _vth_constant_current(vg, np.abs(id_), cc_current, lengths)
+        elif method == "second_derivative":
+            vth = _vth_second_derivative(vg, np.abs(id_), gm, lengths, smooth_window, polyorder)
+        else:
+            vth = _vth_ratio(vg, id_s, gm, gm_max)
+        results[f"Vth_{method}"] = vth
+    return _single_row(results, lengths, ("gm",)) if single else results
+
+
+def extract_ss(vg, id_, window=None, lengths=None):
+    """
+    Subthreshold swing of one sweep (1-D) or many (2-D rows), see the module docstring.
+
+    Returns a dict with 'SS' (mV/dec of the window centred on each point, NaN within
+    window // 2 of the ends; same shape as the input), 'SS_min', 'SS_min_index' (point index
+    of the SS_min window centre, -1 if none), 'SS_avg' (mV/dec over the near-minimum run)
+    and 'SS_decades' (decades of |Id| the run spans). Works for either sweep direction and for
+    p-type devices: the swing is taken positive towards the on-state.
+    """
+    window = int(window if window is not None else config_settings.GT_DEFAULT_SS_WINDOW)
+    if window % 2 == 0:
+        window += 1
+    if window < 3:
+        raise ValueError(f"SS 拟合窗口 ({window}) 必须至少为 3 点。")
+    single, vg, id_, lengths = _as_rows(vg, id_, lengths)
+    n_rows, n_cols = vg.shape
+    half = window // 2
+    ss = np.full((n_rows, n_cols), np.nan)
+    results = {"SS": ss, "SS_min": np.full(n_rows, np.nan), "SS_min_index": np.full(n_rows, -1),
+               "SS_avg": np.full(n_rows, np.nan), "SS_decades": np.full(n_rows, np.nan)}
+    if n_cols < window:
+        return _single_row(results, lengths, ("SS",)) if single else results
+
+    log_id = np.log10(np.clip(np.abs(id_), config_settings.SS_CURRENT_FLOOR_A, None))
+    slope, r_squared, rising, falling = _window_line_fits(vg, log_id, window)  # slope in decades per volt
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ss[:, half:n_cols - half] = 1000.0 / slope
+
+    # Towards the on-state |Id| rises, so orient the swing by where the largest current is
+    abs_id = np.abs(id_)
+    on_index, _ = _masked_argmax(abs_id)
+    off_index, _ = _masked_argmax(-abs_id)
+    polarity = np.where(_take(vg, on_index) >= _take(vg, off_index), 1.0, -1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        swing = 1000.0 / (slope * polarity[:, None])
+    # log|Id| has to move the same way per step in Vg across the whole window (backward legs included)
+    monotonic = np.where(slope > 0, rising, falling)
+    subthreshold = monotonic & (r_squared >= config_settings.SS_MIN_R2) & (swing > 0) & (swing <= config_settings.SS_MAX_MV_DEC)
+
+    best, has_best = _masked_argmax(np.where(subthreshold, -swing, np.nan))
+    ss_min = np.where(has_best, _take(swing, best), np.nan)
+    # Runs of consecutive near-minimum windows share a label; keep the one holding SS_min
+    near_min = subthreshold & (swing <= config_settings.SS_SPAN_FACTOR * ss_min[:, None])
+    run_label = np.cumsum(~near_min, axis=1)
+    in_run = near_min & (run_label == _take(run_label, best)[:, None]) & has_best[:, None]
+    # Points covered by the run: first point of its first window to the last point of its last window
+    first_window = in_run.argmax(axis=1)
+    last_window = in_run.shape[1] - 1 - in_run[:, ::-1].argmax(axis=1)
+    point_index = np.arange(n_cols)
+    covered = (point_index >= first_window[:, None]) & (point_index < (last_window + window)[:, None]) & has_best[:, None]
+    y_lo = np.where(covered, log_id, np.inf).min(axis=1)
+    y_hi = np.where(covered, log_id, -np.inf).max(axis=1)
+    x_lo = np.where(covered, vg, np.inf).min(axis=1)
+    x_hi = np.where(covered, vg, -np.inf).max(axis=1)
+    decades = y_hi - y_lo
+    with np.errstate(divide='ignore', invalid='ignore'):
+        average = 1000.0 * (x_hi - x_lo) / decades
+
+    results["SS_min"] = ss_min
+    results["SS_min_index"] = np.where(has_best, best + half, -1)
+    results["SS_avg"] = np.where(has_best & (decades > 0), average, np.nan)
+    results["SS_decades"] = np.where(has_best, decades, np.nan)
+    return _single_row(results, lengths, ("SS",)) if single else results
+
+
+def extract_output(vd, id_, lengths=None, ron_points=config_settings.OC_RON_FIT_POINTS,
+                   gds_fraction=config_settings.OC_GDS_FIT_FRACTION):
+    """
+    Parameters of one output (Id-Vd) curve (1-D arrays) or of many (2-D, one curve per row).
+
+    Returns a dict with 'Ron' (inverse slope of the line through the `ron_points` points nearest
+    Vd = 0, Ohm), 'gds' (slope of the line through the points in the top `gds_fraction` of the
+    curve's |Vd| span, S), 'V_knee' (Vd where the two lines cross; NaN outside the measured
+    range) and 'Idsat' (Id at the largest |Vd|).
+    """
+    single, vd, id_, lengths = _as_rows(vd, id_, lengths)
+    valid = np.arange(vd.shape[1]) < lengths[:, None]
+    abs_vd = np.where(valid, np.abs(vd), np.inf)
+    # Linear region: rank of every point by |Vd|, the lowest ron_points of each curve
+    rank = np.argsort(np.argsort(abs_vd, axis=1, kind='stable'), axis=1)
+    g_lin, b_lin, n_lin = _masked_line_fit(vd, id_, valid & (rank < ron_points))
+    vd_lo = abs_vd.min(axis=1)
+    vd_hi = np.where(valid, abs_vd, -np.inf).max(axis=1)
+    sat = valid & (abs_vd >= (vd_hi - gds_fraction * (vd_hi - vd_lo))[:, None])
+    g_sat, b_sat, n_sat = _masked_line_fit(vd, id_, sat)
+    top, has_top = _masked_argmax(np.where(valid, abs_vd, np.nan))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ron = 1.0 / g_lin
+        knee = (b_sat - b_lin) / (g_lin - g_sat)
+    lines = (n_lin >= 2) & (n_sat >= 2)
+    results = {
+        "Ron": np.where((n_lin >= 2) & np.isfinite(ron), ron, np.nan),
+        "gds": np.where(n_sat >= 2, g_sat, np.nan),
+        "V_knee": np.where(lines & (np.abs(knee) >= vd_lo) & (np.abs(knee) <= vd_hi), knee, np.nan),
+        "Idsat": np.where(has_top, _take(id_, top), np.nan),
+    }
+    return {key: value[0].item() for key, value in results.items()} if single else results
+
+
+def interp_rows(x, y, lengths, grid):
+    """
+    np.interp of every stacked row (x, y, lengths as from stack_sweeps) at the matching row of
+    `grid`, in one searchsorted call. x need not be sorted; grid points outside a row's x range
+    come back NaN.
+    """
+    n_rows, n_cols = x.shape
+    valid = np.arange(n_cols) < lengths[:, None]
+    order = np.argsort(np.where(valid, x, np.inf), axis=1, kind='stable')
+    xs, ys = np.take_along_axis(x, order, axis=1), np.take_along_axis(y, order, axis=1)
+    last = np.maximum(lengths - 1, 0)
+    lo, hi = xs[:, 0], _take(xs, last)
+    # Rows laid end to end on one sorted key axis: row r occupies [2r, 2r + 1], padding sits at 2r + 1.5
+    row_base = 2.0 * np.arange(n_rows)[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        span = np.where(hi > lo, hi - lo, np.inf)[:, None]
+        key = row_base + np.where(valid, (xs - lo[:, None]) / span, 1.5)
+        grid_key = row_base + np.clip((grid - lo[:, None]) / span, 0.0, 1.0)
+    left = np.searchsorted(key.ravel(), grid_key.ravel(), side='right').reshape(grid.shape) - 1
+    left = np.clip(left - n_cols * np.arange(n_rows)[:, None], 0, np.maximum(lengths - 2, 0)[:, None])
+    right = np.minimum(left + 1, last[:, None])
+    x0, x1 = np.take_along_axis(xs, left, axis=1), np.take_along_axis(xs, right, axis=1)
+    y0, y1 = np.take_along_axis(ys, left, axis=1), np.take_along_axis(ys, right, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.where(x1 > x0, y0 + (grid - x0) / (x1 - x0) * (y1 - y0), y1)
+    outside = (grid < lo[:, None]) | (grid > hi[:, None]) | (lengths < 2)[:, None] | np.isnan(grid)
+    return np.where(outside, np.nan, out)
+
+
+def extract_hysteresis(x_fwd, y_fwd, x_bwd, y_bwd, lengths_fwd=None, lengths_bwd=None, level=None,
+                       grid_points=config_settings.HYSTERESIS_GRID_POINTS):
+    """
+    Hysteresis between the forward and backward leg of one sweep (1-D arrays) or many (2-D rows).
+
+    Returns a dict with 'loop_area' (integral of y_bwd - y_fwd over ascending x: positive when
+    the backward leg runs above the forward one), 'max_gap' (largest |y_bwd - y_fwd| on the
+    grid), 'x_at_max_gap' and the common range 'x_lo' / 'x_hi'. With a criterion `level`, also
+    'x_at_level_fwd' / 'x_at_level_bwd': where |y| of each leg first reaches it coming from the
+    leg's low-|y| end, log-interpolated on the leg's own points (as the constant-current Vth).
+    """
+    single, x_fwd, y_fwd, lengths_fwd = _as_rows(x_fwd, y_fwd, lengths_fwd)
+    _, x_bwd, y_bwd, lengths_bwd = _as_rows(x_bwd, y_bwd, lengths_bwd)
+    x_lo = np.maximum(np.where(np.isnan(x_fwd), np.inf, x_fwd).min(axis=1), np.where(np.isnan(x_bwd), np.inf, x_bwd).min(axis=1))
+    x_hi = np.minimum(np.where(np.isnan(x_fwd), -np.inf, x_fwd).max(axis=1), np.where(np.isnan(x_bwd), -np.inf, x_bwd).max(axis=1))
+    overlap = (x_hi > x_lo) & (lengths_fwd >= 2) & (lengths_bwd >= 2)
+    grid = x_lo[:, None] + (x_hi - x_lo)[:, None] * np.linspace(0.0, 1.0, grid_points)
+    # Rounding can put the last grid point just past x_hi, where interp_rows returns NaN and the area with it
+    grid = np.where(overlap[:, None], np.minimum(grid, x_hi[:, None]), np.nan)
+    fwd_on_grid = interp_rows(x_fwd, y_fwd, lengths_fwd, grid)
+    bwd_on_grid = interp_rows(x_bwd, y_bwd, lengths_bwd, grid)
+
+    gap = bwd_on_grid - fwd_on_grid
+    area = (0.5 * (gap[:, 1:] + gap[:, :-1]) * np.diff(grid, axis=1)).sum(axis=1)
+    widest, has_gap = _masked_argmax(np.abs(gap))
+    results = {
+        "loop_area": np.where(overlap, area, np.nan),
+        "max_gap": np.where(has_gap, np.abs(_take(gap, widest)), np.nan),
+        "x_at_max_gap": np.where(has_gap, _take(grid, widest), np.nan),
+        "x_lo": np.where(overlap, x_lo, np.nan),
+        "x_hi": np.where(overlap, x_hi, np.nan),
+    }
+    if level is not None:
+        # On the raw legs: the grid is a linear interpolation, which misplaces an exponential crossing
+        results["x_at_level_fwd"] = _vth_constant_current(x_fwd, np.abs(y_fwd), level, lengths_fwd)
+        results["x_at_level_bwd"] = _vth_constant_current(x_bwd, np.abs(y_bwd), level, lengths_bwd)
+    return {key: value[0].item() for key, value in results.items()} if single else results
+
+
+def extract_breakdown(vd, i_main, ig=None, is_=None, lengths=None, criterion=None,
+                      window=config_settings.BD_SLOPE_WINDOW, exponent=config_settings.BD_SLOPE_EXPONENT):
+    """
+    Breakdown voltage of one Vd sweep (1-D arrays) or of many (2-D, one sweep per row), see the
+    module docstring.
+
+    i_main is the current (or density) the criterion applies to; ig / is_ are the gate and
+    source currents on the same points. Rows are used as given (NaN points stay in place, so
+    the three currents remain aligned); `lengths` gives the valid points per row and defaults
+    to the full width. `criterion` may be one value or one per row. Returns a dict with
+    'BV_criterion', 'BV_slope' (V, NaN if not reached), 'V_max' (Vd at the largest |Vd|),
+    'I_at_V_max' and, with ig and is_, 'gate_fraction' = |Ig| / (|Ig| + |Is|) at the breakdown
+    point (criterion first, then slope, else the largest |Vd|).
+    """
+    if criterion is None:
+        criterion = config_settings.BD_BV_FALLBACK_CURRENT_A
+    window = int(window)
+    if window < 3:
+        raise ValueError(f"击穿斜率拟合窗口 ({window}) 必须至少为 3 点。")
+    single = np.ndim(vd) == 1
+    vd, i_main = np.atleast_2d(vd).astype(float, copy=False), np.atleast_2d(i_main).astype(float, copy=False)
+    i_abs = np.abs(i_main)
+    n_rows, n_cols = vd.shape
+    lengths = np.full(n_rows, n_cols) if lengths is None else np.atleast_1d(np.asarray(lengths, dtype=int))
+    valid = (np.arange(n_cols) < lengths[:, None]) & ~np.isnan(vd) & ~np.isnan(i_abs)
+    abs_vd = np.where(valid, np.abs(vd), np.nan)
+    i_abs = np.where(valid, i_abs, np.nan)
+
+    bv_criterion = _vth_constant_current(vd, i_abs, criterion, lengths)
+
+    bv_slope = np.full(n_rows, np.nan)
+    if n_cols >= window:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope, r_squared, rising, _ = _window_line_fits(np.log(abs_vd), np.log(i_abs), window)
+        steep = rising & (r_squared >= config_settings.BD_SLOPE_MIN_R2) & (slope >= exponent)
+        first, any_steep = steep.argmax(axis=1), steep.any(axis=1)
+        bv_slope = np.where(any_steep, _take(vd, np.minimum(first + window // 2, n_cols - 1)), np.nan)
+
+    top, has_top = _masked_argmax(abs_vd)
+    results = {
+        "BV_criterion": bv_criterion,
+        "BV_slope": bv_slope,
+        "V_max": np.where(has_top, _take(vd, top), np.nan),
+        "I_at_V_max": np.where(has_top, _take(i_main, top), np.nan),
+    }
+    if ig is not None and is_ is not None:
+        # First point at or past the breakdown voltage; the leakage split is read there
+        bv = np.where(np.isnan(bv_criterion), bv_slope, bv_criterion)
+        past, any_past = _masked_argmax(np.where(abs_vd >= np.abs(bv)[:, None], 1.0, np.nan))
+        point = np.where(any_past, past, top)
+        ig_abs = np.abs(_take(np.atleast_2d(ig).astype(float, copy=False), point))
+        is_abs = np.abs(_take(np.atleast_2d(is_).astype(float, copy=False), point))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = ig_abs / (ig_abs + is_abs)
+        results["gate_fraction"] = np.where(has_top, fraction, np.nan)
+    return {key: value[0].item() for key, value in results.items()} if single else results
+
+
+def _solve3(a, b):
+    """Batched 3x3 solve by Cramer's rule, (rows, 3, 3) and (rows, 3) -> (rows, 3); singular rows give NaN instead of raising."""
+    c0, c1, c2 = a[:, :, 0], a[:, :, 1], a[:, :, 2]
+    # det[x, y, z] of columns is x . (y cross z)
+    det = lambda x, y, z: (x * np.cross(y, z)).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d = det(c0, c1, c2)
+        out = np.stack([det(b, c1, c2), det(c0, b, c2), det(c0, c1, b)], axis=1) / d[:, None]
+    return np.where(np.isfinite(out), out, np.nan)
+
+
+def _scaled_normal_solve(jac, residual, damping=0.0):
+    """Least-squares step for each row of (rows, points, 3) jac: normal equations with unit-scaled columns (+ damping on the diagonal)."""
+    jtj = jac.transpose(0, 2, 1) @ jac
+    jtr = (jac.transpose(0, 2, 1) @ residual[:, :, None])[:, :, 0]
+    scale = np.sqrt(np.diagonal(jtj, axis1=1, axis2=2))
+    scale = np.where(scale > 0, scale, 1.0)
+    jtj = jtj / (scale[:, :, None] * scale[:, None, :]) + np.asarray(damping, dtype=float).reshape(-1, 1, 1) * np.eye(3)
+    return _solve3(jtj, jtr / scale) / scale
+
+
+def _diode_voltage(params, i):
+    """V of the Shockley + Rs model for params rows (n Vt, ln Is, Rs); also returns I / Is."""
+    with np.errstate(over='ignore', invalid='ignore'):
+        ratio = i * np.exp(-params[:, 1:2])
+        return params[:, 0:1] * np.log1p(ratio) + params[:, 2:3] * i, ratio
+
+
+def extract_diode(v, i, lengths=None, on_current=None, reverse_v=None, compliance=None,
+                  min_current=config_settings.DIODE_FIT_MIN_CURRENT_A, iterations=config_settings.DIODE_FIT_ITERATIONS):
+    """
+    Diode parameters of one anode sweep (1-D arrays) or of many (2-D, one sweep per row), see
+    the module docstring.
+
+    The fit uses the points with V > 0 and min_current <= I (< DIODE_FIT_COMPLIANCE_FRACTION x
+    `compliance` when given). `on_current`, `reverse_v` and `compliance` may be one value or one
+    per row. Returns a dict with 'n', 'Is' (A), 'Rs' (Ohm), 'fit_rms' (V), 'fit_points', 'V_on'
+    (V where I first reaches on_current) and 'I_reverse' (I at reverse_v, NaN outside the sweep).
+    """
+    if on_current is None:
+        on_current = config_settings.DIODE_HYST_ON_CURRENT_A
+    if reverse_v is None:
+        reverse_v = float(config_settings.DIODE_DEFAULT_REVERSE_V)
+    single, v, i, lengths = _as_rows(v, i, lengths)
+    n_rows, n_cols = v.shape
+    valid = np.arange(n_cols) < lengths[:, None]
+    fit = valid & (v > 0) & (i >= min_current)
+    if compliance is not None:
+        limit = np.broadcast_to(np.asarray(compliance, dtype=float), (n_rows,))
+        fit &= np.abs(i) < config_settings.DIODE_FIT_COMPLIANCE_FRACTION * limit[:, None]
+    n_fit = fit.sum(axis=1)
+    weight = fit.astype(float)
+    # Placeholders off the fit points keep the logs finite; their zero weight drops them from every sum
+    i_fit = np.where(fit, i, 1.0)
+    v_fit = np.where(fit, v, 0.0)
+
+    # Start: V = c0 + a ln I + Rs I with a = n Vt and c0 = -a ln Is (I >> Is)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        basis = np.stack([np.ones_like(i_fit), np.log(i_fit), i_fit], axis=2) * weight[:, :, None]
+        c0, a, rs = _scaled_normal_solve(basis, v_fit * weight).T
+        params = np.stack([a, -c0 / a, rs], axis=1)
+    model, _ = _diode_voltage(params, i_fit)
+    cost = (weight * (v_fit - model) ** 2).sum(axis=1)
+    damping = np.full(n_rows, 1e-3)
+    for _ in range(iterations):
+        model, ratio = _diode_voltage(params, i_fit)
+        residual = (v_fit - model) * weight
+        with np.errstate(invalid='ignore'):
+            jac = np.stack([np.log1p(ratio), -params[:, 0:1] * ratio / (1.0 + ratio), i_fit], axis=2) * weight[:, :, None]
+        trial = params + _scaled_normal_solve(np.nan_to_num(jac), np.nan_to_num(residual), damping)
+        trial_model, _ = _diode_voltage(trial, i_fit)
+        trial_cost = (weight * (v_fit - trial_model) ** 2).sum(axis=1)
+        better = trial_cost < cost * (1.0 - 1e-12)  # False for NaN, so a failed step only raises the damping
+        if not better.any():
+            break  # Every curve has converged (or cannot improve)
+        params = np.where(better[:, None], trial, params)
+        cost = np.where(better, trial_cost, cost)
+        damping = np.clip(np.where(better, damping * 0.1, damping * 10.0), 1e-9, 1e9)
+
+    fitted = (n_fit >= config_settings.DIODE_FIT_MIN_POINTS) & np.isfinite(cost) & (params[:, 0] > 0)
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        results = {
+            "n": np.where(fitted, params[:, 0] / config_settings.DIODE_THERMAL_VOLTAGE_V, np.nan),
+            "Is": np.where(fitted, np.exp(params[:, 1]), np.nan),
+            "Rs": np.where(fitted, params[:, 2], np.nan),
+            "fit_rms": np.where(fitted, np.sqrt(cost / n_fit), np.nan),
+            "fit_points": n_fit,
+        }
+    results["V_on"] = _vth_constant_current(v, np.abs(i), on_current, lengths)
+    reverse_grid = np.broadcast_to(np.asarray(reverse_v, dtype=float), (n_rows,))[:, None]
+    results["I_reverse"] = interp_rows(v, i, lengths, reverse_grid)[:, 0]
+    return {key: value[0].item() for key, value in results.items()} if single else results
+
+
+def _stretched_log_drift(params, log_t):
+    """
+    ln of D_inf (1 - exp(-(t / tau)^beta)) for params rows (ln D_inf, ln tau, beta); also returns
+    u / expm1(u) with u = (t / tau)^beta and ln(t / tau), the pieces of the Jacobian.
+    """
+    with np.errstate(over='ignore', under='ignore', invalid='ignore', divide='ignore'):
+        log_ratio = log_t - params[:, 1:2]
+        u = np.exp(params[:, 2:3] * log_ratio)
+        return params[:, 0:1] + np.log(-np.expm1(-u)), u / np.expm1(u), log_ratio
+
+
+def extract_drift_kinetics(t, drift, lengths=None, failure=None, start=None,
+                           iterations=config_settings.STRESS_KINETICS_FIT_ITERATIONS):
+    """
+    Drift kinetics of one relative-drift trace (1-D arrays of stress time and dId/Id0) or of many
+    (2-D, one trace per row), see the module docstring.
+
+    Points with t > 0 on the side of zero the trace drifts to (the sign of its summed drift) are
+    fitted. `failure` is the |drift| criterion (STRESS_DEFAULT_FAILURE_PERCENT by default) and
+    `start` optional (ln |D_inf|, ln tau, beta) to start the stretched-exponential fit from, one
+    triple or one per row (NaN rows use the power-law start). Returns a dict with 'A' and 'D_inf'
+    (signed like the drift), 'n', 'r2_power', 'tau' (s), 'beta', 'fit_rms' (of ln |drift|),
+    'fit_points', and 'life_power' / 'life_stretched' (s until |drift| reaches `failure`; inf if
+    the model never gets there).
+    """
+    if failure is None:
+        failure = float(config_settings.STRESS_DEFAULT_FAILURE_PERCENT) / 100.0
+    single, t, drift, lengths = _as_rows(t, drift, lengths)
+    n_rows, n_cols = t.shape
+    valid = (np.arange(n_cols) < lengths[:, None]) & (t > 0) & np.isfinite(drift)
+    sign = np.where(np.where(valid, drift, 0.0).sum(axis=1) < 0, -1.0, 1.0)
+    fit = valid & (sign[:, None] * drift > 0)
+    n_fit = fit.sum(axis=1)
+    weight = fit.astype(float)
+    log_t = np.log(np.where(fit, t, 1.0))
+    log_d = np.log(np.where(fit, sign[:, None] * drift, 1.0))
+
+    # Power law: ln|drift| = ln|A| + n ln t
+    slope, intercept, _ = _masked_line_fit(log_t, log_d, fit)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ss_res = (weight * (log_d - intercept[:, None] - slope[:, None] * log_t) ** 2).sum(axis=1)
+        ss_tot = (weight * (log_d - (weight * log_d).sum(axis=1, keepdims=True) / n_fit[:, None]) ** 2).sum(axis=1)
+        r2_power = 1.0 - ss_res / ss_tot
+
+    # Stretched exponential: for t << tau it is the power law with n = beta and |A| = D_inf / tau^beta
+    beta0 = np.clip(np.nan_to_num(slope, nan=0.5), 0.05, 1.0)
+    log_d_inf0 = np.log(2.0) + np.where(fit, log_d, -np.inf).max(axis=1)
+    with np.errstate(invalid='ignore'):
+        params = np.stack([log_d_inf0, (log_d_inf0 - intercept) / beta0, beta0], axis=1)
+    if start is not None:
+        start = np.broadcast_to(np.asarray(start, dtype=float), (n_rows, 3))
+        params = np.where(np.isfinite(start).all(axis=1)[:, None], start, params)
+    model, _, _ = _stretched_log_drift(params, log_t)
+    cost = (weight * (log_d - model) ** 2).sum(axis=1)
+    damping = np.full(n_rows, 1e-3)
+    # Unlike the diode fit the start can be far off, so a failed step only stops a row once its damping
+    # is high; rows that stopped, or whose last step gained almost nothing, drop out of the later iterations
+    active = np.flatnonzero(n_fit >= config_settings.STRESS_KINETICS_MIN_BINS)
+    for _ in range(iterations):
+        if active.size == 0:
+            break
+        p, w, lt, ld = params[active], weight[active], log_t[active], log_d[active]
+        model, g, log_ratio = _stretched_log_drift(p, lt)
+        jac = np.stack([np.ones_like(lt), -p[:, 2:3] * g, g * log_ratio], axis=2) * w[:, :, None]
+        trial = p + _scaled_normal_solve(np.nan_to_num(jac), np.nan_to_num((ld - model) * w), damping[active])
+        trial_model, _, _ = _stretched_log_drift(trial, lt)
+        trial_cost = (w * (ld - trial_model) ** 2).sum(axis=1)
+        better = trial_cost < cost[active] * (1.0 - 1e-12)
+        converged = better & (trial_cost > cost[active] * (1.0 - 1e-8))
+        params[active] = np.where(better[:, None], trial, p)
+        cost[active] = np.where(better, trial_cost, cost[active])
+        damping[active] = np.clip(np.where(better, damping[active] * 0.1, damping[active] * 10.0), 1e-9, 1e9)
+        active = active[~converged & (better | (damping[active] < 1e4))]
+
+    power_fitted = (n_fit >= config_settings.STRESS_KINETICS_MIN_BINS) & np.isfinite(slope)
+    stretched_fitted = (n_fit >= config_settings.STRESS_KINETICS_MIN_BINS) & np.isfinite(cost) & (params[:, 2] > 0)
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        a_abs, d_inf, tau, beta = np.exp(intercept), np.exp(params[:, 0]), np.exp(params[:, 1]), params[:, 2]
+        life_power = np.where(slope > 0, (failure / a_abs) ** (1.0 / slope), np.inf)
+        life_stretched = np.where(d_inf > failure, tau * (-np.log1p(-failure / d_inf)) ** (1.0 / beta), np.inf)
+        results = {
+            "A": np.where(power_fitted, sign * a_abs, np.nan),
+            "n": np.where(power_fitted, slope, np.nan),
+            "r2_power": np.where(power_fitted, r2_power, np.nan),
+            "D_inf": np.where(stretched_fitted, sign * d_inf, np.nan),
+            "tau": np.where(stretched_fitted, tau, np.nan),
+            "beta": np.where(stretched_fitted, beta, np.nan),
+            "fit_rms": np.where(stretched_fitted, np.sqrt(cost / n_fit), np.nan),
+            "fit_points": n_fit,
+            "life_power": np.where(power_fitted, life_power, np.nan),
+            "life_stretched": np.where(stretched_fitted, life_stretched, np.nan),
+        }
+    return {key: value[0].item() for key, value in results.items()} if single else results
@@ -4,6 +4,8 @@ import traceback
 import os
 import sys
 
+import tracing_utils
+
 def generate_plot_with_common_handling(plot_data_package, plot_content_function):
     """
     Handles common plot generation tasks: figure management, error handling, and saving.
@@ -27,6 +29,7 @@ def generate_plot_with_common_handling(plot_data_package, plot_content_function)
     png_file_path = plot_data_package.get('png_file_path', 'plot.png')
     measurement_name = plot_data_package.get("measurement_type_name", "Plot")
     csv_file_path = plot_data_package.get('csv_file_path')
+    tracer = plot_data_package.get('tracer') # Set by MeasurementBase; plot spans join the measurement's trace
 
     created_temp_fig = False
     if fig is None:
@@ -44,11 +47,13 @@ def generate_plot_with_common_handling(plot_data_package, plot_content_function)
 
     try:
         fig.clear() # Clear the figure before drawing new content
-        plot_content_function(fig, plot_data_package) # Call the specific plotting logic
+        with tracing_utils.span("plot_draw", "plot", tracer=tracer, measurement=measurement_name):
+            plot_content_function(fig, plot_data_package) # Call the specific plotting logic
 
         # Ensure directory for png_file_path exists
         os.makedirs(os.path.dirname(png_file_path), exist_ok=True)
-        fig.savefig(png_file_path, dpi=300)
+        with tracing_utils.span("plot_savefig", "plot", tracer=tracer, file=os.path.basename(png_file_path)):
+            fig.savefig(png_file_path, dpi=300)
         # print(f"  Plot for {measurement_name} saved to: {png_file_path}")
         return True
     except Exception as e:
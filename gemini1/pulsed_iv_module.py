@@ -0,0 +1,149 @@
+# pulsed_iv_module.py
+import numpy as np
+import instrument_utils
+import config_settings
+from gate_transfer_module import GateTransferMeasurement
+from output_module import OutputMeasurement
+
+class _PulsedIVMixin:
+    """
+    Pulse timing shared by the pulsed transfer and output measurements. The TSP scripts take
+    `samples_per_pulse` readings per pulse (measure.count), so every buffer holds points x samples
+    entries; they are averaged back to one row per pulse before the parent class processes them.
+    """
+    samples_per_pulse = 1
+    pulse_period = 0.0
+
+    def _prepare_pulse_parameters(self, config):
+        pulse_width = float(config.get('pulse_width', config_settings.PULSE_DEFAULT_WIDTH))
+        duty_cycle = float(config.get('duty_cycle', config_settings.PULSE_DEFAULT_DUTY_CYCLE))
+        pulse_nplc = float(config.get('pulse_nplc', config_settings.PULSE_DEFAULT_NPLC))
+        samples = int(round(float(config.get('pulse_samples', config_settings.PULSE_DEFAULT_SAMPLES))))
+        meas_delay = float(config.get('pulse_meas_delay', config_settings.PULSE_DEFAULT_MEAS_DELAY))
+        pulse_base = float(config.get('pulse_base', config_settings.PULSE_DEFAULT_BASE))
+        if pulse_width <= 0 or meas_delay <= 0:
+            raise ValueError("脉冲模式: 脉冲宽度和测量延时必须为正数。")
+        if not 0 < duty_cycle < 1:
+            raise ValueError(f"脉冲模式: 占空比 ({duty_cycle}) 必须在 0 和 1 之间。")
+        if samples < 1:
+            raise ValueError("脉冲模式: 每脉冲采样数必须至少为 1。")
+        # Every reading has to finish inside the pulse, otherwise the tail is taken at the base level
+        sample_interval = pulse_nplc / config_settings.LINE_FREQUENCY_HZ
+        window = meas_delay + samples * sample_interval
+        if window > pulse_width:
+            raise ValueError(f"脉冲模式: 测量窗口 (测量延时 + 采样数 × NPLC/电网频率 = {window * 1e3:.3f} ms) "
+                             f"超出脉冲宽度 ({pulse_width * 1e3:.3f} ms)。请减小 NPLC / 采样数或增大脉冲宽度。")
+        self.samples_per_pulse = samples
+        self.pulse_period = pulse_width / duty_cycle
+        return {
+            "pulse_width": pulse_width, "pulse_period": self.pulse_period, "pulse_base": pulse_base,
+            "pulse_nplc": pulse_nplc, "samples": samples, "sample_interval": sample_interval,
+            "meas_delay": meas_delay
+        }
+
+    def _get_expected_point_count(self, config):
+        _, expected_readings = self._get_primary_buffer_info(config)
+        return expected_readings // self.samples_per_pulse
+
+    def _estimate_run_duration_s(self, config, tsp_params):
+        # The pulse train is timer-paced: one period per point
+        return self._get_expected_point_count(config) * self.pulse_period
+
+    def _get_primary_buffer_info(self, config):
+        primary_buffer_obj_str, expected_points = super()._get_primary_buffer_info(config)
+        return primary_buffer_obj_str, expected_points * self.samples_per_pulse
+
+    def _query_and_read_buffers(self, inst, config):
+        super()._query_and_read_buffers(inst, config)
+        samples = self.samples_per_pulse
+        if samples <= 1:
+            return
+        # Readings are stored pulse by pulse: average each group, keep the first time stamp of the pulse
+        for key, arr in self.raw_data.items():
+            if not isinstance(arr, np.ndarray) or arr.size < samples:
+                continue
+            n_pulses = arr.size // samples
+            per_pulse = arr[:n_pulses * samples].reshape(n_pulses, samples)
+            self.raw_data[key] = per_pulse[:, 0] if key.startswith('Time') else np.nanmean(per_pulse, axis=1)
+        self.consistent_len //= samples
+        self.buffer_read_count_final //= samples
+
+    def _get_pulse_metadata_comments(self, config):
+        comments = "# Pulsed Mode: True\n"
+        comments += f"# Pulse Width (s): {config.get('pulse_width', 'N/A')}\n"
+        comments += f"# Pulse Duty Cycle: {config.get('duty_cycle', 'N/A')}\n"
+        comments += f"# Pulse Period (s): {self.pulse_period:.6g}\n"
+        comments += f"# Pulse Base Level (V): {config.get('pulse_base', 'N/A')}\n"
+        comments += f"# Pulse Measure Delay (s): {config.get('pulse_meas_delay', 'N/A')}\n"
+        comments += f"# Pulse NPLC: {config.get('pulse_nplc', 'N/A')}\n"
+        comments += f"# Samples per Pulse (averaged): {self.samples_per_pulse}\n"
+        return comments
+
+
+class PulsedGateTransferMeasurement(_PulsedIVMixin, GateTransferMeasurement):
+    def __init__(self):
+        super().__init__()
+        self.measurement_type_name_short = "PulsedGateTransfer"
+
+    def _get_tsp_script_path_key(self, config):
+        return config_settings.CONFIG_KEY_TSP_PULSED_GATE_TRANSFER
+
+    def _get_default_tsp_script_path(self, config):
+        return config_settings.DEFAULT_TSP_PULSED_GATE_TRANSFER
+
+    def _prepare_tsp_parameters(self, config):
+        # Adaptive stepping and range scheduling need per-point feedback, which a pre-loaded pulse list cannot give
+        tsp_params = super()._prepare_tsp_parameters({**config, 'adaptive_sweep': False, 'range_schedule': False})
+        tsp_params.update(self._prepare_pulse_parameters(config))
+        tsp_params["drain_rangev"] = abs(config['Vd'])
+        tsp_params["gate_rangev"] = max(abs(config['Vg_start']), abs(config['Vg_stop']), abs(tsp_params['pulse_base']))
+        return tsp_params
+
+    def _get_specific_metadata_comments(self, config):
+        return super()._get_specific_metadata_comments(config) + self._get_pulse_metadata_comments(config)
+
+
+class PulsedOutputMeasurement(_PulsedIVMixin, OutputMeasurement):
+    def __init__(self):
+        super().__init__()
+        self.measurement_type_name_short = "PulsedOutput"
+
+    def _get_tsp_script_path_key(self, config):
+        return config_settings.CONFIG_KEY_TSP_PULSED_OUTPUT
+
+    def _get_default_tsp_script_path(self, config):
+        return config_settings.DEFAULT_TSP_PULSED_OUTPUT
+
+    def _prepare_tsp_parameters(self, config):
+        # The pulse list is loaded up front, so there is no per-point early stop either
+        tsp_params = super()._prepare_tsp_parameters({**config, 'oc_early_stop': False})
+        tsp_params.update(self._prepare_pulse_parameters(config))
+        tsp_params["drain_rangev"] = max(abs(config['Vd_start']), abs(config['Vd_stop']), abs(tsp_params['pulse_base']))
+        tsp_params["gate_rangev"] = max(abs(config['Vg_start']), abs(config['Vg_stop']))
+        return tsp_params
+
+    def _get_specific_metadata_comments(self, config):
+        return super()._get_specific_metadata_comments(config) + self._get_pulse_metadata_comments(config)
+
+
+# Plot packages match the DC measurements, so gate_transfer_module.generate_gate_transfer_plot and
+# output_module.generate_output_plot draw the pulsed results as well.
+@instrument_utils.handle_measurement_errors
+def run_pulsed_gate_transfer_measurement(config):
+    config["measurement_type_name"] = "Pulsed Gate Transfer"
+    GPIB_ADDRESS = config.get(config_settings.CONFIG_KEY_GPIB_ADDRESS, config_settings.DEFAULT_GPIB_ADDRESS)
+    TIMEOUT = config.get(config_settings.CONFIG_KEY_TIMEOUT, config_settings.DEFAULT_TIMEOUT)
+    pulsed_gt_measurement = PulsedGateTransferMeasurement()
+    with instrument_utils.visa_instrument(GPIB_ADDRESS, TIMEOUT, config["measurement_type_name"]) as inst:
+        plot_data_package = pulsed_gt_measurement.perform_measurement_flow(config, inst)
+    return plot_data_package
+
+@instrument_utils.handle_measurement_errors
+def run_pulsed_output_measurement(config):
+    config["measurement_type_name"] = "Pulsed Output Characteristics"
+    GPIB_ADDRESS = config.get(config_settings.CONFIG_KEY_GPIB_ADDRESS, config_settings.DEFAULT_GPIB_ADDRESS)
+    TIMEOUT = config.get(config_settings.CONFIG_KEY_TIMEOUT, config_settings.DEFAULT_TIMEOUT)
+    pulsed_oc_measurement = PulsedOutputMeasurement()
+    with instrument_utils.visa_instrument(GPIB_ADDRESS, TIMEOUT, config["measurement_type_name"]) as inst:
+        plot_data_package = pulsed_oc_measurement.perform_measurement_flow(config, inst)
+    return plot_data_package
@@ -0,0 +1,85 @@
+# stress_kinetics.py
+"""
+Running drift kinetics of a stress: dId/Id0 against stress time, kept as sums per log-time bin.
+
+DriftKinetics.add folds each block of samples (a streamed chunk, or a whole run at once) into
+fixed bins of STRESS_KINETICS_BINS_PER_DECADE per decade from STRESS_KINETICS_T_MIN_S, so the
+cost of a chunk does not grow with the length of the stress and no sample is kept. fit() fits
+the bin means with parameter_extraction.extract_drift_kinetics (power law, stretched
+exponential, lifetimes), starting the stretched exponential from the previous fit: during a
+long stress each refit is a few iterations on a few dozen points.
+
+Time and Id0 come from the first sample added, i.e. the t=0 point of the stress.
+"""
+import numpy as np
+
+import config_settings
+import parameter_extraction
+
+# (key, label, fmt) of the kinetics results in the CSV metadata
+KINETICS_LABELS = (("Id0", "Id0 (A)", ".4e"), ("drift_last", "dId/Id0 at End", ".4e"), ("bins", "Log-Time Bins", "d"),
+                   ("A", "Power Law A", ".4e"), ("n", "Power Law n", ".4f"), ("r2_power", "Power Law R^2", ".4f"),
+                   ("D_inf", "Stretched Exp D_inf", ".4e"), ("tau", "Stretched Exp tau (s)", ".4e"),
+                   ("beta", "Stretched Exp beta", ".4f"), ("fit_rms", "Stretched Exp RMS (ln)", ".3e"),
+                   ("life_power", "Lifetime Power Law (s)", ".4e"), ("life_stretched", "Lifetime Stretched Exp (s)", ".4e"))
+
+
+class DriftKinetics:
+    def __init__(self, failure=None, bins_per_decade=config_settings.STRESS_KINETICS_BINS_PER_DECADE,
+                 t_min=config_settings.STRESS_KINETICS_T_MIN_S, decades=config_settings.STRESS_KINETICS_DECADES):
+        self.failure = failure if failure is not None else float(config_settings.STRESS_DEFAULT_FAILURE_PERCENT) / 100.0
+        self.bins_per_decade = bins_per_decade
+        self.t_min = t_min
+        n_bins = int(round(bins_per_decade * decades))
+        self.count = np.zeros(n_bins)
+        self.sum_log_t = np.zeros(n_bins)
+        self.sum_drift = np.zeros(n_bins)
+        self.t0 = self.id0 = None
+        self.t_last = self.drift_last = np.nan
+        self.params = {}
+        self._start = None # (ln |D_inf|, ln tau, beta) of the last stretched-exponential fit
+
+    @property
+    def points(self):
+        return int(self.count.sum())
+
+    def add(self, timestamps, id_):
+        """Folds samples (timestamps in s on any fixed origin, Id in A) into the bins."""
+        timestamps, id_ = np.asarray(timestamps, dtype=float), np.asarray(id_, dtype=float)
+        ok = np.isfinite(timestamps) & np.isfinite(id_)
+        if not ok.any():
+            return
+        timestamps, id_ = timestamps[ok], id_[ok]
+        if self.t0 is None:
+            if id_[0] == 0:
+                return # No relative drift against a zero reference; wait for a usable first sample
+            self.t0, self.id0 = float(timestamps[0]), float(id_[0])
+        t = timestamps - self.t0
+        drift = (id_ - self.id0) / self.id0
+        self.t_last, self.drift_last = float(t[-1]), float(drift[-1])
+        later = t > 0 # The reference point itself has no log time
+        t, drift = t[later], drift[later]
+        if t.size == 0:
+            return
+        index = np.clip(np.floor(self.bins_per_decade * np.log10(t / self.t_min)), 0, self.count.size - 1).astype(int)
+        self.count += np.bincount(index, minlength=self.count.size)
+        self.sum_log_t += np.bincount(index, weights=np.log10(t), minlength=self.count.size)
+        self.sum_drift += np.bincount(index, weights=drift, minlength=self.count.size)
+
+    def binned(self):
+        """(t, dId/Id0) of the filled bins: geometric mean time and mean drift."""
+        filled = self.count > 0
+        return 10.0 ** (self.sum_log_t[filled] / self.count[filled]), self.sum_drift[filled] / self.count[filled]
+
+    def fit(self):
+        """Fits the current bins; returns (and keeps in .params) the extract_drift_kinetics dict plus Id0, drift_last, t_last and bins."""
+        t_bin, drift_bin = self.binned()
+        if t_bin.size == 0:
+            self.params = {}
+            return self.params
+        params = parameter_extraction.extract_drift_kinetics(t_bin, drift_bin, failure=self.failure, start=self._start)
+        stretched = (abs(params['D_inf']), params['tau'], params['beta'])
+        self._start = (np.log(stretched[0]), np.log(stretched[1]), stretched[2]) if np.all(np.isfinite(stretched)) else None
+        params.update(Id0=self.id0, drift_last=self.drift_last, t_last=self.t_last, bins=t_bin.size)
+        self.params = params
+        return params
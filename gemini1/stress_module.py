@@ -2,22 +2,62 @@
 import numpy as np
 import os
 import sys # For sys.stderr in case of errors
+import time
 import traceback # For detailed error tracebacks
+import pyvisa
 
 import instrument_utils
 import config_settings
 from measurement_base import MeasurementBase
 import plotting_utils
+import tracing_utils
+from stress_kinetics import DriftKinetics, KINETICS_LABELS
+
+# Column order of one printbuffer line in StressChunked.tsp
+_CHUNK_COLUMNS = ['Timestamp', 'Vd_read', 'Id', 'Vg_read', 'Ig', 'Vs_read', 'Is_buffer']
+
+def _log_time_schedule(first_point, duration, points_per_decade):
+    """
+    Sample times (s, after the t=0 point) for log-time stress sampling: `points_per_decade` per decade
+    starting at `first_point`, always ending exactly at `duration`.
+    """
+    if duration <= 0:
+        return np.array([])
+    if first_point >= duration:
+        return np.array([float(duration)])
+    n_log = int(np.floor(points_per_decade * np.log10(duration / first_point) + 1e-9)) + 1
+    times = first_point * 10.0 ** (np.arange(n_log) / points_per_decade)
+    times = times[times < duration * (1 - 1e-9)]
+    return np.append(times, float(duration))
+
+def _log_avg_counts(times, sample_time):
+    """Repeat-average filter count per log bin: as many conversions as fit in STRESS_LOG_AVG_FILL of the bin."""
+    bin_widths = np.diff(np.concatenate(([0.0], times)))
+    counts = np.floor(config_settings.STRESS_LOG_AVG_FILL * bin_widths / sample_time)
+    return np.clip(counts, 1, config_settings.STRESS_LOG_FILTER_MAX_COUNT).astype(int)
+
+def _to_lua_table(values, fmt="{:.9g}"):
+    return "{" + ", ".join(fmt.format(v) for v in values) + "}"
 
 class StressMeasurement(MeasurementBase):
     def __init__(self):
         super().__init__(measurement_type_name_short="Stress", plot_file_suffix="_stress.png")
         self.num_expected_stress_points = 0
+        self.log_time_sampling = False
+        self.chunked_logging = False
+        self.chunks_received = 0
+        self.failure_fraction = float(config_settings.STRESS_DEFAULT_FAILURE_PERCENT) / 100.0
+        self.kinetics = None
+        self.kinetics_params = {} # DriftKinetics.fit() of the whole run (keys of KINETICS_LABELS)
 
     def _get_tsp_script_path_key(self, config):
         return config_settings.CONFIG_KEY_TSP_STRESS
 
     def _get_default_tsp_script_path(self, config):
+        if config.get('stress_log_sampling', False):
+            return config_settings.DEFAULT_TSP_STRESS_LOG
+        if config.get('stress_chunked_logging', False):
+            return config_settings.DEFAULT_TSP_STRESS_CHUNKED
         return config_settings.DEFAULT_TSP_STRESS
 
     def _prepare_tsp_parameters(self, config):
@@ -66,8 +106,61 @@ class StressMeasurement(MeasurementBase):
             "Gate_nplc_stress": config.get('Gate_nplc_stress', config_settings.STRESS_DEFAULT_GATE_NPLC),
             "Source_nplc_stress": config.get('Source_nplc_stress', config_settings.STRESS_DEFAULT_SOURCE_NPLC),
         }
+        self._prepare_extraction_parameters(config)
+        self.log_time_sampling = bool(config.get('stress_log_sampling', False))
+        # Log-time runs are short by construction, so chunking only applies to uniform sampling
+        self.chunked_logging = bool(config.get('stress_chunked_logging', False)) and not self.log_time_sampling
+        if self.log_time_sampling:
+            tsp_params.update(self._prepare_log_sampling_parameters(config, duration))
+        elif self.chunked_logging:
+            tsp_params.update(self._prepare_chunked_parameters(duration, interval))
         return tsp_params
 
+    def _prepare_extraction_parameters(self, config):
+        failure_percent = float(config.get('failure_percent', config_settings.STRESS_DEFAULT_FAILURE_PERCENT))
+        if not failure_percent > 0:
+            raise ValueError(f"失效判据 ({failure_percent}%) 必须为正。")
+        self.failure_fraction = failure_percent / 100.0
+        self.kinetics = DriftKinetics(failure=self.failure_fraction)
+
+    def _prepare_chunked_parameters(self, duration, interval):
+        # StressChunked.tsp runs a fixed number of timer-paced readings: t=0 plus one per full interval
+        self.num_expected_stress_points = int(np.floor(duration / interval + 1e-9)) + 1 if interval > 0 else 1
+        return {
+            "total_points": self.num_expected_stress_points,
+            "chunk_points": config_settings.STRESS_CHUNK_POINTS
+        }
+
+    def _prepare_log_sampling_parameters(self, config, duration):
+        # The schedule is built here and handed to StressLog.tsp as-is, so the point count is known exactly
+        first_point = float(config.get('log_first_point', config_settings.STRESS_LOG_DEFAULT_FIRST_POINT))
+        points_per_decade = float(config.get('log_points_per_decade', config_settings.STRESS_LOG_DEFAULT_POINTS_PER_DECADE))
+        if first_point <= 0 or points_per_decade <= 0:
+            raise ValueError("对数时间采样: 首点时间和每十倍频点数必须为正数。")
+        sample_time = sum(float(config.get(key, default)) / config_settings.LINE_FREQUENCY_HZ + config_settings.STRESS_LOG_CONVERSION_OVERHEAD_S
+                          for key, default in (('Drain_nplc_stress', config_settings.STRESS_DEFAULT_DRAIN_NPLC),
+                                               ('Gate_nplc_stress', config_settings.STRESS_DEFAULT_GATE_NPLC),
+                                               ('Source_nplc_stress', config_settings.STRESS_DEFAULT_SOURCE_NPLC)))
+        log_times = _log_time_schedule(first_point, duration, points_per_decade)
+        avg_counts = _log_avg_counts(log_times, sample_time)
+        self.num_expected_stress_points = log_times.size + 1
+        return {
+            "log_times": _to_lua_table(log_times),
+            "log_avg_counts": _to_lua_table(avg_counts, fmt="{:d}"),
+            "sample_time": f"{sample_time:.9g}"
+        }
+
+    def _estimate_run_duration_s(self, config, tsp_params):
+        integration_s = sum(float(tsp_params[k]) for k in ('Drain_nplc_stress', 'Gate_nplc_stress', 'Source_nplc_stress')) / config_settings.LINE_FREQUENCY_HZ
+        return (float(tsp_params['initial_settling_delay']) + float(tsp_params['stress_duration_val'])
+                + self.num_expected_stress_points * (integration_s + config_settings.SCRIPT_POINT_OVERHEAD_S))
+
+    def _wait_for_script_completion(self, inst, config, tsp_params):
+        # Chunked logging reads while the script runs and ends on the script's own END line
+        if self.chunked_logging:
+            return
+        super()._wait_for_script_completion(inst, config, tsp_params)
+
     def _get_primary_buffer_info(self, config):
         """
         Returns the primary buffer object string for querying data count and the expected number of points.
@@ -90,6 +183,79 @@ class StressMeasurement(MeasurementBase):
             'Is_buffer': (config_settings.SOURCE_SMU_IS_BUFFER_READINGS_PATH, buffer_read_count), # Changed to Is_buffer
         }
 
+    def _query_and_read_buffers(self, inst, config):
+        if not self.chunked_logging:
+            return super()._query_and_read_buffers(inst, config)
+        with tracing_utils.span("read_chunks", "flow") as span_args:
+            chunks = self._read_stress_chunks(inst, config)
+            span_args["chunks"] = len(chunks)
+        data = np.concatenate(chunks) if chunks else np.empty((0, len(_CHUNK_COLUMNS)))
+        self.raw_data = {key: data[:, col] for col, key in enumerate(_CHUNK_COLUMNS)}
+        self.buffer_read_count_final = self.consistent_len = data.shape[0]
+        self.chunks_received = len(chunks)
+
+    def _read_stress_chunks(self, inst, config):
+        """
+        Collects the chunks StressChunked.tsp prints while the stress runs. Each chunk arrives as a
+        "CHUNK k n basetimestamp" line plus one printbuffer line; timestamps are made absolute with
+        the chunk's basetimestamp so the chunks join into one time axis. Every chunk also goes into
+        the drift kinetics, refitted for the kinetics callback (if any) so it follows the stress live.
+        Reads poll with a short VISA timeout (progress is reported between them, like
+        wait_for_script_completion); past the planned end plus STRESS_CHUNK_READ_MARGIN_S the
+        script is treated as hung, cleared (aborted) and a RuntimeError raised.
+        """
+        duration = config.get('stress_duration_val', float(config_settings.STRESS_DEFAULT_DURATION))
+        settling = config.get('initial_settling_delay_stress', float(config_settings.STRESS_DEFAULT_INITIAL_SETTLING_DELAY))
+        self.expected_run_duration_s = expected_s = float(duration) + float(settling)
+        limit_s = expected_s + config_settings.STRESS_CHUNK_READ_MARGIN_S
+        n_cols = len(_CHUNK_COLUMNS)
+        kinetics_callback = config.get(config_settings.CONFIG_KEY_STRESS_KINETICS_CALLBACK)
+        progress_callback = config.get(config_settings.CONFIG_KEY_PROGRESS_CALLBACK)
+        start = time.monotonic()
+
+        def read_line():
+            while True:
+                try:
+                    return instrument_utils.visa_read(inst).strip()
+                except pyvisa.errors.VisaIOError as e:
+                    if e.error_code != pyvisa.constants.StatusCode.error_timeout:
+                        raise
+                    elapsed = time.monotonic() - start
+                    if elapsed >= limit_s:
+                        inst.clear() # Device clear aborts the running script
+                        raise RuntimeError(f"分块应力脚本 ({self.measurement_type_name_full}) 在 {limit_s:.0f} s 内未结束，判定为挂起并已中止。")
+                    if progress_callback is not None and expected_s > 0:
+                        progress_callback(min(100.0 * elapsed / expected_s, 99.0), elapsed, expected_s)
+
+        chunks = []
+        original_timeout = inst.timeout
+        inst.timeout = config_settings.SCRIPT_POLL_INTERVAL_S * 1000
+        try:
+            while True:
+                line = read_line()
+                fields = line.split('\t')
+                if fields[0] == 'END':
+                    break
+                if fields[0] != 'CHUNK' or len(fields) < 4:
+                    print(f"  Warning ({self.measurement_type_name_full}): 忽略无法识别的分块输出: '{line[:80]}'", file=sys.stderr)
+                    continue
+                chunk_index, n_points, base_ts = int(float(fields[1])), int(float(fields[2])), float(fields[3])
+                values = instrument_utils.safe_float_convert(read_line())
+                rows = values[:(values.size // n_cols) * n_cols].reshape(-1, n_cols)
+                if rows.shape[0] != n_points:
+                    print(f"  Warning ({self.measurement_type_name_full}): 分块 {chunk_index} 应有 {n_points} 点, 实际读取 {rows.shape[0]} 点。", file=sys.stderr)
+                rows[:, 0] += base_ts
+                chunks.append(rows)
+                self.kinetics.add(rows[:, 0], rows[:, _CHUNK_COLUMNS.index('Id')])
+                if kinetics_callback is not None and self.kinetics.fit():
+                    kinetics_callback(self.kinetics.params)
+        finally:
+            inst.timeout = original_timeout
+        self.script_run_duration_s = time.monotonic() - start
+        if progress_callback is not None and expected_s > 0:
+            progress_callback(100.0, self.script_run_duration_s, expected_s)
+        return chunks
+
     def _get_priority_keys_for_consistent_length(self):
         """
         Returns a list of keys to prioritize for determining consistent data length.
@@ -116,6 +282,14 @@ class StressMeasurement(MeasurementBase):
                  self.processed_data['Time'] = np.full(self.consistent_len, np.nan) if self.consistent_len > 0 else np.array([])
         elif 'Time' not in self.processed_data:
             self.processed_data['Time'] = np.full(self.consistent_len, np.nan) if self.consistent_len > 0 else np.array([])
+        self._extract_kinetics()
+
+    def _extract_kinetics(self):
+        # Chunked runs already fed every chunk into the bins while reading; the other modes go in at once
+        if not (self.chunked_logging and self.kinetics.points):
+            self.kinetics = DriftKinetics(failure=self.failure_fraction)
+            self.kinetics.add(self.processed_data.get('Time', np.array([])), self.processed_data.get('Id', np.array([])))
+        self.kinetics_params = self.kinetics.fit()
 
     def _get_csv_header_info(self, config):
         """
@@ -150,6 +324,19 @@ class StressMeasurement(MeasurementBase):
         comments += f"# Stress Measure Interval (set, s): {config.get('stress_measure_interval_val', 'N/A')}\n"
         comments += f"# Initial Settling Delay (set, s): {config.get('initial_settling_delay_stress', 'N/A')}\n" # New
         comments += f"# Expected Stress Data Points: {self.num_expected_stress_points}\n"
+        if self.log_time_sampling:
+            comments += f"# Sampling Mode: log-time (on-instrument repeat averaging per bin)\n"
+            comments += f"# Log First Point (s): {config.get('log_first_point', 'N/A')}\n"
+            comments += f"# Log Points per Decade: {config.get('log_points_per_decade', 'N/A')}\n"
+        if self.chunked_logging:
+            comments += f"# Logging Mode: chunked double-buffered ({config_settings.STRESS_CHUNK_POINTS} points per buffer set)\n"
+            comments += f"# Chunks Received: {self.chunks_received}\n"
+        if self.kinetics_params:
+            comments += f"# Drift Kinetics: dId/Id0 in {config_settings.STRESS_KINETICS_BINS_PER_DECADE} log-time bins per decade, "
+            comments += f"A*t^n and D_inf*(1-exp(-(t/tau)^beta))\n"
+            comments += f"# Failure Criterion |dId/Id0| (%): {self.failure_fraction * 100:g}\n"
+            for key, label, fmt in KINETICS_LABELS:
+                comments += f"# {label}: {self.kinetics_params[key]:{fmt}}\n"
         comments += f"# IlimitDrain_stress (set, A): {config.get('IlimitDrain_stress', 'N/A')}\n"
         comments += f"# IlimitGate_stress (set, A): {config.get('IlimitGate_stress', 'N/A')}\n"
         comments += f"# IlimitSource_stress (set, A): {config.get('IlimitSource_stress', 'N/A')}\n"
@@ -172,7 +359,18 @@ class StressMeasurement(MeasurementBase):
             "VD_stress_val": config.get('VD_stress_val'),
             "VG_stress_val": config.get('VG_stress_val'),
             "VS_stress_val": config.get('VS_stress_val'),
-            "stress_duration_val": config.get('stress_duration_val')
+            "stress_duration_val": config.get('stress_duration_val'),
+            "log_time_sampling": self.log_time_sampling,
+            "log_first_point": config.get('log_first_point'),
+            "kinetics_params": self.kinetics_params,
+            "kinetics_bins": self.kinetics.binned() if self.kinetics_params else None,
+            "failure_fraction": self.failure_fraction,
+            "Drift_final": self.kinetics_params.get('drift_last'),
+            "Kinetics_n": self.kinetics_params.get('n'),
+            "Kinetics_tau": self.kinetics_params.get('tau'),
+            "Kinetics_beta": self.kinetics_params.get('beta'),
+            "Lifetime_power": self.kinetics_params.get('life_power'),
+            "Lifetime_stretched": self.kinetics_params.get('life_stretched')
         }
 
 def generate_stress_plot(plot_data_package):
@@ -199,9 +397,11 @@ def _plot_stress_figure_content(fig, plot_data_package):
     vs_data = processed_data.get('Vs_read', np.array([]))
     is_data = processed_data.get('Is', np.array([])) # Now 'Is' is consistently populated by MeasurementBase
 
-    ax_volt = fig.add_subplot(3, 1, 1)
-    ax_curr_lin = fig.add_subplot(3, 1, 2, sharex=ax_volt)
-    ax_curr_log = fig.add_subplot(3, 1, 3, sharex=ax_volt)
+    kinetics_bins = plot_data_package.get('kinetics_bins')
+    n_rows = 4 if kinetics_bins is not None else 3
+    ax_volt = fig.add_subplot(n_rows, 1, 1)
+    ax_curr_lin = fig.add_subplot(n_rows, 1, 2, sharex=ax_volt)
+    ax_curr_log = fig.add_subplot(n_rows, 1, 3, sharex=ax_volt)
 
     if time_data.size > 0:
         valid_time_indices = ~np.isnan(time_data)
@@ -265,7 +465,14 @@ def _plot_stress_figure_content(fig, plot_data_package):
         min_time_limit = min(0, min_time_data - max_time_limit * 0.02) # Start from 0 or slightly before data
         if max_time_limit > min_time_limit:
             ax_volt.set_xlim(left=min_time_limit, right=max_time_limit)
+    if plot_data_package.get('log_time_sampling') and plot_data_package.get('log_first_point'):
+        # Linear below the first log sample so the t=0 point stays on the axis
+        ax_volt.set_xscale('symlog', linthresh=float(plot_data_package['log_first_point']))
     
+    if kinetics_bins is not None:
+        _plot_kinetics(fig.add_subplot(n_rows, 1, 4), kinetics_bins, plot_data_package.get('kinetics_params', {}),
+                       plot_data_package.get('failure_fraction'))
+
     if not (ax_volt.lines or ax_curr_lin.lines or ax_curr_log.lines):
         fig.clear()
         fig_text = f"{measurement_name}\nNo valid data to plot"
@@ -279,6 +486,29 @@ def _plot_stress_figure_content(fig, plot_data_package):
     except Exception:
         pass
 
+def _plot_kinetics(ax, kinetics_bins, kinetics_params, failure_fraction):
+    """|dId/Id0| bin means vs time (log-log) with both fits and the failure criterion."""
+    t_bin, drift_bin = kinetics_bins
+    shown = drift_bin != 0
+    ax.plot(t_bin[shown], np.abs(drift_bin[shown]), 'o', markersize=4, label='$|\\Delta I_D/I_{D0}|$ (log bins)')
+    if t_bin.size > 1:
+        t_fit = np.logspace(np.log10(t_bin[0]), np.log10(t_bin[-1]), 200)
+        if np.isfinite(kinetics_params.get('n', np.nan)):
+            ax.plot(t_fit, abs(kinetics_params['A']) * t_fit ** kinetics_params['n'], '--',
+                    label=f"$A t^n$, n = {kinetics_params['n']:.3f}")
+        if np.isfinite(kinetics_params.get('beta', np.nan)):
+            ax.plot(t_fit, abs(kinetics_params['D_inf']) * -np.expm1(-(t_fit / kinetics_params['tau']) ** kinetics_params['beta']), '-',
+                    label=f"stretched exp, $\\tau$ = {kinetics_params['tau']:.3g} s, $\\beta$ = {kinetics_params['beta']:.3f}")
+    if failure_fraction:
+        ax.axhline(failure_fraction, color='red', linestyle=':', label=f"failure {failure_fraction * 100:g}%")
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.set_xlabel('Stress Time (s)')
+    ax.set_ylabel('$|\\Delta I_D/I_{D0}|$')
+    ax.set_title('Drain Current Drift Kinetics')
+    ax.grid(True, which="both", alpha=0.3)
+    if ax.lines: ax.legend(loc='best', fontsize='small')
+
 @instrument_utils.handle_measurement_errors
 def run_stress_measurement(config):
     config["measurement_type_name"] = "Stress Test"
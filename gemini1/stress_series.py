@@ -0,0 +1,248 @@
+# stress_series.py
+"""
+Stress / recovery series of repeated stress -> gate transfer cycles, read back from a data folder.
+
+Runs are grouped by device ID, the file name the user gave the run: the stress sequence names its
+post-stress sweep '<name>' + POST_STRESS_GT_SUFFIX, so '<name>_Stress_<ts>.csv',
+'<name>_post_stress_GT_GateTransfer_<ts>.csv' and a plain '<name>_GateTransfer_<ts>.csv' (the
+pre-stress baseline, or a later recovery read-out) all belong to device '<name>'. Runs are ordered
+by the start timestamp in the file name. The cumulative stress time of a sweep adds up the measured
+length (last Time value) of every earlier stress of the device, and the recovery time is the gap
+from the end of the latest one. The baseline is the last gate transfer before the first stress;
+dVth, dSS_min and dgm_max of every later sweep are taken against it.
+
+Per-file results (forward-leg Vth, SS_min and gm_max, stress length) are cached in
+STRESS_SERIES_CACHE_FILE inside the data folder, keyed by file name, modification time and the
+extraction settings, so a campaign with hundreds of cycles only reads its new files; their sweeps
+go through extract_vth / extract_ss in one stacked call. The series is then computed for every
+device at once with sorted-group array operations.
+
+    python stress_series.py <output_dir> [series.csv]    # print / write the series of a data folder
+"""
+import os
+import re
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import config_settings
+import parameter_extraction
+from gate_transfer_module import GateTransferMeasurement
+from measurement_record import MeasurementRecord, SweepLegs, SWEEP_LEG_ROWS_METADATA_KEY
+
+_SERIES_FILE_RE = re.compile(r"^(?:(?P<name>.+)_)?(?P<kind>Stress|GateTransfer)_(?P<stamp>\d{8}_\d{6})\.csv$")
+# Unnamed post-stress GT runs: "post_stress_GT", or "post_stress_GT_<stamp>" as older versions named them
+_UNNAMED_POST_STRESS_RE = re.compile(rf"^{re.escape(config_settings.POST_STRESS_GT_SUFFIX.lstrip('_'))}(?:_\d{{8}}_\d{{6}})?$")
+_CACHE_FIELDS = ("filename", "mtime", "device", "kind", "t_start", "stress_s", "vth", "ss_min", "gm_max")
+
+# (series key, CSV column, fmt) of the series table
+SERIES_COLUMNS = (("device", "Device", "s"), ("filename", "FileName", "s"), ("stamp", "Timestamp", "s"),
+                  ("cycles", "Stress Cycles", "d"), ("cum_stress_s", "Cumulative Stress (s)", ".4e"),
+                  ("recovery_s", "Recovery Time (s)", ".4e"), ("vth", "Vth_fwd (V)", ".4f"),
+                  ("ss_min", "SS_min_fwd (mV/dec)", ".2f"), ("gm_max", "Max_gm_fwd (S)", ".4e"),
+                  ("d_vth", "dVth (V)", ".4f"), ("d_ss_min", "dSS_min (mV/dec)", ".2f"),
+                  ("d_gm_max", "dgm_max (S)", ".4e"), ("d_gm_max_rel", "dgm_max / gm_max0", ".4e"),
+                  ("baseline", "Baseline File", "s"))
+
+
+def parse_series_filename(filename):
+    """(device ID, 'Stress' or 'GateTransfer', start time in s since the epoch); None for other files."""
+    m = _SERIES_FILE_RE.match(filename)
+    if not m:
+        return None
+    device = m.group('name') or ""
+    if device.endswith(config_settings.POST_STRESS_GT_SUFFIX):
+        device = device[:-len(config_settings.POST_STRESS_GT_SUFFIX)]
+    elif _UNNAMED_POST_STRESS_RE.match(device):
+        device = ""
+    return device, m.group('kind'), datetime.strptime(m.group('stamp'), '%Y%m%d_%H%M%S').timestamp()
+
+
+def extraction_settings(config=None):
+    """Validated (vth_method, vth_smooth_window, vth_cc_current, ss_window) from GT tab style keys."""
+    gt = GateTransferMeasurement()
+    gt._prepare_extraction_parameters(config or {})
+    return gt.vth_method, gt.vth_smooth_window, gt.vth_cc_current, gt.ss_window
+
+
+def _read_run_csv(csv_path):
+    """(metadata, MeasurementRecord with the GT / stress column names used in processing) of one CSV."""
+    metadata = {}
+    with open(csv_path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if not line.startswith('#'):
+                break
+            key, sep, value = line[1:].partition(':')
+            if sep:
+                metadata[key.strip()] = value.strip()
+    df = pd.read_csv(csv_path, comment='#')
+    columns = {'Vg_actual': 'Vg_actual_for_data', 'IDrain': 'Id'}
+    return metadata, MeasurementRecord.from_columns(
+        {columns.get(name.split('(')[0].strip(), name.split('(')[0].strip()): pd.to_numeric(df[name], errors='coerce').values
+         for name in df.columns})
+
+
+def _extract_files(paths, kinds, settings):
+    """Per-file (stress_s, vth, ss_min, gm_max) arrays; all gate transfer forward legs in one stacked extraction."""
+    n = len(paths)
+    stress_s, vth, ss_min, gm_max = (np.full(n, np.nan) for _ in range(4))
+    method, smooth_window, cc_current, ss_window = settings
+    sweep_rows, sweeps = [], []
+    for row, (path, kind) in enumerate(zip(paths, kinds)):
+        try:
+            metadata, record = _read_run_csv(path)
+        except (OSError, ValueError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+            print(f"  Warning (应力序列): 无法读取 {os.path.basename(path)}: {e}", file=sys.stderr)
+            continue
+        if kind == "Stress":
+            time_s = record.get('Time')
+            if time_s is not None and np.any(np.isfinite(time_s)):
+                stress_s[row] = np.nanmax(time_s)
+            continue
+        fwd_leg = SweepLegs.from_metadata(record, metadata.get(SWEEP_LEG_ROWS_METADATA_KEY)).forward
+        vg, id_ = fwd_leg.get('Vg_actual_for_data'), fwd_leg.get('Id')
+        if vg is None or id_ is None or np.count_nonzero(~np.isnan(vg) & ~np.isnan(id_)) < max(ss_window, 3):
+            continue
+        sweep_rows.append(row)
+        sweeps.append((vg, id_))
+    if sweeps:
+        vg_rows, id_rows, lengths = parameter_extraction.stack_sweeps(sweeps)
+        vth_results = parameter_extraction.extract_vth(vg_rows, id_rows, methods=(method,), smooth_window=smooth_window,
+                                                       cc_current=cc_current, lengths=lengths)
+        ss_results = parameter_extraction.extract_ss(vg_rows, id_rows, window=ss_window, lengths=lengths)
+        vth[sweep_rows] = vth_results[f"Vth_{method}"]
+        gm_max[sweep_rows] = vth_results["gm_max"]
+        ss_min[sweep_rows] = ss_results["SS_min"]
+    return stress_s, vth, ss_min, gm_max
+
+
+def load_series_table(output_dir, settings):
+    """
+    Per-file table (dict of arrays, keys _CACHE_FIELDS) of every stress / gate transfer CSV in
+    output_dir, from the cache where the file and settings are unchanged; the cache is rewritten.
+    """
+    cache_path = os.path.join(output_dir, config_settings.STRESS_SERIES_CACHE_FILE)
+    settings_key = "|".join(str(value) for value in settings)
+    cache, cached = {}, {}
+    if os.path.isfile(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as cache_file:
+                if str(cache_file['settings']) == settings_key:
+                    cache = {field: cache_file[field] for field in _CACHE_FIELDS}
+                    cached = {name: row for row, name in enumerate(cache['filename'])}
+        except (OSError, KeyError, ValueError) as e:
+            print(f"  Warning (应力序列): 缓存 {cache_path} 无法读取, 重新提取: {e}", file=sys.stderr)
+
+    entries = []
+    for filename in os.listdir(output_dir):
+        parsed = parse_series_filename(filename)
+        if parsed:
+            entries.append((filename, os.path.getmtime(os.path.join(output_dir, filename))) + parsed)
+    entries.sort(key=lambda entry: entry[0])
+    n = len(entries)
+    table = {"filename": np.array([e[0] for e in entries], dtype=str), "mtime": np.array([e[1] for e in entries], dtype=float),
+             "device": np.array([e[2] for e in entries], dtype=str), "kind": np.array([e[3] for e in entries], dtype=str),
+             "t_start": np.array([e[4] for e in entries], dtype=float)}
+    values = {field: np.full(n, np.nan) for field in ("stress_s", "vth", "ss_min", "gm_max")}
+    stale = []
+    for row, (filename, mtime) in enumerate(zip(table["filename"], table["mtime"])):
+        hit = cached.get(filename)
+        if hit is None or cache['mtime'][hit] != mtime:
+            stale.append(row)
+            continue
+        for field in values:
+            values[field][row] = cache[field][hit]
+    if stale:
+        extracted = _extract_files([os.path.join(output_dir, table["filename"][row]) for row in stale],
+                                   table["kind"][stale], settings)
+        for field, new_values in zip(("stress_s", "vth", "ss_min", "gm_max"), extracted):
+            values[field][stale] = new_values
+    table.update(values)
+    try:
+        np.savez(cache_path, settings=np.array(settings_key), **table)
+    except OSError as e:
+        print(f"  Warning (应力序列): 无法写入缓存 {cache_path}: {e}", file=sys.stderr)
+    return table
+
+
+def compute_series(table, devices=None):
+    """
+    Series rows (dict of arrays, keys of SERIES_COLUMNS) of the gate transfer runs in `table`,
+    sorted by device and time; `devices` restricts it to those device IDs.
+    """
+    keep = np.isin(table["device"], list(devices)) if devices is not None else np.ones(table["filename"].size, dtype=bool)
+    device_ids, codes = np.unique(table["device"][keep], return_inverse=True)
+    is_stress_all = table["kind"][keep] == "Stress"
+    # Device, then start time, then stress before a sweep started in the same second
+    order = np.lexsort((~is_stress_all, table["t_start"][keep], codes))
+    rows = {field: table[field][keep][order] for field in ("filename", "device", "t_start", "stress_s", "vth", "ss_min", "gm_max")}
+    group = codes[order]
+    is_stress = is_stress_all[order]
+    n = group.size
+    if n == 0:
+        return {key: np.array([]) for key, _, _ in SERIES_COLUMNS}
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    index = np.arange(n)
+
+    def group_cumsum(values):
+        total = np.cumsum(values)
+        return total - (total - values)[starts][group]
+
+    duration = np.where(is_stress, np.nan_to_num(rows["stress_s"]), 0.0)
+    cum_stress = group_cumsum(duration)
+    cycles = group_cumsum(is_stress.astype(int))
+    # Latest stress end per row: running maximum, kept apart per device by a per-group offset
+    t_origin = rows["t_start"].min() - 1.0
+    span = (rows["t_start"] + duration).max() - t_origin + 1.0
+    stress_end = np.where(is_stress, rows["t_start"] + duration - t_origin, 0.0) + group * span
+    last_end = np.maximum.accumulate(stress_end) - group * span + t_origin
+    recovery = np.where(cycles > 0, np.maximum(rows["t_start"] - last_end, 0.0), np.nan)
+    # Baseline: last gate transfer of the device before its first stress
+    candidates = np.where(~is_stress & (cycles == 0), index, -1)
+    baseline = np.maximum.reduceat(candidates, starts)[group]
+    has_baseline = baseline >= 0
+    base = np.where(has_baseline, baseline, index)
+
+    sweep = ~is_stress
+    with np.errstate(invalid='ignore', divide='ignore'):
+        series = {
+            "device": rows["device"], "filename": rows["filename"],
+            "stamp": np.array([datetime.fromtimestamp(t).strftime('%Y%m%d_%H%M%S') for t in rows["t_start"]], dtype=str),
+            "cycles": cycles, "cum_stress_s": cum_stress, "recovery_s": recovery,
+            "vth": rows["vth"], "ss_min": rows["ss_min"], "gm_max": rows["gm_max"],
+            "d_vth": np.where(has_baseline, rows["vth"] - rows["vth"][base], np.nan),
+            "d_ss_min": np.where(has_baseline, rows["ss_min"] - rows["ss_min"][base], np.nan),
+            "d_gm_max": np.where(has_baseline, rows["gm_max"] - rows["gm_max"][base], np.nan),
+            "d_gm_max_rel": np.where(has_baseline, rows["gm_max"] / rows["gm_max"][base] - 1.0, np.nan),
+            "baseline": np.where(has_baseline, rows["filename"][base], ""),
+        }
+    return {key: value[sweep] for key, value in series.items()}
+
+
+def series_dataframe(series):
+    """The series as a DataFrame with the SERIES_COLUMNS headers; NaN values as 'N/A'."""
+    def cell(value, fmt):
+        if fmt == "s":
+            return value if value != "" else 'N/A'
+        if fmt == "d":
+            return f"{int(value)}"
+        return f"{value:{fmt}}" if np.isfinite(value) else 'N/A'
+    return pd.DataFrame({label: [cell(value, fmt) for value in series[key]] for key, label, fmt in SERIES_COLUMNS})
+
+
+def analyze_directory(output_dir, devices=None, config=None):
+    """Series of the data folder (see compute_series), extracted with the GT tab style settings in `config`."""
+    return compute_series(load_series_table(output_dir, extraction_settings(config)), devices)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python stress_series.py <数据目录> [输出CSV]", file=sys.stderr)
+        sys.exit(2)
+    summary = series_dataframe(analyze_directory(sys.argv[1]))
+    if len(sys.argv) > 2:
+        summary.to_csv(sys.argv[2], index=False, encoding='utf-8')
+    else:
+        print(summary.to_string(index=False))
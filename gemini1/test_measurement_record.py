@@ -0,0 +1,42 @@
+# test_measurement_record.py
+import numpy as np
+
+from measurement_record import MeasurementRecord, SweepLegs, SPARE_COLUMNS
+
+
+def _abc_record():
+    record = MeasurementRecord(3, ['a', 'b', 'c'])
+    for name, values in (('a', [1, 2, 3]), ('b', [4, 5, 6]), ('c', [7, 8, 9])):
+        record[name] = values
+    return record
+
+
+def test_delete_then_add_keeps_existing_columns():
+    record = _abc_record()
+    del record['a']
+    record['d'] = [0, 0, 0]
+    assert sorted(record) == ['b', 'c', 'd']
+    np.testing.assert_array_equal(record['b'], [4, 5, 6])
+    np.testing.assert_array_equal(record['c'], [7, 8, 9])
+    np.testing.assert_array_equal(record['d'], [0, 0, 0])
+
+
+def test_delete_then_grow_past_spare_slots():
+    record = _abc_record()
+    del record['a']
+    extras = {f'x{extra}': [extra] * 3 for extra in range(2 * SPARE_COLUMNS)}
+    for name, values in extras.items():
+        record[name] = values
+    assert sorted(record) == sorted(['b', 'c', *extras])
+    np.testing.assert_array_equal(record['c'], [7, 8, 9])
+    for name, values in extras.items():
+        np.testing.assert_array_equal(record[name], values)
+
+
+def test_leg_views_after_delete():
+    record = _abc_record()
+    del record['a']
+    record['d'] = [0, 0, 0]
+    legs = SweepLegs.split(record, True, 2, 1)
+    assert legs.forward['c'].tolist() == [7.0, 8.0]
+    assert legs.backward['c'].tolist() == [9.0]
@@ -0,0 +1,54 @@
+# test_stress_series.py
+import numpy as np
+import pytest
+
+from stress_series import compute_series, parse_series_filename
+
+
+@pytest.mark.parametrize("filename, device, kind", [
+    ("devA_GateTransfer_20260101_110000.csv", "devA", "GateTransfer"),
+    ("devA_Stress_20260101_120000.csv", "devA", "Stress"),
+    ("devA_post_stress_GT_GateTransfer_20260101_121000.csv", "devA", "GateTransfer"),
+    # Unnamed runs: the stress file and its post-stress sweep both belong to device ""
+    ("GateTransfer_20260101_110000.csv", "", "GateTransfer"),
+    ("Stress_20260101_120000.csv", "", "Stress"),
+    ("post_stress_GT_GateTransfer_20260101_121000.csv", "", "GateTransfer"),
+    ("post_stress_GT_20260101_120959_GateTransfer_20260101_121000.csv", "", "GateTransfer"),
+])
+def test_parse_series_filename(filename, device, kind):
+    assert parse_series_filename(filename)[:2] == (device, kind)
+
+
+def test_parse_series_filename_skips_other_runs():
+    assert parse_series_filename("devA_Output_20260101_120000.csv") is None
+
+
+def _table(runs):
+    """Series table as load_series_table builds it, from (filename, stress_s, vth) of each run."""
+    parsed = [parse_series_filename(filename) for filename, _, _ in runs]
+    return {
+        "filename": np.array([filename for filename, _, _ in runs]),
+        "mtime": np.zeros(len(runs)),
+        "device": np.array([device for device, _, _ in parsed]),
+        "kind": np.array([kind for _, kind, _ in parsed]),
+        "t_start": np.array([t_start for _, _, t_start in parsed]),
+        "stress_s": np.array([stress_s for _, stress_s, _ in runs]),
+        "vth": np.array([vth for _, _, vth in runs]),
+        "ss_min": np.full(len(runs), np.nan),
+        "gm_max": np.full(len(runs), np.nan),
+    }
+
+
+@pytest.mark.parametrize("name", ["devA_", ""])
+def test_post_stress_sweep_follows_its_stress(name):
+    series = compute_series(_table([
+        (f"{name}GateTransfer_20260101_110000.csv", np.nan, 1.0),
+        (f"{name}Stress_20260101_120000.csv", 300.0, np.nan),
+        (f"{name}post_stress_GT_GateTransfer_20260101_121000.csv", np.nan, 1.1),
+    ]))
+    assert series["device"].tolist() == [name.rstrip("_")] * 2
+    assert series["cycles"].tolist() == [0, 1]
+    assert series["cum_stress_s"].tolist() == [0.0, 300.0]
+    assert series["recovery_s"][1] == pytest.approx(300.0)
+    assert series["d_vth"][1] == pytest.approx(0.1)
+    assert series["baseline"][1] == f"{name}GateTransfer_20260101_110000.csv"
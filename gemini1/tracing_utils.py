@@ -0,0 +1,213 @@
+# tracing_utils.py
+"""
+Lightweight tracing for the measurement pipeline: nested timing spans and counters.
+
+A Tracer is made active for the current thread with `activate(tracer)`; the module-level
+`span()` / `count()` helpers record into it and are near no-ops when no tracer is active,
+so instrument_utils can be instrumented unconditionally. Finished spans can be streamed to
+a JSONL file, summarised into CSV '#' metadata lines, or exported in Chrome trace format
+(chrome://tracing, https://ui.perfetto.dev):
+
+    python tracing_utils.py run_trace.jsonl [run_trace.chrome.json]
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+_ACTIVE_TRACER = contextvars.ContextVar("active_tracer", default=None)
+
+
+class Tracer:
+    def __init__(self, name="", jsonl_path=None):
+        self.name = name
+        self.spans = []     # Finished spans, in completion order
+        self.counters = {}
+        self.jsonl_path = None
+        self._origin_ns = time.perf_counter_ns()
+        self._wall_origin = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if jsonl_path:
+            self.attach_jsonl(jsonl_path)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name, cat="", **args):
+        """Times the enclosed block. Yields the span's `args` dict so results (sizes, counts) can be attached."""
+        stack = self._stack()
+        stack.append(name)
+        start_ns = time.perf_counter_ns()
+        try:
+            yield args
+        finally:
+            end_ns = time.perf_counter_ns()
+            stack.pop()
+            record = {
+                "name": name, "cat": cat,
+                "ts_us": (start_ns - self._origin_ns) / 1000.0,
+                "dur_us": (end_ns - start_ns) / 1000.0,
+                "depth": len(stack),
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+            with self._lock:
+                self.spans.append(record)
+                if self.jsonl_path:
+                    self._write_jsonl_lines([dict(record, type="span")])
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    # --- Output -------------------------------------------------------------
+
+    def attach_jsonl(self, path):
+        """Stream spans to `path` from now on; spans finished earlier are written immediately."""
+        with self._lock:
+            self.jsonl_path = path
+            header = {"type": "trace", "name": self.name, "wall_time": self._wall_origin, "pid": os.getpid()}
+            self._write_jsonl_lines([header] + [dict(r, type="span") for r in self.spans], mode="w")
+
+    def flush_counters(self):
+        if not self.jsonl_path:
+            return
+        with self._lock:
+            self._write_jsonl_lines([{"type": "counter", "name": k, "value": v} for k, v in self.counters.items()])
+
+    def _write_jsonl_lines(self, records, mode="a"):
+        try:
+            with open(self.jsonl_path, mode, encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            print(f"写入跟踪文件 {self.jsonl_path} 时出错: {e}", file=sys.stderr)
+            self.jsonl_path = None
+
+    def summary(self):
+        """{span name: {"count", "total_ms", "max_ms"}} in order of first completion."""
+        result = {}
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            entry = result.setdefault(record["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            dur_ms = record["dur_us"] / 1000.0
+            entry["count"] += 1
+            entry["total_ms"] += dur_ms
+            entry["max_ms"] = max(entry["max_ms"], dur_ms)
+        return result
+
+    def total_ms(self, *names):
+        summary = self.summary()
+        return sum(summary[n]["total_ms"] for n in names if n in summary)
+
+    def metadata_comments(self):
+        """'# Timing <span> (ms): ...' / '# Counter <name>: ...' lines for the CSV header."""
+        comments = ""
+        for name, entry in self.summary().items():
+            repeat_info = f" (n={entry['count']}, max={entry['max_ms']:.3f})" if entry["count"] > 1 else ""
+            comments += f"# Timing {name} (ms): {entry['total_ms']:.3f}{repeat_info}\n"
+        for name, value in self.counters.items():
+            comments += f"# Counter {name}: {value}\n"
+        return comments
+
+    def to_chrome_trace(self):
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+        return chrome_trace_from_records(self.name, os.getpid(), spans, counters)
+
+    def export_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f, default=str)
+        return path
+
+
+def chrome_trace_from_records(name, pid, spans, counters):
+    events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": name or "measurement"}}]
+    end_us = 0.0
+    for record in spans:
+        events.append({
+            "name": record["name"], "cat": record.get("cat") or "default", "ph": "X",
+            "ts": record["ts_us"], "dur": record["dur_us"], "pid": pid, "tid": record.get("tid", 0),
+            "args": record.get("args", {}),
+        })
+        end_us = max(end_us, record["ts_us"] + record["dur_us"])
+    for counter_name, value in counters.items():
+        events.append({"name": counter_name, "ph": "C", "ts": end_us, "pid": pid, "tid": 0, "args": {"value": value}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def jsonl_to_chrome_trace(jsonl_path, output_path=None):
+    name, pid, spans, counters = "", 0, [], {}
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            kind = record.get("type")
+            if kind == "trace":
+                name, pid = record.get("name", ""), record.get("pid", 0)
+            elif kind == "span":
+                spans.append(record)
+            elif kind == "counter":
+                counters[record["name"]] = record["value"]
+    output_path = output_path or os.path.splitext(jsonl_path)[0] + ".chrome.json"
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(chrome_trace_from_records(name, pid, spans, counters), f, default=str)
+    return output_path
+
+
+# --- Module-level helpers (record into the active tracer, if any) ---
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+
+def current_tracer():
+    return _ACTIVE_TRACER.get()
+
+
+@contextmanager
+def activate(tracer):
+    token = _ACTIVE_TRACER.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _ACTIVE_TRACER.reset(token)
+
+
+def span(name, cat="", tracer=None, **args):
+    tracer = tracer or _ACTIVE_TRACER.get()
+    if tracer is None:
+        return _NULL_SPAN
+    return tracer.span(name, cat, **args)
+
+
+def count(name, value=1, tracer=None):
+    tracer = tracer or _ACTIVE_TRACER.get()
+    if tracer is not None:
+        tracer.count(name, value)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python tracing_utils.py <trace.jsonl> [输出.chrome.json]", file=sys.stderr)
+        sys.exit(2)
+    print(jsonl_to_chrome_trace(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None))
@@ -0,0 +1,945 @@
+# tsp_interpreter.py
+"""
+Small interpreter for the Lua subset used by the scripts in tsp_scripts/.
+
+It exists so instrument_simulator.py can run the real .tsp files offline; it is not a general
+Lua implementation. Supported: local/global assignment, numeric and generic `for`, while,
+repeat, if/elseif/else, break, functions (incl. closures and `a.b.c` / `a:b` definitions),
+tables, calls, method calls and the usual arithmetic/comparison/logical/concat operators.
+Host objects are plain Python objects: field reads map to getattr (missing -> nil), field
+writes to setattr, integer indexing to __getitem__.
+"""
+import math
+import re
+
+class TspError(RuntimeError):
+    pass
+
+_TOKEN_RE = re.compile(r'''
+    (?P<ws>[ \t\r\n]+)
+  | (?P<lcomment>--\[(?P<ceq>=*)\[.*?\](?P=ceq)\])
+  | (?P<comment>--[^\n]*)
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<lstring>\[(?P<seq>=*)\[.*?\](?P=seq)\])
+  | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+  | (?P<op>\.\.\.|\.\.|==|~=|<=|>=|[-+*/%^\#<>=(){}\[\];:,.])
+''', re.VERBOSE | re.DOTALL)
+
+_KEYWORDS = {
+    'and', 'break', 'do', 'else', 'elseif', 'end', 'false', 'for', 'function', 'if', 'in',
+    'local', 'nil', 'not', 'or', 'repeat', 'return', 'then', 'true', 'until', 'while'
+}
+
+# (left priority, right priority), as in the reference Lua parser
+_BINARY_PRIORITY = {
+    'or': (1, 1), 'and': (2, 2),
+    '<': (3, 3), '>': (3, 3), '<=': (3, 3), '>=': (3, 3), '~=': (3, 3), '==': (3, 3),
+    '..': (5, 4), '+': (6, 6), '-': (6, 6), '*': (7, 7), '/': (7, 7), '%': (7, 7), '^': (10, 9),
+}
+_UNARY_PRIORITY = 8
+
+_STRING_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '\\': '\\', '"': '"', "'": "'", '\n': '\n'}
+
+
+def tokenize(source):
+    tokens = []
+    pos, line = 0, 1
+    length = len(source)
+    while pos < length:
+        m = _TOKEN_RE.match(source, pos)
+        if not m:
+            raise TspError(f"[line {line}] unexpected symbol near '{source[pos:pos + 10]}'")
+        kind = m.lastgroup
+        text = m.group(kind)
+        if kind in ('ceq', 'seq'):
+            kind = 'lcomment' if text is not None and m.group('lcomment') else 'lstring'
+            text = m.group(kind)
+        if kind == 'number':
+            value = int(text, 16) if text[:2].lower() == '0x' else float(text)
+            if isinstance(value, float) and value.is_integer() and re.fullmatch(r'\d+', text):
+                value = int(text)
+            tokens.append(('number', value, line))
+        elif kind == 'string':
+            body = text[1:-1]
+            tokens.append(('string', re.sub(r'\\(.)', lambda e: _STRING_ESCAPES.get(e.group(1), e.group(1)), body, flags=re.DOTALL), line))
+        elif kind == 'lstring':
+            body = text[text.index('[', 1) + 1:text.rindex(']', 0, -1)]
+            tokens.append(('string', body[1:] if body.startswith('\n') else body, line))
+        elif kind == 'name':
+            tokens.append(('kw' if text in _KEYWORDS else 'name', text, line))
+        elif kind == 'op':
+            tokens.append(('op', text, line))
+        line += text.count('\n')
+        pos = m.end()
+    tokens.append(('eof', None, line))
+    return tokens
+
+
+# --- Runtime values ---
+
+class LuaTable:
+    """Lua table with 1-based array semantics; integral float keys are normalised to int."""
+    def __init__(self, items=None):
+        self.hash = {}
+        if items:
+            for i, v in enumerate(items, start=1):
+                self.hash[i] = v
+
+    @staticmethod
+    def _norm(key):
+        if isinstance(key, float) and key.is_integer():
+            return int(key)
+        return key
+
+    def get(self, key):
+        return self.hash.get(self._norm(key))
+
+    def set(self, key, value):
+        key = self._norm(key)
+        if key is None:
+            raise TspError("table index is nil")
+        if value is None:
+            self.hash.pop(key, None)
+        else:
+            self.hash[key] = value
+
+    def length(self):
+        n = 0
+        while (n + 1) in self.hash:
+            n += 1
+        return n
+
+    def array_values(self):
+        return [self.hash[i] for i in range(1, self.length() + 1)]
+
+    def next_key(self, key):
+        keys = list(self.hash.keys())
+        if key is None:
+            idx = 0
+        else:
+            try:
+                idx = keys.index(self._norm(key)) + 1
+            except ValueError:
+                raise TspError("invalid key to 'next'")
+        if idx >= len(keys):
+            return None
+        return keys[idx]
+
+
+class Multi(tuple):
+    """Multiple return values from a call (only expanded where Lua expands them)."""
+
+
+def first(value):
+    if isinstance(value, Multi):
+        return value[0] if value else None
+    return value
+
+
+class _Break(Exception):
+    pass
+
+
+class _Return(Exception):
+    def __init__(self, values):
+        self.values = values
+
+
+class _Scope:
+    __slots__ = ('vars', 'parent', 'globals')
+
+    def __init__(self, parent, globals_dict):
+        self.vars = {}
+        self.parent = parent
+        self.globals = globals_dict
+
+    def lookup(self, name):
+        sc = self
+        while sc is not None:
+            if name in sc.vars:
+                return sc.vars[name]
+            sc = sc.parent
+        return self.globals.get(name)
+
+    def assign(self, name, value):
+        sc = self
+        while sc is not None:
+            if name in sc.vars:
+                sc.vars[name] = value
+                return
+            sc = sc.parent
+        self.globals[name] = value
+
+
+class LuaFunction:
+    def __init__(self, params, is_vararg, body, closure_scope, name="?"):
+        self.params = params
+        self.is_vararg = is_vararg
+        self.body = body
+        self.closure_scope = closure_scope
+        self.name = name
+
+    def __call__(self, *args):
+        scope = _Scope(self.closure_scope, self.closure_scope.globals)
+        for i, p in enumerate(self.params):
+            scope.vars[p] = args[i] if i < len(args) else None
+        if self.is_vararg:
+            scope.vars['...'] = Multi(args[len(self.params):])
+        try:
+            self.body(scope)
+        except _Return as r:
+            return r.values
+        return Multi()
+
+
+# --- Value helpers ---
+
+def to_lua_string(value):
+    if value is None: return "nil"
+    if value is True: return "true"
+    if value is False: return "false"
+    if isinstance(value, float):
+        if value.is_integer() and abs(value) < 1e15:
+            return str(int(value))
+        return f"{value:.14g}"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, str):
+        return value
+    if isinstance(value, LuaTable):
+        return f"table: 0x{id(value):08x}"
+    if callable(value):
+        return f"function: 0x{id(value):08x}"
+    return f"userdata: 0x{id(value):08x}"
+
+
+def _truthy(v):
+    return v is not None and v is not False
+
+
+def _lua_eq(a, b):
+    if isinstance(a, bool) != isinstance(b, bool):
+        return False
+    return a is b or a == b
+
+
+def _arith_operand(v, op):
+    if isinstance(v, bool) or v is None:
+        raise TspError(f"attempt to perform arithmetic ({op}) on a {'nil' if v is None else 'boolean'} value")
+    if isinstance(v, str):
+        try:
+            return float(v)
+        except ValueError:
+            raise TspError(f"attempt to perform arithmetic ({op}) on a string value")
+    return v
+
+
+def index_value(obj, key):
+    if obj is None:
+        raise TspError(f"attempt to index a nil value (field '{key}')")
+    if isinstance(obj, LuaTable):
+        return obj.get(key)
+    if isinstance(key, str):
+        if key.startswith('_'):
+            return None
+        return getattr(obj, key, None)
+    if isinstance(key, float) and key.is_integer():
+        key = int(key)
+    try:
+        return obj[key]
+    except (IndexError, KeyError, TypeError):
+        return None
+
+
+def set_index_value(obj, key, value):
+    if obj is None:
+        raise TspError(f"attempt to index a nil value (field '{key}')")
+    if isinstance(obj, LuaTable):
+        obj.set(key, value)
+    elif isinstance(key, str):
+        if key.startswith('_'):
+            raise TspError(f"cannot set field '{key}'")
+        setattr(obj, key, value)
+    else:
+        if isinstance(key, float) and key.is_integer():
+            key = int(key)
+        obj[key] = value
+
+
+def call_value(func, args):
+    if func is None:
+        raise TspError("attempt to call a nil value")
+    if not callable(func):
+        raise TspError(f"attempt to call a {type(func).__name__} value")
+    return func(*args)
+
+
+def _binary(op, a, b):
+    if op == '+': return _arith_operand(a, op) + _arith_operand(b, op)
+    if op == '-': return _arith_operand(a, op) - _arith_operand(b, op)
+    if op == '*': return _arith_operand(a, op) * _arith_operand(b, op)
+    if op == '/':
+        a, b = _arith_operand(a, op), _arith_operand(b, op)
+        if b == 0:
+            if a == 0: return math.nan
+            return math.copysign(math.inf, a) * math.copysign(1.0, b)
+        return a / b
+    if op == '%':
+        a, b = _arith_operand(a, op), _arith_operand(b, op)
+        if b == 0: return math.nan
+        return a - math.floor(a / b) * b
+    if op == '^': return float(_arith_operand(a, op)) ** _arith_operand(b, op)
+    if op == '..':
+        if a is None or b is None or isinstance(a, bool) or isinstance(b, bool):
+            raise TspError("attempt to concatenate a nil/boolean value")
+        return to_lua_string(a) + to_lua_string(b)
+    if op == '==': return _lua_eq(a, b)
+    if op == '~=': return not _lua_eq(a, b)
+    try:
+        if op == '<': return a < b
+        if op == '>': return a > b
+        if op == '<=': return a <= b
+        if op == '>=': return a >= b
+    except TypeError:
+        raise TspError(f"attempt to compare {type(a).__name__} with {type(b).__name__}")
+    raise TspError(f"unknown operator '{op}'")
+
+
+# --- Parser / compiler (AST is compiled straight to Python closures) ---
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    # token helpers
+    def peek(self, offset=0):
+        return self.tokens[self.pos + offset]
+
+    def next(self):
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def check(self, kind, value=None):
+        tok = self.tokens[self.pos]
+        return tok[0] == kind and (value is None or tok[1] == value)
+
+    def accept(self, kind, value=None):
+        if self.check(kind, value):
+            return self.next()
+        return None
+
+    def expect(self, kind, value=None):
+        tok = self.next()
+        if tok[0] != kind or (value is not None and tok[1] != value):
+            raise TspError(f"[line {tok[2]}] '{value or kind}' expected near '{tok[1]}'")
+        return tok
+
+    def expect_name(self):
+        return self.expect('name')[1]
+
+    # blocks
+    def parse_chunk(self):
+        block = self.parse_block()
+        if not self.check('eof'):
+            tok = self.peek()
+            raise TspError(f"[line {tok[2]}] '<eof>' expected near '{tok[1]}'")
+        return block
+
+    def _block_end(self):
+        tok = self.peek()
+        return tok[0] == 'eof' or (tok[0] == 'kw' and tok[1] in ('end', 'else', 'elseif', 'until'))
+
+    def parse_block(self):
+        statements = []
+        while not self._block_end():
+            line = self.peek()[2]
+            if self.check('kw', 'return'):
+                self.next()
+                exprs = []
+                if not self._block_end() and not self.check('op', ';'):
+                    exprs = self.parse_exprlist()
+                self.accept('op', ';')
+                statements.append((line, self._compile_return(exprs)))
+                break
+            stmt = self.parse_statement()
+            if stmt is not None:
+                statements.append((line, stmt))
+        return self._compile_block(statements)
+
+    @staticmethod
+    def _compile_block(statements):
+        def run_block(scope):
+            line = 0
+            try:
+                for line, stmt in statements:
+                    stmt(scope)
+            except (_Break, _Return):
+                raise
+            except TspError as e:
+                if not str(e).startswith('[line'):
+                    raise TspError(f"[line {line}] {e}") from e
+                raise
+            except (TypeError, ValueError, ZeroDivisionError, OverflowError, AttributeError) as e:
+                raise TspError(f"[line {line}] {e}") from e
+        return run_block
+
+    @staticmethod
+    def _scoped(block):
+        def run(scope):
+            block(_Scope(scope, scope.globals))
+        return run
+
+    @staticmethod
+    def _compile_return(exprs):
+        evaluate = _Parser._compile_exprlist(exprs)
+        def stmt(scope):
+            raise _Return(Multi(evaluate(scope)))
+        return stmt
+
+    # statements
+    def parse_statement(self):
+        tok = self.peek()
+        if tok[0] == 'op' and tok[1] == ';':
+            self.next()
+            return None
+        if tok[0] == 'kw':
+            kw = tok[1]
+            if kw == 'if': return self.parse_if()
+            if kw == 'while': return self.parse_while()
+            if kw == 'do':
+                self.next()
+                block = self.parse_block()
+                self.expect('kw', 'end')
+                return self._scoped(block)
+            if kw == 'for': return self.parse_for()
+            if kw == 'repeat': return self.parse_repeat()
+            if kw == 'function': return self.parse_function_stat()
+            if kw == 'local':
+                self.next()
+                if self.accept('kw', 'function'):
+                    name = self.expect_name()
+                    func_factory = self.parse_funcbody(name)
+                    def local_function(scope):
+                        scope.vars[name] = None
+                        scope.vars[name] = func_factory(scope)
+                    return local_function
+                return self.parse_local()
+            if kw == 'break':
+                self.next()
+                def do_break(scope):
+                    raise _Break()
+                return do_break
+        return self.parse_expr_statement()
+
+    def parse_if(self):
+        self.expect('kw', 'if')
+        branches = []
+        cond = self.parse_expr()
+        self.expect('kw', 'then')
+        branches.append((cond, self._scoped(self.parse_block())))
+        else_block = None
+        while True:
+            if self.accept('kw', 'elseif'):
+                cond = self.parse_expr()
+                self.expect('kw', 'then')
+                branches.append((cond, self._scoped(self.parse_block())))
+            elif self.accept('kw', 'else'):
+                else_block = self._scoped(self.parse_block())
+                self.expect('kw', 'end')
+                break
+            else:
+                self.expect('kw', 'end')
+                break
+        def stmt(scope):
+            for cond_fn, block in branches:
+                if _truthy(cond_fn(scope)):
+                    block(scope)
+                    return
+            if else_block is not None:
+                else_block(scope)
+        return stmt
+
+    def parse_while(self):
+        self.expect('kw', 'while')
+        cond = self.parse_expr()
+        self.expect('kw', 'do')
+        block = self._scoped(self.parse_block())
+        self.expect('kw', 'end')
+        def stmt(scope):
+            try:
+                while _truthy(cond(scope)):
+                    block(scope)
+            except _Break:
+                pass
+        return stmt
+
+    def parse_repeat(self):
+        self.expect('kw', 'repeat')
+        body = self.parse_block()
+        self.expect('kw', 'until')
+        cond = self.parse_expr()
+        def stmt(scope):
+            try:
+                while True:
+                    inner = _Scope(scope, scope.globals)
+                    body(inner)
+                    if _truthy(cond(inner)):
+                        break
+            except _Break:
+                pass
+        return stmt
+
+    def parse_for(self):
+        self.expect('kw', 'for')
+        name = self.expect_name()
+        if self.accept('op', '='):
+            start = self.parse_expr()
+            self.expect('op', ',')
+            limit = self.parse_expr()
+            step = self.parse_expr() if self.accept('op', ',') else (lambda scope: 1)
+            self.expect('kw', 'do')
+            body = self.parse_block()
+            self.expect('kw', 'end')
+            def numeric_for(scope):
+                v = _arith_operand(start(scope), 'for'); lim = _arith_operand(limit(scope), 'for'); st = _arith_operand(step(scope), 'for')
+                if st == 0:
+                    raise TspError("'for' step is zero")
+                try:
+                    while (st > 0 and v <= lim) or (st < 0 and v >= lim):
+                        inner = _Scope(scope, scope.globals)
+                        inner.vars[name] = v
+                        body(inner)
+                        v += st
+                except _Break:
+                    pass
+            return numeric_for
+        names = [name]
+        while self.accept('op', ','):
+            names.append(self.expect_name())
+        self.expect('kw', 'in')
+        explist = self._compile_exprlist(self.parse_exprlist())
+        self.expect('kw', 'do')
+        body = self.parse_block()
+        self.expect('kw', 'end')
+        def generic_for(scope):
+            values = explist(scope) + [None, None, None]
+            f, s, var = values[0], values[1], values[2]
+            try:
+                while True:
+                    results = call_value(f, (s, var))
+                    results = list(results) if isinstance(results, Multi) else [results]
+                    if not results or results[0] is None:
+                        break
+                    var = results[0]
+                    inner = _Scope(scope, scope.globals)
+                    for i, n in enumerate(names):
+                        inner.vars[n] = results[i] if i < len(results) else None
+                    body(inner)
+            except _Break:
+                pass
+        return generic_for
+
+    def parse_function_stat(self):
+        self.expect('kw', 'function')
+        path = [self.expect_name()]
+        is_method = False
+        while self.check('op', '.') or self.check('op', ':'):
+            sep = self.next()[1]
+            path.append(self.expect_name())
+            if sep == ':':
+                is_method = True
+                break
+        func_factory = self.parse_funcbody('.'.join(path), is_method=is_method)
+        def stmt(scope):
+            func = func_factory(scope)
+            if len(path) == 1:
+                scope.assign(path[0], func)
+                return
+            obj = scope.lookup(path[0])
+            for key in path[1:-1]:
+                obj = index_value(obj, key)
+            set_index_value(obj, path[-1], func)
+        return stmt
+
+    def parse_funcbody(self, name="?", is_method=False):
+        self.expect('op', '(')
+        params = ['self'] if is_method else []
+        is_vararg = False
+        if not self.check('op', ')'):
+            while True:
+                if self.accept('op', '...'):
+                    is_vararg = True
+                    break
+                params.append(self.expect_name())
+                if not self.accept('op', ','):
+                    break
+        self.expect('op', ')')
+        body = self.parse_block()
+        self.expect('kw', 'end')
+        def factory(scope):
+            return LuaFunction(params, is_vararg, body, scope, name)
+        return factory
+
+    def parse_local(self):
+        names = [self.expect_name()]
+        while self.accept('op', ','):
+            names.append(self.expect_name())
+        exprs = self._compile_exprlist(self.parse_exprlist()) if self.accept('op', '=') else (lambda scope: [])
+        def stmt(scope):
+            values = exprs(scope)
+            for i, n in enumerate(names):
+                scope.vars[n] = values[i] if i < len(values) else None
+        return stmt
+
+    def parse_expr_statement(self):
+        line = self.peek()[2]
+        target = self.parse_suffixed_expr()
+        if self.check('op', '=') or self.check('op', ','):
+            targets = [target]
+            while self.accept('op', ','):
+                targets.append(self.parse_suffixed_expr())
+            self.expect('op', '=')
+            values_fn = self._compile_exprlist(self.parse_exprlist())
+            setters = []
+            for t in targets:
+                if t[0] == 'name':
+                    name = t[1]
+                    setters.append(lambda scope, value, name=name: scope.assign(name, value))
+                elif t[0] == 'index':
+                    obj_fn, key_fn = t[1], t[2]
+                    setters.append(lambda scope, value, obj_fn=obj_fn, key_fn=key_fn: set_index_value(obj_fn(scope), key_fn(scope), value))
+                else:
+                    raise TspError(f"[line {line}] syntax error: cannot assign to expression")
+            if len(setters) == 1:
+                setter = setters[0]
+                def assign_one(scope):
+                    values = values_fn(scope)
+                    setter(scope, values[0] if values else None)
+                return assign_one
+            def assign_many(scope):
+                values = values_fn(scope)
+                for i, setter in enumerate(setters):
+                    setter(scope, values[i] if i < len(values) else None)
+            return assign_many
+        if target[0] != 'call':
+            raise TspError(f"[line {line}] syntax error near '{self.peek()[1]}'")
+        call_fn = target[1]
+        def call_stmt(scope):
+            call_fn(scope)
+        return call_stmt
+
+    # expressions. Suffixed expressions return a tagged tuple so statements can tell
+    # assignable targets from calls; everything else is compiled to a closure directly.
+    def parse_primary_expr(self):
+        tok = self.next()
+        if tok[0] == 'name':
+            name = tok[1]
+            return ('name', name, lambda scope: scope.lookup(name))
+        if tok[0] == 'op' and tok[1] == '(':
+            inner = self.parse_expr()
+            self.expect('op', ')')
+            return ('expr', lambda scope: first(inner(scope)))
+        raise TspError(f"[line {tok[2]}] unexpected symbol near '{tok[1]}'")
+
+    @staticmethod
+    def _as_value(node):
+        if node[0] == 'name': return node[2]
+        if node[0] == 'index':
+            obj_fn, key_fn = node[1], node[2]
+            return lambda scope: index_value(obj_fn(scope), key_fn(scope))
+        return node[1]
+
+    def parse_suffixed_expr(self):
+        node = self.parse_primary_expr()
+        while True:
+            if self.accept('op', '.'):
+                key = self.expect_name()
+                node = ('index', self._as_value(node), lambda scope, key=key: key)
+            elif self.accept('op', '['):
+                key_fn = self.parse_expr()
+                self.expect('op', ']')
+                node = ('index', self._as_value(node), key_fn)
+            elif self.accept('op', ':'):
+                method = self.expect_name()
+                args_fn = self.parse_call_args()
+                obj_fn = self._as_value(node)
+                def method_call(scope, obj_fn=obj_fn, method=method, args_fn=args_fn):
+                    obj = obj_fn(scope)
+                    func = index_value(obj, method)
+                    args = args_fn(scope)
+                    # Host (Python) methods are already bound; Lua-defined ones get `self`
+                    if getattr(func, '__self__', None) is obj:
+                        return call_value(func, args)
+                    return call_value(func, [obj] + args)
+                node = ('call', method_call)
+            elif self.check('op', '(') or self.check('string') or self.check('op', '{'):
+                func_fn = self._as_value(node)
+                args_fn = self.parse_call_args()
+                node = ('call', lambda scope, func_fn=func_fn, args_fn=args_fn: call_value(func_fn(scope), args_fn(scope)))
+            else:
+                return node
+
+    def parse_call_args(self):
+        if self.check('string'):
+            value = self.next()[1]
+            return lambda scope: [value]
+        if self.check('op', '{'):
+            table_fn = self.parse_table()
+            return lambda scope: [table_fn(scope)]
+        self.expect('op', '(')
+        exprs = [] if self.check('op', ')') else self.parse_exprlist()
+        self.expect('op', ')')
+        return self._compile_exprlist(exprs)
+
+    def parse_exprlist(self):
+        exprs = [self.parse_expr_raw()]
+        while self.accept('op', ','):
+            exprs.append(self.parse_expr_raw())
+        return exprs
+
+    @staticmethod
+    def _compile_exprlist(exprs):
+        """Evaluates to a Python list; only the last expression may expand to multiple values."""
+        if not exprs:
+            return lambda scope: []
+        head = [e for e in exprs[:-1]]
+        last = exprs[-1]
+        def evaluate(scope):
+            values = [first(e(scope)) for e in head]
+            v = last(scope)
+            if isinstance(v, Multi):
+                values.extend(v)
+            else:
+                values.append(v)
+            return values
+        return evaluate
+
+    def parse_expr(self):
+        raw = self.parse_expr_raw()
+        return lambda scope: first(raw(scope))
+
+    def parse_expr_raw(self):
+        return self.parse_subexpr(0)
+
+    def parse_subexpr(self, limit):
+        tok = self.peek()
+        if (tok[0] == 'kw' and tok[1] == 'not') or (tok[0] == 'op' and tok[1] in ('-', '#')):
+            self.next()
+            operand = self.parse_subexpr(_UNARY_PRIORITY)
+            op = tok[1]
+            if op == 'not':
+                left = lambda scope: not _truthy(first(operand(scope)))
+            elif op == '-':
+                left = lambda scope: -_arith_operand(first(operand(scope)), '-')
+            else:
+                def length(scope):
+                    v = first(operand(scope))
+                    if isinstance(v, LuaTable): return v.length()
+                    if isinstance(v, str): return len(v)
+                    raise TspError("attempt to get length of a non-table value")
+                left = length
+        else:
+            left = self.parse_simple_expr()
+        while True:
+            tok = self.peek()
+            op = tok[1] if (tok[0] == 'op' or (tok[0] == 'kw' and tok[1] in ('and', 'or'))) else None
+            if op not in _BINARY_PRIORITY or _BINARY_PRIORITY[op][0] <= limit:
+                break
+            self.next()
+            right = self.parse_subexpr(_BINARY_PRIORITY[op][1])
+            left = self._compile_binary(op, left, right)
+        return left
+
+    @staticmethod
+    def _compile_binary(op, left, right):
+        if op == 'and':
+            def and_op(scope):
+                a = first(left(scope))
+                return first(right(scope)) if _truthy(a) else a
+            return and_op
+        if op == 'or':
+            def or_op(scope):
+                a = first(left(scope))
+                return a if _truthy(a) else first(right(scope))
+            return or_op
+        return lambda scope: _binary(op, first(left(scope)), first(right(scope)))
+
+    def parse_simple_expr(self):
+        tok = self.peek()
+        if tok[0] == 'number' or tok[0] == 'string':
+            self.next()
+            value = tok[1]
+            return lambda scope: value
+        if tok[0] == 'kw':
+            if tok[1] == 'nil': self.next(); return lambda scope: None
+            if tok[1] == 'true': self.next(); return lambda scope: True
+            if tok[1] == 'false': self.next(); return lambda scope: False
+            if tok[1] == 'function':
+                self.next()
+                factory = self.parse_funcbody()
+                return factory
+        if tok[0] == 'op' and tok[1] == '...':
+            self.next()
+            return lambda scope: scope.lookup('...')
+        if tok[0] == 'op' and tok[1] == '{':
+            return self.parse_table()
+        node = self.parse_suffixed_expr()
+        return self._as_value(node)
+
+    def parse_table(self):
+        self.expect('op', '{')
+        items = []  # (kind, key_fn, value_fn)
+        while not self.check('op', '}'):
+            if self.check('op', '['):
+                self.next()
+                key_fn = self.parse_expr()
+                self.expect('op', ']')
+                self.expect('op', '=')
+                items.append(('keyed', key_fn, self.parse_expr()))
+            elif self.check('name') and self.peek(1)[0] == 'op' and self.peek(1)[1] == '=':
+                key = self.next()[1]
+                self.next()
+                items.append(('keyed', lambda scope, key=key: key, self.parse_expr()))
+            else:
+                items.append(('positional', None, self.parse_expr_raw()))
+            if not (self.accept('op', ',') or self.accept('op', ';')):
+                break
+        self.expect('op', '}')
+        def build(scope):
+            table = LuaTable()
+            index = 1
+            for n, (kind, key_fn, value_fn) in enumerate(items):
+                if kind == 'keyed':
+                    table.set(key_fn(scope), value_fn(scope))
+                    continue
+                value = value_fn(scope)
+                if isinstance(value, Multi) and n == len(items) - 1:
+                    for v in value:
+                        table.set(index, v); index += 1
+                else:
+                    table.set(index, first(value)); index += 1
+            return table
+        return build
+
+
+class TspInterpreter:
+    """Compiles and runs TSP/Lua chunks against a dict of host globals."""
+    def __init__(self, globals_dict):
+        self.globals = globals_dict
+        self._chunk_cache = {}
+        self._install_base_library()
+
+    def _install_base_library(self):
+        g = self.globals
+        g.setdefault('tostring', lambda v=None: to_lua_string(v))
+        g.setdefault('tonumber', _tonumber)
+        g.setdefault('type', _lua_type)
+        g.setdefault('pairs', lambda t: Multi((_lua_next, t, None)))
+        g.setdefault('ipairs', lambda t: Multi((_ipairs_next, t, 0)))
+        g.setdefault('next', _lua_next)
+        g.setdefault('unpack', lambda t: Multi(t.array_values()))
+        g.setdefault('error', _lua_error)
+        g.setdefault('math', _make_math_table())
+        g.setdefault('string', _make_string_table())
+        g.setdefault('table', _make_table_table())
+
+    def compile(self, source):
+        chunk = self._chunk_cache.get(source)
+        if chunk is None:
+            chunk = _Parser(tokenize(source)).parse_chunk()
+            if len(self._chunk_cache) > 256:
+                self._chunk_cache.clear()
+            self._chunk_cache[source] = chunk
+        return chunk
+
+    def execute(self, source):
+        chunk = self.compile(source)
+        try:
+            chunk(_Scope(None, self.globals))
+        except _Return:
+            pass
+        except _Break:
+            raise TspError("no loop to break")
+
+
+def _tonumber(v, base=None):
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return v
+    try:
+        return int(v, base) if base else float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _lua_type(v):
+    if v is None: return "nil"
+    if isinstance(v, bool): return "boolean"
+    if isinstance(v, (int, float)): return "number"
+    if isinstance(v, str): return "string"
+    if isinstance(v, LuaTable): return "table"
+    if callable(v): return "function"
+    return "userdata"
+
+
+def _lua_next(t, key=None):
+    k = t.next_key(key)
+    if k is None:
+        return None
+    return Multi((k, t.get(k)))
+
+
+def _ipairs_next(t, i):
+    i = int(i) + 1
+    v = t.get(i)
+    if v is None:
+        return None
+    return Multi((i, v))
+
+
+def _lua_error(message=None, level=None):
+    raise TspError(to_lua_string(message))
+
+
+def _make_math_table():
+    t = LuaTable()
+    for name, fn in {
+        'abs': abs, 'floor': lambda x: math.floor(x), 'ceil': lambda x: math.ceil(x),
+        'sqrt': math.sqrt, 'exp': math.exp, 'log': math.log, 'log10': math.log10,
+        'pow': math.pow, 'min': min, 'max': max, 'mod': math.fmod, 'fmod': math.fmod,
+        'sin': math.sin, 'cos': math.cos,
+    }.items():
+        t.set(name, fn)
+    t.set('pi', math.pi)
+    t.set('huge', math.inf)
+    return t
+
+
+def _make_string_table():
+    t = LuaTable()
+    def lua_format(fmt, *args):
+        # Lua format specifiers are a subset of Python's %-formatting for what the scripts use
+        return fmt.replace('%i', '%d') % tuple(args)
+    t.set('format', lua_format)
+    t.set('len', len)
+    t.set('rep', lambda s, n: s * int(n))
+    return t
+
+
+def _make_table_table():
+    t = LuaTable()
+    def insert(table, *args):
+        if len(args) == 1:
+            table.set(table.length() + 1, args[0])
+        else:
+            pos, value = int(args[0]), args[1]
+            n = table.length()
+            for i in range(n, pos - 1, -1):
+                table.set(i + 1, table.get(i))
+            table.set(pos, value)
+    t.set('insert', insert)
+    t.set('getn', lambda table: table.length())
+    t.set('concat', lambda table, sep="": sep.join(to_lua_string(v) for v in table.array_values()))
+    return t
@@ -0,0 +1,127 @@
+# tsp_template.py
+"""
+Compiled TSP script templates.
+
+A .tsp file is parsed once into literal text and `{{key}}` placeholders and cached per path
+until its modification time changes. Rendering checks that every placeholder is supplied with
+a number (or a numeric string / Lua table of numbers) before anything is sent, so a missing or
+malformed parameter fails here instead of as a script error or timeout on the instrument.
+With minification on, comments, indentation and blank lines are dropped from the compiled
+form; statements stay one per line, so instrument error messages still name a sensible line.
+"""
+import math
+import numbers
+import os
+import re
+import threading
+
+import config_settings
+
+_PLACEHOLDER_RE = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+_LUA_NUMBER_TABLE_RE = re.compile(r"^\{\s*(?:[^{},\s][^{},]*(?:,\s*[^{},\s][^{},]*)*)?\s*,?\s*\}$")
+
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def _strip_lua_comment(line):
+    """Return the line without a trailing `--` comment (string literals are respected)."""
+    quote = None
+    i = 0
+    while i < len(line):
+        ch = line[i]
+        if quote:
+            if ch == "\\":
+                i += 1
+            elif ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+        elif line.startswith("--", i):
+            return line[:i]
+        i += 1
+    return line
+
+
+def minify_tsp(source):
+    """Drop comments, indentation, trailing blanks and empty lines. Block comments / long strings ([[ ]]) are not used by these scripts and are kept as is."""
+    if "[[" in source:
+        return source
+    lines = []
+    for raw_line in source.splitlines():
+        line = _strip_lua_comment(raw_line).strip()
+        if line:
+            lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool) and math.isfinite(float(value))
+
+
+def format_tsp_value(key, value):
+    """Text substituted for {{key}}: numbers, numeric strings, sequences of numbers or a Lua table literal of numbers."""
+    if _is_number(value):
+        return repr(int(value)) if isinstance(value, numbers.Integral) else repr(float(value))
+    if isinstance(value, (list, tuple)):
+        if all(_is_number(v) for v in value):
+            return "{" + ", ".join(format_tsp_value(key, v) for v in value) + "}"
+    elif isinstance(value, str):
+        text = value.strip()
+        try:
+            if math.isfinite(float(text)):
+                return text
+        except ValueError:
+            if _LUA_NUMBER_TABLE_RE.match(text):
+                items = [t.strip() for t in text[1:-1].split(",") if t.strip()]
+                try:
+                    if all(math.isfinite(float(t)) for t in items):
+                        return text
+                except ValueError:
+                    pass
+    raise ValueError(f"TSP参数 '{key}' 的值 {value!r} 不是有效数值 (需要数字、数字字符串或数字组成的 Lua 表)。")
+
+
+class CompiledTspTemplate:
+    def __init__(self, path, mtime_ns, source, minify):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.minify = minify
+        self.source_chars = len(source)
+        text = minify_tsp(source) if minify else source
+        # Alternating literal / placeholder-name pieces: [lit, key, lit, key, ..., lit]
+        self.pieces = _PLACEHOLDER_RE.split(text)
+        self.placeholders = frozenset(self.pieces[1::2])
+
+    def render(self, tsp_params):
+        missing = sorted(k for k in self.placeholders if k not in tsp_params)
+        if missing:
+            raise ValueError(f"TSP脚本 '{os.path.basename(self.path)}' 缺少占位符参数: {', '.join(missing)}")
+        values = {k: format_tsp_value(k, tsp_params[k]) for k in self.placeholders}
+        pieces = list(self.pieces)
+        for i in range(1, len(pieces), 2):
+            pieces[i] = values[pieces[i]]
+        return "".join(pieces)
+
+
+def compile_tsp_template(script_path, minify=None):
+    """Compiled template for script_path, reused until the file's mtime changes. Returns (template, cache_hit)."""
+    if minify is None:
+        minify = config_settings.TSP_MINIFY_ENABLED
+    path = os.path.abspath(script_path)
+    mtime_ns = os.stat(path).st_mtime_ns
+    with _CACHE_LOCK:
+        cached = _CACHE.get((path, minify))
+    if cached is not None and cached.mtime_ns == mtime_ns:
+        return cached, True
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+    compiled = CompiledTspTemplate(path, mtime_ns, source, minify)
+    with _CACHE_LOCK:
+        _CACHE[(path, minify)] = compiled
+    return compiled, False
+
+
+def clear_cache():
+    with _CACHE_LOCK:
+        _CACHE.clear()